@@ -4,10 +4,49 @@
 # Desarrollada para pacientes en régimen con L.N. en Nutrición
 # -------------------------------------------------------------
 
+from functools import wraps
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 from datetime import datetime, date, time, timedelta
 
+from nutri import cards
+from nutri.schema import FULL_MASK, MEAL_COLS, MOOD_OPTIONS, WEIGHT_RANGE
+from nutri.adherence import AdherenceIndex
+from nutri.agenda import DEFAULT_MINUTES, Agenda
+from nutri.cache import LRUCache
+from nutri.checkpoint import CHECKPOINTS_ENABLED, Checkpointer
+from nutri.downsample import lttb_indices
+from nutri.events import LOG, PROFILE, WEIGHT, EventLog, events_frame
+from nutri.exporter import MIME_TYPES, export_bytes
+from nutri.generator import RecipeCatalog, generate_week, macro_targets
+from nutri.importer import import_file
+from nutri.nutrients import NUTRIENT_LABELS, FoodTable, macro_split
+from nutri.plans import PlanStore, read_plan_file
+from nutri.profiling import PROFILER
+from nutri.reminders import REMINDERS_ENABLED, OutboxNotifier, ReminderScheduler
+from nutri.search import BASE_PLAN, SearchIndex
+from nutri.shared_state import (
+    SESSION_COOKIE,
+    SESSION_TTL,
+    LocalVersionCache,
+    PatientVersions,
+    SessionStore,
+    backend_from_url,
+)
+from nutri.storage import Storage
+from nutri.streaks import StreakTracker
+from nutri.summaries import (
+    SUMMARY_SORT_COLS,
+    calculate_bmi,
+    calculate_progress,
+    compute_summary,
+)
+from nutri.timeseries import ordinals_to_dates
+from nutri.trend import WeightTrend, refresh_clinician_trends
+from nutri.writebehind import WriteBehind
+
 # -------------------------------------------------------------
 # CONFIGURACIÓN GENERAL DE LA APP
 # -------------------------------------------------------------
@@ -122,6 +161,13 @@ st.markdown(
         margin-bottom: 0.4rem;
     }
 
+    .search-hit mark {
+        background-color: #fef3c7;
+        color: inherit;
+        padding: 0 0.1rem;
+        border-radius: 4px;
+    }
+
     .small-label {
         font-size: 0.78rem;
         text-transform: uppercase;
@@ -134,18 +180,60 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+# Máximo de puntos que se envían a la gráfica de peso
+MAX_CHART_POINTS = 500
+
+# Días que se proyecta la tendencia en la gráfica: hasta la fecha meta con
+# este tope, o este mínimo si todavía no hay tendencia clara
+MAX_PROJECTION_DAYS = 180
+MIN_PROJECTION_DAYS = 30
+
+# Credenciales de ejemplo. Aquí luego se puede conectar a DB, Google Sheets, etc.
+# Cada paciente indica qué nutrióloga lo atiende.
+USUARIOS = {
+    "paciente": {"password": "nutri123", "rol": "paciente", "nutriologa": "brenda"},
+    "brenda": {"password": "clinica123", "rol": "nutriologa", "admin": True},
+}
+
+# Pacientes por página en el panel de la nutrióloga
+PATIENTS_PAGE_SIZE = 25
+
+# Días por página en "Todo el historial" del registro diario
+HISTORY_PAGE_SIZE = 30
+
+# Cambios que muestra el "Historial de cambios" del registro diario
+HISTORY_EVENTS = 50
+
+# Nombres de los tiempos de comida en el orden de MEAL_COLS
+MEAL_LABELS = ["Desayuno", "Colación 1", "Comida", "Colación 2", "Cena"]
+
 # -------------------------------------------------------------
 # INICIALIZACIÓN DE ESTADO DE SESIÓN
 # -------------------------------------------------------------
+@PROFILER.timed()
 def init_session_state():
     """Crea datos por defecto la primera vez que se abre la app."""
-    today = date.today()
-
     # ---- Estado de autenticación ----
     if "logged_in" not in st.session_state:
         st.session_state["logged_in"] = False
     if "username" not in st.session_state:
         st.session_state["username"] = None
+    if "role" not in st.session_state:
+        st.session_state["role"] = None
+
+    # ---- Reconexión: la sesión de login vive en el almacén compartido ----
+    # El token llega en la cookie del navegador (solo se revisa al abrir la página)
+    if "_cookie_checked" not in st.session_state:
+        st.session_state["_cookie_checked"] = True
+        token = st.context.cookies.get(SESSION_COOKIE)
+        sesion = get_session_store().get(token) if token else None
+        if sesion:
+            st.session_state["logged_in"] = True
+            st.session_state["username"] = sesion["username"]
+            st.session_state["role"] = sesion["role"]
+            st.session_state["session_token"] = token
+            # Renueva también la vigencia de la cookie
+            st.session_state["_session_cookie"] = token
 
     # ---- Datos de seguimiento ----
     if "initial_weight" not in st.session_state:
@@ -157,63 +245,469 @@ def init_session_state():
     if "height_m" not in st.session_state:
         st.session_state["height_m"] = 1.65  # metros (ejemplo)
 
-    if "next_appointment_date" not in st.session_state:
-        st.session_state["next_appointment_date"] = today + timedelta(days=7)
-    if "next_appointment_time" not in st.session_state:
-        now_time = datetime.now().time().replace(second=0, microsecond=0)
-        st.session_state["next_appointment_time"] = now_time
-
-    # Historial de peso
-    if "weight_df" not in st.session_state:
-        days = [today - timedelta(days=i) for i in range(9, -1, -1)]  # últimos 10 días
-        start = st.session_state["initial_weight"]
-        end = st.session_state["current_weight"]
-        steps = len(days) - 1 if len(days) > 1 else 1
-        step = (end - start) / steps
-        weights = [round(start + step * i, 1) for i in range(len(days))]
-        st.session_state["weight_df"] = pd.DataFrame(
-            {"date": days, "weight": weights}
-        )
-
-    # Registros diarios simulados
-    if "daily_logs_df" not in st.session_state:
-        registros = []
-        for i in range(6, -1, -1):  # últimos 7 días
-            d = today - timedelta(days=i)
-            # patrón sencillo de cumplimiento
-            cumplidas = 5 - (i % 3)
-            valores = [True] * cumplidas + [False] * (5 - cumplidas)
-            registros.append(
-                {
-                    "date": d,
-                    "desayuno": valores[0],
-                    "colacion1": valores[1],
-                    "comida": valores[2],
-                    "colacion2": valores[3],
-                    "cena": valores[4],
-                    "mood": "Bien",
-                    "comentarios": "Registro simulado.",
-                }
-            )
-        st.session_state["daily_logs_df"] = pd.DataFrame(registros)
 
+# -------------------------------------------------------------
+# ACCESO A DATOS PERSISTENTES
+# -------------------------------------------------------------
+@st.cache_resource
+def get_shared_state():
+    """Almacén compartido entre workers (ver NUTRI_SHARED_STATE)."""
+    return backend_from_url()
 
-def sync_weight_with_today():
-    """Sincroniza el peso actual con un registro para el día de hoy en el historial."""
-    df = st.session_state["weight_df"].copy()
-    today = date.today()
-    current_w = st.session_state["current_weight"]
 
-    if today in df["date"].values:
-        df.loc[df["date"] == today, "weight"] = current_w
-    else:
-        df = pd.concat(
-            [df, pd.DataFrame({"date": [today], "weight": [current_w]})],
-            ignore_index=True,
+@st.cache_resource
+def get_version_cache():
+    """Copia local del worker de las versiones guardadas en el almacén compartido."""
+    return LocalVersionCache(get_shared_state())
+
+
+@st.cache_resource
+def get_session_store():
+    """Sesiones de login compartidas entre workers."""
+    return SessionStore(get_shared_state())
+
+
+@st.cache_resource
+def get_store():
+    """Almacenamiento SQLite compartido por todas las sesiones del proceso."""
+    return Storage(versions=PatientVersions(get_version_cache()))
+
+
+@st.cache_resource
+def get_checkpoints():
+    """
+    Puntos de control en disco (Arrow IPC) para retomar sesiones tras un
+    reinicio; None con NUTRI_CHECKPOINTS=0 o sin pyarrow.
+    """
+    return Checkpointer() if CHECKPOINTS_ENABLED else None
+
+
+@st.cache_resource
+def get_event_log():
+    """Bitácora de cambios de los pacientes (estado desde instantánea + eventos)."""
+    return EventLog(get_store(), checkpoints=get_checkpoints())
+
+
+@st.cache_resource
+def get_writes():
+    """
+    Cola de escritura diferida de registros, pesos y resúmenes: se vacía
+    por lotes desde un hilo aparte y reindexa los comentarios escritos.
+    """
+    index = get_search_index()
+
+    def indexar(revs, registros):
+        for patient, r in registros:
+            index.update_comment(patient, r["date"], r.get("comentarios"), revs[patient])
+
+    return WriteBehind(get_store(), on_flush=indexar)
+
+
+@st.cache_resource
+def get_plan_store():
+    """Planes de alimentación con caché LRU compartida por las sesiones del proceso."""
+    return PlanStore(get_store(), get_diet_plan_df)
+
+
+@st.cache_resource
+def get_food_table():
+    """Tabla de alimentos (equivalentes SMAE) para estimar calorías; None si no está."""
+    try:
+        return FoodTable.from_csv()
+    except FileNotFoundError:
+        return None
+
+
+@st.cache_resource
+def get_recipe_catalog():
+    """Recetario del generador de planes; None si faltan los archivos."""
+    foods = get_food_table()
+    if foods is None:
+        return None
+    try:
+        return RecipeCatalog.from_csv(foods=foods)
+    except FileNotFoundError:
+        return None
+
+
+@st.cache_resource
+def get_agenda():
+    """Agendas de citas de las nutriólogas compartidas por las sesiones del proceso."""
+    return Agenda(get_store())
+
+
+@st.cache_resource
+def get_reminders():
+    """
+    Programador de recordatorios del proceso, en su propio hilo
+    (None con NUTRI_REMINDERS=0, por ejemplo si corre en un proceso aparte).
+    """
+    if not REMINDERS_ENABLED:
+        return None
+    return ReminderScheduler(get_store(), OutboxNotifier()).start()
+
+
+def refresh_reminders():
+    """Tras cambiar la agenda: el programador vuelve a leer las citas próximas."""
+    reminders = get_reminders()
+    if reminders is not None:
+        reminders.refresh()
+
+
+@st.cache_resource
+def get_search_index():
+    """Índice de búsqueda de planes y comentarios compartido por las sesiones del proceso."""
+    return SearchIndex(get_store(), get_plan_store())
+
+
+@st.cache_resource
+def get_chart_cache():
+    """Caché de puntos de gráficas compartida por las sesiones del proceso."""
+    return LRUCache(maxsize=256)
+
+
+def current_patient():
+    """Identificador del paciente con sesión iniciada."""
+    return st.session_state["username"]
+
+
+def _rerun_cache():
+    """Lecturas ya hechas durante el rerun actual (se vacía en main)."""
+    return st.session_state.setdefault("_rerun_cache", {})
+
+
+def _patient_state():
+    """
+    Series e índices del paciente guardados en la sesión.
+    Siguen vigentes mientras la revisión en la base no cambie; la
+    revisión se consulta una sola vez por rerun.
+    """
+    state = st.session_state.get("_patient_state")
+    if state is None or state["patient"] != current_patient():
+        state = {"patient": current_patient(), "rev": None, "items": {}}
+        st.session_state["_patient_state"] = state
+    cache = _rerun_cache()
+    if "rev_checked" not in cache:
+        rev = get_store().revision(current_patient())
+        if rev != state["rev"]:
+            # Otra sesión escribió: se aplican sus eventos
+            state["rev"] = rev
+            _catch_up(state)
+        cache["rev_checked"] = True
+    return state
+
+
+def _catch_up(state):
+    """
+    Aplica al estado en memoria los eventos que aún no tiene y actualiza con
+    ellos rachas, adherencia y tendencia. Las importaciones (lotes) o un
+    atraso muy largo descartan las vistas para reconstruirlas bajo demanda.
+    Lo propio que sigue en la cola de escritura se vuelve a aplicar encima.
+    """
+    items = state["items"]
+    base = items.get("state")
+    if base is None:
+        return
+    events = get_event_log().since(state["patient"], base.seq)
+    if events is None:
+        items.clear()
+        return
+    pendientes = get_writes().pending(state["patient"])
+    _apply_events(items, base, events + pendientes)
+    if not pendientes:
+        # Instantánea y punto de control solo con lo que ya está en la base
+        get_event_log().maybe_snapshot(state["patient"], base)
+
+
+def _apply_events(items, base, events):
+    """Aplica eventos al estado y a las vistas derivadas que ya estén armadas."""
+    for event in events:
+        # Los eventos propios ya están aplicados: apply no cambia nada
+        if not base.apply(event):
+            continue
+        d = event.data
+        if event.kind == LOG:
+            cumplidas = sum(bool(d[c]) for c in MEAL_COLS)
+            if "streaks" in items:
+                items["streaks"].update(d["date"], cumplidas == len(MEAL_COLS))
+            if "adherence" in items:
+                items["adherence"].update(d["date"], cumplidas)
+        elif event.kind == WEIGHT:
+            if "trend" in items and not items["trend"].update(d["date"], d["weight"]):
+                items.pop("trend")
+        elif event.kind != PROFILE:
+            for name in [n for n in items if n != "state"]:
+                del items[name]
+
+
+def _patient_item(name, build):
+    """Objeto en memoria del paciente (serie o índice), construido una vez."""
+    items = _patient_state()["items"]
+    if name not in items:
+        items[name] = build()
+    return items[name]
+
+
+def _after_write(rev):
+    """Registra la revisión que dejó una escritura propia."""
+    state = _patient_state()
+    state["rev"] = rev
+    # Trae el evento propio (ya aplicado) y los de otras sesiones entre medias
+    _catch_up(state)
+
+
+def get_patient_events_state():
+    """
+    Registros, pesos y perfil del paciente en memoria, cargados desde su
+    punto de control en disco (o la última instantánea de la bitácora) más
+    los eventos que siguen.
+    """
+    def build():
+        state = get_event_log().load(current_patient())
+        # Lectura de lo propio: lo que sigue en la cola de escritura
+        for event in get_writes().pending(current_patient()):
+            state.apply(event)
+        return state
+
+    return _patient_item("state", build)
+
+
+def get_weight_series():
+    """Historial de peso del paciente como serie ordenada en memoria."""
+    return get_patient_events_state().weights
+
+
+def get_weight_trend():
+    """Modelo de tendencia de peso; se actualiza con cada pesaje."""
+    return _patient_item("trend", lambda: WeightTrend.from_series(get_weight_series()))
+
+
+@PROFILER.timed("df:get_weight_df")
+def get_weight_df():
+    """Vista DataFrame del historial de peso (para gráficas y tablas)."""
+    return get_weight_series().to_frame()
+
+
+@PROFILER.timed("df:get_weight_chart_df")
+def get_weight_chart_df(start, end, projection_days=0):
+    """
+    Puntos de la gráfica de peso para el rango visible, reducidos con LTTB,
+    más la proyección de la tendencia (con su banda de 95%) si se pide.
+    Se guardan por (paciente, revisión, rango) para no recalcular en cada rerun.
+    """
+    # La versión de la serie cubre los pesajes propios que aún no llegan a la base
+    key = (current_patient(), _patient_state()["rev"], get_weight_series().version,
+           start, end, projection_days, MAX_CHART_POINTS)
+
+    def compute():
+        series = get_weight_series()
+        i, j = series.span(start, end)
+        days = series.days[i:j]
+        weights = series.column("weight")[i:j]
+        keep = lttb_indices(days, weights, MAX_CHART_POINTS)
+        df = pd.DataFrame(
+            {"weight": weights[keep]},
+            index=pd.Index(ordinals_to_dates(days[keep]), name="Fecha"),
+        )
+        if not projection_days:
+            return df
+        dias, centro, baja, alta = get_weight_trend().projection(projection_days)
+        tendencia = pd.DataFrame(
+            {"tendencia": centro, "banda_inferior": baja, "banda_superior": alta},
+            index=pd.Index(ordinals_to_dates(dias), name="Fecha"),
         )
-        df = df.sort_values("date")
+        return df.join(tendencia, how="outer")
+
+    return get_chart_cache().get_or_compute(key, compute)
+
+
+def get_daily_logs():
+    """Registros diarios compactos del paciente en memoria."""
+    return get_patient_events_state().logs
+
+
+@PROFILER.timed("df:get_daily_logs_df")
+def get_daily_logs_df(start=None, end=None):
+    """Vista DataFrame de los registros diarios, solo del rango pedido."""
+    return get_daily_logs().to_frame(start, end)
+
+
+def save_weight(day, weight):
+    """
+    Guarda el peso de una fecha; no escribe si el valor no cambió. La
+    sesión cambia ya; la base, con el siguiente lote de la cola.
+    """
+    if not get_weight_series().upsert(day, weight=float(weight)):
+        return False
+    if not get_weight_trend().update(day, weight):
+        # Pesaje anterior al último: el modelo se vuelve a construir
+        _patient_state()["items"].pop("trend", None)
+    get_writes().put_weight(current_patient(), day, weight)
+    refresh_patient_summary()
+    return True
+
+
+def save_daily_log(registro):
+    """
+    Guarda (o reemplaza) el registro de una fecha; no escribe si no cambió.
+    La sesión cambia ya; la base, con el siguiente lote de la cola.
+    """
+    if not get_daily_logs().upsert_registro(registro):
+        return False
+    cumplidas = sum(bool(registro[c]) for c in MEAL_COLS)
+    get_streak_tracker().update(registro["date"], cumplidas == len(MEAL_COLS))
+    get_adherence_index().update(registro["date"], cumplidas)
+    get_writes().put_log(current_patient(), registro)
+    refresh_patient_summary()
+    return True
+
+
+def save_patient_plan(patient, df):
+    """Guarda una versión nueva del plan de un paciente y la indexa para búsquedas."""
+    version = get_plan_store().update(patient, df)
+    get_search_index().update_plan(patient, get_plan_store().get(patient))
+    return version
+
+
+def patient_clinician():
+    """Usuario de la nutrióloga que atiende al paciente (o None)."""
+    return USUARIOS.get(current_patient(), {}).get("nutriologa")
+
+
+def get_clinician_agenda(clinician):
+    """Agenda de la nutrióloga en memoria; su versión se revisa una vez por rerun."""
+    cache = _rerun_cache()
+    if ("agenda", clinician) not in cache:
+        cache[("agenda", clinician)] = get_agenda().clinician(clinician)
+    return cache[("agenda", clinician)]
+
+
+def get_next_appointment():
+    """
+    Próxima cita del paciente. La búsqueda se guarda en la sesión y se repite
+    solo si cambió la agenda de su nutrióloga o si la cita ya terminó.
+    """
+    clinician = patient_clinician()
+    if clinician is None:
+        return None
+    agenda = get_clinician_agenda(clinician)
+    now = datetime.now()
+    llave = (current_patient(), clinician, agenda.version)
+    guardada = st.session_state.get("_proxima_cita")
+    if guardada is None or guardada[0] != llave or (guardada[1] is not None and guardada[1].end <= now):
+        guardada = (llave, agenda.next_for_patient(current_patient(), now))
+        st.session_state["_proxima_cita"] = guardada
+    return guardada[1]
+
+
+def get_profile():
+    """Perfil guardado del paciente (pesos de referencia, altura, nutrióloga)."""
+    return get_patient_events_state().profile
+
+
+@PROFILER.timed()
+def sync_profile():
+    """Guarda los datos del panel lateral si cambiaron respecto a los guardados."""
+    profile = get_profile()
+    nuevo = {
+        "clinician": patient_clinician(),
+        "initial_weight": float(st.session_state["initial_weight"]),
+        "goal_weight": float(st.session_state["goal_weight"]),
+        "height_m": float(st.session_state["height_m"]),
+    }
+    if profile == nuevo:
+        return False
+    get_patient_events_state().profile = nuevo
+    _after_write(get_store().upsert_profile(current_patient(), nuevo))
+    refresh_patient_summary()
+    return True
+
+
+def refresh_patient_summary():
+    """Recalcula la fila de resumen del paciente para el panel de la nutrióloga."""
+    profile = get_profile()
+    if profile is None:
+        return
+    logs = get_daily_logs()
+    ultimo = date.fromordinal(int(logs.days[-1])) if len(logs) else None
+    peso = get_weight_series().last("weight")
+    summary = compute_summary(
+        profile,
+        None if peso is None else float(peso),
+        get_streak_tracker(),
+        get_adherence_index(),
+        ultimo,
+        trend=get_weight_trend(),
+    )
+    get_writes().put_summary(current_patient(), profile["clinician"], summary)
+
+
+def get_streak_tracker():
+    """Rachas del paciente; se actualizan al guardar cada registro."""
+    return _patient_item(
+        "streaks", lambda: StreakTracker.from_compact(get_daily_logs())
+    )
+
+
+def get_adherence_index():
+    """Sumas acumuladas de adherencia; se actualizan al guardar cada registro."""
+    return _patient_item(
+        "adherence", lambda: AdherenceIndex.from_compact(get_daily_logs())
+    )
 
-    st.session_state["weight_df"] = df
+
+def seed_demo_data(patient):
+    """Carga datos de ejemplo para un paciente que aún no tiene historial."""
+    today = date.today()
+    store = get_store()
+
+    # Historial de peso (últimos 10 días)
+    days = [today - timedelta(days=i) for i in range(9, -1, -1)]
+    start = st.session_state["initial_weight"]
+    end = st.session_state["current_weight"]
+    steps = len(days) - 1 if len(days) > 1 else 1
+    step = (end - start) / steps
+    weights = [round(start + step * i, 1) for i in range(len(days))]
+    store.upsert_weights(patient, zip(days, weights))
+
+    # Registros diarios simulados (últimos 7 días)
+    registros = []
+    for i in range(6, -1, -1):
+        d = today - timedelta(days=i)
+        # patrón sencillo de cumplimiento
+        cumplidas = 5 - (i % 3)
+        valores = [True] * cumplidas + [False] * (5 - cumplidas)
+        registro = {"date": d, "mood": "Bien", "comentarios": "Registro simulado."}
+        registro.update(zip(MEAL_COLS, valores))
+        registros.append(registro)
+    store.upsert_daily_logs(patient, registros)
+
+
+@PROFILER.timed()
+def ensure_patient_data():
+    """Prepara los datos del paciente una sola vez por sesión."""
+    if st.session_state.get("data_ready_for") == current_patient():
+        return
+    if not get_store().has_data(current_patient()):
+        seed_demo_data(current_patient())
+    # El peso actual arranca desde el último valor guardado
+    ultimo = get_weight_series().last("weight")
+    if ultimo is not None:
+        st.session_state["current_weight"] = float(ultimo)
+    # Los datos del panel lateral arrancan desde el perfil guardado
+    profile = get_profile()
+    if profile is not None:
+        for key in ("initial_weight", "goal_weight", "height_m"):
+            st.session_state[key] = profile[key]
+    sync_profile()
+    st.session_state["data_ready_for"] = current_patient()
+
+
+@PROFILER.timed()
+def sync_weight_with_today():
+    """Sincroniza el peso actual con un registro para el día de hoy en el historial."""
+    # Búsqueda binaria en la serie; solo se escribe si el peso de hoy cambió
+    save_weight(date.today(), st.session_state["current_weight"])
 
 
 def get_diet_plan_df():
@@ -267,69 +761,214 @@ def get_diet_plan_df():
     return df
 
 
-def calculate_streak(df):
-    """Calcula días consecutivos cumpliendo todos los tiempos de comida."""
-    if df.empty:
-        return 0
-
-    df_sorted = df.sort_values("date")
-    # Se cumple el día si todos los tiempos son True
-    meal_cols = ["desayuno", "colacion1", "comida", "colacion2", "cena"]
-    df_sorted["cumplido_dia"] = df_sorted[meal_cols].all(axis=1)
+# -------------------------------------------------------------
+# FRAGMENTOS: PARTES DE LA PÁGINA QUE SE REDIBUJAN SOLAS
+# -------------------------------------------------------------
+# Cada fragmento declara de qué datos depende. Al cambiar un dato del
+# panel lateral o guardar un registro solo se vuelven a ejecutar los
+# fragmentos visibles que dependen de él (st.rerun con sus llaves);
+# los widgets dentro de un fragmento solo vuelven a ejecutar ese fragmento.
+# "registros" representa los registros diarios guardados.
+FRAGMENT_DEPS = {
+    "resumen": {"initial_weight", "current_weight", "goal_weight", "cita"},
+    "tarjetas": {"initial_weight", "current_weight", "goal_weight", "height_m", "registros"},
+    "grafica_peso": {"initial_weight", "current_weight", "goal_weight"},
+    "grafica_adherencia": {"registros"},
+    "tabla_registros": {"registros"},
+}
+
+
+def page_fragment(key):
+    """
+    Convierte una función en un fragmento con llave (st.fragment).
+    Registra que el fragmento está visible y vuelve a revisar la revisión
+    de los datos, porque en un rerun del fragmento main() no se ejecuta.
+    """
+    def decorate(func):
+        @wraps(func)
+        def run(*args, **kwargs):
+            st.session_state["_rerun_cache"] = {}
+            st.session_state.setdefault("_fragmentos", set()).add(key)
+            return func(*args, **kwargs)
 
-    cumplidos = df_sorted[df_sorted["cumplido_dia"]]
-    if cumplidos.empty:
-        return 0
+        return st.fragment(PROFILER.timed(f"fragment:{key}")(run), key=key)
 
-    fechas = sorted(cumplidos["date"].unique(), reverse=True)
-    streak = 0
-    esperada = fechas[0]
+    return decorate
 
-    for f in fechas:
-        if f == esperada:
-            streak += 1
-            esperada = esperada - timedelta(days=1)
-        else:
-            break
 
-    return streak
+def rerun_dependents(changed, also=()):
+    """
+    Desde un callback: vuelve a ejecutar solo los fragmentos visibles que
+    dependen de los datos en changed (más los de also). Si ninguno depende,
+    no hace nada y Streamlit sigue con el rerun normal de la interacción.
+    """
+    visibles = st.session_state.get("_fragmentos", set())
+    keys = [k for k, deps in FRAGMENT_DEPS.items() if k in visibles and deps & changed]
+    keys += [k for k in also if k in visibles and k not in keys]
+    if keys:
+        st.rerun(keys)
 
 
+@page_fragment("resumen")
 def show_top_summary():
-    """Resumen siempre visible: pesos y próxima cita."""
-    iw = st.session_state["initial_weight"]
-    cw = st.session_state["current_weight"]
-    gw = st.session_state["goal_weight"]
-    ap_date = st.session_state["next_appointment_date"]
-    ap_time = st.session_state["next_appointment_time"]
-    ap_dt = datetime.combine(ap_date, ap_time)
-    ap_str = ap_dt.strftime("%d/%m/%Y %H:%M")
-
+    """Resumen siempre visible: pesos y próxima cita (de la agenda)."""
+    cita = get_next_appointment()
     st.markdown(
-        f"""
-        <div class="card" style="background-color:#e8f8f2; margin-bottom:1.4rem;">
-            <div class="card-title">Resumen de tu proceso</div>
-            <p style="margin-bottom:0.25rem;">
-                <strong>Peso inicial:</strong> {iw:.1f} kg · 
-                <strong>Peso actual:</strong> {cw:.1f} kg · 
-                <strong>Peso objetivo:</strong> {gw:.1f} kg
-            </p>
-            <p style="margin-bottom:0;">
-                💬 Próxima cita: <strong>{ap_str}</strong> con la L.N. Brenda López Hernández.
-            </p>
-        </div>
-        """,
+        cards.summary_card(
+            st.session_state["initial_weight"],
+            st.session_state["current_weight"],
+            st.session_state["goal_weight"],
+            cita.start if cita is not None else None,
+        ),
         unsafe_allow_html=True,
     )
 
+
+@PROFILER.timed("callback:datos")
+def _on_patient_data_change(field):
+    """Guarda un dato del panel lateral y redibuja solo lo que depende de él."""
+    st.session_state[field] = st.session_state[f"_w_{field}"]
+    st.session_state["_rerun_cache"] = {}
+    if field == "current_weight":
+        sync_weight_with_today()
+    else:
+        sync_profile()
+    rerun_dependents({field})
+
+
+@page_fragment("datos")
+def sidebar_patient_data():
+    """Datos del paciente y próxima cita en el panel lateral."""
+    st.markdown("---")
+    st.markdown("#### ⚖️ Mis datos")
+    limites = {
+        "initial_weight": ("Peso inicial (kg)", *WEIGHT_RANGE, 0.1),
+        "current_weight": ("Peso actual (kg)", *WEIGHT_RANGE, 0.1),
+        "goal_weight": ("Peso objetivo (kg)", *WEIGHT_RANGE, 0.1),
+        "height_m": ("Altura (m)", 1.20, 2.10, 0.01),
+    }
+    for field, (label, minimo, maximo, paso) in limites.items():
+        st.number_input(
+            label,
+            min_value=minimo,
+            max_value=maximo,
+            value=float(st.session_state[field]),
+            step=paso,
+            key=f"_w_{field}",
+            on_change=_on_patient_data_change,
+            args=(field,),
+        )
+
+    st.markdown("---")
+    st.markdown("#### 📅 Próxima cita")
+    appointment_sidebar()
+
+
+def appointment_sidebar():
+    """Próxima cita y horarios libres de la nutrióloga para agendarla o cambiarla."""
+    clinician = patient_clinician()
+    if clinician is None:
+        st.caption("Tu usuario no tiene nutrióloga asignada.")
+        return
+    cita = get_next_appointment()
+    if cita is None:
+        st.caption("Sin cita agendada.")
+    else:
+        st.markdown(f"**{cita.start.strftime('%d/%m/%Y')}** a las **{cita.start.strftime('%H:%M')}** ({cita.minutes} min)")
+
+    mensaje = st.session_state.pop("_cita_mensaje", None)
+    if mensaje:
+        (st.success if mensaje[0] == "ok" else st.error)(mensaje[1])
+
+    with st.expander("Cambiar mi cita" if cita else "Agendar cita"):
+        ahora = datetime.now()
+        dia = st.date_input(
+            "Día",
+            value=cita.start.date() if cita else ahora.date(),
+            min_value=ahora.date(),
+            key="cita_dia",
+        )
+        libres = get_agenda().free_slots(clinician, dia, after=ahora)
+        if not libres:
+            siguiente = get_agenda().next_free(clinician, max(ahora, datetime.combine(dia, time())))
+            st.caption(
+                "No hay horarios libres ese día."
+                + (f" El siguiente: {siguiente.strftime('%d/%m/%Y %H:%M')}." if siguiente else "")
+            )
+            return
+        st.selectbox("Horario libre", libres, format_func=lambda t: t.strftime("%H:%M"), key="cita_hora")
+        st.button(
+            "Cambiar a este horario" if cita else "Agendar",
+            key="cita_agendar",
+            on_click=_on_book_appointment,
+        )
+
+
+@PROFILER.timed("callback:cita")
+def _on_book_appointment():
+    """Agenda (o cambia) la cita del paciente y redibuja el resumen."""
+    st.session_state["_rerun_cache"] = {}
+    inicio = st.session_state["cita_hora"]
+    cita = get_next_appointment()
+    try:
+        if cita is None:
+            get_agenda().book(patient_clinician(), current_patient(), inicio)
+        else:
+            get_agenda().reschedule(patient_clinician(), cita.id, inicio)
+    except ValueError as exc:
+        st.session_state["_cita_mensaje"] = ("error", f"No se pudo agendar: {exc}")
+    else:
+        refresh_reminders()
+        st.session_state["_cita_mensaje"] = (
+            "ok", f"Cita agendada el {inicio.strftime('%d/%m/%Y')} a las {inicio.strftime('%H:%M')}."
+        )
+    st.session_state["_rerun_cache"] = {}
+    st.session_state.pop("_proxima_cita", None)
+    rerun_dependents({"cita"}, also=("datos",))
+
 # -------------------------------------------------------------
 # SECCIÓN LOGIN
 # -------------------------------------------------------------
+def set_session_cookie(token):
+    """
+    Guarda (o borra, con token vacío) la cookie de la sesión de login en el
+    navegador. Vence junto con la sesión del almacén compartido.
+    """
+    # Limitación conocida: la cookie se escribe con document.cookie desde
+    # JavaScript, así que no puede ser HttpOnly (Streamlit no deja poner
+    # encabezados Set-Cookie). Por eso la vigencia es corta (SESSION_TTL)
+    # y el token solo es un identificador opaco: sin la sesión del lado
+    # del servidor no sirve de nada. init_session_state() lo revisa con
+    # get_session_store().get(token) y lo ignora si expiró o se cerró.
+    max_age = SESSION_TTL if token else 0
+    st.html(
+        f"<script>document.cookie = '{SESSION_COOKIE}={token}; Max-Age={max_age}; Path=/; "
+        "SameSite=Strict' + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True,
+    )
+
+
+def logout():
+    """Cierra la sesión aquí y en el almacén compartido."""
+    token = st.session_state.pop("session_token", None)
+    if token:
+        get_session_store().delete(token)
+    # La cookie se borra en el siguiente rerun (este se interrumpe)
+    st.session_state["_session_cookie"] = ""
+    st.session_state["logged_in"] = False
+    st.session_state["username"] = None
+    st.session_state["role"] = None
+    st.session_state.pop("data_ready_for", None)
+    st.rerun()
+
+
+@PROFILER.timed()
 def show_login():
     """
     Sección de iniciar sesión.
-    Por ahora usa credenciales de ejemplo:
+    Por ahora usa credenciales de ejemplo (ver USUARIOS):
     usuario: 'paciente', contraseña: 'nutri123'
+    nutrióloga: 'brenda', contraseña: 'clinica123'
     """
     st.markdown('<div class="main-title">🔐 Iniciar sesión</div>', unsafe_allow_html=True)
     st.markdown(
@@ -346,30 +985,31 @@ def show_login():
             submit = st.form_submit_button("Entrar")
 
         if submit:
-            # Credenciales de ejemplo. Aquí luego se puede conectar a DB, Google Sheets, etc.
-            if username == "paciente" and password == "nutri123":
+            usuario = USUARIOS.get(username)
+            if usuario and password == usuario["password"]:
                 st.session_state["logged_in"] = True
                 st.session_state["username"] = username
+                st.session_state["role"] = usuario["rol"]
+                # El token en una cookie permite retomar la sesión en cualquier worker
+                token = get_session_store().create(username, usuario["rol"])
+                st.session_state["session_token"] = token
+                set_session_cookie(token)
                 st.success("Bienvenido a tu App de Seguimiento Nutricional 🥦")
             else:
                 st.error("Usuario o contraseña incorrectos. Intenta de nuevo.")
 
     with col2:
         st.markdown(
-            """
-            <div class="card-soft">
-                <div class="card-title">¿Qué es esta app?</div>
-                <p style="font-size:0.88rem; color:#374151;">
-                    Esta plataforma te permite ver tu peso inicial, peso actual, 
-                    tu peso objetivo y la fecha de tu próxima cita, además de 
-                    registrar si estás cumpliendo con tu plan de alimentación.
-                </p>
-                <p style="font-size:0.85rem; color:#4b5563;">
-                    Las credenciales de acceso son asignadas por tu nutrióloga. 
-                    Si tienes dudas, contáctala directamente.
-                </p>
-            </div>
-            """,
+            cards.info_card(
+                "¿Qué es esta app?",
+                (
+                    "Esta plataforma te permite ver tu peso inicial, peso actual, "
+                    "tu peso objetivo y la fecha de tu próxima cita, además de "
+                    "registrar si estás cumpliendo con tu plan de alimentación.",
+                    "Las credenciales de acceso son asignadas por tu nutrióloga. "
+                    "Si tienes dudas, contáctala directamente.",
+                ),
+            ),
             unsafe_allow_html=True,
         )
 
@@ -378,6 +1018,7 @@ def show_login():
 # -------------------------------------------------------------
 # SECCIÓN 1: SEGUIMIENTO PROFESIONAL (DASHBOARD)
 # -------------------------------------------------------------
+@PROFILER.timed()
 def show_dashboard():
     st.markdown('<div class="main-title">🥦 Seguimiento profesional</div>', unsafe_allow_html=True)
     st.markdown(
@@ -386,123 +1027,118 @@ def show_dashboard():
     )
 
     show_top_summary()
+    metric_cards()
 
-    weight_df = st.session_state["weight_df"].copy()
-    daily_df = st.session_state["daily_logs_df"].copy()
+    st.markdown("")
 
+    # Gráfica de evolución de peso
+    weight_chart()
+
+    # Mensaje de la nutrióloga (simulado)
+    st.markdown("")
+    st.subheader("💚 Mensaje de la nutrióloga")
+    mensaje = (
+        "¡Vas haciendo un gran trabajo! Recuerda mantener una buena hidratación, "
+        "respetar tus horarios de comida y dormir adecuadamente. Si notas cambios "
+        "importantes en tu apetito, energía o estado de ánimo, coméntalo en tu próxima cita."
+    )
+    st.markdown(cards.message_card("Nota", mensaje, True), unsafe_allow_html=True)
+
+
+@page_fragment("tarjetas")
+def metric_cards():
+    """Tarjetas de peso, IMC, progreso y racha."""
     iw = st.session_state["initial_weight"]
     cw = st.session_state["current_weight"]
     gw = st.session_state["goal_weight"]
     h = st.session_state["height_m"]
 
     # Cálculos clave
-    bmi = cw / (h ** 2) if h > 0 else None
-    # Progreso hacia la meta (pérdida de peso)
-    progress_pct = 0.0
-    if iw != gw:
-        if iw > gw:  # meta bajar de peso
-            progress_pct = (iw - cw) / (iw - gw)
-        else:        # meta subir de peso
-            progress_pct = (cw - iw) / (gw - iw)
-        progress_pct = max(0.0, min(progress_pct, 1.0))
-
-    streak = calculate_streak(daily_df)
-
-    # Métricas principales en tarjetas
-    col1, col2, col3, col4 = st.columns(4)
+    bmi = calculate_bmi(cw, h)
+    # Progreso hacia la meta (bajar o subir de peso)
+    progress_pct = calculate_progress(iw, cw, gw)
 
-    with col1:
-        st.markdown(
-            f"""
-            <div class="card-soft">
-                <div class="card-title">Peso actual</div>
-                <div class="metric-highlight">{cw:.1f} kg</div>
-                <div class="metric-caption">Meta: {gw:.1f} kg</div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
+    tracker = get_streak_tracker()
+    streak = tracker.current
 
+    # Métricas principales en tarjetas (HTML memorizado por valores)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown(cards.weight_card(cw, gw), unsafe_allow_html=True)
     with col2:
-        if bmi:
-            st.markdown(
-                f"""
-                <div class="card-soft">
-                    <div class="card-title">IMC estimado</div>
-                    <div class="metric-highlight">{bmi:.1f}</div>
-                    <div class="metric-caption">Altura: {h:.2f} m</div>
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
-        else:
-            st.markdown(
-                """
-                <div class="card-soft">
-                    <div class="card-title">IMC estimado</div>
-                    <div class="metric-highlight">-</div>
-                    <div class="metric-caption">Agrega tu altura en el panel lateral.</div>
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
-
+        st.markdown(cards.bmi_card(bmi, h), unsafe_allow_html=True)
     with col3:
-        st.markdown(
-            f"""
-            <div class="card-soft">
-                <div class="card-title">Progreso hacia la meta</div>
-                <div class="metric-highlight">{progress_pct*100:.0f}%</div>
-                <div class="metric-caption">Con base en peso inicial y objetivo.</div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
+        st.markdown(cards.progress_card(progress_pct), unsafe_allow_html=True)
     with col4:
+        st.markdown(cards.streak_card(streak, tracker.longest), unsafe_allow_html=True)
+
+    # Fecha estimada para la meta según la tendencia de los pesajes
+    pronostico = get_weight_trend().forecast(gw, iw)
+    if pronostico is not None:
         st.markdown(
-            f"""
-            <div class="card-soft">
-                <div class="card-title">Días consecutivos cumpliendo</div>
-                <div class="metric-highlight">{streak}</div>
-                <div class="metric-caption">Todos los tiempos de comida cumplidos.</div>
-            </div>
-            """,
+            cards.goal_date_card(
+                gw,
+                round(pronostico["kg_per_week"], 2),
+                pronostico["goal_date"],
+                pronostico["goal_early"],
+                pronostico["goal_late"],
+                pronostico["clear"],
+                pronostico["reached"],
+            ),
             unsafe_allow_html=True,
         )
 
-    st.markdown("")
 
-    # Gráfica de evolución de peso
+@page_fragment("grafica_peso")
+def weight_chart():
+    """Gráfica de peso con su selector de rango."""
+    weight_series = get_weight_series()
     st.subheader("📉 Evolución de tu peso")
-    if not weight_df.empty:
-        chart_df = weight_df.set_index("date")[["weight"]]
-        chart_df.index.name = "Fecha"
-        st.line_chart(chart_df)
+    if len(weight_series):
+        dias = weight_series.days
+        primero = date.fromordinal(int(dias[0]))
+        ultimo = date.fromordinal(int(dias[-1]))
+        if primero < ultimo:
+            inicio, fin = st.slider(
+                "Rango a mostrar",
+                min_value=primero,
+                max_value=ultimo,
+                value=(primero, ultimo),
+                format="DD/MM/YYYY",
+            )
+        else:
+            inicio, fin = primero, ultimo
+        # La proyección solo se dibuja si el rango llega al último pesaje
+        proyeccion = 0
+        if fin == ultimo and st.checkbox("Mostrar tendencia y proyección", value=True):
+            proyeccion = projection_days(
+                get_weight_trend().forecast(st.session_state["goal_weight"], st.session_state["initial_weight"]),
+                ultimo,
+            )
+        chart_df = get_weight_chart_df(inicio, fin, proyeccion)
+        with PROFILER.stage("chart:peso"):
+            st.line_chart(chart_df)
+            if proyeccion:
+                st.caption(
+                    "La línea de tendencia se proyecta hasta la fecha estimada de tu meta "
+                    "(banda de 95%); se ajusta con cada pesaje."
+                )
     else:
         st.info("Aún no hay historial de peso. Agrega tu peso actual en el panel lateral.")
 
-    # Mensaje de la nutrióloga (simulado)
-    st.markdown("")
-    st.subheader("💚 Mensaje de la nutrióloga")
-    mensaje = (
-        "¡Vas haciendo un gran trabajo! Recuerda mantener una buena hidratación, "
-        "respetar tus horarios de comida y dormir adecuadamente. Si notas cambios "
-        "importantes en tu apetito, energía o estado de ánimo, coméntalo en tu próxima cita."
-    )
-    st.markdown(
-        f"""
-        <div class="card">
-            <div class="small-label">Nota</div>
-            <p style="font-size:0.9rem; color:#1f2937; margin-bottom:0;">{mensaje}</p>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
+def projection_days(forecast, last_day):
+    """Días a proyectar: hasta la fecha meta estimada (con tope) o un tramo corto."""
+    if forecast is None or forecast["reached"]:
+        return 0
+    meta = forecast["goal_late"] or forecast["goal_date"]
+    if forecast["clear"] and meta:
+        return min((meta - last_day).days, MAX_PROJECTION_DAYS)
+    return MIN_PROJECTION_DAYS
 
 # -------------------------------------------------------------
 # SECCIÓN 2: MI PLAN DE ALIMENTACIÓN
 # -------------------------------------------------------------
+@PROFILER.timed()
 def show_plan():
     st.markdown('<div class="main-title">📋 Mi plan de alimentación</div>', unsafe_allow_html=True)
     st.markdown(
@@ -512,45 +1148,134 @@ def show_plan():
 
     show_top_summary()
 
-    dieta_df = get_diet_plan_df()
+    # Plan ya procesado desde la caché (se separa por día una sola vez)
+    plan = get_plan_store().get(current_patient())
+
+    with st.expander("🔎 Buscar en mi plan y mis comentarios"):
+        search_box(
+            (current_patient(),) + (() if plan.version else (BASE_PLAN,)),
+            "Ej. atún, tortillas, ansiedad...",
+        )
+
+    # Calorías y macros estimados (se calculan una vez por versión del plan)
+    foods = get_food_table()
+    nutricion = plan.nutrition(foods) if foods is not None else None
 
     # Filtro por día
-    dias = dieta_df["Día"].unique().tolist()
-    dia_seleccionado = st.selectbox("Selecciona el día de la semana:", dias, index=0)
+    dia_seleccionado = st.selectbox("Selecciona el día de la semana:", plan.days, index=0)
 
-    filtro_df = dieta_df[dieta_df["Día"] == dia_seleccionado].copy()
+    if nutricion is not None:
+        plan_totals(nutricion, dia_seleccionado)
 
     st.markdown("### 🍽️ Comidas del día seleccionado")
 
     # Mostrar en formato "cards" por tiempo de comida
-    for _, row in filtro_df.iterrows():
+    kcal = nutricion.meal_kcal(dia_seleccionado) if nutricion is not None else None
+    for k, (tiempo, descripcion) in enumerate(plan.meals_by_day[dia_seleccionado]):
         st.markdown(
-            f"""
-            <div class="card-soft">
-                <div class="meal-title">{row['Tiempo de comida']}</div>
-                <div class="meal-text">{row['Descripción']}</div>
-            </div>
-            """,
+            cards.meal_card(tiempo, descripcion, kcal[k] if kcal else None),
             unsafe_allow_html=True,
         )
 
     st.markdown("### 📊 Vista en tabla (puedes filtrar y ordenar)")
-    st.dataframe(
-        filtro_df.reset_index(drop=True),
-        use_container_width=True,
-        hide_index=True,
-    )
+    with PROFILER.stage("tabla:plan"):
+        st.dataframe(
+            nutricion.day_table(dia_seleccionado) if nutricion is not None else plan.by_day[dia_seleccionado],
+            use_container_width=True,
+            hide_index=True,
+        )
 
-    st.markdown(
-        """
-        > 💡 *Recuerda:* Este plan es un ejemplo. La L.N. puede personalizar tu dieta. 
-        > Puedes modificar directamente el código de esta sección para adaptar tu propio plan.
-        """
+    if nutricion is not None:
+        with st.expander("📈 Totales de la semana"):
+            st.dataframe(
+                nutricion.days.rename(columns=NUTRIENT_LABELS),
+                use_container_width=True,
+            )
+            semana = nutricion.week
+            promedio = nutricion.daily_average
+            st.caption(
+                f"Semana: {semana['energia_kcal']:,.0f} kcal · "
+                f"promedio diario: {promedio['energia_kcal']:,.0f} kcal, "
+                f"{promedio['proteina_g']:.0f} g de proteína, {promedio['lipidos_g']:.0f} g de lípidos "
+                f"y {promedio['hidratos_g']:.0f} g de hidratos de carbono."
+            )
+
+    if plan.version:
+        st.caption(f"Plan personalizado · versión {plan.version}")
+    else:
+        st.markdown(
+            """
+            > 💡 *Recuerda:* Este plan es un ejemplo. La L.N. puede personalizar tu dieta
+            > y cargar tu plan desde su panel.
+            """
+        )
+
+def plan_totals(nutricion, dia):
+    """Tarjetas con energía y macros estimados del día del plan."""
+    totales = nutricion.day_totals(dia)
+    reparto = macro_split(totales)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown(
+            cards.metric_card("Energía del día", f"~{totales['energia_kcal']:,.0f} kcal", "Estimada con equivalentes SMAE"),
+            unsafe_allow_html=True,
+        )
+    for col, nutrimento, titulo in (
+        (col2, "proteina_g", "Proteína"),
+        (col3, "lipidos_g", "Lípidos"),
+        (col4, "hidratos_g", "Hidratos de carbono"),
+    ):
+        with col:
+            st.markdown(
+                cards.metric_card(
+                    titulo, f"{totales[nutrimento]:.0f} g", f"{reparto[nutrimento] * 100:.0f}% de la energía"
+                ),
+                unsafe_allow_html=True,
+            )
+    sin_estimar = [tiempo for d, tiempo in nutricion.unmatched if d == dia]
+    if sin_estimar:
+        st.caption(f"Sin estimar (no se reconocieron alimentos): {', '.join(sin_estimar)}.")
+
+# Resultados que se muestran por búsqueda
+SEARCH_RESULTS = 20
+
+
+@page_fragment("busqueda")
+def search_box(patients, placeholder, show_patient=False):
+    """Búsqueda de texto en los planes y comentarios de patients, con resaltado."""
+    consulta = st.text_input("Buscar", placeholder=placeholder, key="busqueda_texto")
+    if not consulta.strip():
+        return
+    index = get_search_index()
+    if not index.ready:
+        with st.spinner("Preparando el índice de búsqueda..."):
+            index.sync()
+    with PROFILER.stage("busqueda"):
+        resultados = index.search(consulta, patients, limit=SEARCH_RESULTS)
+    if not resultados:
+        st.info("No se encontró nada con esas palabras.")
+        return
+    st.caption(
+        f"Los {SEARCH_RESULTS} resultados más relevantes."
+        if len(resultados) == SEARCH_RESULTS
+        else f"{len(resultados)} resultados, del más al menos relevante."
     )
+    for r in resultados:
+        if r["fuente"] == "Plan":
+            titulo = f"📋 {r['dia']} · {r['tiempo']}"
+            if r["paciente"] is None:
+                nota = "Plan base"
+            else:
+                nota = f"Plan de {r['paciente']}" if show_patient else "Mi plan"
+        else:
+            titulo = f"📝 {r['fecha'].strftime('%d/%m/%Y')}"
+            nota = f"Comentario de {r['paciente']}" if show_patient else "Mi comentario"
+        st.markdown(cards.search_hit_card(titulo, nota, r["resaltado"]), unsafe_allow_html=True)
 
 # -------------------------------------------------------------
 # SECCIÓN 3: REGISTRO DIARIO
 # -------------------------------------------------------------
+@PROFILER.timed()
 def show_daily_log():
     st.markdown('<div class="main-title">📝 Registro diario</div>', unsafe_allow_html=True)
     st.markdown(
@@ -559,96 +1284,204 @@ def show_daily_log():
     )
 
     show_top_summary()
+    daily_log_form()
 
-    daily_df = st.session_state["daily_logs_df"].copy()
+    st.markdown("---")
+    st.subheader("Mis registros recientes")
+    records_table()
 
-    st.subheader("Registrar mi día de hoy")
+    with st.expander("📤 Descargar mi historial"):
+        export_history_form(current_patient())
 
-    today = date.today()
+    with st.expander("📥 Importar historial desde archivo (CSV o Parquet)"):
+        import_history_form(current_patient())
+
+    with st.expander("🕓 Historial de cambios"):
+        change_history()
+
+
+def change_history():
+    """Últimos cambios guardados del paciente (registros, pesos, datos)."""
+    # Lo que sigue en la cola de escritura va primero
+    pendientes = sorted(get_writes().pending(current_patient()), key=lambda e: -e.ts)
+    events = pendientes + get_event_log().history(current_patient(), limit=HISTORY_EVENTS)
+    if not events:
+        st.info("Aún no hay cambios guardados.")
+        return
+    st.dataframe(events_frame(events), use_container_width=True, hide_index=True)
+
+
+@PROFILER.timed("callback:registro")
+def _on_registro_submit():
+    """Guarda el registro del formulario y redibuja lo que depende de los registros."""
+    st.session_state["_rerun_cache"] = {}
+    nuevo_registro = {"date": st.session_state["reg_date"]}
+    for c in MEAL_COLS:
+        nuevo_registro[c] = st.session_state[f"reg_{c}"]
+    nuevo_registro["mood"] = st.session_state["reg_mood"]
+    nuevo_registro["comentarios"] = st.session_state["reg_comentarios"]
+
+    # Si ya existe registro para la fecha, lo reemplazamos
+    save_daily_log(nuevo_registro)
+    st.session_state["_registro_guardado"] = True
+    rerun_dependents({"registros"}, also=("registro",))
+
+
+@page_fragment("registro")
+def daily_log_form():
+    """Formulario del día; al guardarlo no se vuelve a ejecutar la página completa."""
+    st.subheader("Registrar mi día de hoy")
 
     with st.form("registro_diario_form"):
-        fecha = st.date_input("Fecha", value=today)
+        st.date_input("Fecha", value=date.today(), key="reg_date")
         st.markdown("#### Tiempos de comida cumplidos")
         c1, c2, c3 = st.columns(3)
         with c1:
-            desayuno = st.checkbox("Desayuno")
-            colacion1 = st.checkbox("Colación 1")
+            st.checkbox("Desayuno", key="reg_desayuno")
+            st.checkbox("Colación 1", key="reg_colacion1")
         with c2:
-            comida = st.checkbox("Comida")
-            colacion2 = st.checkbox("Colación 2")
+            st.checkbox("Comida", key="reg_comida")
+            st.checkbox("Colación 2", key="reg_colacion2")
         with c3:
-            cena = st.checkbox("Cena")
+            st.checkbox("Cena", key="reg_cena")
 
         st.markdown("#### ¿Cómo me sentí hoy?")
-        mood = st.selectbox(
+        st.selectbox(
             "Selecciona una opción:",
-            ["Muy bien", "Bien", "Regular", "Mal"],
+            MOOD_OPTIONS,
             index=1,
+            key="reg_mood",
         )
 
-        comentarios = st.text_area(
+        st.text_area(
             "Comentarios (opcional)",
             placeholder="Ejemplo: Me sentí con más energía por la mañana...",
+            key="reg_comentarios",
         )
 
-        enviado = st.form_submit_button("Guardar registro")
-
-    if enviado:
-        nuevo_registro = {
-            "date": fecha,
-            "desayuno": desayuno,
-            "colacion1": colacion1,
-            "comida": comida,
-            "colacion2": colacion2,
-            "cena": cena,
-            "mood": mood,
-            "comentarios": comentarios,
-        }
-
-        # Si ya existe registro para la fecha, lo reemplazamos
-        daily_df = daily_df[daily_df["date"] != fecha]
-        daily_df = pd.concat(
-            [daily_df, pd.DataFrame([nuevo_registro])],
-            ignore_index=True,
-        )
-        daily_df = daily_df.sort_values("date")
-
-        st.session_state["daily_logs_df"] = daily_df
+        st.form_submit_button("Guardar registro", on_click=_on_registro_submit)
 
+    if st.session_state.pop("_registro_guardado", False):
         st.success("✅ Registro guardado correctamente.")
 
-    st.markdown("---")
-    st.subheader("Mis registros recientes")
 
-    if daily_df.empty:
+@page_fragment("tabla_registros")
+def records_table():
+    """Registros de hoy o de los últimos 7 días."""
+    logs = get_daily_logs()
+    today = date.today()
+
+    if not len(logs):
         st.info("Aún no hay registros cargados.")
         return
 
     filtro = st.radio(
         "¿Qué quieres ver?",
-        ("Hoy", "Últimos 7 días"),
+        ("Hoy", "Últimos 7 días", "Todo el historial"),
         horizontal=True,
     )
 
+    if filtro == "Todo el historial":
+        history_pages(logs)
+        return
+
+    # Solo se arma el DataFrame del rango que se va a mostrar
     if filtro == "Hoy":
-        df_mostrar = daily_df[daily_df["date"] == today]
+        i, j = logs.span(today, today)
     else:
-        hace_7 = today - timedelta(days=7)
-        df_mostrar = daily_df[daily_df["date"] >= hace_7]
-
-    if df_mostrar.empty:
+        i, j = logs.span(today - timedelta(days=7))
+    if i == j:
         st.info("No hay registros en el rango seleccionado.")
     else:
-        df_print = df_mostrar.copy().sort_values("date", ascending=False)
+        show_records_page(logs, np.arange(j - 1, i - 1, -1))
+
+
+def show_records_page(logs, positions):
+    """Tabla con las filas indicadas (ya en el orden en que se muestran)."""
+    with PROFILER.stage("df:registros_tabla"):
+        df_print = logs.frame_at(positions)
         df_print["date"] = df_print["date"].astype(str)
-        st.dataframe(
-            df_print.reset_index(drop=True),
-            use_container_width=True,
+    with PROFILER.stage("tabla:registros"):
+        st.dataframe(df_print, use_container_width=True, hide_index=True)
+
+
+# Opciones del filtro de comidas: máscara de los tiempos que deben faltar
+MISSED_FILTERS = {
+    "Todas": 0,
+    "Algún tiempo sin cumplir": FULL_MASK,
+    **{f"Sin {label.lower()}": 1 << i for i, label in enumerate(MEAL_LABELS)},
+}
+
+
+def _history_cursor_reset():
+    st.session_state["_hist_cursores"] = []
+
+
+def _history_cursor_move(cursor):
+    """Avanza a la página anterior a cursor (ordinal) o regresa (None)."""
+    cursores = st.session_state.setdefault("_hist_cursores", [])
+    if cursor is None:
+        if cursores:
+            cursores.pop()
+    else:
+        cursores.append(cursor)
+
+
+def history_pages(logs):
+    """
+    Historial completo paginado del más reciente al más antiguo. Los filtros
+    se aplican sobre los arreglos compactos y solo se arma la página visible;
+    cada página se ubica por la fecha de su último día (cursor), no por offset.
+    """
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        moods = st.multiselect(
+            "Estado de ánimo", MOOD_OPTIONS, key="hist_animo", on_change=_history_cursor_reset
+        )
+    with col2:
+        comidas = st.selectbox(
+            "Tiempos de comida", list(MISSED_FILTERS), key="hist_comidas",
+            on_change=_history_cursor_reset,
+        )
+    with col3:
+        texto = st.text_input(
+            "Buscar en comentarios", key="hist_texto", on_change=_history_cursor_reset
+        )
+
+    with PROFILER.stage("df:historial_filtro"):
+        positions = logs.filter_positions(moods, MISSED_FILTERS[comidas], texto.strip())
+    if not len(positions):
+        st.info("Ningún registro coincide con los filtros.")
+        return
+
+    cursores = st.session_state.setdefault("_hist_cursores", [])
+    pagina = logs.page_before(positions, cursores[-1] if cursores else None, HISTORY_PAGE_SIZE)
+    if not len(pagina):
+        # Los filtros dejaron la página fuera de rango: se vuelve al inicio
+        cursores.clear()
+        pagina = logs.page_before(positions, None, HISTORY_PAGE_SIZE)
+
+    paginas = (len(positions) + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    st.caption(f"{len(positions)} días · página {len(cursores) + 1} de {paginas}")
+    show_records_page(logs, pagina)
+
+    col1, _, col2 = st.columns([1, 2, 1])
+    with col1:
+        st.button(
+            "← Más recientes", disabled=not cursores, key="hist_recientes",
+            on_click=_history_cursor_move, args=(None,),
+        )
+    with col2:
+        mas_antiguos = bool(len(pagina)) and pagina[-1] > positions[0]
+        st.button(
+            "Más antiguos →", disabled=not mas_antiguos, key="hist_antiguos",
+            on_click=_history_cursor_move, args=(int(logs.days[pagina[-1]]),),
         )
 
 # -------------------------------------------------------------
 # SECCIÓN 4: PROGRESO
 # -------------------------------------------------------------
+@PROFILER.timed()
 def show_progress():
     st.markdown('<div class="main-title">📈 Progreso</div>', unsafe_allow_html=True)
     st.markdown(
@@ -657,58 +1490,59 @@ def show_progress():
     )
 
     show_top_summary()
+    adherence_section()
+
 
-    daily_df = st.session_state["daily_logs_df"].copy()
+@page_fragment("grafica_adherencia")
+def adherence_section():
+    """Selector de periodo, gráfica de adherencia y tarjetas del periodo."""
+    index = get_adherence_index()
 
-    if daily_df.empty:
+    if index.origin is None:
         st.info("Aún no hay datos para mostrar el progreso.")
         return
 
-    meal_cols = ["desayuno", "colacion1", "comida", "colacion2", "cena"]
-
-    # Convertir booleanos a enteros para cálculo
-    for c in meal_cols:
-        daily_df[c] = daily_df[c].astype(int)
-
-    # Adherencia diaria: promedio de tiempos cumplidos
-    daily_df["adherencia"] = daily_df[meal_cols].sum(axis=1) / len(meal_cols)
+    today = date.today()
+    ventanas = {"7 días": 7, "30 días": 30, "90 días": 90, "Rango personalizado": None}
+    ventana = st.radio("Periodo a revisar:", list(ventanas), horizontal=True)
 
-    # Agrupar por fecha
-    resumen = (
-        daily_df.groupby("date")["adherencia"]
-        .mean()
-        .reset_index()
-        .sort_values("date")
-    )
+    if ventanas[ventana]:
+        inicio = today - timedelta(days=ventanas[ventana] - 1)
+        fin = today
+        etiqueta = f"últimos {ventanas[ventana]} días"
+    else:
+        rango = st.date_input(
+            "Del / al (por ejemplo, entre dos citas)",
+            value=(today - timedelta(days=29), today),
+        )
+        # Mientras se elige el rango, el widget devuelve una sola fecha
+        if not isinstance(rango, (tuple, list)) or len(rango) != 2:
+            st.info("Selecciona la fecha de inicio y la de fin.")
+            return
+        inicio, fin = rango
+        etiqueta = f"{inicio.strftime('%d/%m/%Y')} – {fin.strftime('%d/%m/%Y')}"
 
-    today = date.today()
-    hace_7 = today - timedelta(days=6)
-    resumen_7 = resumen[resumen["date"] >= hace_7]
+    adherencia_media, dias_registrados = index.window(inicio, fin)
 
     st.subheader("📊 Adherencia por día")
 
-    if resumen_7.empty:
-        st.info("No hay registros suficientes para los últimos 7 días.")
+    if adherencia_media is None:
+        st.info("No hay registros suficientes en el periodo seleccionado.")
         return
 
-    chart_df = resumen_7.set_index("date")[["adherencia"]]
-    chart_df["% adherencia"] = chart_df["adherencia"] * 100
+    fechas, valores = index.daily(inicio, fin)
+    chart_df = pd.DataFrame({"% adherencia": valores * 100}, index=fechas)
+    chart_df.index.name = "date"
 
-    st.bar_chart(chart_df[["% adherencia"]])
+    with PROFILER.stage("chart:adherencia"):
+        st.bar_chart(chart_df)
 
-    adherencia_media = chart_df["adherencia"].mean()
     adherencia_pct = adherencia_media * 100
 
     col1, col2 = st.columns(2)
     with col1:
         st.markdown(
-            f"""
-            <div class="card-soft">
-                <div class="card-title">% de adherencia (últimos 7 días)</div>
-                <div class="metric-highlight">{adherencia_pct:.0f}%</div>
-                <div class="metric-caption">Promedio de comidas cumplidas por día.</div>
-            </div>
-            """,
+            cards.adherence_card(etiqueta, adherencia_media, dias_registrados),
             unsafe_allow_html=True,
         )
 
@@ -724,18 +1558,14 @@ def show_progress():
 
     with col2:
         st.markdown(
-            f"""
-            <div class="card">
-                <div class="card-title">Mensaje según tu nivel de adherencia</div>
-                <p style="font-size:0.9rem; color:#111827; margin-bottom:0;">{mensaje}</p>
-            </div>
-            """,
+            cards.message_card("Mensaje según tu nivel de adherencia", mensaje),
             unsafe_allow_html=True,
         )
 
 # -------------------------------------------------------------
 # SECCIÓN 5: CONTACTO CON LA NUTRIÓLOGA
 # -------------------------------------------------------------
+@PROFILER.timed()
 def show_contact():
     st.markdown('<div class="main-title">📞 Contacto</div>', unsafe_allow_html=True)
     st.markdown(
@@ -749,20 +1579,16 @@ def show_contact():
 
     with col1:
         st.markdown(
-            """
-            <div class="contact-card">
-                <div class="contact-name">L.N. Brenda López Hernández</div>
-                <div class="contact-role">Licenciada en Nutrición · Cédula profesional 11036805</div>
-                <p style="font-size:0.9rem; color:#1f2937;">
-                    Esta app está diseñada para acompañar tu tratamiento nutricional profesional.
-                    Ante cualquier duda importante sobre tu plan, ajustes de porciones o síntomas,
-                    es fundamental que te comuniques directamente con tu nutrióloga.
-                </p>
-                <p style="font-size:0.86rem; color:#4b5563; margin-bottom:0.4rem;">
-                    <strong>Sugerencia:</strong> Puedes anotar aquí los puntos que quieras comentar en tu próxima cita.
-                </p>
-            </div>
-            """,
+            cards.contact_card(
+                "L.N. Brenda López Hernández",
+                "Licenciada en Nutrición · Cédula profesional 11036805",
+                (
+                    "Esta app está diseñada para acompañar tu tratamiento nutricional profesional. "
+                    "Ante cualquier duda importante sobre tu plan, ajustes de porciones o síntomas, "
+                    "es fundamental que te comuniques directamente con tu nutrióloga.",
+                ),
+                "Puedes anotar aquí los puntos que quieras comentar en tu próxima cita.",
+            ),
             unsafe_allow_html=True,
         )
 
@@ -775,25 +1601,485 @@ def show_contact():
 
     with col2:
         st.markdown(
-            """
-            <div class="card-soft">
-                <div class="card-title">Recomendaciones generales</div>
-                <ul style="padding-left:1.1rem; margin-bottom:0; font-size:0.85rem; color:#374151;">
-                    <li>No realices cambios bruscos en tu plan sin consultarlo.</li>
-                    <li>Mantén un registro honesto de lo que comes y cómo te sientes.</li>
-                    <li>Si presentas malestar importante, suspende el plan y repórtalo.</li>
-                </ul>
-            </div>
-            """,
+            cards.list_card(
+                "Recomendaciones generales",
+                (
+                    "No realices cambios bruscos en tu plan sin consultarlo.",
+                    "Mantén un registro honesto de lo que comes y cómo te sientes.",
+                    "Si presentas malestar importante, suspende el plan y repórtalo.",
+                ),
+            ),
             unsafe_allow_html=True,
         )
 
+# -------------------------------------------------------------
+# PANEL DE LA NUTRIÓLOGA: VISTA DE TODOS SUS PACIENTES
+# -------------------------------------------------------------
+@PROFILER.timed()
+def show_clinician_overview():
+    st.markdown('<div class="main-title">👩‍⚕️ Mis pacientes</div>', unsafe_allow_html=True)
+    st.markdown(
+        '<div class="subtitle">Resumen de peso, IMC, avance, racha y adherencia de cada paciente.</div>',
+        unsafe_allow_html=True,
+    )
+
+    store = get_store()
+    clinician = st.session_state["username"]
+
+    # Adherencia de 7 días de quienes no han registrado nada hoy (una vez al día)
+    today = date.today()
+    if st.session_state.get("summaries_refreshed_on") != today:
+        store.refresh_stale_summaries(clinician, today)
+        # Ritmo y fecha meta de todos los pacientes en un solo lote
+        refresh_clinician_trends(store, clinician)
+        st.session_state["summaries_refreshed_on"] = today
+
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        busqueda = st.text_input("Buscar paciente", placeholder="Inicio del usuario...")
+    with col2:
+        orden = st.selectbox("Ordenar por", list(SUMMARY_SORT_COLS))
+    with col3:
+        descendente = st.checkbox("Descendente")
+
+    total = store.count_summaries(clinician, busqueda)
+    if not total:
+        st.info("No hay pacientes que coincidan con la búsqueda.")
+        clinician_tools()
+        return
+
+    paginas = (total + PATIENTS_PAGE_SIZE - 1) // PATIENTS_PAGE_SIZE
+    pagina = st.number_input(
+        f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, step=1
+    )
+
+    # Solo se lee la página visible, ordenada con el índice de la columna
+    page_df = store.query_summaries(
+        clinician,
+        sort=SUMMARY_SORT_COLS[orden],
+        descending=descendente,
+        search=busqueda,
+        limit=PATIENTS_PAGE_SIZE,
+        offset=(int(pagina) - 1) * PATIENTS_PAGE_SIZE,
+    )
+    page_df["progress_pct"] = page_df["progress_pct"] * 100
+    page_df["adherence_7d"] = page_df["adherence_7d"] * 100
+    page_df = page_df.rename(
+        columns={
+            "patient": "Paciente",
+            "current_weight": "Peso actual (kg)",
+            "bmi": "IMC",
+            "progress_pct": "% hacia la meta",
+            "streak": "Racha",
+            "longest_streak": "Récord",
+            "adherence_7d": "% adherencia 7 días",
+            "last_log_date": "Último registro",
+            "summary_day": "Calculado el",
+            "trend_kg_week": "Ritmo (kg/semana)",
+            "goal_date": "Fecha meta estimada",
+        }
+    )
+    st.caption(f"{total} pacientes")
+    with PROFILER.stage("tabla:pacientes"):
+        st.dataframe(
+            page_df.round(1),
+            use_container_width=True,
+            hide_index=True,
+        )
+    clinician_tools()
+
+
+def clinician_tools():
+    """Agenda, búsqueda, carga de planes e importación de historial desde archivos."""
+    with st.expander("📅 Agenda de citas"):
+        agenda_panel()
+
+    with st.expander("🔎 Buscar en planes y comentarios de mis pacientes"):
+        search_box(
+            tuple(get_store().clinician_patients(st.session_state["username"])) + (BASE_PLAN,),
+            "Ej. ansiedad, atún, gimnasio...",
+            show_patient=True,
+        )
+
+    with st.expander("📋 Cargar plan de alimentación de un paciente"):
+        st.caption("Archivo CSV con columnas: Día, Tiempo de comida, Descripción.")
+        with st.form("cargar_plan_form"):
+            paciente = st.text_input("Usuario del paciente")
+            archivo = st.file_uploader("Plan (CSV)", type=["csv"])
+            cargar = st.form_submit_button("Guardar plan")
+        if cargar:
+            if not paciente or archivo is None:
+                st.error("Indica el paciente y el archivo del plan.")
+            else:
+                try:
+                    version = save_patient_plan(paciente, read_plan_file(archivo))
+                except ValueError as exc:
+                    st.error(f"No se pudo cargar el plan: {exc}")
+                else:
+                    st.success(f"Plan de {paciente} guardado (versión {version}).")
+
+    with st.expander("🧮 Generar plan semanal automáticamente"):
+        plan_generator_form()
+
+    with st.expander("📥 Importar historial de pacientes (CSV o Parquet)"):
+        import_history_form()
+
+    with st.expander("📤 Exportar historial de pacientes"):
+        export_history_form()
+
+
+REPEAT_OPTIONS = {"Una sola cita": 0, "Cada semana": 7, "Cada 2 semanas": 14, "Cada 4 semanas": 28}
+
+
+@page_fragment("agenda")
+def agenda_panel():
+    """Citas del día, horarios libres, reserva con seguimientos y cancelación."""
+    clinician = st.session_state["username"]
+    agenda = get_agenda()
+    mensaje = st.session_state.pop("_agenda_mensaje", None)
+    if mensaje:
+        {"ok": st.success, "warning": st.warning}.get(mensaje[0], st.error)(mensaje[1])
+
+    dia = st.date_input("Día", value=date.today(), key="agenda_dia")
+    citas = agenda.day(clinician, dia)
+    if citas:
+        st.dataframe(
+            pd.DataFrame({
+                "Hora": [f"{a.start:%H:%M}–{a.end:%H:%M}" for a in citas],
+                "Paciente": [a.patient for a in citas],
+                "Seguimiento": ["Sí" if a.series is not None else "" for a in citas],
+                "Nota": [a.note or "" for a in citas],
+            }),
+            hide_index=True,
+            use_container_width=True,
+        )
+    else:
+        st.caption("Sin citas este día.")
+    libres = agenda.free_slots(clinician, dia)
+    st.caption(
+        f"Horarios libres ({DEFAULT_MINUTES} min): "
+        + (", ".join(t.strftime("%H:%M") for t in libres) if libres else "ninguno")
+    )
+
+    with st.form("agendar_cita_form"):
+        pacientes = get_store().clinician_patients(clinician)
+        if pacientes:
+            st.selectbox("Paciente", pacientes, key="agenda_paciente")
+        else:
+            st.text_input("Usuario del paciente", key="agenda_paciente")
+        col1, col2, col3 = st.columns(3)
+        col1.date_input("Fecha", value=dia, key="agenda_fecha")
+        col2.time_input("Hora", value=time(9, 0), step=timedelta(minutes=15), key="agenda_hora")
+        col3.number_input("Duración (min)", 15, 120, DEFAULT_MINUTES, step=15, key="agenda_minutos")
+        col1, col2 = st.columns(2)
+        col1.selectbox("Seguimiento", list(REPEAT_OPTIONS), key="agenda_repetir")
+        col2.number_input("Número de citas", 2, 52, 6, help="Solo con seguimiento.", key="agenda_veces")
+        st.text_input("Nota (opcional)", key="agenda_nota")
+        st.form_submit_button("Agendar", on_click=_on_agenda_book)
+
+    if citas:
+        col1, col2 = st.columns([3, 2])
+        elegida = col1.selectbox(
+            "Cancelar cita",
+            citas,
+            format_func=lambda a: f"{a.start:%H:%M} · {a.patient}",
+            key="agenda_cancelar",
+        )
+        col2.checkbox(
+            "Y las siguientes de su serie",
+            disabled=elegida.series is None,
+            key="agenda_cancelar_serie",
+        )
+        st.button("Cancelar", key="agenda_cancelar_btn", on_click=_on_agenda_cancel)
+
+
+def _on_agenda_book():
+    """Reserva la cita (o la serie de seguimientos) del formulario de la agenda."""
+    clinician = st.session_state["username"]
+    paciente = (st.session_state["agenda_paciente"] or "").strip()
+    inicio = datetime.combine(st.session_state["agenda_fecha"], st.session_state["agenda_hora"])
+    minutos = int(st.session_state["agenda_minutos"])
+    cada = REPEAT_OPTIONS[st.session_state["agenda_repetir"]]
+    nota = st.session_state["agenda_nota"].strip() or None
+    if not paciente:
+        st.session_state["_agenda_mensaje"] = ("error", "Indica el paciente.")
+        return
+    nivel = "ok"
+    try:
+        if cada:
+            hechas, movidas, omitidas = get_agenda().book_series(
+                clinician, paciente, inicio, minutos, cada, int(st.session_state["agenda_veces"]), nota
+            )
+            texto = f"{len(hechas)} citas agendadas para {paciente}."
+            if movidas:
+                texto += " Se movieron por estar ocupadas: " + "; ".join(
+                    f"{pedida:%d/%m %H:%M} → {cita.start:%d/%m %H:%M}" for pedida, cita in movidas
+                ) + "."
+            if omitidas:
+                texto += " Sin horario libre, no se agendaron: " + ", ".join(
+                    f"{pedida:%d/%m %H:%M}" for pedida in omitidas
+                ) + "."
+                nivel = "warning" if hechas else "error"
+        else:
+            get_agenda().book(clinician, paciente, inicio, minutos, nota)
+            texto = f"Cita de {paciente} agendada el {inicio:%d/%m/%Y} a las {inicio:%H:%M}."
+    except ValueError as exc:
+        st.session_state["_agenda_mensaje"] = ("error", f"No se pudo agendar: {exc}")
+    else:
+        refresh_reminders()
+        st.session_state["_agenda_mensaje"] = (nivel, texto)
+
+
+def _on_agenda_cancel():
+    """Cancela la cita elegida (y, si se pidió, las siguientes de su serie)."""
+    canceladas = get_agenda().cancel(
+        st.session_state["username"],
+        st.session_state["agenda_cancelar"].id,
+        following=st.session_state.get("agenda_cancelar_serie", False),
+    )
+    refresh_reminders()
+    st.session_state["_agenda_mensaje"] = ("ok", f"{len(canceladas)} cita(s) cancelada(s).")
+
+
+def plan_generator_form():
+    """Plan de lunes a domingo con metas de calorías y macros, para revisar y guardar."""
+    catalog = get_recipe_catalog()
+    if catalog is None:
+        st.info("Faltan la tabla de alimentos o el recetario en la carpeta data/.")
+        return
+    st.caption(
+        "Arma el plan con el recetario (data/recetas.csv) buscando la combinación que más "
+        "se acerca a la meta de cada día. Cada vez que generas sale una variante distinta."
+    )
+    with st.form("generar_plan_form"):
+        paciente = st.text_input("Usuario del paciente", key="gen_paciente")
+        kcal = st.number_input("Energía (kcal/día)", min_value=1000, max_value=4000, value=1800, step=50)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            proteina = st.number_input("% proteína", min_value=5, max_value=60, value=20)
+        with col2:
+            lipidos = st.number_input("% lípidos", min_value=5, max_value=60, value=30)
+        with col3:
+            hidratos = st.number_input("% hidratos", min_value=5, max_value=80, value=50)
+        exclusiones = st.text_input(
+            "Excluir (separado por coma)", placeholder="Ej. lácteos, pescado, gluten, frutos secos"
+        )
+        generar = st.form_submit_button("Generar plan")
+    if generar:
+        try:
+            plan = generate_week(
+                catalog,
+                macro_targets(kcal, proteina, lipidos, hidratos),
+                [e.strip() for e in exclusiones.split(",") if e.strip()],
+                patient=paciente.strip() or None,
+            )
+        except ValueError as exc:
+            st.error(f"No se pudo generar el plan: {exc}")
+        else:
+            st.session_state["_plan_generado"] = plan
+
+    plan = st.session_state.get("_plan_generado")
+    if plan is None:
+        return
+    st.caption(plan.summary())
+    st.dataframe(plan.day_totals().rename(columns=NUTRIENT_LABELS), use_container_width=True)
+    st.dataframe(plan.df, use_container_width=True, hide_index=True)
+    if plan.patient and st.button(f"Guardar como plan de {plan.patient}", key="gen_guardar"):
+        version = save_patient_plan(plan.patient, plan.df)
+        st.success(f"Plan de {plan.patient} guardado (versión {version}).")
+
+
+EXPORT_FORMATS = {"csv": "CSV", "parquet": "Parquet", "xlsx": "Excel"}
+
+
+@page_fragment("exportar")
+def export_history_form(patient=None):
+    """
+    Descarga del historial por bloques. Sin paciente fijo (panel de la
+    nutrióloga) se indican usuarios o se exportan todos sus pacientes.
+    """
+    store = get_store()
+    writes = get_writes()
+    if patient is None:
+        texto = st.text_input(
+            "Usuarios de los pacientes (separados por coma)",
+            placeholder="Vacío: todos tus pacientes",
+            key="exp_pacientes",
+        )
+        propios = store.clinician_patients(st.session_state["username"])
+        pacientes = list(dict.fromkeys(p.strip() for p in texto.split(",") if p.strip()))
+        # Solo se exportan pacientes de la nutrióloga
+        permitidos = set(propios)
+        ajenos = [p for p in pacientes if p not in permitidos]
+        if ajenos:
+            st.warning(f"Se omiten (no son tus pacientes): {', '.join(ajenos)}")
+            pacientes = [p for p in pacientes if p not in ajenos]
+        elif not pacientes:
+            pacientes = propios
+    else:
+        pacientes = [patient]
+
+    col1, col2 = st.columns(2)
+    with col1:
+        tipo = st.radio("Contenido", ("Registros diarios", "Pesos"), horizontal=True, key="exp_tipo")
+    with col2:
+        fmt = st.radio(
+            "Formato", list(EXPORT_FORMATS), format_func=EXPORT_FORMATS.get,
+            horizontal=True, key="exp_formato",
+        )
+    desde = hasta = None
+    if st.checkbox("Solo un rango de fechas", key="exp_rango"):
+        col1, col2 = st.columns(2)
+        desde = col1.date_input("Desde", value=date.today() - timedelta(days=90), key="exp_desde")
+        hasta = col2.date_input("Hasta", value=date.today(), key="exp_hasta")
+
+    if not pacientes:
+        st.info("Aún no hay pacientes para exportar.")
+        return
+    kind = "registros" if tipo == "Registros diarios" else "pesos"
+    nombre = pacientes[0] if len(pacientes) == 1 else f"{len(pacientes)}_pacientes"
+
+    def generar():
+        # Lo que sigue en la cola de escritura también entra en la descarga
+        writes.flush()
+        return export_bytes(store, pacientes, kind, fmt, desde, hasta)
+
+    st.download_button(
+        "⬇️ Descargar",
+        # Se arma al hacer clic, en otro hilo (sin st.* ni session_state)
+        data=generar,
+        file_name=f"{kind}_{nombre}.{fmt}",
+        mime=MIME_TYPES[fmt],
+        on_click="ignore",
+    )
+
+
+def import_history_form(patient=None):
+    """
+    Formulario de importación masiva. Sin paciente fijo (panel de la
+    nutrióloga) se pide el usuario, o el archivo trae columna "paciente";
+    solo se aceptan filas de los pacientes de la nutrióloga. Con paciente
+    fijo se rechazan las filas de cualquier otro paciente.
+    """
+    if patient is not None:
+        permitidos = {patient}
+    else:
+        permitidos = set(get_store().clinician_patients(st.session_state["username"]))
+    st.caption(
+        "Registros diarios: fecha, desayuno, colacion1, comida, colacion2, cena "
+        "(sí/no o 1/0), ánimo y comentarios. Pesos: fecha y peso. "
+        "Si una fecha ya existe, se reemplaza."
+    )
+    with st.form(f"importar_form_{patient or 'panel'}"):
+        if patient is None:
+            patient = st.text_input(
+                "Usuario del paciente", help="Vacío si el archivo trae la columna paciente."
+            ).strip() or None
+        archivo = st.file_uploader("Archivo", type=["csv", "parquet"])
+        tipo = st.radio(
+            "Contenido", ("Detectar", "Registros diarios", "Pesos"), horizontal=True
+        )
+        reemplazar = st.checkbox("Borrar el historial anterior de ese tipo antes de importar")
+        importar = st.form_submit_button("Importar")
+
+    if importar:
+        if archivo is None:
+            st.error("Selecciona un archivo.")
+            return
+        if patient is not None and patient not in permitidos:
+            st.error(f"{patient} no es uno de tus pacientes.")
+            return
+        kind = {"Registros diarios": "registros", "Pesos": "pesos"}.get(tipo)
+        # Lo encolado antes de importar llega primero a la base
+        get_writes().flush()
+        try:
+            with st.spinner("Importando..."):
+                report = import_file(
+                    get_store(), archivo, patient=patient, kind=kind, replace=reemplazar,
+                    allowed=permitidos,
+                )
+        except ValueError as exc:
+            st.error(f"No se pudo importar: {exc}")
+            return
+        st.session_state["_importacion"] = report
+        if current_patient() in report.patients:
+            # Los datos en memoria se recargan por la revisión nueva; el
+            # peso actual y el perfil se vuelven a leer de lo guardado
+            st.session_state["_rerun_cache"] = {}
+            st.session_state.pop("data_ready_for", None)
+        st.rerun()
+
+    report = st.session_state.pop("_importacion", None)
+    if report is not None:
+        (st.warning if report.bad else st.success)(report.summary())
+        if report.bad_rows:
+            st.dataframe(report.bad_rows_frame(), hide_index=True, use_container_width=True)
+
+# -------------------------------------------------------------
+# PANEL DE PERFILADO (SOLO ADMINISTRACIÓN)
+# -------------------------------------------------------------
+def is_admin():
+    return bool(USUARIOS.get(st.session_state.get("username"), {}).get("admin"))
+
+
+def show_profiling_panel():
+    """Tiempos por etapa de los reruns de este proceso (todas las sesiones)."""
+    with st.expander("🛠 Perfilado de reruns"):
+        if not PROFILER.enabled:
+            st.caption("Desactivado. Inicia la app con NUTRI_PROFILING=1 para medir cada etapa.")
+            return
+        snapshot = PROFILER.snapshot()
+        if not snapshot:
+            st.caption("Aún no hay mediciones.")
+            return
+        tabla = pd.DataFrame(
+            [
+                {
+                    "Etapa": nombre,
+                    "Llamadas": s["count"],
+                    "p50 (ms)": s["p50_ms"],
+                    "p95 (ms)": s["p95_ms"],
+                    "p99 (ms)": s["p99_ms"],
+                    "Máx. (ms)": s["max_ms"],
+                    "Total (s)": s["sum_s"],
+                }
+                for nombre, s in snapshot.items()
+            ]
+        )
+        st.dataframe(tabla.round(2), use_container_width=True, hide_index=True)
+        st.caption("Percentiles de las últimas 1000 muestras de cada etapa.")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("Volcar a disco"):
+                st.success(f"Guardado en {PROFILER.dump()}")
+        with col2:
+            st.download_button(
+                "Prometheus",
+                PROFILER.to_prometheus(snapshot),
+                file_name="profiling.prom",
+                mime="text/plain",
+            )
+        with col3:
+            if st.button("Reiniciar"):
+                PROFILER.reset()
+
+
 # -------------------------------------------------------------
 # FUNCIÓN PRINCIPAL
 # -------------------------------------------------------------
 def main():
     # Inicializar estado
     init_session_state()
+    # Cookie de sesión pendiente de escribir (reconexión o cierre de sesión)
+    if "_session_cookie" in st.session_state:
+        set_session_cookie(st.session_state.pop("_session_cookie"))
+    # Arranca (una vez por proceso) los recordatorios en segundo plano
+    get_reminders()
+    # Las lecturas en caché solo valen para este rerun
+    st.session_state["_rerun_cache"] = {}
+    # Fragmentos dibujados en este rerun completo
+    st.session_state["_fragmentos"] = set()
 
     # Si NO está logueado, mostrar únicamente pantalla de login
     if not st.session_state["logged_in"]:
@@ -813,8 +2099,26 @@ def main():
         show_login()
         return
 
+    # ---- VISTA DE LA NUTRIÓLOGA ----
+    if st.session_state["role"] == "nutriologa":
+        with st.sidebar:
+            st.markdown("### 🥗 App de Seguimiento Nutricional")
+            st.markdown(
+                f"👩‍⚕️ <span style='font-size:0.9rem;'>Sesión iniciada como <strong>{st.session_state['username']}</strong></span>",
+                unsafe_allow_html=True,
+            )
+            if st.button("Cerrar sesión"):
+                logout()
+        show_clinician_overview()
+        if is_admin():
+            show_profiling_panel()
+        return
+
+    # Cargar (o sembrar) los datos persistentes del paciente
+    ensure_patient_data()
+
     # ---- SIDEBAR COMPLETO CUANDO YA INICIÓ SESIÓN ----
-    with st.sidebar:
+    with st.sidebar, PROFILER.stage("sidebar"):
         st.markdown("### 🥗 App de Seguimiento Nutricional")
         st.markdown(
             """
@@ -833,51 +2137,9 @@ def main():
 
         # Botón para cerrar sesión
         if st.button("Cerrar sesión"):
-            st.session_state["logged_in"] = False
-            st.session_state["username"] = None
-            st.experimental_rerun()
+            logout()
 
-        st.markdown("---")
-        st.markdown("#### ⚖️ Mis datos")
-        st.session_state["initial_weight"] = st.number_input(
-            "Peso inicial (kg)",
-            min_value=30.0,
-            max_value=300.0,
-            value=float(st.session_state["initial_weight"]),
-            step=0.1,
-        )
-        st.session_state["current_weight"] = st.number_input(
-            "Peso actual (kg)",
-            min_value=30.0,
-            max_value=300.0,
-            value=float(st.session_state["current_weight"]),
-            step=0.1,
-        )
-        st.session_state["goal_weight"] = st.number_input(
-            "Peso objetivo (kg)",
-            min_value=30.0,
-            max_value=300.0,
-            value=float(st.session_state["goal_weight"]),
-            step=0.1,
-        )
-        st.session_state["height_m"] = st.number_input(
-            "Altura (m)",
-            min_value=1.20,
-            max_value=2.10,
-            value=float(st.session_state["height_m"]),
-            step=0.01,
-        )
-
-        st.markdown("---")
-        st.markdown("#### 📅 Próxima cita")
-        st.session_state["next_appointment_date"] = st.date_input(
-            "Fecha de la cita",
-            value=st.session_state["next_appointment_date"],
-        )
-        st.session_state["next_appointment_time"] = st.time_input(
-            "Hora de la cita",
-            value=st.session_state["next_appointment_time"],
-        )
+        sidebar_patient_data()
 
         st.markdown("---")
         st.markdown("#### 🔍 Navegación")
@@ -892,8 +2154,9 @@ def main():
             ),
         )
 
-    # Actualizar historial de peso con el valor de hoy
+    # Actualizar historial de peso con el valor de hoy y guardar cambios del panel
     sync_weight_with_today()
+    sync_profile()
 
     # Contenido principal por sección
     if menu == "Seguimiento profesional":
@@ -907,6 +2170,11 @@ def main():
     elif menu == "Contacto":
         show_contact()
 
+    if is_admin():
+        show_profiling_panel()
+
 
 if __name__ == "__main__":
-    main()
+    with PROFILER.stage("rerun"):
+        main()
+    PROFILER.maybe_dump()
@@ -0,0 +1,123 @@
+# benchmarks/bench_agenda.py
+# -------------------------------------------------------------
+# Agenda de citas: choques, horarios libres y próxima cita
+# -------------------------------------------------------------
+# Llena en una base temporal la agenda de una nutrióloga con miles de
+# citas (varios años, casi todos los horarios ocupados) y compara las
+# consultas de la agenda en memoria (búsqueda binaria) con recorrer la
+# lista completa de citas, que es lo que haría una consulta ingenua.
+# También mide reservar una cita (transacción en SQLite incluida).
+#
+# Uso:
+#   python -m benchmarks.bench_agenda                  # 3 años, 300 pacientes
+#   python -m benchmarks.bench_agenda --years 1 --patients 50
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from nutri.agenda import DEFAULT_MINUTES, Agenda
+from nutri.storage import Storage
+
+CLINICIAN = "bench"
+
+
+def seed(agenda, years, patients, ocupacion, seed=0):
+    """Reserva citas en horario de consulta con la ocupación pedida."""
+    rng = np.random.default_rng(seed)
+    inicio = date.today() - timedelta(days=365 * years // 2)
+    citas = 0
+    for d in range(365 * years):
+        dia = inicio + timedelta(days=d)
+        for hora in agenda.free_slots(CLINICIAN, dia):
+            if rng.random() < ocupacion:
+                try:
+                    agenda.book(CLINICIAN, f"p{rng.integers(patients):04d}", hora)
+                    citas += 1
+                except ValueError:
+                    pass  # el horario quedó tapado por la cita anterior
+    return citas
+
+
+def _ms(valores):
+    valores = np.asarray(valores) * 1000
+    return f"p50 {np.percentile(valores, 50):.3f} ms · p95 {np.percentile(valores, 95):.3f} ms"
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Consultas de la agenda de citas")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--patients", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="nutri-agenda-") as tmp:
+        agenda = Agenda(Storage(os.path.join(tmp, "n.db")))
+        t = time.perf_counter()
+        citas = seed(agenda, args.years, args.patients, ocupacion=0.25)
+        sembrado = time.perf_counter() - t
+        print(f"{citas:,} citas en {args.years} años · reservadas en {sembrado:.1f} s "
+              f"({sembrado / max(citas, 1) * 1000:.2f} ms por reserva con transacción)")
+
+        memoria = agenda.clinician(CLINICIAN)
+        lista = list(memoria._items)
+        rng = np.random.default_rng(1)
+        base = datetime.combine(date.today(), datetime.min.time())
+        momentos = [
+            base + timedelta(days=int(rng.integers(-300, 300)), minutes=int(rng.integers(9 * 60, 19 * 60)))
+            for _ in range(args.repeat)
+        ]
+        pacientes = [f"p{rng.integers(args.patients):04d}" for _ in range(args.repeat)]
+        duracion = timedelta(minutes=DEFAULT_MINUTES)
+
+        for nombre, rapido, lento in (
+            (
+                "choques de un horario",
+                lambda m, p: memoria.conflicts(m, m + duracion),
+                lambda m, p: [a for a in lista if a.start < m + duracion and m < a.end],
+            ),
+            (
+                "próxima cita de un paciente",
+                lambda m, p: memoria.next_for_patient(p, m),
+                lambda m, p: min((a for a in lista if a.patient == p and a.end > m),
+                                 key=lambda a: a.start, default=None),
+            ),
+            (
+                "horarios libres de un día",
+                lambda m, p: memoria.free_slots(m.date(), hours=agenda.hours),
+                None,
+            ),
+            (
+                "siguiente horario libre",
+                lambda m, p: memoria.next_free(m, hours=agenda.hours),
+                None,
+            ),
+        ):
+            tiempos, lineal = [], []
+            for m, p in zip(momentos, pacientes):
+                t = time.perf_counter()
+                rapido(m, p)
+                tiempos.append(time.perf_counter() - t)
+                if lento is not None:
+                    t = time.perf_counter()
+                    lento(m, p)
+                    lineal.append(time.perf_counter() - t)
+            print(f"{nombre:30s} {_ms(tiempos)}" + (f"   (recorrido lineal: {_ms(lineal)})" if lineal else ""))
+
+        t = time.perf_counter()
+        agenda.clinician(CLINICIAN)
+        print(f"revisar versión (una consulta por rerun): {(time.perf_counter() - t) * 1000:.3f} ms")
+        agenda._agendas.clear()
+        t = time.perf_counter()
+        agenda.clinician(CLINICIAN)
+        print(f"cargar la agenda completa de la base:     {(time.perf_counter() - t) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
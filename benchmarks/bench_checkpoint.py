@@ -0,0 +1,104 @@
+# benchmarks/bench_checkpoint.py
+# -------------------------------------------------------------
+# Puntos de control de sesión: retomar tras un reinicio
+# -------------------------------------------------------------
+# Siembra en una base temporal un paciente con un historial largo
+# (registros con comentarios y pesos diarios) y mide cuánto tarda en
+# quedar lista su sesión después de un reinicio: desde el punto de control
+# Arrow en disco (memory map), desde la instantánea de la bitácora en
+# SQLite y leyendo las tablas. También mide lo que cuesta un punto de
+# control en el hilo de la página (solo copiar los arreglos) contra la
+# escritura completa que hace el hilo de fondo.
+#
+# Uso:
+#   python -m benchmarks.bench_checkpoint                # 10 años
+#   python -m benchmarks.bench_checkpoint --years 30
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from nutri.checkpoint import Checkpointer, _Copy
+from nutri.events import EventLog
+from nutri.schema import MEAL_COLS, MOOD_OPTIONS
+from nutri.storage import Storage
+
+PATIENT = "bench"
+
+
+def seed(storage, years, seed=0):
+    rng = np.random.default_rng(seed)
+    inicio = date.today() - timedelta(days=365 * years)
+    fechas = [(inicio + timedelta(days=d)).isoformat() for d in range(365 * years)]
+    comentarios = np.array(["Me sentí con energía", "Comí fuera", "Mucha hambre en la tarde", None], dtype=object)
+    logs = pd.DataFrame({
+        "date": fechas,
+        "mood": rng.choice(np.array(MOOD_OPTIONS, dtype=object), len(fechas)),
+        "comentarios": comentarios[rng.integers(len(comentarios), size=len(fechas))],
+    })
+    for c in MEAL_COLS:
+        logs[c] = rng.random(len(fechas)) < 0.8
+    storage.upsert_daily_logs_frame(PATIENT, logs)
+    storage.upsert_weights_frame(PATIENT, pd.DataFrame({
+        "date": fechas, "weight": 80 - np.arange(len(fechas)) * 0.002,
+    }))
+    storage.upsert_profile(PATIENT, {
+        "clinician": "nutri", "initial_weight": 80.0, "goal_weight": 70.0, "height_m": 1.65,
+    })
+    return len(fechas)
+
+
+def _best(fn, repeat):
+    tiempos = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t)
+    return min(tiempos) * 1000
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Retomar sesiones desde puntos de control Arrow")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="nutri-checkpoint-") as tmp:
+        storage = Storage(os.path.join(tmp, "n.db"))
+        dias = seed(storage, args.years)
+        directorio = os.path.join(tmp, "checkpoints")
+        checkpoints = Checkpointer(directorio)
+        estado = EventLog(storage).load(PATIENT)
+        EventLog(storage).save_snapshot(PATIENT, estado)
+        checkpoints.schedule(PATIENT, estado)
+        checkpoints.flush()
+        tamano = sum(os.path.getsize(os.path.join(directorio, f)) for f in os.listdir(directorio))
+        print(f"{args.years} años ({dias:,} días con registro y peso) · punto de control de "
+              f"{tamano / 1024:.0f} KB")
+
+        for nombre, fn in (
+            ("punto de control Arrow (memory map)", lambda: EventLog(storage, checkpoints=Checkpointer(directorio)).load(PATIENT)),
+            ("instantánea de la bitácora (SQLite)", lambda: EventLog(storage).load(PATIENT)),
+            ("leer las tablas con SQL", lambda: (
+                storage.load_daily_logs_compact(PATIENT),
+                storage.load_weight_series(PATIENT),
+                storage.load_profile(PATIENT),
+            )),
+        ):
+            print(f"retomar la sesión · {nombre:38s} {_best(fn, args.repeat):7.2f} ms")
+
+        print(f"punto de control en el hilo de la página (copia):   {_best(lambda: _Copy(estado), args.repeat):7.2f} ms")
+        copia = _Copy(estado)
+        print(f"escritura en el hilo de fondo:                      "
+              f"{_best(lambda: checkpoints._write(PATIENT, copia), args.repeat):7.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
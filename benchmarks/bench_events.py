@@ -0,0 +1,133 @@
+# benchmarks/bench_events.py
+# -------------------------------------------------------------
+# Bitácora de cambios: carga en frío, ponerse al día y tamaño
+# -------------------------------------------------------------
+# Siembra en una base temporal un paciente con años de registros y
+# pesos (una importación) y luego miles de ediciones sueltas, como las
+# haría la app. Compara cargar su estado desde la última instantánea más
+# la cola de eventos contra repetir toda la bitácora desde el inicio y
+# contra leer las tablas con SQL, y mide cuánto cuesta aplicar los
+# eventos nuevos de otra sesión y cuánto ocupa cada evento.
+#
+# Uso:
+#   python -m benchmarks.bench_events                   # 5 años, 5,000 ediciones
+#   python -m benchmarks.bench_events --years 10 --edits 20000
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from nutri.events import Event, EventLog, PatientState
+from nutri.schema import MEAL_COLS
+from nutri.storage import Storage
+
+PATIENT = "bench"
+
+
+def seed(storage, years, edits, seed=0):
+    rng = np.random.default_rng(seed)
+    inicio = date.today() - timedelta(days=365 * years)
+    fechas = [(inicio + timedelta(days=d)).isoformat() for d in range(365 * years)]
+    logs = pd.DataFrame({"date": fechas, "mood": "Bien", "comentarios": None})
+    for c in MEAL_COLS:
+        logs[c] = rng.random(len(fechas)) < 0.8
+    storage.upsert_daily_logs_frame(PATIENT, logs)
+    storage.upsert_weights_frame(PATIENT, pd.DataFrame({
+        "date": fechas, "weight": 80 - np.arange(len(fechas)) * 0.005,
+    }))
+    storage.upsert_profile(PATIENT, {
+        "clinician": "nutri", "initial_weight": 80.0, "goal_weight": 70.0, "height_m": 1.65,
+    })
+    t = time.perf_counter()
+    for k in range(edits):
+        dia = inicio + timedelta(days=int(rng.integers(365 * years)))
+        if k % 2:
+            storage.upsert_weight(PATIENT, dia, float(rng.normal(75, 2)))
+        else:
+            registro = {"date": dia, "mood": "Bien", "comentarios": "Edición de prueba"}
+            registro.update((c, bool(rng.random() < 0.8)) for c in MEAL_COLS)
+            storage.upsert_daily_log(PATIENT, registro)
+    return time.perf_counter() - t
+
+
+def _best(fn, repeat):
+    tiempos = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t)
+    return min(tiempos) * 1000
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Bitácora de cambios con instantáneas")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--edits", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="nutri-events-") as tmp:
+        storage = Storage(os.path.join(tmp, "n.db"))
+        escrituras = seed(storage, args.years, args.edits)
+        print(f"{args.years} años de historial + {args.edits:,} ediciones "
+              f"({escrituras / args.edits * 1000:.2f} ms por escritura con su evento)")
+
+        log = EventLog(storage)
+        estado = log.load(PATIENT)  # deja la instantánea al día
+        with storage.pool.connection() as conn:
+            n, bytes_eventos = conn.execute(
+                "SELECT COUNT(*), SUM(LENGTH(data)) FROM events WHERE patient = ?", (PATIENT,)
+            ).fetchone()
+            sueltos = conn.execute(
+                "SELECT AVG(LENGTH(data)) FROM events WHERE patient = ? AND kind IN (1, 2)", (PATIENT,)
+            ).fetchone()[0]
+            instantanea = conn.execute(
+                "SELECT LENGTH(data) FROM snapshots WHERE patient = ? ORDER BY seq DESC LIMIT 1", (PATIENT,)
+            ).fetchone()[0]
+        print(f"bitácora: {n:,} eventos, {bytes_eventos / 1024:.0f} KB "
+              f"({sueltos:.1f} B por registro o peso suelto); instantánea {instantanea / 1024:.0f} KB")
+
+        # Cola de eventos típica: la mitad del intervalo entre instantáneas
+        for k in range(log.snapshot_every // 2):
+            storage.upsert_weight(PATIENT, date.today() - timedelta(days=k), 74.0)
+
+        def repetir_todo():
+            estado = PatientState()
+            for row in storage.load_events(PATIENT, after=0):
+                estado.apply(Event.from_row(row))
+            return estado
+
+        for nombre, fn in (
+            (f"instantánea + {log.snapshot_every // 2} eventos", lambda: EventLog(storage).load(PATIENT)),
+            (f"repetir los {n:,} eventos", repetir_todo),
+            ("leer las tablas con SQL", lambda: (
+                storage.load_daily_logs_compact(PATIENT),
+                storage.load_weight_series(PATIENT),
+                storage.load_profile(PATIENT),
+            )),
+        ):
+            print(f"carga en frío · {nombre:32s} {_best(fn, args.repeat):8.1f} ms")
+
+        # Otra sesión guarda un peso: ponerse al día con since + apply
+        estado = log.load(PATIENT)
+        tiempos = []
+        for k in range(200):
+            storage.upsert_weight(PATIENT, date.today() + timedelta(days=k), 73.0)
+            t = time.perf_counter()
+            for event in log.since(PATIENT, estado.seq):
+                estado.apply(event)
+            tiempos.append(time.perf_counter() - t)
+        tiempos = np.asarray(tiempos) * 1000
+        print(f"ponerse al día con 1 evento nuevo: p50 {np.percentile(tiempos, 50):.3f} ms · "
+              f"p95 {np.percentile(tiempos, 95):.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
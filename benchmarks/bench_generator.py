@@ -0,0 +1,57 @@
+# benchmarks/bench_generator.py
+# -------------------------------------------------------------
+# Generador de planes: tiempo por lote de pacientes y error contra la meta
+# -------------------------------------------------------------
+# Genera planes semanales para pacientes sintéticos (metas entre 1200 y
+# 2500 kcal, con y sin exclusiones) con generate_batch, en uno o varios
+# procesos, y reporta el tiempo total y el error de energía por día.
+#
+# Uso:
+#   python -m benchmarks.bench_generator                 # 500 pacientes
+#   python -m benchmarks.bench_generator --patients 2000 --workers 4
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from nutri.generator import generate_batch
+
+EXCLUSIONES = ["", "lácteos", "pescado", "gluten", "frutos secos", "pollo, res"]
+
+
+def make_specs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "paciente": f"gen{i:04d}",
+            "kcal": int(rng.integers(1200, 2500)),
+            "exclusiones": EXCLUSIONES[i % len(EXCLUSIONES)],
+        }
+        for i in range(n)
+    ]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Generación de planes por lote")
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    specs = make_specs(args.patients)
+    t = time.perf_counter()
+    planes = generate_batch(specs, workers=args.workers)
+    segundos = time.perf_counter() - t
+    error = np.concatenate([np.abs(p.errors[:, 0]) for p in planes]) * 100
+
+    print(f"{len(planes)} planes · {args.workers} procesos · {segundos:.2f} s "
+          f"({segundos / len(planes) * 1000:.1f} ms por paciente)")
+    print(f"error de energía por día: p50 {np.percentile(error, 50):.1f}% · "
+          f"p95 {np.percentile(error, 95):.1f}% · máx {error.max():.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,140 @@
+# benchmarks/bench_import.py
+# -------------------------------------------------------------
+# Importación y exportación masiva: tiempo y memoria pico
+# -------------------------------------------------------------
+# Genera un CSV de registros diarios (varios pacientes, columna
+# "paciente") y lo importa en un proceso nuevo, para que la memoria
+# pico (ru_maxrss) sea solo la de la importación. Como referencia mide
+# también leer el mismo archivo completo con pd.read_csv. Después
+# exporta todo el historial importado a CSV y Parquet, también cada
+# formato en su propio proceso.
+#
+# Uso:
+#   python -m benchmarks.bench_import                  # 1,000,000 filas
+#   python -m benchmarks.bench_import --rows 200000 --chunk 20000
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from nutri.schema import MEAL_COLS, MOOD_OPTIONS
+
+DIAS_POR_PACIENTE = 2000
+
+
+def write_csv(path, n_rows, seed=0, block=100_000):
+    """CSV sintético con el formato de una hoja de cálculo de pacientes."""
+    rng = np.random.default_rng(seed)
+    inicio = pd.Timestamp("2019-01-01")
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(0, n_rows, block):
+            idx = np.arange(i, min(i + block, n_rows))
+            df = pd.DataFrame(
+                {
+                    "paciente": [f"import{j:04d}" for j in idx // DIAS_POR_PACIENTE],
+                    "fecha": (inicio + pd.to_timedelta(idx % DIAS_POR_PACIENTE, unit="D")).strftime("%Y-%m-%d"),
+                }
+            )
+            for c in MEAL_COLS:
+                df[c] = (rng.random(len(idx)) < 0.8).astype(int)
+            df["ánimo"] = np.array(MOOD_OPTIONS)[rng.integers(0, len(MOOD_OPTIONS), len(idx))]
+            df["comentarios"] = np.where(rng.random(len(idx)) < 0.2, "Me sentí con más energía.", "")
+            df.to_csv(f, header=(i == 0), index=False)
+
+
+def _peak_mb():
+    # ru_maxrss está en KiB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_import(path, db_path, chunk_rows):
+    from nutri.importer import import_file
+    from nutri.storage import Storage
+
+    storage = Storage(db_path)
+    base = _peak_mb()
+    t = time.perf_counter()
+    report = import_file(storage, path, chunk_rows=chunk_rows)
+    return {
+        "seconds": round(time.perf_counter() - t, 2),
+        "peak_mb": round(_peak_mb() - base, 1),
+        "summary": report.summary(),
+    }
+
+
+def _run_read_all(path):
+    base = _peak_mb()
+    t = time.perf_counter()
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return {
+        "seconds": round(time.perf_counter() - t, 2),
+        "peak_mb": round(_peak_mb() - base, 1),
+        "rows": len(df),
+    }
+
+
+def _run_export(db_path, fmt):
+    from nutri.exporter import export_to_file
+    from nutri.storage import Storage
+
+    storage = Storage(db_path)
+    with storage.pool.connection() as conn:
+        patients = [r[0] for r in conn.execute("SELECT DISTINCT patient FROM daily_logs")]
+    base = _peak_mb()
+    t = time.perf_counter()
+    with open(os.devnull, "wb") as f:
+        size = export_to_file(storage, f, patients, "registros", fmt)
+    return {
+        "seconds": round(time.perf_counter() - t, 2),
+        "peak_mb": round(_peak_mb() - base, 1),
+        "size_mb": round(size / 1e6, 1),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Importación y exportación masiva")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk", type=int, default=50_000, help="filas por bloque")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="nutri-import-") as tmp:
+        path = os.path.join(tmp, "historial.csv")
+        write_csv(path, args.rows)
+        print(f"{args.rows} filas · {os.path.getsize(path) / 1e6:.0f} MB en disco")
+        # Cada medición en su propio proceso
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            importado = pool.submit(_run_import, path, os.path.join(tmp, "n.db"), args.chunk).result()
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            completo = pool.submit(_run_read_all, path).result()
+        exportado = {}
+        for fmt in ("csv", "parquet"):
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                exportado[fmt] = pool.submit(_run_export, os.path.join(tmp, "n.db"), fmt).result()
+
+    print()
+    print("| | tiempo | memoria pico |")
+    print("|---|---:|---:|")
+    print(
+        f"| importar por bloques de {args.chunk} (valida y escribe) "
+        f"| {importado['seconds']:.1f} s | {importado['peak_mb']:.0f} MB |"
+    )
+    print(
+        f"| solo leer el CSV completo (pd.read_csv) "
+        f"| {completo['seconds']:.1f} s | {completo['peak_mb']:.0f} MB |"
+    )
+    for fmt, r in exportado.items():
+        print(f"| exportar todo a {fmt} ({r['size_mb']:.0f} MB) | {r['seconds']:.1f} s | {r['peak_mb']:.0f} MB |")
+    print()
+    print(importado["summary"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
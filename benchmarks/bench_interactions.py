@@ -0,0 +1,190 @@
+# benchmarks/bench_interactions.py
+# -------------------------------------------------------------
+# Tiempo de rerun por interacción (qué se vuelve a ejecutar)
+# -------------------------------------------------------------
+# Siembra un paciente con historial largo, entra con un token y repite
+# cada interacción típica de la app midiendo el rerun que provoca. Con
+# fragmentos (st.fragment) solo se ejecutan las partes que dependen del
+# widget; sin ellos cada interacción vuelve a correr todo el script.
+#
+# Se reportan dos tiempos por interacción:
+#   - "script": lo que se ejecuta del código de la app, según el
+#     perfilador. Si se ejecutaron todas las etapas declaradas para la
+#     interacción (callback y fragmentos), es su suma; si no, es el rerun
+#     completo ("rerun"), como en versiones sin fragmentos.
+#   - "apptest": el tiempo de pared del rerun en AppTest, que agrega un
+#     costo fijo del arnés. Ojo: AppTest solo ejecuta fragmentos sueltos
+#     cuando un callback pide st.rerun(llaves); un widget dentro de un
+#     fragmento provoca ahí un rerun completo, aunque el navegador solo
+#     ejecutaría ese fragmento.
+#
+# Uso:
+#   python -m benchmarks.bench_interactions                 # 1825 días, 20 repeticiones
+#   python -m benchmarks.bench_interactions --days 365 --repeat 50 --output r.json
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmarks.bench_load import APP_PATH, _git_commit, _latency_stats, seed_patients
+
+
+def _by_label(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"No se encontró el widget {label!r}")
+
+
+def _go(at, page):
+    if not any(r.label == "Ir a:" for r in at.sidebar.radio):
+        at.run()
+    _by_label(at.sidebar.radio, "Ir a:").set_value(page)
+    at.run()
+
+
+# Cada interacción: (nombre, sección, función que cambia un widget en la
+# vuelta i, etapas del perfilador que ejecuta el navegador)
+def _peso_actual(at, i):
+    _by_label(at.sidebar.number_input, "Peso actual (kg)").set_value(80.0 + (i % 2) * 0.5)
+
+
+def _altura(at, i):
+    _by_label(at.sidebar.number_input, "Altura (m)").set_value(1.65 + (i % 2) * 0.01)
+
+
+def _rango_peso(at, i):
+    slider = _by_label(at.slider, "Rango a mostrar")
+    fin = slider.value[1]
+    slider.set_value((fin - timedelta(days=180 * (i % 2 + 1)), fin))
+
+
+def _periodo(at, i):
+    _by_label(at.radio, "Periodo a revisar:").set_value(("7 días", "30 días", "90 días")[i % 3])
+
+
+def _filtro_registros(at, i):
+    _by_label(at.radio, "¿Qué quieres ver?").set_value(("Hoy", "Últimos 7 días")[i % 2])
+
+
+def _guardar_registro(at, i):
+    cena = _by_label(at.checkbox, "Cena")
+    cena.check() if i % 2 == 0 else cena.uncheck()
+    _by_label(at.button, "Guardar registro").click()
+
+
+INTERACTIONS = (
+    (
+        "Peso actual (panel lateral)",
+        "Seguimiento profesional",
+        _peso_actual,
+        ("callback:datos", "fragment:resumen", "fragment:tarjetas", "fragment:grafica_peso"),
+    ),
+    (
+        "Altura (panel lateral)",
+        "Mi plan de alimentación",
+        _altura,
+        ("callback:datos", "fragment:datos"),
+    ),
+    ("Rango de la gráfica de peso", "Seguimiento profesional", _rango_peso, ("fragment:grafica_peso",)),
+    ("Periodo de adherencia", "Progreso", _periodo, ("fragment:grafica_adherencia",)),
+    ("Filtro de registros", "Registro diario", _filtro_registros, ("fragment:tabla_registros",)),
+    (
+        "Guardar registro",
+        "Registro diario",
+        _guardar_registro,
+        ("callback:registro", "fragment:registro", "fragment:tabla_registros"),
+    ),
+)
+
+
+def _script_seconds(profiler, etapas):
+    """Tiempo del código de la app en el último rerun (ver encabezado)."""
+    medidas = [profiler.last(e) for e in etapas]
+    if all(m is not None for m in medidas):
+        return sum(medidas)
+    return profiler.last("rerun")
+
+
+def run(days, repeat, timeout=120):
+    with tempfile.TemporaryDirectory(prefix="nutri-bench-") as tmp:
+        db_path = os.path.join(tmp, "nutricion.db")
+        shared_url = "sqlite:///" + os.path.join(tmp, "shared_state.db")
+        # La app lee estas variables al importar nutri.storage / nutri.shared_state
+        os.environ["NUTRI_DB_PATH"] = db_path
+        os.environ["NUTRI_SHARED_STATE"] = shared_url
+        os.environ["NUTRI_PROFILING"] = "1"
+        os.environ["NUTRI_PROFILING_DIR"] = os.path.join(tmp, "profiling")
+
+        from streamlit.testing.v1 import AppTest
+
+        from nutri.profiling import PROFILER
+        from nutri.shared_state import SessionStore, backend_from_url
+
+        patient, _ = seed_patients(db_path, 1, [days])[0]
+        token = SessionStore(backend_from_url(shared_url)).create(patient, "paciente")
+
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        at.query_params["sid"] = token
+        at.run()
+
+        resultados = {}
+        for nombre, pagina, interactuar, etapas in INTERACTIONS:
+            _go(at, pagina)
+            tiempos = []
+            script = []
+            # La primera vuelta calienta cachés y no se cuenta
+            for i in range(repeat + 1):
+                interactuar(at, i)
+                PROFILER.reset()
+                t = time.perf_counter()
+                at.run()
+                if i:
+                    tiempos.append(time.perf_counter() - t)
+                    script.append(_script_seconds(PROFILER, etapas))
+                if at.exception:
+                    raise RuntimeError(f"{nombre}: {at.exception[0].value}")
+                # Tras un rerun de fragmento AppTest solo conserva los elementos
+                # (y el estado de los widgets) de ese fragmento; se vuelve a
+                # abrir la sección con un rerun completo sin medir
+                _go(at, pagina)
+            resultados[nombre] = {
+                "script": _latency_stats(script),
+                "apptest": _latency_stats(tiempos),
+            }
+    return {
+        "commit": _git_commit(),
+        "params": {"days": days, "repeat": repeat},
+        "interactions": resultados,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Tiempo de rerun por interacción")
+    parser.add_argument("--days", type=int, default=1825, help="días de historial del paciente")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="archivo JSON con los resultados")
+    args = parser.parse_args(argv)
+
+    result = run(args.days, args.repeat)
+    print(f"commit {result['commit']} · {args.days} días de historial · {args.repeat} repeticiones")
+    print()
+    print("| interacción | script p50 | script p95 | AppTest p50 |")
+    print("|---|---:|---:|---:|")
+    for nombre, s in result["interactions"].items():
+        print(
+            f"| {nombre} | {s['script']['p50_ms']:.1f} ms | {s['script']['p95_ms']:.1f} ms "
+            f"| {s['apptest']['p50_ms']:.1f} ms |"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,353 @@
+# benchmarks/bench_load.py
+# -------------------------------------------------------------
+# Prueba de carga sin navegador de todas las secciones de la app
+# -------------------------------------------------------------
+# Siembra pacientes sintéticos en una base temporal y luego abre
+# muchas sesiones simuladas con streamlit.testing (AppTest), repartidas
+# en un pool de procesos que comparten la misma base SQLite y el mismo
+# almacén de sesiones. Cada sesión entra con un token (como si volviera
+# por la URL con ?sid=...) y recorre las cinco secciones del paciente.
+#
+# Reporta por sección p50/p95/p99 del rerun, bytes enviados al
+# navegador (suma de los mensajes protobuf de la página) y la memoria
+# por sesión de cada worker. El resultado se guarda en JSON para
+# comparar entre commits:
+#
+#   python -m benchmarks.bench_load                          # valores por defecto
+#   python -m benchmarks.bench_load --patients 40 --days 30,365,1825 --workers 4
+#   python -m benchmarks.bench_load --compare antes.json despues.json
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from multiprocessing import get_context
+
+import numpy as np
+
+from nutri.schema import MEAL_COLS, MOOD_OPTIONS
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+PAGES = (
+    "Seguimiento profesional",
+    "Mi plan de alimentación",
+    "Registro diario",
+    "Progreso",
+    "Contacto",
+)
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+
+# ---------------------------------------------------------------------
+# Datos sintéticos
+# ---------------------------------------------------------------------
+def synthetic_history(n_days, seed, today=None):
+    """Pesos y registros diarios de n_days días que terminan hoy."""
+    rng = np.random.default_rng(seed)
+    today = today or date.today()
+    days = [today - timedelta(days=i) for i in range(n_days - 1, -1, -1)]
+    # Bajada lenta con ruido diario
+    pesos = 85.0 - 0.02 * np.arange(n_days) + rng.normal(0, 0.3, n_days)
+    meals = rng.random((n_days, len(MEAL_COLS))) < 0.8
+    moods = rng.integers(0, len(MOOD_OPTIONS), n_days)
+    registros = []
+    for i, d in enumerate(days):
+        registro = {"date": d, "mood": MOOD_OPTIONS[moods[i]], "comentarios": ""}
+        registro.update(zip(MEAL_COLS, meals[i].tolist()))
+        registros.append(registro)
+    return list(zip(days, np.round(pesos, 1).tolist())), registros
+
+
+def seed_patients(db_path, n_patients, history_days):
+    """Crea n_patients pacientes; la longitud del historial rota entre history_days."""
+    from nutri.storage import Storage
+
+    store = Storage(db_path)
+    patients = []
+    for i in range(n_patients):
+        patient = f"bench{i:04d}"
+        n_days = history_days[i % len(history_days)]
+        pesos, registros = synthetic_history(n_days, seed=i)
+        store.upsert_weights(patient, pesos)
+        store.upsert_daily_logs(patient, registros)
+        # Sin nutrióloga asignada, igual que un usuario fuera de USUARIOS
+        store.upsert_profile(
+            patient,
+            {
+                "clinician": None,
+                "initial_weight": pesos[0][1],
+                "goal_weight": 70.0,
+                "height_m": 1.65,
+            },
+        )
+        patients.append((patient, n_days))
+    return patients
+
+
+# ---------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------
+def _rss_bytes():
+    """Memoria residente actual del proceso."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _payload_bytes(at):
+    """Bytes de los mensajes que la página envía al navegador."""
+    return sum(node.proto.ByteSize() for node in at._tree if getattr(node, "proto", None))
+
+
+def _init_worker(db_path, shared_url):
+    os.environ["NUTRI_DB_PATH"] = db_path
+    os.environ["NUTRI_SHARED_STATE"] = shared_url
+
+
+def run_worker(sessions, rounds, timeout):
+    """
+    Abre las sesiones asignadas (patient, token) y recorre las secciones.
+    Las sesiones quedan vivas hasta el final para medir su memoria.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    apps = []
+    base_rss = None
+    timings = {"login": []}
+    timings.update({page: [] for page in PAGES})
+    payloads = {page: [] for page in PAGES}
+    errors = []
+
+    for patient, token in sessions:
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        at.query_params["sid"] = token
+        t = time.perf_counter()
+        at.run()
+        timings["login"].append(time.perf_counter() - t)
+        if at.exception:
+            errors.append(f"{patient} login: {at.exception[0].value}")
+            continue
+        apps.append(at)
+        if base_rss is None:
+            # La primera sesión paga la importación de la app; no cuenta
+            base_rss = _rss_bytes()
+
+    for _ in range(rounds):
+        for page in PAGES:
+            for at in apps:
+                at.sidebar.radio[0].set_value(page)
+                t = time.perf_counter()
+                at.run()
+                timings[page].append(time.perf_counter() - t)
+                if at.exception:
+                    errors.append(f"{page}: {at.exception[0].value}")
+                payloads[page].append(_payload_bytes(at))
+
+    return {
+        "sessions": len(apps),
+        "rss_delta_bytes": _rss_bytes() - base_rss if base_rss is not None else 0,
+        "timings": timings,
+        "payloads": payloads,
+        "errors": errors,
+    }
+
+
+# ---------------------------------------------------------------------
+# Resultados
+# ---------------------------------------------------------------------
+def _latency_stats(values):
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _versions():
+    import pandas as pd
+    import streamlit
+
+    return {
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def run(n_patients, history_days, sessions_per_worker, workers, rounds, timeout=120):
+    """Siembra, reparte las sesiones en el pool y junta las métricas."""
+    from nutri.shared_state import SessionStore, backend_from_url
+
+    with tempfile.TemporaryDirectory(prefix="nutri-bench-") as tmp:
+        db_path = os.path.join(tmp, "nutricion.db")
+        shared_url = "sqlite:///" + os.path.join(tmp, "shared_state.db")
+
+        t = time.perf_counter()
+        patients = seed_patients(db_path, n_patients, history_days)
+        seed_s = time.perf_counter() - t
+
+        # Cada sesión simulada tiene su propio token de login
+        sessions_store = SessionStore(backend_from_url(shared_url))
+        total = sessions_per_worker * workers
+        sesiones = [
+            (patients[i % n_patients][0], sessions_store.create(patients[i % n_patients][0], "paciente"))
+            for i in range(total)
+        ]
+        chunks = [sesiones[w::workers] for w in range(workers)]
+
+        t = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(db_path, shared_url),
+        ) as pool:
+            parts = list(pool.map(run_worker, chunks, [rounds] * workers, [timeout] * workers))
+        wall_s = time.perf_counter() - t
+
+    timings = {name: [] for name in ("login",) + PAGES}
+    payloads = {page: [] for page in PAGES}
+    errors = []
+    for part in parts:
+        for name, values in part["timings"].items():
+            timings[name].extend(values)
+        for page, values in part["payloads"].items():
+            payloads[page].extend(values)
+        errors.extend(part["errors"])
+
+    per_session = [p["rss_delta_bytes"] / (p["sessions"] - 1) for p in parts if p["sessions"] > 1]
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "versions": _versions(),
+        "params": {
+            "patients": n_patients,
+            "history_days": list(history_days),
+            "sessions_per_worker": sessions_per_worker,
+            "workers": workers,
+            "rounds": rounds,
+        },
+        "seed_seconds": round(seed_s, 2),
+        "wall_seconds": round(wall_s, 2),
+        "reruns_per_second": round(sum(len(v) for v in timings.values()) / wall_s, 1),
+        "memory_per_session_bytes": int(np.mean(per_session)) if per_session else None,
+        "login": _latency_stats(timings["login"]),
+        "pages": {
+            page: dict(
+                _latency_stats(timings[page]) or {},
+                payload_bytes=int(np.median(payloads[page])) if payloads[page] else None,
+            )
+            for page in PAGES
+        },
+        "errors": errors[:20],
+        "error_count": len(errors),
+    }
+
+
+def print_report(result):
+    p = result["params"]
+    print(
+        f"{p['workers']} workers × {p['sessions_per_worker']} sesiones, "
+        f"{p['patients']} pacientes ({', '.join(map(str, p['history_days']))} días), "
+        f"{p['rounds']} vueltas — commit {result['commit']}"
+    )
+    print()
+    print("| sección | n | p50 | p95 | p99 | payload |")
+    print("|---|---:|---:|---:|---:|---:|")
+    filas = [("Login (sid)", result["login"])] + list(result["pages"].items())
+    for nombre, s in filas:
+        if not s:
+            continue
+        payload = f"{s['payload_bytes'] / 1024:,.1f} KB" if s.get("payload_bytes") else "—"
+        print(
+            f"| {nombre} | {s['n']} | {s['p50_ms']:.1f} ms | {s['p95_ms']:.1f} ms "
+            f"| {s['p99_ms']:.1f} ms | {payload} |"
+        )
+    print()
+    mem = result["memory_per_session_bytes"]
+    print(f"Memoria por sesión: {mem / 1e6:.2f} MB" if mem is not None else "Memoria por sesión: —")
+    print(f"Reruns por segundo: {result['reruns_per_second']}")
+    if result["error_count"]:
+        print(f"Errores: {result['error_count']} (ver JSON)")
+
+
+def compare(old_path, new_path):
+    """Tabla de diferencias de p50/p95/p99 entre dos resultados guardados."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old.get('commit')} → {new.get('commit')}")
+    print()
+    print("| sección | métrica | antes | después | cambio |")
+    print("|---|---|---:|---:|---:|")
+    for page in PAGES:
+        a, b = old["pages"].get(page) or {}, new["pages"].get(page) or {}
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "payload_bytes"):
+            if a.get(metric) is None or b.get(metric) is None:
+                continue
+            cambio = (b[metric] - a[metric]) / a[metric] * 100 if a[metric] else 0.0
+            print(f"| {page} | {metric} | {a[metric]:,} | {b[metric]:,} | {cambio:+.1f}% |")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Prueba de carga de las secciones de la app")
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument(
+        "--days", default="30,365,1825", help="longitudes de historial separadas por comas"
+    )
+    parser.add_argument("--sessions", type=int, default=5, help="sesiones por worker")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--rounds", type=int, default=3, help="vueltas por todas las secciones")
+    parser.add_argument("--output", help="archivo JSON (por defecto benchmarks/results/load-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DESPUES"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    history_days = [int(d) for d in args.days.split(",")]
+    result = run(args.patients, history_days, args.sessions, args.workers, args.rounds)
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{result['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {output}")
+    return 0 if not result["error_count"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,96 @@
+# benchmarks/bench_memory.py
+# -------------------------------------------------------------
+# Memoria de los registros diarios: DataFrame original vs. compacto
+# -------------------------------------------------------------
+# Uso:
+#   python -m benchmarks.bench_memory            # 1, 100 y 10,000 paciente-año
+#   python -m benchmarks.bench_memory 1 100      # tamaños a elección
+
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from nutri.compact import CompactLogs
+from nutri.schema import MEAL_COLS, MOOD_OPTIONS
+from nutri.timeseries import dates_to_ordinals
+
+DIAS_POR_ANIO = 365
+
+
+def synthetic_columns(n_rows, seed=0):
+    """Columnas sintéticas con la forma de daily_logs_df."""
+    rng = np.random.default_rng(seed)
+    start = date(2020, 1, 1)
+    # Cada paciente-año cubre el mismo calendario de 365 días
+    fechas = [start + timedelta(days=int(i) % DIAS_POR_ANIO) for i in range(n_rows)]
+    meals = rng.random((n_rows, len(MEAL_COLS))) < 0.8
+    moods = np.array(MOOD_OPTIONS, dtype=object)[rng.integers(0, len(MOOD_OPTIONS), n_rows)]
+    # La mayoría de los días no lleva comentario
+    comentarios = np.full(n_rows, "", dtype=object)
+    con_texto = np.flatnonzero(rng.random(n_rows) < 0.2)
+    comentarios[con_texto] = [f"Día {i}: me sentí con más energía." for i in con_texto]
+    return fechas, meals, moods, comentarios
+
+
+def original_frame(fechas, meals, moods, comentarios):
+    """DataFrame como lo construía la app: fechas como objetos, bools y texto."""
+    data = {"date": fechas}
+    for i, c in enumerate(MEAL_COLS):
+        data[c] = meals[:, i]
+    data["mood"] = moods
+    data["comentarios"] = comentarios
+    return pd.DataFrame(data)
+
+
+def _text_bytes(values):
+    """Bytes de los objetos str referenciados (cada objeto se cuenta una vez)."""
+    unicos = {id(v): v for v in values if v is not None}
+    return sum(sys.getsizeof(v) for v in unicos.values())
+
+
+def measure(patient_years):
+    n_rows = patient_years * DIAS_POR_ANIO
+    fechas, meals, moods, comentarios = synthetic_columns(n_rows)
+
+    df = original_frame(fechas, meals, moods, comentarios)
+    usage = df.memory_usage(deep=True)
+    before_total = int(usage.sum())
+    before_sin_texto = before_total - int(usage["comentarios"])
+
+    masks = np.zeros(n_rows, dtype=np.uint8)
+    for i in range(len(MEAL_COLS)):
+        masks |= meals[:, i].astype(np.uint8) << i
+    logs = CompactLogs.from_columns(dates_to_ordinals(fechas), masks, moods, comentarios)
+    after_sin_texto = logs.days.nbytes + logs.masks.nbytes + logs.moods.nbytes
+    after_total = logs.nbytes + _text_bytes(logs.comments)
+
+    return {
+        "patient_years": patient_years,
+        "rows": n_rows,
+        "before_bytes": before_total,
+        "after_bytes": after_total,
+        "before_no_text_bytes": before_sin_texto,
+        "after_no_text_bytes": after_sin_texto,
+    }
+
+
+def _mb(n):
+    return f"{n / 1e6:,.2f} MB"
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [1, 100, 10_000]
+    print("| paciente-año | filas | antes | después | antes (sin comentarios) | después (sin comentarios) |")
+    print("|---:|---:|---:|---:|---:|---:|")
+    for py in sizes:
+        r = measure(py)
+        print(
+            f"| {py:,} | {r['rows']:,} | {_mb(r['before_bytes'])} | {_mb(r['after_bytes'])} "
+            f"| {_mb(r['before_no_text_bytes'])} | {_mb(r['after_no_text_bytes'])} |"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,126 @@
+# benchmarks/bench_reminders.py
+# -------------------------------------------------------------
+# Recordatorios: un día completo con decenas de miles de pacientes
+# -------------------------------------------------------------
+# Siembra en una base temporal pacientes con perfil (la mitad ya
+# registró hoy, una parte cortó ayer una racha) y miles de citas entre
+# hoy y mañana repartidas entre varias nutriólogas. Luego simula el día
+# con un reloj falso: el programador salta de un vencimiento al siguiente
+# del montículo, como haría dormido, y se cuentan los despertares, los
+# recordatorios enviados y el tiempo de cada despertar.
+#
+# Uso:
+#   python -m benchmarks.bench_reminders                   # 20,000 pacientes
+#   python -m benchmarks.bench_reminders --patients 50000 --appointments 8000
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from nutri.agenda import Agenda
+from nutri.reminders import ReminderScheduler
+from nutri.schema import MEAL_COLS
+from nutri.storage import Storage
+
+CLINICIANS = 100
+
+
+class CountingNotifier:
+    """Cuenta los recordatorios en lugar de escribirlos."""
+
+    def __init__(self):
+        self.sent = 0
+        self.batches = 0
+
+    def send(self, reminders):
+        self.sent += len(reminders)
+        self.batches += 1
+
+
+def seed(storage, patients, appointments, today, seed=0):
+    rng = np.random.default_rng(seed)
+    ayer, antier = today - timedelta(days=1), today - timedelta(days=2)
+    for p in range(patients):
+        patient = f"rec{p:05d}"
+        storage.upsert_profile(patient, {
+            "clinician": f"nutri{p % CLINICIANS:02d}", "initial_weight": 80.0,
+            "goal_weight": 70.0, "height_m": 1.65,
+        })
+        registros = []
+        if rng.random() < 0.5:
+            registros.append({"date": today, "mood": "Bien", **{c: True for c in MEAL_COLS}})
+        if rng.random() < 0.1:
+            # Racha hasta antier, ayer sin cumplir
+            for k in range(2, 7):
+                registros.append({"date": today - timedelta(days=k), "mood": "Bien", **{c: True for c in MEAL_COLS}})
+            registros.append({"date": ayer, "mood": "Bien", **{c: False for c in MEAL_COLS}})
+        if registros:
+            storage.upsert_daily_logs(patient, registros)
+            if any(r["date"] == antier for r in registros):
+                storage.upsert_summary(patient, f"nutri{p % CLINICIANS:02d}", {"streak": 5})
+
+    agenda = Agenda(storage)
+    hechas = 0
+    for k in range(appointments):
+        clinician = f"nutri{k % CLINICIANS:02d}"
+        dia = today + timedelta(days=int(rng.integers(0, 3)))
+        libres = agenda.free_slots(clinician, dia)
+        if libres:
+            agenda.book(clinician, f"rec{int(rng.integers(patients)):05d}", libres[int(rng.integers(len(libres)))])
+            hechas += 1
+    return hechas
+
+
+async def simulate(scheduler, start, end):
+    """Recorre el día saltando de vencimiento en vencimiento."""
+    tiempos = []
+    scheduler.schedule_jobs(start)
+    while scheduler.next_due() is not None and scheduler.next_due() < end:
+        t = time.perf_counter()
+        await scheduler.run_due(scheduler.next_due())
+        tiempos.append(time.perf_counter() - t)
+    return tiempos
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Programador de recordatorios en un día simulado")
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--appointments", type=int, default=3_000)
+    args = parser.parse_args(argv)
+
+    # Lunes, para que haya horario de consulta hoy y mañana
+    hoy = date.today() + timedelta(days=-date.today().weekday() + 7)
+    with tempfile.TemporaryDirectory(prefix="nutri-reminders-") as tmp:
+        storage = Storage(os.path.join(tmp, "n.db"))
+        t = time.perf_counter()
+        citas = seed(storage, args.patients, args.appointments, hoy)
+        print(f"{args.patients:,} pacientes y {citas:,} citas sembrados en {time.perf_counter() - t:.1f} s")
+
+        notifier = CountingNotifier()
+        scheduler = ReminderScheduler(storage, notifier)
+        inicio = datetime.combine(hoy, datetime.min.time())
+        t = time.perf_counter()
+        tiempos = asyncio.run(simulate(scheduler, inicio, inicio + timedelta(days=1)))
+        total = time.perf_counter() - t
+        tiempos = np.asarray(tiempos) * 1000
+        print(f"día simulado en {total:.1f} s: {len(tiempos)} despertares, "
+              f"{notifier.sent:,} recordatorios en {notifier.batches} lotes")
+        print(f"por despertar: p50 {np.percentile(tiempos, 50):.1f} ms · "
+              f"p95 {np.percentile(tiempos, 95):.1f} ms · máx {tiempos.max():.0f} ms")
+        print("detalle: " + ", ".join(f"{k} {v:,}" for k, v in scheduler.stats.items()))
+
+        # Un segundo proceso con el mismo día no repite nada
+        otro = CountingNotifier()
+        asyncio.run(simulate(ReminderScheduler(storage, otro), inicio, inicio + timedelta(days=1)))
+        print(f"segundo programador sobre el mismo día: {otro.sent} recordatorios repetidos")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
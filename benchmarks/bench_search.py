@@ -0,0 +1,143 @@
+# benchmarks/bench_search.py
+# -------------------------------------------------------------
+# Búsqueda de texto: construcción del índice, consultas y actualizaciones
+# -------------------------------------------------------------
+# Siembra en una base temporal pacientes con años de registros diarios
+# (una parte con comentarios escritos a partir de frases sueltas) y un
+# plan propio armado con el recetario. Mide la construcción completa
+# del índice, la latencia de búsquedas típicas en todos los pacientes y
+# en uno solo, y el costo de reflejar un registro o un plan nuevos.
+#
+# Uso:
+#   python -m benchmarks.bench_search                    # 500 pacientes × 3 años
+#   python -m benchmarks.bench_search --patients 100 --days 365
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from nutri.generator import render_recipe
+from nutri.plans import DAY_ORDER, PlanStore
+from nutri.schema import MEAL_COLS
+from nutri.search import BASE_PLAN, SearchIndex
+from nutri.storage import Storage
+
+FRASES = [
+    "Me sentí con más energía por la mañana",
+    "Tuve mucha ansiedad por la tarde",
+    "Comí atún en la comida en lugar de pollo",
+    "Se me antojó algo dulce después de la cena",
+    "Dormí poco y desayuné tarde",
+    "Fui al gimnasio y tuve hambre en la colación",
+    "Comida familiar, me pasé con las tortillas",
+    "Me costó tomar suficiente agua",
+    "Cambié la avena por pan integral",
+    "Reunión de trabajo, no alcancé a comer a mi hora",
+    "Me dolió el estómago después de los frijoles",
+    "Salí a caminar 30 minutos",
+    "Probé la receta de pescado a la talla",
+    "Estuve muy inflamada",
+    "Sin problemas, todo según el plan",
+]
+
+CONSULTAS = ["atún", "atun", "tortillas", "ansiedad tarde", "pescado talla", "agua",
+             "gim", "dolor estomago", "pan integral", "energía mañana"]
+
+
+def seed(storage, patients, days, seed=0):
+    rng = np.random.default_rng(seed)
+    recetas = pd.read_csv(os.path.join("data", "recetas.csv"))
+    inicio = date.today() - timedelta(days=days)
+    fechas = [(inicio + timedelta(days=i)) for i in range(days)]
+    for p in range(patients):
+        patient = f"busq{p:04d}"
+        registros = []
+        for d in fechas:
+            frases = rng.choice(len(FRASES), size=rng.integers(1, 3), replace=False)
+            registro = {"date": d, "mood": "Bien"}
+            registro.update({c: True for c in MEAL_COLS})
+            registro["comentarios"] = ". ".join(FRASES[i] for i in frases) if rng.random() < 0.6 else ""
+            registros.append(registro)
+        storage.upsert_daily_logs(patient, registros)
+        if p % 2 == 0:
+            filas = rng.choice(len(recetas), size=5 * len(DAY_ORDER))
+            plan = pd.DataFrame({
+                "Día": np.repeat(DAY_ORDER, 5),
+                "Tiempo de comida": ["Desayuno", "Colación 1", "Comida", "Colación 2", "Cena"] * len(DAY_ORDER),
+                "Descripción": [render_recipe(recetas["receta"][i], 1.0) for i in filas],
+            })
+            storage.save_plan(patient, plan)
+
+
+def base_plan_df():
+    return pd.DataFrame({
+        "Día": ["Lunes"], "Tiempo de comida": ["Comida"],
+        "Descripción": ["Pechuga de pollo con ensalada y 2 tortillas"],
+    })
+
+
+def _ms(valores):
+    valores = np.asarray(valores) * 1000
+    return f"p50 {np.percentile(valores, 50):.1f} ms · p95 {np.percentile(valores, 95):.1f} ms"
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Índice de búsqueda de planes y comentarios")
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="nutri-search-") as tmp:
+        storage = Storage(os.path.join(tmp, "n.db"))
+        t = time.perf_counter()
+        seed(storage, args.patients, args.days)
+        print(f"{args.patients} pacientes × {args.days} días sembrados en {time.perf_counter() - t:.1f} s")
+
+        index = SearchIndex(storage, PlanStore(storage, base_plan_df))
+        t = time.perf_counter()
+        index.sync()
+        construccion = time.perf_counter() - t
+        ix = index.index
+        memoria = sum(a.nbytes for a in (ix._docs, ix._tfs, ix._offsets, ix._kind, ix._patient,
+                                          ix._key, ix._length, ix._crc, ix._alive))
+        print(f"índice: {len(ix):,} documentos, {len(ix._terms):,} términos · "
+              f"construido en {construccion:.1f} s · arreglos {memoria / 1e6:.1f} MB")
+
+        todos, uno = [], []
+        for _ in range(args.repeat):
+            for q in CONSULTAS:
+                t = time.perf_counter()
+                index.search(q)
+                todos.append(time.perf_counter() - t)
+                t = time.perf_counter()
+                index.search(q, patients=["busq0000", BASE_PLAN])
+                uno.append(time.perf_counter() - t)
+        print(f"búsqueda en todos los pacientes: {_ms(todos)}")
+        print(f"búsqueda en un paciente:         {_ms(uno)}")
+
+        tiempos = []
+        for i in range(200):
+            registro = {"date": date.today(), "mood": "Bien", "comentarios": f"Comí atún otra vez {i}"}
+            registro.update({c: True for c in MEAL_COLS})
+            rev = storage.upsert_daily_log("busq0001", registro)
+            t = time.perf_counter()
+            index.update_comment("busq0001", registro["date"], registro["comentarios"], rev)
+            tiempos.append(time.perf_counter() - t)
+        print(f"reflejar un registro guardado:   {_ms(tiempos)}")
+
+        storage.upsert_daily_log("busq0002", registro)
+        t = time.perf_counter()
+        index.sync(force=True)
+        print(f"sync con un paciente cambiado por fuera: {(time.perf_counter() - t) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,112 @@
+# benchmarks/bench_writebehind.py
+# -------------------------------------------------------------
+# Cola de escritura diferida: la hora pico de la mañana
+# -------------------------------------------------------------
+# Varios hilos (sesiones) guardan a la vez el registro del día, el peso
+# (que se corrige un par de veces) y el resumen de muchos pacientes, como
+# en la hora pico de la mañana. Compara escribir cada guardado en su propia
+# transacción (como antes) contra encolarlo en WriteBehind: tiempo que
+# espera la página por guardado, transacciones hechas y espera máxima de
+# una escritura en la cola antes de llegar a la base.
+#
+# Uso:
+#   python -m benchmarks.bench_writebehind                   # 2,000 pacientes, 8 hilos
+#   python -m benchmarks.bench_writebehind --patients 10000 --threads 16
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+from nutri.schema import MEAL_COLS
+from nutri.storage import Storage
+from nutri.writebehind import WriteBehind
+
+
+def saves(patients, seed=0):
+    """Guardados de la mañana: registro, peso corregido 3 veces y resumen por guardado."""
+    rng = np.random.default_rng(seed)
+    hoy = date.today()
+    trabajo = []
+    for p in range(patients):
+        patient = f"wb{p:05d}"
+        registro = {"date": hoy, "mood": "Bien", "comentarios": None}
+        registro.update((c, bool(rng.random() < 0.8)) for c in MEAL_COLS)
+        trabajo.append(("registro", patient, registro))
+        for _ in range(3):
+            trabajo.append(("peso", patient, round(float(rng.normal(75, 5)), 1)))
+    orden = rng.permutation(len(trabajo))
+    return [trabajo[i] for i in orden]
+
+
+def run(trabajo, threads, guardar):
+    tiempos = [[] for _ in range(threads)]
+
+    def sesion(k):
+        for tipo, patient, valor in trabajo[k::threads]:
+            t = time.perf_counter()
+            guardar(tipo, patient, valor)
+            tiempos[k].append(time.perf_counter() - t)
+
+    hilos = [threading.Thread(target=sesion, args=(k,)) for k in range(threads)]
+    t = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return time.perf_counter() - t, np.concatenate([np.asarray(x) for x in tiempos]) * 1000
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Guardados en hora pico: directo vs cola diferida")
+    parser.add_argument("--patients", type=int, default=2_000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    trabajo = saves(args.patients)
+    resumen = {"streak": 1}
+    with tempfile.TemporaryDirectory(prefix="nutri-writebehind-") as tmp:
+        directo = Storage(os.path.join(tmp, "directo.db"), pool_size=args.threads)
+
+        def guardar_directo(tipo, patient, valor):
+            if tipo == "registro":
+                directo.upsert_daily_log(patient, valor)
+            else:
+                directo.upsert_weight(patient, date.today(), valor)
+            directo.upsert_summary(patient, "nutri", resumen)
+
+        total, tiempos = run(trabajo, args.threads, guardar_directo)
+        print(f"{len(trabajo):,} guardados de {args.patients:,} pacientes en {args.threads} hilos")
+        print(f"directo (2 transacciones por guardado): {total:5.2f} s · por guardado "
+              f"p50 {np.percentile(tiempos, 50):.2f} ms · p95 {np.percentile(tiempos, 95):.2f} ms · "
+              f"{2 * len(trabajo):,} transacciones")
+
+        cola = WriteBehind(Storage(os.path.join(tmp, "cola.db"), pool_size=args.threads))
+
+        def guardar_en_cola(tipo, patient, valor):
+            if tipo == "registro":
+                cola.put_log(patient, valor)
+            else:
+                cola.put_weight(patient, date.today(), valor)
+            cola.put_summary(patient, "nutri", resumen)
+
+        total, tiempos = run(trabajo, args.threads, guardar_en_cola)
+        t = time.perf_counter()
+        cola.flush()
+        total += time.perf_counter() - t
+        s = cola.stats
+        print(f"cola diferida:                          {total:5.2f} s · por guardado "
+              f"p50 {np.percentile(tiempos, 50):.3f} ms · p95 {np.percentile(tiempos, 95):.3f} ms · "
+              f"{s['lotes']} transacciones")
+        print(f"  {s['encoladas']:,} encoladas, {s['juntadas']:,} juntadas, {s['escritas']:,} escritas; "
+              f"espera máxima en la cola {s['espera_max_ms']:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
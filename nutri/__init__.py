@@ -0,0 +1,5 @@
+# nutri/__init__.py
+# -------------------------------------------------------------
+# Motores de datos de la App de Seguimiento Nutricional.
+# La interfaz vive en app.py; aquí están almacenamiento y cálculos.
+# -------------------------------------------------------------
@@ -0,0 +1,156 @@
+# nutri/adherence.py
+# -------------------------------------------------------------
+# Índice de adherencia con sumas acumuladas por día
+# -------------------------------------------------------------
+# Cada paciente tiene un eje de días denso que empieza en su primer
+# registro. Se guardan las sumas acumuladas de comidas cumplidas y de
+# días registrados, así que cualquier ventana (7, 30, 90 días o un
+# rango entre citas) se responde con dos restas.
+
+from datetime import date, timedelta
+
+import numpy as np
+
+from nutri.schema import MEAL_COLS
+
+N_MEALS = len(MEAL_COLS)
+
+
+def _ordinal(day):
+    return day.toordinal() if isinstance(day, date) else int(day)
+
+
+class AdherenceIndex:
+    """Adherencia por ventana de días en tiempo constante."""
+
+    def __init__(self, capacity=64):
+        self.origin = None  # ordinal del primer día del eje
+        self._size = 0      # días cubiertos por el eje
+        self._meals = np.zeros(capacity, dtype=np.int8)
+        self._logged = np.zeros(capacity, dtype=bool)
+        # _cum_x[i] = suma de x en los días [0, i)
+        self._cum_meals = np.zeros(capacity + 1, dtype=np.int64)
+        self._cum_logged = np.zeros(capacity + 1, dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Construye el índice a partir de un DataFrame de registros diarios."""
+        if df.empty:
+            return cls()
+        days = [d.toordinal() for d in df["date"]]
+        return cls.from_arrays(days, df[MEAL_COLS].to_numpy(dtype=bool).sum(axis=1))
+
+    @classmethod
+    def from_compact(cls, logs):
+        """Construye el índice a partir de registros compactos (CompactLogs)."""
+        return cls.from_arrays(logs.days, logs.meals_done())
+
+    @classmethod
+    def from_arrays(cls, days, meals):
+        """Construye el índice desde ordinales de fecha y tiempos cumplidos."""
+        index = cls()
+        days = np.asarray(days, dtype=np.int64)
+        if not len(days):
+            return index
+        origin = int(days.min())
+        size = int(days.max()) - origin + 1
+        index.origin = origin
+        index._grow(size)
+        index._size = size
+        index._meals[days - origin] = meals
+        index._logged[days - origin] = True
+        np.cumsum(index._meals[:size], out=index._cum_meals[1:size + 1])
+        np.cumsum(index._logged[:size], out=index._cum_logged[1:size + 1])
+        return index
+
+    def _grow(self, size):
+        cap = len(self._meals)
+        if size <= cap:
+            return
+        new_cap = max(size, cap * 2)
+        self._meals = np.resize(self._meals, new_cap)
+        self._logged = np.resize(self._logged, new_cap)
+        self._cum_meals = np.resize(self._cum_meals, new_cap + 1)
+        self._cum_logged = np.resize(self._cum_logged, new_cap + 1)
+
+    def _extend_to(self, i):
+        """Alarga el eje hasta incluir la posición i (días sin registro)."""
+        if i < self._size:
+            return
+        self._grow(i + 1)
+        self._meals[self._size:i + 1] = 0
+        self._logged[self._size:i + 1] = False
+        self._cum_meals[self._size + 1:i + 2] = self._cum_meals[self._size]
+        self._cum_logged[self._size + 1:i + 2] = self._cum_logged[self._size]
+        self._size = i + 1
+
+    def _shift_origin(self, new_origin):
+        """Mueve el inicio del eje hacia atrás (registro anterior al primero)."""
+        shift = self.origin - new_origin
+        size = self._size + shift
+        meals = np.zeros(size, dtype=np.int8)
+        logged = np.zeros(size, dtype=bool)
+        meals[shift:] = self._meals[:self._size]
+        logged[shift:] = self._logged[:self._size]
+        self.origin = new_origin
+        self._size = 0
+        self._grow(size)
+        self._size = size
+        self._meals[:size] = meals
+        self._logged[:size] = logged
+        self._cum_meals[0] = 0
+        self._cum_logged[0] = 0
+        np.cumsum(meals, out=self._cum_meals[1:size + 1])
+        np.cumsum(logged, out=self._cum_logged[1:size + 1])
+
+    def update(self, day, meals_done):
+        """Registra (o reemplaza) cuántos tiempos se cumplieron en un día."""
+        d = _ordinal(day)
+        if self.origin is None:
+            self.origin = d
+        elif d < self.origin:
+            self._shift_origin(d)
+        i = d - self.origin
+        self._extend_to(i)
+
+        delta_meals = int(meals_done) - int(self._meals[i])
+        delta_logged = 0 if self._logged[i] else 1
+        self._meals[i] = meals_done
+        self._logged[i] = True
+        # Registrar hoy solo toca la última posición de las sumas
+        if delta_meals:
+            self._cum_meals[i + 1:self._size + 1] += delta_meals
+        if delta_logged:
+            self._cum_logged[i + 1:self._size + 1] += delta_logged
+
+    # ---- Consultas ----
+    def _bounds(self, start, end):
+        if self.origin is None:
+            return 0, 0
+        s = min(max(_ordinal(start) - self.origin, 0), self._size)
+        e = min(max(_ordinal(end) - self.origin + 1, s), self._size)
+        return s, e
+
+    def window(self, start, end):
+        """
+        Adherencia promedio entre dos fechas (incluidas).
+        Devuelve (adherencia 0-1 o None, días con registro).
+        """
+        s, e = self._bounds(start, end)
+        logged = int(self._cum_logged[e] - self._cum_logged[s])
+        if not logged:
+            return None, 0
+        meals = int(self._cum_meals[e] - self._cum_meals[s])
+        return meals / (N_MEALS * logged), logged
+
+    def last_days(self, n, today=None):
+        """Adherencia de los últimos n días hasta hoy."""
+        today = today or date.today()
+        return self.window(today - timedelta(days=n - 1), today)
+
+    def daily(self, start, end):
+        """Adherencia por día registrado dentro del rango: (fechas, valores)."""
+        s, e = self._bounds(start, end)
+        pos = np.flatnonzero(self._logged[s:e]) + s
+        fechas = [date.fromordinal(self.origin + int(p)) for p in pos]
+        return fechas, self._meals[pos] / N_MEALS
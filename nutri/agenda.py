@@ -0,0 +1,369 @@
+# nutri/agenda.py
+# -------------------------------------------------------------
+# Agenda de citas por nutrióloga: choques, horarios libres y seguimientos
+# -------------------------------------------------------------
+# Las citas se guardan en SQLite (tabla appointments) y cada nutrióloga
+# tiene en memoria su agenda como intervalos ordenados [inicio, fin).
+# Una agenda no admite citas encimadas, así que los intervalos no se
+# traslapan y los fines quedan en el mismo orden que los inicios. Con eso
+# cada consulta es una búsqueda binaria (bisect) más las citas que
+# devuelve:
+#   - choques de [a, b): desde la primera cita que termina después de a
+#     hasta la última que empieza antes de b;
+#   - horarios libres de un día: los huecos entre las citas del día dentro
+#     del horario de consulta (WORKING_HOURS);
+#   - próxima cita de un paciente: bisect en los fines de sus citas.
+# Las listas son de Python: insertar solo mueve referencias (memmove), lo
+# que en agendas de miles de citas no se nota.
+#
+# La base es la que decide: reservar revisa el choque con dos consultas
+# por índice dentro de una transacción (BEGIN IMMEDIATE), así que dos
+# workers no pueden dar el mismo horario. Cada cambio aumenta la versión
+# de la agenda; la copia en memoria se vuelve a leer solo si la versión
+# guardada ya no es la suya.
+#
+# Los seguimientos (cada N días, M veces) se reservan cita por cita; si
+# un horario está ocupado se mueve al siguiente libre, el mismo día o en
+# los días siguientes. Las que no encuentran lugar se devuelven aparte
+# para avisar, sin deshacer las que sí se reservaron.
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+
+# Horario de consulta por día de la semana (0 = lunes): [(inicio, fin)]
+WORKING_HOURS = {
+    0: [(time(9, 0), time(14, 0)), (time(16, 0), time(19, 0))],
+    1: [(time(9, 0), time(14, 0)), (time(16, 0), time(19, 0))],
+    2: [(time(9, 0), time(14, 0)), (time(16, 0), time(19, 0))],
+    3: [(time(9, 0), time(14, 0)), (time(16, 0), time(19, 0))],
+    4: [(time(9, 0), time(14, 0)), (time(16, 0), time(19, 0))],
+    5: [(time(9, 0), time(13, 0))],
+}
+
+# Duración habitual de una consulta y separación entre horarios ofrecidos
+DEFAULT_MINUTES = 45
+SLOT_STEP_MINUTES = 15
+# Días que se revisan como máximo al buscar el siguiente horario libre
+MAX_SEARCH_DAYS = 90
+
+_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def _text(moment):
+    return moment.strftime(_FORMAT)
+
+
+def _parse(text):
+    return datetime.strptime(text, _FORMAT)
+
+
+class Appointment:
+    """Una cita de la agenda."""
+
+    __slots__ = ("id", "clinician", "patient", "start", "end", "series", "note")
+
+    def __init__(self, id, clinician, patient, start, end, series=None, note=None):
+        self.id = id
+        self.clinician = clinician
+        self.patient = patient
+        self.start = start
+        self.end = end
+        self.series = series
+        self.note = note
+
+    @classmethod
+    def from_row(cls, row):
+        id, clinician, patient, start, end, series, note = row
+        return cls(id, clinician, patient, _parse(start), _parse(end), series, note)
+
+    @property
+    def minutes(self):
+        return int((self.end - self.start).total_seconds() // 60)
+
+    def __repr__(self):
+        return f"Appointment({self.id}, {self.patient!r}, {_text(self.start)}–{self.end:%H:%M})"
+
+
+class ClinicianAgenda:
+    """Citas de una nutrióloga como intervalos ordenados que no se traslapan."""
+
+    def __init__(self, appointments=(), version=0):
+        self.version = version
+        self._starts = []
+        self._ends = []
+        self._items = []
+        self._by_id = {}
+        # paciente → (fines, citas) ordenados
+        self._by_patient = {}
+        for appointment in sorted(appointments, key=lambda a: a.start):
+            self._starts.append(appointment.start)
+            self._ends.append(appointment.end)
+            self._items.append(appointment)
+            self._index_patient(appointment)
+            self._by_id[appointment.id] = appointment
+
+    def __len__(self):
+        return len(self._items)
+
+    def _index_patient(self, appointment):
+        fines, citas = self._by_patient.setdefault(appointment.patient, ([], []))
+        i = bisect_right(fines, appointment.end)
+        fines.insert(i, appointment.end)
+        citas.insert(i, appointment)
+
+    def get(self, appointment_id):
+        return self._by_id.get(appointment_id)
+
+    def add(self, appointment):
+        """Agrega una cita ya revisada (no debe chocar con ninguna)."""
+        i = bisect_right(self._starts, appointment.start)
+        self._starts.insert(i, appointment.start)
+        self._ends.insert(i, appointment.end)
+        self._items.insert(i, appointment)
+        self._by_id[appointment.id] = appointment
+        self._index_patient(appointment)
+
+    def remove(self, appointment_id):
+        """Quita una cita; devuelve la cita o None si no estaba."""
+        appointment = self._by_id.pop(appointment_id, None)
+        if appointment is None:
+            return None
+        i = bisect_left(self._starts, appointment.start)
+        while self._items[i] is not appointment:
+            i += 1
+        del self._starts[i], self._ends[i], self._items[i]
+        fines, citas = self._by_patient[appointment.patient]
+        j = bisect_left(fines, appointment.end)
+        while citas[j] is not appointment:
+            j += 1
+        del fines[j], citas[j]
+        return appointment
+
+    def between(self, start, end):
+        """Citas que se traslapan con [start, end), en orden."""
+        i = bisect_right(self._ends, start)
+        j = bisect_left(self._starts, end, lo=i)
+        return self._items[i:j]
+
+    def conflicts(self, start, end, ignore=None):
+        """Citas con las que chocaría una cita en [start, end) (sin contar ignore)."""
+        return [a for a in self.between(start, end) if a.id != ignore]
+
+    def free_slots(self, day, minutes=DEFAULT_MINUTES, hours=None, step=SLOT_STEP_MINUTES,
+                   after=None):
+        """
+        Inicios libres de un día para una cita de minutes minutos, cada step
+        minutos dentro del horario de consulta; after descarta los anteriores.
+        """
+        hours = WORKING_HOURS if hours is None else hours
+        duracion, paso = timedelta(minutes=minutes), timedelta(minutes=step)
+        libres = []
+        for inicio, fin in hours.get(day.weekday(), ()):
+            ventana_ini = datetime.combine(day, inicio)
+            ventana_fin = datetime.combine(day, fin)
+            t = ventana_ini
+            if after is not None and after > t:
+                # Siguiente múltiplo de step desde el inicio de la ventana
+                t += paso * -((ventana_ini - after) // paso)
+            for cita in self.between(ventana_ini, ventana_fin) + [None]:
+                hueco_fin = ventana_fin if cita is None else min(cita.start, ventana_fin)
+                while t + duracion <= hueco_fin:
+                    libres.append(t)
+                    t += paso
+                if cita is not None and cita.end > t:
+                    t += paso * -((t - cita.end) // paso)
+        return libres
+
+    def next_free(self, after, minutes=DEFAULT_MINUTES, hours=None, step=SLOT_STEP_MINUTES,
+                  max_days=MAX_SEARCH_DAYS):
+        """Primer horario libre desde after (en los siguientes max_days días) o None."""
+        for k in range(max_days):
+            day = after.date() + timedelta(days=k)
+            libres = self.free_slots(day, minutes, hours, step, after=after)
+            if libres:
+                return libres[0]
+        return None
+
+    def next_for_patient(self, patient, now):
+        """Cita del paciente en curso o siguiente a now, o None."""
+        fines, citas = self._by_patient.get(patient, ((), ()))
+        i = bisect_right(fines, now)
+        return citas[i] if i < len(citas) else None
+
+    def patient_appointments(self, patient, since=None):
+        """Citas del paciente (desde since), en orden."""
+        fines, citas = self._by_patient.get(patient, ((), ()))
+        return list(citas[bisect_right(fines, since):] if since is not None else citas)
+
+
+class Agenda:
+    """Agendas de todas las nutriólogas, guardadas en la base y en memoria."""
+
+    def __init__(self, storage, hours=None):
+        self.storage = storage
+        self.hours = WORKING_HOURS if hours is None else hours
+        self._agendas = {}
+        self._lock = threading.Lock()
+
+    def clinician(self, clinician, check=True):
+        """
+        Agenda en memoria de una nutrióloga. Con check se compara su versión
+        con la de la base (una consulta) y se vuelve a leer si cambió.
+        """
+        agenda = self._agendas.get(clinician)
+        if agenda is not None and (
+            not check or agenda.version == self.storage.agenda_version(clinician)
+        ):
+            return agenda
+        rows, version = self.storage.load_appointments(clinician)
+        agenda = ClinicianAgenda([Appointment.from_row(r) for r in rows], version)
+        with self._lock:
+            self._agendas[clinician] = agenda
+        return agenda
+
+    def _apply(self, clinician, version, add=(), remove=()):
+        """Refleja un cambio propio en memoria si no hubo otros entre medias."""
+        with self._lock:
+            agenda = self._agendas.get(clinician)
+            if agenda is None:
+                return
+            if agenda.version != version - 1:
+                # Otro worker escribió: se vuelve a leer completa la próxima vez
+                del self._agendas[clinician]
+                return
+            for appointment_id in remove:
+                agenda.remove(appointment_id)
+            for appointment in add:
+                agenda.add(appointment)
+            agenda.version = version
+
+    def book(self, clinician, patient, start, minutes=DEFAULT_MINUTES, note=None,
+             series=None, new_series=False):
+        """
+        Reserva una cita; ValueError si el horario choca con otra cita o no
+        está dentro del horario de consulta.
+        """
+        end = start + timedelta(minutes=minutes)
+        if not self.within_hours(start, end):
+            raise ValueError(f"{_text(start)} está fuera del horario de consulta.")
+        row, info = self.storage.insert_appointment(
+            clinician, patient, _text(start), _text(end), series, note, new_series
+        )
+        if row is None:
+            # Choque en la base: la copia en memoria estaba atrasada
+            ocupadas = self.clinician(clinician).conflicts(start, end)
+            detalle = ", ".join(f"{a.patient} {a.start:%H:%M}–{a.end:%H:%M}" for a in ocupadas)
+            raise ValueError(f"El horario choca con otra cita ({detalle or 'recién agendada'}).")
+        appointment = Appointment.from_row(row)
+        self._apply(clinician, info, add=[appointment])
+        return appointment
+
+    def book_series(self, clinician, patient, start, minutes=DEFAULT_MINUTES, every_days=14,
+                    count=6, note=None):
+        """
+        Seguimientos cada every_days días a la misma hora, count veces. Los
+        horarios ocupados se mueven al siguiente libre. Cada cita se reserva
+        por separado, así que una que no se pudo dar no deshace las
+        anteriores. Devuelve (citas, movidas, omitidas): movidas son pares
+        (hora pedida, cita) de las que cambiaron; omitidas, las horas
+        pedidas que se quedaron sin cita.
+        """
+        citas, movidas, omitidas, series = [], [], [], None
+        for k in range(count):
+            pedida = start + timedelta(days=every_days * k)
+            cita = libre = None
+            # Un segundo intento si otro worker tomó el horario entre la
+            # búsqueda y la reserva
+            for _ in range(2):
+                libre = self._free_at(clinician, pedida, minutes)
+                if libre is None:
+                    break
+                try:
+                    cita = self.book(
+                        clinician, patient, libre, minutes, note, series, new_series=series is None
+                    )
+                    break
+                except ValueError:
+                    continue
+            if cita is None:
+                omitidas.append(pedida)
+                continue
+            series = cita.series
+            citas.append(cita)
+            if libre != pedida:
+                movidas.append((pedida, cita))
+        return citas, movidas, omitidas
+
+    def _free_at(self, clinician, start, minutes):
+        """start si está libre y en horario; si no, el siguiente horario libre."""
+        end = start + timedelta(minutes=minutes)
+        agenda = self.clinician(clinician)
+        if self.within_hours(start, end) and not agenda.conflicts(start, end):
+            return start
+        return agenda.next_free(start, minutes, self.hours)
+
+    def cancel(self, clinician, appointment_id, following=False):
+        """
+        Cancela una cita; con following también las siguientes de su serie.
+        Devuelve las citas canceladas.
+        """
+        agenda = self.clinician(clinician)
+        cita = agenda.get(appointment_id)
+        if cita is None:
+            return []
+        canceladas = [cita]
+        if following and cita.series is not None:
+            canceladas += [
+                a for a in agenda.patient_appointments(cita.patient, since=cita.end)
+                if a.series == cita.series
+            ]
+        version = self.storage.delete_appointments(clinician, [a.id for a in canceladas])
+        self._apply(clinician, version, remove=[a.id for a in canceladas])
+        return canceladas
+
+    def reschedule(self, clinician, appointment_id, start, minutes=None):
+        """Mueve una cita a otro horario (reserva el nuevo y cancela el anterior)."""
+        anterior = self.clinician(clinician).get(appointment_id)
+        if anterior is None:
+            raise ValueError("La cita ya no existe.")
+        minutes = minutes or anterior.minutes
+        if start < anterior.end and anterior.start < start + timedelta(minutes=minutes):
+            # El horario nuevo se encima con el anterior: primero se libera
+            self.cancel(clinician, appointment_id)
+            try:
+                return self.book(clinician, anterior.patient, start, minutes, anterior.note, anterior.series)
+            except ValueError:
+                self.book(clinician, anterior.patient, anterior.start, anterior.minutes,
+                          anterior.note, anterior.series)
+                raise
+        nueva = self.book(clinician, anterior.patient, start, minutes, anterior.note, anterior.series)
+        self.cancel(clinician, appointment_id)
+        return nueva
+
+    def within_hours(self, start, end):
+        """Indica si [start, end) cae dentro de una ventana del horario de consulta."""
+        if start.date() != (end - timedelta(microseconds=1)).date():
+            return False
+        return any(
+            inicio <= start.time() and end.time() <= fin
+            for inicio, fin in self.hours.get(start.weekday(), ())
+        )
+
+    def conflicts(self, clinician, start, minutes=DEFAULT_MINUTES):
+        return self.clinician(clinician).conflicts(start, start + timedelta(minutes=minutes))
+
+    def free_slots(self, clinician, day, minutes=DEFAULT_MINUTES, after=None):
+        return self.clinician(clinician).free_slots(day, minutes, self.hours, after=after)
+
+    def next_free(self, clinician, after, minutes=DEFAULT_MINUTES):
+        return self.clinician(clinician).next_free(after, minutes, self.hours)
+
+    def day(self, clinician, day):
+        """Citas de un día, en orden."""
+        inicio = datetime.combine(day, time())
+        return self.clinician(clinician).between(inicio, inicio + timedelta(days=1))
+
+    def next_for_patient(self, clinician, patient, now=None):
+        """Próxima cita del paciente con su nutrióloga (o la que está en curso)."""
+        return self.clinician(clinician).next_for_patient(patient, now or datetime.now())
@@ -0,0 +1,63 @@
+# nutri/cache.py
+# -------------------------------------------------------------
+# Caché LRU en memoria compartida por el proceso
+# -------------------------------------------------------------
+
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Caché con tamaño máximo; descarta lo menos usado recientemente."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Valor guardado para la llave (y lo marca como usado)."""
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Guarda un valor y descarta el más antiguo si se pasa del máximo."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Devuelve el valor guardado o lo calcula con compute() y lo guarda."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, match):
+        """Elimina las llaves para las que match(llave) es verdadero."""
+        with self._lock:
+            for key in [k for k in self._data if match(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
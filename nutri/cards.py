@@ -0,0 +1,201 @@
+# nutri/cards.py
+# -------------------------------------------------------------
+# Tarjetas HTML de la app, memorizadas por sus valores
+# -------------------------------------------------------------
+# Cada tarjeta es una función que recibe valores crudos (pesos, fecha
+# de la cita, IMC, racha, adherencia...) y devuelve el HTML que se pasa
+# a st.markdown(..., unsafe_allow_html=True). El resultado se guarda en
+# una caché LRU del proceso con llave (tarjeta, valores), así que una
+# tarjeta que no cambió no se vuelve a formatear en el siguiente rerun.
+# Que además no se vuelva a enviar al navegador depende de que su
+# fragmento no se ejecute (ver FRAGMENT_DEPS en app.py).
+#
+# Los textos que vienen de datos (descripciones del plan, mensajes) se
+# escapan; las clases CSS son las del bloque de estilos de app.py.
+
+from functools import wraps
+from html import escape
+
+from nutri.cache import LRUCache
+
+# Tarjetas distintas que se guardan (todas las sesiones del proceso)
+CARD_CACHE = LRUCache(maxsize=1024)
+
+
+def memo_card(func):
+    """Guarda el HTML de la tarjeta por (nombre, argumentos)."""
+
+    @wraps(func)
+    def wrapper(*args):
+        return CARD_CACHE.get_or_compute((func.__name__,) + args, lambda: func(*args))
+
+    return wrapper
+
+
+def _card(css_class, body, style=""):
+    style = f' style="{style}"' if style else ""
+    return f'<div class="{css_class}"{style}>{body}</div>'
+
+
+# ---- Tarjetas con métricas ----
+@memo_card
+def metric_card(title, value, caption):
+    """Tarjeta suave con título, valor destacado y nota (textos ya formateados)."""
+    return _card(
+        "card-soft",
+        f'<div class="card-title">{escape(title)}</div>'
+        f'<div class="metric-highlight">{escape(value)}</div>'
+        f'<div class="metric-caption">{escape(caption)}</div>',
+    )
+
+
+@memo_card
+def summary_card(initial, current, goal, appointment):
+    """Resumen del proceso: pesos y próxima cita (datetime o None)."""
+    if appointment is None:
+        cita = "💬 Sin cita agendada. Puedes agendarla desde el panel lateral."
+    else:
+        cita = (
+            f"💬 Próxima cita: <strong>{appointment.strftime('%d/%m/%Y %H:%M')}</strong> "
+            "con la L.N. Brenda López Hernández."
+        )
+    return _card(
+        "card",
+        '<div class="card-title">Resumen de tu proceso</div>'
+        '<p style="margin-bottom:0.25rem;">'
+        f"<strong>Peso inicial:</strong> {initial:.1f} kg · "
+        f"<strong>Peso actual:</strong> {current:.1f} kg · "
+        f"<strong>Peso objetivo:</strong> {goal:.1f} kg"
+        "</p>"
+        f'<p style="margin-bottom:0;">{cita}</p>',
+        style="background-color:#e8f8f2; margin-bottom:1.4rem;",
+    )
+
+
+@memo_card
+def weight_card(current, goal):
+    return metric_card("Peso actual", f"{current:.1f} kg", f"Meta: {goal:.1f} kg")
+
+
+@memo_card
+def bmi_card(bmi, height_m):
+    if not bmi:
+        return metric_card("IMC estimado", "-", "Agrega tu altura en el panel lateral.")
+    return metric_card("IMC estimado", f"{bmi:.1f}", f"Altura: {height_m:.2f} m")
+
+
+@memo_card
+def progress_card(progress):
+    return metric_card(
+        "Progreso hacia la meta", f"{progress * 100:.0f}%", "Con base en peso inicial y objetivo."
+    )
+
+
+@memo_card
+def streak_card(current, longest):
+    return metric_card(
+        "Días consecutivos cumpliendo",
+        str(current),
+        f"Todos los tiempos de comida cumplidos · récord: {longest}",
+    )
+
+
+@memo_card
+def adherence_card(label, adherence, logged_days):
+    return metric_card(
+        f"% de adherencia ({label})",
+        f"{adherence * 100:.0f}%",
+        f"Promedio de comidas cumplidas por día · {logged_days} días registrados.",
+    )
+
+
+@memo_card
+def goal_date_card(goal, kg_per_week, goal_date, early, late, clear, reached):
+    """Fecha estimada para llegar a la meta según la tendencia (fechas o None)."""
+    ritmo = f"Ritmo de tu tendencia: {kg_per_week:+.2f} kg/semana"
+    if reached:
+        return metric_card("Fecha estimada de meta", "¡Meta alcanzada!", ritmo)
+    if not clear or goal_date is None:
+        return metric_card(
+            "Fecha estimada de meta",
+            "Sin tendencia clara",
+            f"Sigue registrando tu peso para estimar cuándo llegas a {goal:.1f} kg · {ritmo}",
+        )
+    rango = ""
+    if early and late:
+        rango = f" · entre {early.strftime('%d/%m/%Y')} y {late.strftime('%d/%m/%Y')}"
+    elif early:
+        rango = f" · desde {early.strftime('%d/%m/%Y')}"
+    return metric_card(
+        f"Fecha estimada para {goal:.1f} kg",
+        goal_date.strftime("%d/%m/%Y"),
+        ritmo + rango,
+    )
+
+
+# ---- Tarjetas de texto ----
+@memo_card
+def message_card(title, text, label=False):
+    """Tarjeta con un mensaje; label=True usa el título pequeño de "Nota"."""
+    header = (
+        f'<div class="small-label">{escape(title)}</div>'
+        if label
+        else f'<div class="card-title">{escape(title)}</div>'
+    )
+    return _card(
+        "card",
+        header + f'<p style="font-size:0.9rem; color:#1f2937; margin-bottom:0;">{escape(text)}</p>',
+    )
+
+
+@memo_card
+def meal_card(meal, description, kcal=None):
+    """Comida del plan; kcal es la energía estimada (o None)."""
+    title = escape(meal) if kcal is None else f"{escape(meal)} · ~{kcal:.0f} kcal"
+    return _card(
+        "card-soft",
+        f'<div class="meal-title">{title}</div>'
+        f'<div class="meal-text">{escape(description)}</div>',
+    )
+
+
+@memo_card
+def search_hit_card(title, caption, snippet_html):
+    """Resultado de búsqueda; snippet_html ya viene escapado (nutri.search.highlight)."""
+    return _card(
+        "card-soft search-hit",
+        f'<div class="meal-title">{escape(title)}</div>'
+        f'<div class="meal-text">{snippet_html}</div>'
+        f'<div class="metric-caption">{escape(caption)}</div>',
+    )
+
+
+@memo_card
+def info_card(title, paragraphs):
+    """Tarjeta suave con título y párrafos de texto (tupla)."""
+    body = "".join(f'<p style="font-size:0.88rem; color:#374151;">{escape(p)}</p>' for p in paragraphs)
+    return _card("card-soft", f'<div class="card-title">{escape(title)}</div>{body}')
+
+
+@memo_card
+def list_card(title, items):
+    """Tarjeta suave con título y lista con viñetas (tupla)."""
+    lis = "".join(f"<li>{escape(i)}</li>" for i in items)
+    return _card(
+        "card-soft",
+        f'<div class="card-title">{escape(title)}</div>'
+        f'<ul style="padding-left:1.1rem; margin-bottom:0; font-size:0.85rem; color:#374151;">{lis}</ul>',
+    )
+
+
+@memo_card
+def contact_card(name, role, paragraphs, suggestion):
+    body = "".join(f'<p style="font-size:0.9rem; color:#1f2937;">{escape(p)}</p>' for p in paragraphs)
+    return _card(
+        "contact-card",
+        f'<div class="contact-name">{escape(name)}</div>'
+        f'<div class="contact-role">{escape(role)}</div>'
+        f"{body}"
+        '<p style="font-size:0.86rem; color:#4b5563; margin-bottom:0.4rem;">'
+        f"<strong>Sugerencia:</strong> {escape(suggestion)}</p>",
+    )
@@ -0,0 +1,226 @@
+# nutri/checkpoint.py
+# -------------------------------------------------------------
+# Puntos de control de la sesión en disco (Arrow IPC)
+# -------------------------------------------------------------
+# El estado en memoria de un paciente (registros compactos, serie de peso,
+# perfil y el seq del último evento aplicado) se guarda en dos archivos
+# Arrow IPC por paciente:
+#   <paciente>.logs.arrow     day int32 · mask uint8 · mood int8 · comment
+#   <paciente>.weights.arrow  day int32 · weight float64
+# Las categorías de ánimo, el perfil y el seq van en los metadatos del
+# esquema. Al iniciar sesión se abren con memory map: las columnas
+# numéricas se leen sin copia desde el archivo mapeado y solo se copian
+# una vez a los arreglos de la serie (que se editan en su lugar). Luego se
+# aplican los eventos posteriores al seq, como con una instantánea.
+#
+# La escritura no bloquea a la sesión: schedule() copia los arreglos (es
+# lo único que corre en el hilo de la página) y un hilo aparte escribe,
+# juntando en uno los puntos de control seguidos del mismo paciente. Cada
+# archivo se escribe a un temporal y se renombra; si los seq de los dos
+# archivos no coinciden (se cortó a la mitad) se ignoran y se carga de la
+# base. Un punto de control que no se puede escribir solo se registra en
+# el log: la sesión sigue y al iniciar se carga de la base. Sin pyarrow no
+# hay puntos de control.
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import quote
+
+from nutri.compact import LOG_DTYPES, CompactLogs
+from nutri.events import PatientState
+from nutri.timeseries import WEIGHT_DTYPES, TimeSeries
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # sin pyarrow el estado se carga desde la base
+    pa = None
+
+CHECKPOINTS_ENABLED = pa is not None and os.environ.get("NUTRI_CHECKPOINTS", "1") not in ("", "0")
+DEFAULT_CHECKPOINT_DIR = os.environ.get(
+    "NUTRI_CHECKPOINT_DIR", os.path.join("data", "checkpoints")
+)
+
+# Espera antes de escribir, para juntar varias escrituras seguidas
+CHECKPOINT_DELAY = 1.0
+# Cambia si cambia el formato de los archivos
+FORMAT_VERSION = b"1"
+
+log = logging.getLogger(__name__)
+
+
+def _metadata(state, **extra):
+    meta = {b"version": FORMAT_VERSION, b"seq": str(state.seq).encode()}
+    meta.update((k.encode(), json.dumps(v).encode()) for k, v in extra.items())
+    return meta
+
+
+class _Copy:
+    """Copia de un PatientState tomada en el hilo de la sesión."""
+
+    __slots__ = ("seq", "days", "masks", "moods", "comments", "categories",
+                 "w_days", "weights", "profile")
+
+    def __init__(self, state):
+        logs, weights = state.logs, state.weights
+        self.seq = state.seq
+        self.days = logs.days.copy()
+        self.masks = logs.masks.copy()
+        self.moods = logs.moods.copy()
+        self.comments = logs.comments.copy()
+        self.categories = list(logs.mood_categories)
+        self.w_days = weights.days.copy()
+        self.weights = weights.column("weight").copy()
+        self.profile = None if state.profile is None else dict(state.profile)
+
+
+class Checkpointer:
+    """Escribe puntos de control en un hilo aparte y los restaura al iniciar sesión."""
+
+    def __init__(self, directory=DEFAULT_CHECKPOINT_DIR, delay=CHECKPOINT_DELAY):
+        self.directory = directory
+        self.delay = delay
+        self._pending = {}
+        # paciente → seq del último punto de control pedido
+        self._seq = {}
+        self._cond = threading.Condition()
+        # Un lote a la vez, en el orden en que se tomaron
+        self._writing = threading.Lock()
+        self._thread = None
+        self._atexit = False
+        self.stats = {"escritos": 0, "juntados": 0, "restaurados": 0, "errores": 0}
+
+    def _paths(self, patient):
+        base = os.path.join(self.directory, quote(patient, safe=""))
+        return base + ".logs.arrow", base + ".weights.arrow"
+
+    # ---- Escritura ----
+    def schedule(self, patient, state):
+        """Pide un punto de control del estado; regresa enseguida."""
+        if self._seq.get(patient) == state.seq:
+            return
+        copia = _Copy(state)
+        with self._cond:
+            if patient in self._pending:
+                self.stats["juntados"] += 1
+            self._pending[patient] = copia
+            self._seq[patient] = state.seq
+            if self._thread is None:
+                if not self._atexit:
+                    atexit.register(self.flush)
+                    self._atexit = True
+                self._thread = threading.Thread(target=self._run, name="nutri-checkpoints", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._pending:
+                        self._cond.wait()
+                # Deja que se junten las escrituras seguidas antes de tomar el lote
+                time.sleep(self.delay)
+                try:
+                    self.flush()
+                except Exception:
+                    log.exception("Error inesperado al escribir puntos de control")
+        finally:
+            # Si el hilo termina, el siguiente schedule arranca otro
+            with self._cond:
+                self._thread = None
+
+    def flush(self):
+        """Escribe ya todo lo pendiente (también se llama al salir del proceso)."""
+        with self._writing:
+            with self._cond:
+                lote, self._pending = self._pending, {}
+            for patient, copia in lote.items():
+                try:
+                    self._write(patient, copia)
+                    self.stats["escritos"] += 1
+                except Exception:
+                    # Se pierde solo este punto de control; el resto del lote sigue
+                    log.exception("No se pudo escribir el punto de control de %s", patient)
+                    self.stats["errores"] += 1
+                    self._seq.pop(patient, None)
+
+    def _write(self, patient, c):
+        os.makedirs(self.directory, exist_ok=True)
+        logs = pa.table(
+            {
+                "day": pa.array(c.days, pa.int32()),
+                "mask": pa.array(c.masks, pa.uint8()),
+                "mood": pa.array(c.moods, pa.int8()),
+                "comment": pa.array(c.comments, pa.string()),
+            },
+        ).replace_schema_metadata(_metadata(c, moods=c.categories, profile=c.profile))
+        weights = pa.table(
+            {"day": pa.array(c.w_days, pa.int32()), "weight": pa.array(c.weights, pa.float64())},
+        ).replace_schema_metadata(_metadata(c))
+        for path, table in zip(self._paths(patient), (logs, weights)):
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with pa.OSFile(tmp, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+    # ---- Lectura ----
+    def restore(self, patient):
+        """PatientState del último punto de control del paciente, o None."""
+        logs_path, weights_path = self._paths(patient)
+        try:
+            with pa.memory_map(logs_path) as f_logs, pa.memory_map(weights_path) as f_weights:
+                logs = ipc.open_file(f_logs).read_all()
+                weights = ipc.open_file(f_weights).read_all()
+                meta, w_meta = logs.schema.metadata, weights.schema.metadata
+                if meta.get(b"version") != FORMAT_VERSION or meta.get(b"seq") != w_meta.get(b"seq"):
+                    return None
+                state = PatientState(
+                    _restore_logs(logs, json.loads(meta[b"moods"])),
+                    _restore_weights(weights),
+                    json.loads(meta[b"profile"]),
+                    int(meta[b"seq"]),
+                )
+        except (OSError, KeyError, ValueError, pa.ArrowException):
+            return None
+        self._seq[patient] = state.seq
+        self.stats["restaurados"] += 1
+        return state
+
+
+def _column(table, name):
+    """Columna numérica sin copia (vista sobre el archivo mapeado)."""
+    column = table.column(name)
+    array = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    return array.to_numpy(zero_copy_only=True)
+
+
+def _restore_logs(table, categories):
+    if table.num_rows == 0:
+        return CompactLogs.empty()
+    logs = CompactLogs.from_arrays(
+        LOG_DTYPES,
+        _column(table, "day"),
+        masks=_column(table, "mask"),
+        moods=_column(table, "mood"),
+        comments=table.column("comment").to_numpy(zero_copy_only=False),
+    )
+    logs.mood_categories = categories
+    return logs
+
+
+def _restore_weights(table):
+    if table.num_rows == 0:
+        return TimeSeries(WEIGHT_DTYPES)
+    return TimeSeries.from_arrays(
+        WEIGHT_DTYPES, _column(table, "day"), weight=_column(table, "weight")
+    )
@@ -0,0 +1,162 @@
+# nutri/compact.py
+# -------------------------------------------------------------
+# Representación compacta de los registros diarios
+# -------------------------------------------------------------
+# En lugar de un DataFrame con cinco columnas bool, fechas como
+# objetos y el ánimo como texto, cada día ocupa:
+#   - int32  : fecha como ordinal
+#   - uint8  : tiempos cumplidos empaquetados en bits (ver FULL_MASK)
+#   - int8   : ánimo como código de categoría
+# Los comentarios (texto libre) quedan como referencias a str.
+# El DataFrame para st.dataframe se arma solo para el rango pedido.
+
+import numpy as np
+import pandas as pd
+
+from nutri.schema import (
+    DAILY_LOG_COLS,
+    MEAL_COLS,
+    MOOD_OPTIONS,
+    frame_to_masks,
+    meals_to_mask,
+)
+from nutri.timeseries import TimeSeries, dates_to_ordinals, ordinals_to_dates
+
+# Número de bits encendidos de cada máscara posible
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+LOG_DTYPES = {"masks": np.uint8, "moods": np.int8, "comments": object}
+
+
+class CompactLogs(TimeSeries):
+    """Registros diarios de un paciente ordenados por fecha, en arreglos numpy."""
+
+    def __init__(self, dtypes=LOG_DTYPES, capacity=64):
+        super().__init__(dtypes, capacity=capacity)
+        self.mood_categories = list(MOOD_OPTIONS)
+
+    @classmethod
+    def empty(cls):
+        return cls()
+
+    @classmethod
+    def from_columns(cls, days, masks, moods, comments):
+        """Construye desde columnas sueltas; el ánimo llega como texto."""
+        categories = list(MOOD_OPTIONS)
+        moods = pd.Categorical(moods)
+        # Ánimos fuera de la lista estándar se agregan como categorías nuevas
+        for extra in moods.categories:
+            if extra not in categories:
+                categories.append(extra)
+        codes = pd.Categorical(moods, categories=categories).codes
+        logs = cls.from_arrays(
+            LOG_DTYPES,
+            days,
+            masks=masks,
+            moods=codes,
+            comments=np.asarray(comments, dtype=object),
+        )
+        logs.mood_categories = categories
+        return logs
+
+    @classmethod
+    def from_frame(cls, df):
+        """Compacta un DataFrame con las columnas de daily_logs_df."""
+        if df.empty:
+            return cls.empty()
+        return cls.from_columns(
+            dates_to_ordinals(list(df["date"])),
+            frame_to_masks(df),
+            df["mood"].to_numpy(dtype=object),
+            df["comentarios"].to_numpy(dtype=object),
+        )
+
+    # ---- Vistas sin copia ----
+    @property
+    def masks(self):
+        return self.column("masks")
+
+    @property
+    def moods(self):
+        return self.column("moods")
+
+    @property
+    def comments(self):
+        return self.column("comments")
+
+    @property
+    def nbytes(self):
+        """Bytes ocupados por los arreglos (referencias a comentarios incluidas)."""
+        return self.days.nbytes + self.masks.nbytes + self.moods.nbytes + self.comments.nbytes
+
+    def meals_done(self):
+        """Tiempos de comida cumplidos por día (0 a 5)."""
+        return POPCOUNT[self.masks]
+
+    def mood_code(self, mood):
+        """Código de categoría de un ánimo (se agrega si es nuevo)."""
+        if mood is None:
+            return -1
+        if mood not in self.mood_categories:
+            self.mood_categories.append(mood)
+        return self.mood_categories.index(mood)
+
+    def upsert_registro(self, registro):
+        """Inserta o reemplaza el registro de un día; False si no cambió nada."""
+        return self.upsert(
+            registro["date"],
+            masks=meals_to_mask(registro),
+            moods=self.mood_code(registro.get("mood")),
+            comments=registro.get("comentarios"),
+        )
+
+    def to_frame(self, start=None, end=None):
+        """DataFrame con las columnas de daily_logs_df solo para el rango pedido."""
+        i, j = self.span(start, end)
+        return self.frame_at(slice(i, j))
+
+    def frame_at(self, positions):
+        """DataFrame de daily_logs_df solo con las filas indicadas (rebanada o índices)."""
+        masks = self.masks[positions]
+        data = {"date": ordinals_to_dates(self.days[positions])}
+        for bit, c in enumerate(MEAL_COLS):
+            data[c] = (masks >> bit & 1).astype(bool)
+        data["mood"] = pd.Categorical.from_codes(
+            self.moods[positions], categories=self.mood_categories
+        ).astype(object)
+        data["comentarios"] = self.comments[positions]
+        return pd.DataFrame(data, columns=DAILY_LOG_COLS)
+
+    # ---- Filtros y páginas (tabla del historial completo) ----
+    def filter_positions(self, moods=(), missed=0, text=""):
+        """
+        Posiciones (en orden de fecha) de los días que cumplen los filtros:
+        ánimo en moods, algún tiempo de la máscara missed sin cumplir y
+        text dentro de los comentarios (sin distinguir mayúsculas).
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if moods:
+            codes = [self.mood_categories.index(m) for m in moods if m in self.mood_categories]
+            keep &= np.isin(self.moods, codes)
+        if missed:
+            keep &= (self.masks & missed) != missed
+        if text:
+            # Solo se revisan los comentarios de los días que quedan
+            idx = np.flatnonzero(keep)
+            found = pd.Series(self.comments[idx], dtype=object).str.contains(
+                text, case=False, regex=False, na=False
+            )
+            keep[idx[~found.to_numpy(dtype=bool)]] = False
+        return np.flatnonzero(keep)
+
+    def page_before(self, positions, before=None, size=30):
+        """
+        Página en orden descendente: hasta size posiciones (de las filtradas)
+        con fecha anterior al ordinal before, o las más recientes si es None.
+        Se ubica con dos búsquedas binarias, sin recorrer el historial.
+        """
+        if before is None:
+            end = len(positions)
+        else:
+            end = int(np.searchsorted(positions, np.searchsorted(self.days, before, "left")))
+        return positions[max(0, end - size):end][::-1]
@@ -0,0 +1,43 @@
+# nutri/downsample.py
+# -------------------------------------------------------------
+# Reducción de puntos para gráficas (Largest-Triangle-Three-Buckets)
+# -------------------------------------------------------------
+# Con años de pesajes diarios la gráfica de peso mandaría miles de
+# puntos al navegador en cada rerun. LTTB conserva la forma de la
+# tendencia eligiendo, en cada cubeta, el punto que forma el
+# triángulo de mayor área con sus vecinos.
+
+import numpy as np
+
+
+def lttb_indices(x, y, n_out):
+    """Posiciones de los puntos a conservar (siempre incluye el primero y el último)."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (n_out - 2)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # Promedio de la cubeta siguiente (la última usa el punto final)
+        n_start = end
+        n_end = min(int((i + 2) * every) + 1, n - 1)
+        if n_start < n_end:
+            avg_x = x[n_start:n_end].mean()
+            avg_y = y[n_start:n_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        out[i + 1] = a
+    out[-1] = n - 1
+    return out
@@ -0,0 +1,427 @@
+# nutri/events.py
+# -------------------------------------------------------------
+# Bitácora de cambios por paciente (eventos) con instantáneas
+# -------------------------------------------------------------
+# Cada escritura de registros, pesos o perfil agrega un evento a la tabla
+# events dentro de la misma transacción que actualiza las tablas, así que
+# la bitácora y los datos nunca se separan. Nada se borra ni se edita: la
+# bitácora dice qué cambió y cuándo (ts), en orden (seq por paciente).
+#
+# Los eventos se guardan en binario compacto (struct), no en JSON:
+#   registro  día int32 · máscara uint8 · ánimo · comentario   (~10 B + texto)
+#   peso      día int32 · peso float64                         (12 B)
+#   perfil    peso inicial, meta y altura float64 · nutrióloga
+#   lote      importaciones: columnas numpy seguidas y un indicador de
+#             reemplazo (borra lo anterior de ese tipo)
+# Los textos van como longitud uint32 + UTF-8 (0xFFFFFFFF = None).
+#
+# El estado de un paciente (PatientState: registros compactos, serie de
+# peso y perfil) se arma desde la última instantánea más los eventos que
+# siguen. Las instantáneas (tabla snapshots) son el estado completo en
+# binario comprimido con zlib; se toma una nueva cuando la cola pasa de
+# SNAPSHOT_EVERY eventos o SNAPSHOT_BYTES, así que cargar a un paciente con
+# años de ediciones lee una instantánea y unas cuantas decenas de eventos.
+# Los pacientes que ya tenían datos antes de la bitácora reciben una
+# instantánea base (seq 0) justo antes de su primer evento.
+#
+# Las vistas derivadas en memoria (rachas, adherencia, tendencia) se
+# alimentan con los eventos nuevos (since) en lugar de recargarse.
+
+import math
+import struct
+import time
+import zlib
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from nutri.compact import CompactLogs
+from nutri.schema import MEAL_COLS, meals_to_mask
+from nutri.timeseries import WEIGHT_DTYPES, TimeSeries
+
+# Tipos de evento
+LOG = 1
+WEIGHT = 2
+PROFILE = 3
+LOGS_BATCH = 4
+WEIGHTS_BATCH = 5
+
+# Cuándo tomar una instantánea nueva (eventos o bytes en la cola)
+SNAPSHOT_EVERY = 200
+SNAPSHOT_BYTES = 256 * 1024
+# Más eventos pendientes que esto: se recarga en lugar de aplicarlos
+CATCH_UP_MAX = 500
+
+_LOG = struct.Struct("<iB")
+_WEIGHT = struct.Struct("<id")
+_PROFILE = struct.Struct("<ddd")
+_BATCH = struct.Struct("<BI")
+_SNAPSHOT = struct.Struct("<IIB")
+_LENGTH = struct.Struct("<I")
+_NONE = 0xFFFFFFFF
+
+
+# ---- Codificación ----
+def _ordinal(day):
+    return day.toordinal() if isinstance(day, date) else int(day)
+
+
+def _pack_text(value):
+    if value is None:
+        return _LENGTH.pack(_NONE)
+    data = str(value).encode("utf-8")
+    return _LENGTH.pack(len(data)) + data
+
+
+def _unpack_text(buf, pos):
+    (n,) = _LENGTH.unpack_from(buf, pos)
+    pos += _LENGTH.size
+    if n == _NONE:
+        return None, pos
+    return bytes(buf[pos:pos + n]).decode("utf-8"), pos + n
+
+
+def _pack_texts(values):
+    """Muchos textos: longitudes uint32 seguidas y luego los bytes."""
+    datos = [None if v is None else str(v).encode("utf-8") for v in values]
+    largos = np.fromiter(
+        (_NONE if d is None else len(d) for d in datos), dtype=np.uint32, count=len(datos)
+    )
+    return largos.tobytes() + b"".join(d for d in datos if d)
+
+
+def _unpack_texts(buf, pos, n):
+    largos = np.frombuffer(buf, dtype=np.uint32, count=n, offset=pos)
+    pos += 4 * n
+    textos = []
+    for largo in largos.tolist():
+        if largo == _NONE:
+            textos.append(None)
+        else:
+            textos.append(bytes(buf[pos:pos + largo]).decode("utf-8"))
+            pos += largo
+    return textos, pos
+
+
+def _float(value):
+    return math.nan if value is None else float(value)
+
+
+def _optional(value):
+    return None if math.isnan(value) else value
+
+
+def encode_log(registro):
+    return (
+        _LOG.pack(_ordinal(registro["date"]), meals_to_mask(registro))
+        + _pack_text(registro.get("mood"))
+        + _pack_text(registro.get("comentarios"))
+    )
+
+
+def encode_weight(day, weight):
+    return _WEIGHT.pack(_ordinal(day), float(weight))
+
+
+def encode_profile(profile):
+    return _PROFILE.pack(
+        _float(profile.get("initial_weight")),
+        _float(profile.get("goal_weight")),
+        _float(profile.get("height_m")),
+    ) + _pack_text(profile.get("clinician"))
+
+
+def encode_logs_batch(days, masks, moods, comments, replace=False):
+    """Lote de registros: ordinales, máscaras, ánimos y comentarios."""
+    days = np.asarray(days, dtype=np.int32)
+    return (
+        _BATCH.pack(int(replace), len(days))
+        + days.tobytes()
+        + np.asarray(masks, dtype=np.uint8).tobytes()
+        + _pack_texts(moods)
+        + _pack_texts(comments)
+    )
+
+
+def encode_weights_batch(days, weights, replace=False):
+    days = np.asarray(days, dtype=np.int32)
+    return (
+        _BATCH.pack(int(replace), len(days))
+        + days.tobytes()
+        + np.asarray(weights, dtype=np.float64).tobytes()
+    )
+
+
+def _mask_to_registro(day, mask, mood, comment):
+    registro = {"date": date.fromordinal(day)}
+    registro.update((c, bool(mask >> i & 1)) for i, c in enumerate(MEAL_COLS))
+    registro["mood"] = mood
+    registro["comentarios"] = comment
+    return registro
+
+
+def decode(kind, data):
+    """Contenido de un evento: dict (registro, peso, perfil) o columnas del lote."""
+    buf = memoryview(data)
+    if kind == LOG:
+        day, mask = _LOG.unpack_from(buf, 0)
+        mood, pos = _unpack_text(buf, _LOG.size)
+        comment, _ = _unpack_text(buf, pos)
+        return _mask_to_registro(day, mask, mood, comment)
+    if kind == WEIGHT:
+        day, weight = _WEIGHT.unpack_from(buf, 0)
+        return {"date": date.fromordinal(day), "weight": weight}
+    if kind == PROFILE:
+        inicial, meta, altura = _PROFILE.unpack_from(buf, 0)
+        clinician, _ = _unpack_text(buf, _PROFILE.size)
+        return {
+            "clinician": clinician,
+            "initial_weight": _optional(inicial),
+            "goal_weight": _optional(meta),
+            "height_m": _optional(altura),
+        }
+    replace, n = _BATCH.unpack_from(buf, 0)
+    pos = _BATCH.size
+    days = np.frombuffer(buf, dtype=np.int32, count=n, offset=pos)
+    pos += 4 * n
+    if kind == WEIGHTS_BATCH:
+        weights = np.frombuffer(buf, dtype=np.float64, count=n, offset=pos)
+        return {"replace": bool(replace), "days": days, "weights": weights}
+    masks = np.frombuffer(buf, dtype=np.uint8, count=n, offset=pos)
+    moods, pos = _unpack_texts(buf, pos + n, n)
+    comments, _ = _unpack_texts(buf, pos, n)
+    return {"replace": bool(replace), "days": days, "masks": masks, "moods": moods, "comments": comments}
+
+
+class Event:
+    """Un cambio guardado en la bitácora."""
+
+    __slots__ = ("seq", "ts", "kind", "data")
+
+    def __init__(self, seq, ts, kind, data):
+        self.seq = seq
+        self.ts = ts
+        self.kind = kind
+        self.data = data
+
+    @classmethod
+    def from_row(cls, row):
+        seq, ts, kind, blob = row
+        return cls(seq, ts, kind, decode(kind, blob))
+
+    def describe(self):
+        """Texto corto del cambio para el historial."""
+        d = self.data
+        if self.kind == LOG:
+            cumplidas = sum(d[c] for c in MEAL_COLS)
+            texto = f"Registro del {d['date']:%d/%m/%Y}: {cumplidas}/{len(MEAL_COLS)} tiempos"
+            if d["mood"]:
+                texto += f", ánimo {d['mood']}"
+            return texto + (", con comentario" if d["comentarios"] else "")
+        if self.kind == WEIGHT:
+            return f"Peso del {d['date']:%d/%m/%Y}: {d['weight']:.1f} kg"
+        if self.kind == PROFILE:
+            partes = [
+                f"{nombre} {d[k]:{fmt}}"
+                for k, nombre, fmt in (
+                    ("initial_weight", "peso inicial", ".1f"),
+                    ("goal_weight", "meta", ".1f"),
+                    ("height_m", "altura", ".2f"),
+                )
+                if d[k] is not None
+            ]
+            return "Datos: " + ", ".join(partes)
+        que = "registros" if self.kind == LOGS_BATCH else "pesos"
+        texto = f"Carga de {len(d['days']):,} {que}"
+        return texto + (" (reemplazó los anteriores)" if d["replace"] else "")
+
+    def __repr__(self):
+        return f"Event({self.seq}, {self.describe()!r})"
+
+
+# ---- Estado del paciente ----
+def _merge(old_days, old_cols, new_days, new_cols):
+    """Une columnas ordenadas por día; en días repetidos gana lo nuevo."""
+    days = np.concatenate((new_days, old_days))
+    # np.unique se queda con la primera aparición: la del lote nuevo
+    days, first = np.unique(days, return_index=True)
+    cols = {
+        name: np.concatenate((np.asarray(new_cols[name], dtype=old_cols[name].dtype), old_cols[name]))[first]
+        for name in old_cols
+    }
+    return days, cols
+
+
+class PatientState:
+    """Registros compactos, serie de peso y perfil de un paciente en un seq."""
+
+    def __init__(self, logs=None, weights=None, profile=None, seq=0):
+        self.logs = logs if logs is not None else CompactLogs.empty()
+        self.weights = weights if weights is not None else TimeSeries(WEIGHT_DTYPES)
+        self.profile = profile
+        self.seq = seq
+
+    def apply(self, event):
+        """Aplica un evento; devuelve True si cambió algo."""
+        d = event.data
+        self.seq = max(self.seq, event.seq)
+        if event.kind == LOG:
+            return self.logs.upsert_registro(d)
+        if event.kind == WEIGHT:
+            return self.weights.upsert(d["date"], weight=d["weight"])
+        if event.kind == PROFILE:
+            cambio = d != self.profile
+            self.profile = dict(d)
+            return cambio
+        if event.kind == LOGS_BATCH:
+            moods, comments = list(d["moods"]), list(d["comments"])
+            if not d["replace"] and len(self.logs):
+                logs = self.logs
+                viejos = {
+                    "masks": logs.masks,
+                    "moods": np.array([logs.mood_categories[c] if c >= 0 else None for c in logs.moods], dtype=object),
+                    "comments": np.asarray(logs.comments, dtype=object),
+                }
+                nuevos = {"masks": d["masks"], "moods": moods, "comments": comments}
+                days, cols = _merge(logs.days, viejos, d["days"], nuevos)
+                self.logs = CompactLogs.from_columns(days, cols["masks"], cols["moods"], cols["comments"])
+            else:
+                self.logs = CompactLogs.from_columns(d["days"], d["masks"], moods, comments) if len(d["days"]) else CompactLogs.empty()
+            return True
+        # WEIGHTS_BATCH
+        if not d["replace"] and len(self.weights):
+            days, cols = _merge(
+                self.weights.days, {"weight": self.weights.column("weight")},
+                d["days"], {"weight": d["weights"]},
+            )
+        else:
+            days, cols = d["days"], {"weight": d["weights"]}
+        self.weights = TimeSeries.from_arrays(WEIGHT_DTYPES, days, weight=cols["weight"])
+        return True
+
+    # ---- Instantáneas ----
+    def encode(self):
+        """Estado completo en binario comprimido (para la tabla snapshots)."""
+        logs, weights = self.logs, self.weights
+        moods = [logs.mood_categories[c] if c >= 0 else None for c in logs.moods.tolist()]
+        partes = [
+            _SNAPSHOT.pack(len(logs), len(weights), self.profile is not None),
+            np.ascontiguousarray(logs.days).tobytes(),
+            np.ascontiguousarray(logs.masks).tobytes(),
+            _pack_texts(moods),
+            _pack_texts(logs.comments.tolist()),
+            np.ascontiguousarray(weights.days).tobytes(),
+            np.ascontiguousarray(weights.column("weight")).tobytes(),
+        ]
+        if self.profile is not None:
+            partes.append(encode_profile(self.profile))
+        return zlib.compress(b"".join(partes), 1)
+
+    @classmethod
+    def decode(cls, blob, seq):
+        buf = memoryview(zlib.decompress(blob))
+        n_logs, n_weights, has_profile = _SNAPSHOT.unpack_from(buf, 0)
+        pos = _SNAPSHOT.size
+        days = np.frombuffer(buf, dtype=np.int32, count=n_logs, offset=pos)
+        pos += 4 * n_logs
+        masks = np.frombuffer(buf, dtype=np.uint8, count=n_logs, offset=pos)
+        moods, pos = _unpack_texts(buf, pos + n_logs, n_logs)
+        comments, pos = _unpack_texts(buf, pos, n_logs)
+        w_days = np.frombuffer(buf, dtype=np.int32, count=n_weights, offset=pos)
+        pos += 4 * n_weights
+        w = np.frombuffer(buf, dtype=np.float64, count=n_weights, offset=pos)
+        pos += 8 * n_weights
+        profile = decode(PROFILE, bytes(buf[pos:])) if has_profile else None
+        logs = CompactLogs.from_columns(days, masks, moods, comments) if n_logs else CompactLogs.empty()
+        weights = TimeSeries.from_arrays(WEIGHT_DTYPES, w_days, weight=w) if n_weights else TimeSeries(WEIGHT_DTYPES)
+        return cls(logs, weights, profile, seq)
+
+
+class EventLog:
+    """Lectura de la bitácora: estado (instantánea + cola), eventos nuevos e historial."""
+
+    def __init__(self, storage, snapshot_every=SNAPSHOT_EVERY, snapshot_bytes=SNAPSHOT_BYTES,
+                 checkpoints=None):
+        self.storage = storage
+        # Checkpointer (nutri/checkpoint.py) o None
+        self.checkpoints = checkpoints
+        self.snapshot_every = snapshot_every
+        self.snapshot_bytes = snapshot_bytes
+        # paciente → seq de su última instantánea conocida
+        self._snapshot_seq = {}
+
+    def load(self, patient, upto=None):
+        """
+        Estado del paciente (o como estaba en el evento upto). Si la cola
+        después de la instantánea quedó larga se guarda una nueva. Sin upto
+        se parte del punto de control en disco, si hay uno al día.
+        """
+        if upto is None and self.checkpoints is not None:
+            state = self._from_checkpoint(patient)
+            if state is not None:
+                return state
+        snapshot = self.storage.load_snapshot(patient, upto)
+        state = PatientState() if snapshot is None else PatientState.decode(snapshot[1], snapshot[0])
+        rows = self.storage.load_events(patient, after=state.seq, upto=upto)
+        cola = 0
+        for row in rows:
+            state.apply(Event.from_row(row))
+            cola += len(row[3])
+        self._snapshot_seq[patient] = snapshot[0] if snapshot else 0
+        if upto is None and (len(rows) >= self.snapshot_every or cola >= self.snapshot_bytes):
+            self.save_snapshot(patient, state)
+        if upto is None and self.checkpoints is not None:
+            self.checkpoints.schedule(patient, state)
+        return state
+
+    def _from_checkpoint(self, patient):
+        """Punto de control más sus eventos posteriores, o None si no sirve."""
+        state = self.checkpoints.restore(patient)
+        if state is None:
+            return None
+        rows = self.storage.load_events(patient, after=state.seq, limit=CATCH_UP_MAX + 1)
+        if len(rows) > CATCH_UP_MAX or state.seq > self.storage.last_event(patient):
+            # Muy atrasado, o de otra base con menos eventos
+            return None
+        for row in rows:
+            state.apply(Event.from_row(row))
+        if rows:
+            self.checkpoints.schedule(patient, state)
+        return state
+
+    def save_snapshot(self, patient, state):
+        self.storage.save_snapshot(patient, state.seq, state.encode())
+        self._snapshot_seq[patient] = state.seq
+
+    def maybe_snapshot(self, patient, state):
+        """
+        Tras ponerse al día: instantánea en la base si ya hay muchos eventos
+        desde la última, y punto de control en disco (en otro hilo).
+        """
+        if self.checkpoints is not None:
+            self.checkpoints.schedule(patient, state)
+        base = self._snapshot_seq.get(patient)
+        if base is None:
+            base = self._snapshot_seq[patient] = self.storage.snapshot_seq(patient)
+        if state.seq - base >= self.snapshot_every:
+            self.save_snapshot(patient, state)
+
+    def since(self, patient, seq, limit=CATCH_UP_MAX):
+        """Eventos posteriores a seq, o None si son más de limit (conviene recargar)."""
+        rows = self.storage.load_events(patient, after=seq, limit=limit + 1)
+        if len(rows) > limit:
+            return None
+        return [Event.from_row(r) for r in rows]
+
+    def history(self, patient, limit=50, before=None):
+        """Eventos más recientes primero (antes del seq before, si se indica)."""
+        return [Event.from_row(r) for r in self.storage.recent_events(patient, limit, before)]
+
+
+def events_frame(events):
+    """Tabla del historial de cambios: fecha y hora, y descripción."""
+    return pd.DataFrame({
+        "Fecha y hora": [time.strftime("%d/%m/%Y %H:%M", time.localtime(e.ts)) for e in events],
+        "Cambio": [e.describe() for e in events],
+    })
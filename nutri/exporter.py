@@ -0,0 +1,219 @@
+# nutri/exporter.py
+# -------------------------------------------------------------
+# Exportación del historial (registros diarios y pesos) por bloques
+# -------------------------------------------------------------
+# stream_export() es un generador de bytes: lee cada paciente en
+# bloques con Storage.iter_history (consultas por llave de fecha),
+# convierte el bloque al formato pedido y lo suelta de inmediato. En
+# memoria solo está el bloque en curso, sin importar el tamaño del
+# historial ni cuántos pacientes se exporten.
+#
+# Formatos:
+#   - csv      texto UTF-8, encabezado solo en el primer bloque
+#   - parquet  un row group por bloque (pyarrow)
+#   - xlsx     hoja en modo write_only de openpyxl (en requirements.txt);
+#              si se pasa del límite de filas de Excel sigue en otra hoja
+#
+# Las columnas son las de la app más "patient", así que un archivo
+# exportado se puede volver a importar con nutri.importer.
+#
+# Uso desde la terminal:
+#   python -m nutri.exporter historial.csv registros paciente1 paciente2
+#   python -m nutri.exporter pesos.parquet pesos --nutriologa brenda --desde 2024-01-01
+
+import argparse
+import io
+import sys
+import tempfile
+from datetime import date
+
+import pandas as pd
+
+from nutri.schema import DAILY_LOG_COLS, MEAL_COLS, WEIGHT_COLS
+
+# Filas por bloque al leer de la base
+CHUNK_ROWS = 10_000
+
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Tabla y columnas de cada tipo de exportación
+KINDS = {
+    "registros": ("daily_logs", ["patient"] + DAILY_LOG_COLS),
+    "pesos": ("weights", ["patient"] + WEIGHT_COLS),
+}
+
+# Filas de datos por hoja de Excel (el límite es 1,048,576 con encabezado)
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def iter_frames(storage, patients, kind, start=None, end=None, chunk_rows=CHUNK_ROWS):
+    """Bloques (DataFrames) del historial de varios pacientes, en orden."""
+    table, cols = KINDS[kind]
+    for patient in patients:
+        for chunk in storage.iter_history(table, patient, start, end, chunk_rows):
+            chunk.insert(0, "patient", patient)
+            if kind == "registros":
+                chunk[MEAL_COLS] = chunk[MEAL_COLS].astype(bool)
+            yield chunk[cols]
+
+
+class _Drain(io.RawIOBase):
+    """Archivo de solo escritura que entrega lo escrito y lo olvida."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _stream_csv(frames):
+    primero = True
+    for chunk in frames:
+        yield chunk.to_csv(index=False, header=primero).encode("utf-8")
+        primero = False
+
+
+def _arrow_schema(kind):
+    import pyarrow as pa
+
+    tipos = {"patient": pa.string(), "date": pa.date32(), "weight": pa.float64(),
+             "mood": pa.string(), "comentarios": pa.string()}
+    tipos.update({c: pa.bool_() for c in MEAL_COLS})
+    return pa.schema([(c, tipos[c]) for c in KINDS[kind][1]])
+
+
+def _stream_parquet(frames, kind):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Para exportar Parquet instala el paquete: pip install pyarrow") from exc
+    schema = _arrow_schema(kind)
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in frames:
+            chunk = chunk.assign(date=pd.to_datetime(chunk["date"], format="%Y-%m-%d").dt.date)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _stream_xlsx(frames, kind):
+    try:
+        from openpyxl import Workbook
+    except ImportError as exc:
+        raise RuntimeError("Para exportar a Excel instala el paquete: pip install openpyxl") from exc
+    cols = KINDS[kind][1]
+    # En write_only cada hoja se escribe a un archivo temporal fila por fila
+    libro = Workbook(write_only=True)
+    hoja, filas = None, EXCEL_MAX_ROWS
+    for chunk in frames:
+        chunk = chunk.assign(date=pd.to_datetime(chunk["date"], format="%Y-%m-%d").dt.date)
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            if filas == EXCEL_MAX_ROWS:
+                hoja = libro.create_sheet(kind if hoja is None else f"{kind} ({len(libro.worksheets) + 1})")
+                hoja.append(cols)
+                filas = 0
+            hoja.append(row)
+            filas += 1
+    if hoja is None:
+        libro.create_sheet(kind).append(cols)
+    # El .xlsx es un zip que solo se puede cerrar al final; se arma en disco
+    with tempfile.TemporaryFile() as tmp:
+        libro.save(tmp)
+        tmp.seek(0)
+        while True:
+            data = tmp.read(1 << 20)
+            if not data:
+                break
+            yield data
+
+
+def stream_export(storage, patients, kind="registros", fmt="csv", start=None, end=None,
+                  chunk_rows=CHUNK_ROWS):
+    """Generador de bytes del archivo exportado (ver formatos en el encabezado)."""
+    if kind not in KINDS:
+        raise ValueError(f"Tipo de exportación no soportado: {kind}")
+    frames = iter_frames(storage, patients, kind, start, end, chunk_rows)
+    if fmt == "csv":
+        return _stream_csv(frames)
+    if fmt == "parquet":
+        return _stream_parquet(frames, kind)
+    if fmt == "xlsx":
+        return _stream_xlsx(frames, kind)
+    raise ValueError(f"Formato no soportado: {fmt}")
+
+
+def export_to_file(storage, target, patients, kind="registros", fmt="csv", start=None, end=None):
+    """Escribe la exportación en un archivo (ruta o archivo binario abierto)."""
+    if isinstance(target, (str, bytes)) or hasattr(target, "__fspath__"):
+        with open(target, "wb") as f:
+            return export_to_file(storage, f, patients, kind, fmt, start, end)
+    total = 0
+    for data in stream_export(storage, patients, kind, fmt, start, end):
+        target.write(data)
+        total += len(data)
+    return total
+
+
+def export_bytes(storage, patients, kind="registros", fmt="csv", start=None, end=None):
+    """
+    El archivo completo como bytes, para st.download_button (que guarda los
+    bytes del archivo). Se arma en un temporal en disco, así que en memoria
+    solo queda el archivo final, no los DataFrames del historial.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        export_to_file(storage, tmp, patients, kind, fmt, start, end)
+        tmp.seek(0)
+        return tmp.read()
+
+
+def main(argv):
+    """Exporta desde la terminal (ver el encabezado del módulo)."""
+    from nutri.storage import Storage
+
+    parser = argparse.ArgumentParser(description="Exporta historiales de pacientes")
+    parser.add_argument("archivo", help="destino .csv, .parquet o .xlsx")
+    parser.add_argument("tipo", choices=list(KINDS))
+    parser.add_argument("pacientes", nargs="*")
+    parser.add_argument("--nutriologa", help="exporta a todos los pacientes de esta nutrióloga")
+    parser.add_argument("--desde", type=date.fromisoformat)
+    parser.add_argument("--hasta", type=date.fromisoformat)
+    args = parser.parse_args(argv)
+
+    fmt = args.archivo.rsplit(".", 1)[-1].lower()
+    if fmt not in MIME_TYPES:
+        parser.error("el archivo debe terminar en .csv, .parquet o .xlsx")
+    storage = Storage()
+    patients = list(args.pacientes)
+    if args.nutriologa:
+        patients += storage.clinician_patients(args.nutriologa)
+    if not patients:
+        parser.error("indica pacientes o --nutriologa")
+    size = export_to_file(storage, args.archivo, patients, args.tipo, fmt, args.desde, args.hasta)
+    print(f"{args.archivo}: {len(patients)} pacientes, {size / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,460 @@
+# nutri/generator.py
+# -------------------------------------------------------------
+# Generador automático de planes semanales con metas de calorías y macros
+# -------------------------------------------------------------
+# Las recetas vienen de un CSV local (data/recetas.csv): tiempo de comida
+# (Desayuno, Colación, Comida o Cena), la receta como plantilla y
+# etiquetas para exclusiones ("lacteo", "gluten", "frutos secos"...).
+# En la plantilla las cantidades van entre llaves y se escalan con la
+# porción: "{90} g de pollo" o "{2:tortilla} de maíz" (cantidad y
+# sustantivo, que se pone en plural si hace falta). La energía y los
+# macros de cada receta salen de la misma tabla de alimentos que usa
+# "Mi plan de alimentación" (nutri/nutrients.py), así que los totales del
+# plan generado coinciden con los que ve el paciente.
+#
+# Cada día se arma con una búsqueda con poda (branch and bound) sobre
+# los cinco tiempos de comida:
+#   - cada receta entra con la porción (PORTIONS) más cercana a la
+#     parte del día que le toca a su tiempo (SLOT_SHARES);
+#   - el costo es el error relativo al cuadrado de energía, proteína,
+#     lípidos e hidratos contra la meta, más una penalización por
+#     repetir recetas en la semana;
+#   - las combinaciones de Comida + Desayuno ("cabezas") y de Cena +
+#     colaciones ("colas") se calculan una vez por paciente; un bloque
+#     de cabezas se evalúa contra todas las colas con un producto de
+#     matrices, y los bloques cuya cota inferior (la meta contra el
+#     rango alcanzable con las colas) no mejora a la mejor solución ya
+#     no se evalúan.
+# Variedad: ninguna receta se repite el mismo día ni en días seguidos y
+# se usa a lo más MAX_USES veces por semana. Las exclusiones quitan las
+# recetas cuyo texto, etiquetas o grupos de alimentos las mencionan.
+#
+# Para muchos pacientes, generate_batch() reparte el trabajo en un pool
+# de procesos; cada proceso carga la tabla y las recetas una sola vez.
+#
+# Uso desde la terminal (CSV con paciente, kcal y opcionalmente
+# proteina_pct, lipidos_pct, hidratos_pct y exclusiones):
+#   python -m nutri.generator pacientes.csv            # solo resume
+#   python -m nutri.generator pacientes.csv --guardar  # guarda cada plan
+
+import os
+import re
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+
+from nutri.nutrients import DEFAULT_FOODS_PATH, NUTRIENT_COLS, FoodTable, parse_quantity, tokenize
+from nutri.plans import DAY_ORDER, PLAN_COLS
+
+DEFAULT_RECIPES_PATH = os.environ.get(
+    "NUTRI_RECIPES_PATH", os.path.join("data", "recetas.csv")
+)
+
+# Tiempos de comida del plan, la parte de la energía del día de cada uno
+# y el tipo de receta que les corresponde
+SLOT_SHARES = {
+    "Desayuno": 0.25,
+    "Colación 1": 0.10,
+    "Comida": 0.35,
+    "Colación 2": 0.10,
+    "Cena": 0.20,
+}
+SLOT_KIND = {
+    "Desayuno": "Desayuno",
+    "Colación 1": "Colación",
+    "Comida": "Comida",
+    "Colación 2": "Colación",
+    "Cena": "Cena",
+}
+
+# Porciones posibles de cada receta
+PORTIONS = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0)
+
+# Reparto de la energía por omisión (proteína, lípidos, hidratos)
+DEFAULT_MACROS = (0.20, 0.30, 0.50)
+
+# Peso de cada nutrimento en el costo (la energía pesa más)
+NUTRIENT_WEIGHTS = np.array([4.0, 1.0, 1.0, 1.0])
+
+# Variedad: usos por semana de una receta y costo de cada repetición
+MAX_USES = 2
+REPEAT_PENALTY = 0.01
+
+_PLACEHOLDER = re.compile(r"\{([^}:]+)(?::([^}]+))?\}")
+
+
+def macro_targets(kcal, protein=DEFAULT_MACROS[0], fat=DEFAULT_MACROS[1], carbs=DEFAULT_MACROS[2]):
+    """Metas diarias en el orden de NUTRIENT_COLS (kcal y gramos de cada macro)."""
+    total = protein + fat + carbs
+    if total <= 0:
+        raise ValueError("El reparto de macros debe sumar más de 0.")
+    protein, fat, carbs = protein / total, fat / total, carbs / total
+    return np.array([kcal, kcal * protein / 4, kcal * fat / 9, kcal * carbs / 4])
+
+
+def format_quantity(q, grams=False):
+    """Cantidad legible: gramos de 5 en 5, lo demás en medios, tercios o cuartos."""
+    if grams:
+        return str(max(5, int(round(q / 5)) * 5))
+    mejor = min(
+        (Fraction(max(1, round(q * d)), d) for d in (1, 2, 3, 4)),
+        key=lambda f: (abs(float(f) - q), f.denominator),
+    )
+    entero, resto = divmod(mejor.numerator, mejor.denominator)
+    if not resto:
+        return str(entero)
+    fraccion = f"{resto}/{mejor.denominator}"
+    return f"{entero} {fraccion}" if entero else fraccion
+
+
+def pluralize(noun, q):
+    """Plural de la última palabra si la cantidad es mayor que uno."""
+    if q <= 1:
+        return noun
+    cabeza, _, palabra = noun.rpartition(" ")
+    if palabra.endswith("z"):
+        palabra = palabra[:-1] + "ces"
+    elif palabra[-1] in "aeiouáéó":
+        palabra += "s"
+    else:
+        palabra += "es"
+    return f"{cabeza} {palabra}" if cabeza else palabra
+
+
+def render_recipe(template, portion=1.0):
+    """Texto de la receta con las cantidades multiplicadas por la porción."""
+
+    def cambiar(match):
+        noun = match.group(2)
+        gramos = noun is None and template.startswith(" g ", match.end())
+        texto = format_quantity(parse_quantity(match.group(1)) * portion, grams=gramos)
+        if noun is None:
+            return texto
+        return f"{texto} {pluralize(noun, parse_quantity(texto))}"
+
+    return _PLACEHOLDER.sub(cambiar, template)
+
+
+class RecipeCatalog:
+    """Recetas con la energía y macros de cada porción, indexadas por tiempo de comida."""
+
+    def __init__(self, recipes_df, foods):
+        faltan = [c for c in ("tiempo", "receta", "etiquetas") if c not in recipes_df.columns]
+        if faltan:
+            raise ValueError(f"Al recetario le faltan columnas: {', '.join(faltan)}")
+        df = recipes_df.fillna({"etiquetas": ""}).reset_index(drop=True)
+        self.foods = foods
+        self.templates = df["receta"].tolist()
+        self.kinds = df["tiempo"].tolist()
+        # Nutrimentos de cada receta en cada porción: (recetas, porciones, 4)
+        self.vectors = np.zeros((len(df), len(PORTIONS), len(NUTRIENT_COLS)))
+        self.texts = []
+        for i, template in enumerate(self.templates):
+            textos = []
+            for p, portion in enumerate(PORTIONS):
+                texto = render_recipe(template, portion)
+                for food, eq in foods.parse(texto):
+                    self.vectors[i, p] += eq * foods.nutrients[food]
+                textos.append(texto)
+            self.texts.append(textos)
+        # Palabras de cada receta para las exclusiones: texto, etiquetas y grupos
+        self.terms = []
+        for i, (template, etiquetas) in enumerate(zip(self.templates, df["etiquetas"])):
+            palabras = set(tokenize(_PLACEHOLDER.sub(lambda m: m.group(2) or "", template)))
+            for etiqueta in str(etiquetas).split("|"):
+                palabras.update(tokenize(etiqueta))
+            for food, _ in foods.parse(self.texts[i][PORTIONS.index(1.0)]):
+                palabras.update(tokenize(foods.groups[food]))
+                palabras.update(tokenize(foods.names[food]))
+            self.terms.append(palabras)
+        self.by_kind = {}
+        for i, kind in enumerate(self.kinds):
+            self.by_kind.setdefault(kind, []).append(i)
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_RECIPES_PATH, foods=None):
+        return cls(pd.read_csv(path), foods if foods is not None else FoodTable.from_csv())
+
+    def __len__(self):
+        return len(self.templates)
+
+    def allowed(self, kind, exclusions=()):
+        """Recetas de un tipo que no mencionan ninguna exclusión."""
+        excluir = [set(tokenize(e)) - {"de"} for e in exclusions if str(e).strip()]
+        return [
+            i for i in self.by_kind.get(kind, [])
+            if not any(e and e <= self.terms[i] for e in excluir)
+        ]
+
+
+class GeneratedPlan:
+    """Plan generado: tabla Día / Tiempo de comida / Descripción y totales por día."""
+
+    def __init__(self, patient, df, totals, targets):
+        self.patient = patient
+        self.df = df
+        self.totals = totals      # (días, 4) en el orden de NUTRIENT_COLS
+        self.targets = targets
+
+    @property
+    def errors(self):
+        """Error relativo de cada día contra la meta, por nutrimento."""
+        return (self.totals - self.targets) / self.targets
+
+    def day_totals(self):
+        return pd.DataFrame(self.totals.round(1), columns=NUTRIENT_COLS, index=pd.Index(DAY_ORDER, name="Día"))
+
+    def summary(self):
+        error = np.abs(self.errors)
+        return (
+            f"{self.patient or 'plan'}: meta {self.targets[0]:,.0f} kcal · "
+            f"promedio {self.totals[:, 0].mean():,.0f} kcal · "
+            f"error máximo de energía {error[:, 0].max() * 100:.1f}%, "
+            f"de macros {error[:, 1:].max() * 100:.1f}%"
+        )
+
+
+def _candidates(catalog, slot, allowed, targets):
+    """Para cada receta permitida, la porción con energía más cercana a la del tiempo."""
+    meta = targets[0] * SLOT_SHARES[slot]
+    vectores = catalog.vectors[allowed]                  # (n, porciones, 4)
+    porcion = np.abs(vectores[:, :, 0] - meta).argmin(axis=1)
+    return np.asarray(allowed), porcion, vectores[np.arange(len(allowed)), porcion]
+
+
+def _combine(slots):
+    """
+    Todas las combinaciones de varios tiempos: posiciones elegidas en cada
+    tiempo (m, tiempos), recetas (m, tiempos) y nutrimentos sumados (m, 4).
+    Una receta no se repite dentro de la combinación.
+    """
+    rejilla = np.meshgrid(*[np.arange(len(r)) for r, _, _ in slots], indexing="ij")
+    pos = np.stack(rejilla, axis=-1).reshape(-1, len(slots))
+    recetas = np.stack([r[pos[:, k]] for k, (r, _, _) in enumerate(slots)], axis=1)
+    distintas = np.ones(len(pos), dtype=bool)
+    for a in range(len(slots)):
+        for b in range(a + 1, len(slots)):
+            distintas &= recetas[:, a] != recetas[:, b]
+    pos, recetas = pos[distintas], recetas[distintas]
+    vectores = sum(v[pos[:, k]] for k, (_, _, v) in enumerate(slots))
+    return pos, recetas, vectores
+
+
+# Los dos tiempos que más aportan van en la "cabeza"; el resto en la "cola"
+_HEAD = ["Comida", "Desayuno"]
+_TAIL = ["Cena", "Colación 1", "Colación 2"]
+
+# Cabezas que se evalúan juntas en cada paso de la búsqueda
+_BLOCK = 16
+
+
+class _DaySearch:
+    """
+    Búsqueda del mejor día con poda. Las combinaciones de la cabeza y de
+    la cola se calculan una vez por paciente; cada día solo cambian las
+    penalizaciones de variedad. El costo de cabeza i + cola j es
+        Σ w·(h_i + c_j - meta)² = Σ w·(h_i - meta)² + 2·Σ w·(h_i - meta)·c_j + Σ w·c_j²
+    así que un bloque de cabezas contra todas las colas es un producto de
+    matrices. Las cabezas se recorren ordenadas por su cota inferior y la
+    búsqueda se detiene cuando la cota del siguiente bloque ya no puede
+    mejorar a la mejor solución.
+    """
+
+    def __init__(self, slots, targets, weights):
+        self.targets = targets
+        self.weights = weights
+        self.head_pos, self.head_recipes, head = _combine([slots[s] for s in _HEAD])
+        self.tail_pos, self.tail_recipes, tail = _combine([slots[s] for s in _TAIL])
+        self.head_dev = head - targets
+        self.head_sq = (self.head_dev ** 2 * weights).sum(axis=1)
+        self.tail = tail
+        self.tail_sq = (tail ** 2 * weights).sum(axis=1)
+        self.tail_w = (tail * weights).T
+
+    def best(self, pen_recipe):
+        """Mejor (cabeza, cola) con la penalización de cada receta, o None."""
+        pen_head = pen_recipe[self.head_recipes].sum(axis=1)
+        pen_tail = pen_recipe[self.tail_recipes].sum(axis=1)
+        colas = np.isfinite(pen_tail)
+        if not colas.any() or not np.isfinite(pen_head).any():
+            return None
+        tail_w, base_tail = self.tail_w[:, colas], self.tail_sq[colas] + pen_tail[colas]
+
+        # Cota inferior de cada cabeza: distancia de la meta al rango de las colas
+        bajo = self.head_dev + self.tail[colas].min(axis=0)
+        alto = self.head_dev + self.tail[colas].max(axis=0)
+        falta = np.maximum(np.maximum(bajo, -alto), 0.0)
+        cota = (falta ** 2 * self.weights).sum(axis=1) + pen_head
+        orden = np.argsort(cota)
+        orden = orden[np.isfinite(cota[orden])]
+
+        mejor, eleccion = np.inf, None
+        for inicio in range(0, len(orden), _BLOCK):
+            bloque = orden[inicio:inicio + _BLOCK]
+            if cota[bloque[0]] >= mejor:
+                break  # poda: ninguna cabeza restante puede mejorar
+            costo = (self.head_sq[bloque] + pen_head[bloque])[:, None] + 2 * (self.head_dev[bloque] @ tail_w)
+            costo += base_tail[None, :]
+            k = int(costo.argmin())
+            if costo.flat[k] < mejor:
+                i, j = divmod(k, costo.shape[1])
+                mejor, eleccion = float(costo.flat[k]), (int(bloque[i]), int(np.flatnonzero(colas)[j]))
+        return eleccion
+
+
+def generate_week(catalog, targets, exclusions=(), patient=None, seed=None):
+    """
+    Plan de lunes a domingo para las metas dadas (ver macro_targets).
+    exclusions: alimentos, grupos o etiquetas que no deben aparecer.
+    seed: desempata entre recetas parecidas (distintos pacientes, distintos planes).
+    """
+    targets = np.asarray(targets, dtype=float)
+    weights = NUTRIENT_WEIGHTS / targets ** 2
+    rng = np.random.default_rng(seed)
+    jitter = rng.uniform(0, REPEAT_PENALTY / 2, len(catalog))
+    slots = {}
+    for slot in SLOT_SHARES:
+        allowed = catalog.allowed(SLOT_KIND[slot], exclusions)
+        if not allowed:
+            raise ValueError(f"No quedan recetas para {slot} con esas exclusiones.")
+        slots[slot] = _candidates(catalog, slot, allowed, targets)
+    busqueda = _DaySearch(slots, targets, weights)
+
+    usos = np.zeros(len(catalog))
+    ayer = np.array([], dtype=np.int64)
+    filas, totales = [], []
+    for dia in DAY_ORDER:
+        # Variedad; si no hay combinación posible se relaja paso a paso
+        for max_usos, sin_ayer in ((MAX_USES, True), (np.inf, True), (np.inf, False)):
+            pen = REPEAT_PENALTY * usos + jitter
+            bloqueadas = usos >= max_usos
+            if sin_ayer:
+                bloqueadas[ayer] = True
+            eleccion = busqueda.best(np.where(bloqueadas, np.inf, pen))
+            if eleccion is not None:
+                break
+        i, j = eleccion
+        elegido = {}
+        for nombres, pos, fila in ((_HEAD, busqueda.head_pos, i), (_TAIL, busqueda.tail_pos, j)):
+            for slot, k in zip(nombres, pos[fila]):
+                recetas, porciones, vectores = slots[slot]
+                elegido[slot] = (int(recetas[k]), int(porciones[k]), vectores[k])
+        hoy = np.array([r for r, _, _ in elegido.values()], dtype=np.int64)
+        usos[hoy] += 1
+        ayer = hoy
+        totales.append(sum(v for _, _, v in elegido.values()))
+        for slot in SLOT_SHARES:
+            r, p, _ = elegido[slot]
+            filas.append((dia, slot, catalog.texts[r][p]))
+    df = pd.DataFrame(filas, columns=PLAN_COLS)
+    return GeneratedPlan(patient, df, np.array(totales), targets)
+
+
+def _spec_value(spec, key, default=None):
+    """
+    Valor de una columna de la fila; las celdas vacías de un CSV llegan
+    como NaN y cuentan como faltantes.
+    """
+    valor = spec.get(key)
+    if valor is None or (np.ndim(valor) == 0 and pd.isna(valor)):
+        return default
+    if isinstance(valor, str) and not valor.strip():
+        return default
+    return valor
+
+
+def spec_targets(spec):
+    """Metas de una fila de pacientes (kcal y reparto de macros en %)."""
+    kcal = _spec_value(spec, "kcal")
+    if kcal is None:
+        raise ValueError(f"Falta kcal para {_spec_value(spec, 'paciente', 'un paciente')}.")
+    protein = float(_spec_value(spec, "proteina_pct", DEFAULT_MACROS[0] * 100))
+    fat = float(_spec_value(spec, "lipidos_pct", DEFAULT_MACROS[1] * 100))
+    carbs = float(_spec_value(spec, "hidratos_pct", DEFAULT_MACROS[2] * 100))
+    return macro_targets(float(kcal), protein, fat, carbs)
+
+
+def spec_exclusions(spec):
+    valor = _spec_value(spec, "exclusiones", ())
+    if isinstance(valor, str):
+        valor = valor.replace(";", ",").split(",")
+    return [str(v).strip() for v in valor if str(v).strip()]
+
+
+def read_specs(path):
+    """Filas del CSV de pacientes como dicts, sin NaN en las celdas vacías."""
+    df = pd.read_csv(path, dtype={"paciente": str, "exclusiones": str})
+    return [
+        {k: v for k, v in fila.items() if _spec_value(fila, k) is not None}
+        for fila in df.to_dict("records")
+    ]
+
+
+# Recetario del proceso (cada proceso del pool carga el suyo una vez)
+_CATALOG = None
+
+
+def _init_worker(recipes_path, foods_path):
+    global _CATALOG
+    _CATALOG = RecipeCatalog.from_csv(recipes_path, FoodTable.from_csv(foods_path))
+
+
+def _generate_spec(spec):
+    paciente = _spec_value(spec, "paciente")
+    return generate_week(
+        _CATALOG,
+        spec_targets(spec),
+        spec_exclusions(spec),
+        patient=paciente,
+        seed=int(_spec_value(spec, "seed", zlib.crc32(str(paciente).encode("utf-8")))),
+    )
+
+
+def generate_batch(specs, workers=None, recipes_path=DEFAULT_RECIPES_PATH, foods_path=DEFAULT_FOODS_PATH):
+    """
+    Planes para muchos pacientes. specs: dicts con paciente, kcal y
+    opcionalmente proteina_pct, lipidos_pct, hidratos_pct y exclusiones.
+    Con workers=1 (o un solo paciente) corre en este proceso.
+    """
+    specs = list(specs)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(specs) <= 1:
+        _init_worker(recipes_path, foods_path)
+        return [_generate_spec(s) for s in specs]
+    chunksize = max(1, len(specs) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(recipes_path, foods_path)
+    ) as pool:
+        return list(pool.map(_generate_spec, specs, chunksize=chunksize))
+
+
+def main(argv):
+    """Genera planes desde la terminal (ver el encabezado del módulo)."""
+    args = [a for a in argv if not a.startswith("--")]
+    if len(args) != 1:
+        print("Uso: python -m nutri.generator <pacientes.csv> [--guardar]")
+        return 1
+    specs = read_specs(args[0])
+    t = time.perf_counter()
+    planes = generate_batch(specs)
+    print(f"{len(planes)} planes en {time.perf_counter() - t:.1f} s")
+    if "--guardar" in argv:
+        from nutri.storage import Storage
+
+        storage = Storage()
+        for plan in planes:
+            version = storage.save_plan(plan.patient, plan.df)
+            print(f"{plan.summary()} · versión {version}")
+    else:
+        for plan in planes:
+            print(plan.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
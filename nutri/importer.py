@@ -0,0 +1,358 @@
+# nutri/importer.py
+# -------------------------------------------------------------
+# Importación masiva de historial (registros diarios y pesos)
+# -------------------------------------------------------------
+# Lee archivos CSV o Parquet por bloques (chunksize / iter_batches),
+# así que un archivo de un millón de filas nunca se carga completo:
+# en memoria solo está el bloque en curso y la lista (acotada) de
+# filas con errores.
+#
+# Cada bloque se valida de forma vectorizada contra las columnas de
+# daily_logs_df / weight_df, se quitan fechas repetidas dentro del
+# bloque (gana la última fila) y se escribe con un upsert por fecha en
+# una sola transacción por paciente. Si una fecha se repite en bloques
+# distintos también gana la última, porque el upsert la reemplaza.
+#
+# El archivo puede traer una columna "paciente" (migración de varios
+# pacientes a la vez); si no, todas las filas son del paciente indicado.
+# Con allowed (desde la app) las filas de pacientes fuera de ese conjunto
+# se rechazan: un paciente solo importa lo suyo y una nutrióloga solo a
+# sus pacientes.
+#
+# Uso desde la terminal:
+#   python -m nutri.importer <paciente> <archivo.csv|.parquet> [registros|pesos] [--reemplazar]
+
+import os
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from nutri.adherence import AdherenceIndex
+from nutri.schema import DAILY_LOG_COLS, MEAL_COLS, MOOD_OPTIONS, WEIGHT_COLS, WEIGHT_RANGE
+from nutri.streaks import StreakTracker
+from nutri.summaries import compute_summary
+from nutri.trend import WeightTrend
+
+# Filas por bloque al leer el archivo
+CHUNK_ROWS = 50_000
+
+# Filas con error que se guardan para el reporte (se cuentan todas)
+MAX_BAD_ROWS = 1000
+
+KINDS = {"registros": DAILY_LOG_COLS, "pesos": WEIGHT_COLS}
+
+# Encabezados en español que se aceptan además de los de la app
+COLUMN_ALIASES = {
+    "fecha": "date",
+    "peso": "weight",
+    "animo": "mood",
+    "ánimo": "mood",
+    "estado de ánimo": "mood",
+    "colación 1": "colacion1",
+    "colación 2": "colacion2",
+    "colacion 1": "colacion1",
+    "colacion 2": "colacion2",
+    "paciente": "patient",
+}
+
+_TRUE = {"1", "1.0", "true", "verdadero", "si", "sí", "s", "x", "yes", "y"}
+_FALSE = {"0", "0.0", "false", "falso", "no", "n", ""}
+_MOODS = {m.lower(): m for m in MOOD_OPTIONS}
+
+
+class ImportReport:
+    """Conteos de una importación y las primeras filas rechazadas."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0         # filas leídas del archivo
+        self.written = 0      # filas escritas (upsert)
+        self.duplicates = 0   # fechas repetidas dentro de un bloque
+        self.bad = 0          # filas rechazadas
+        self.bad_rows = []    # (fila, motivo), como máximo MAX_BAD_ROWS
+        self.patients = set()
+
+    def add_bad(self, filas, motivos):
+        self.bad += len(filas)
+        espacio = MAX_BAD_ROWS - len(self.bad_rows)
+        if espacio > 0:
+            self.bad_rows.extend(zip(filas[:espacio].tolist(), motivos[:espacio].tolist()))
+
+    def bad_rows_frame(self):
+        """Filas rechazadas como DataFrame (fila 1 = primera fila de datos)."""
+        return pd.DataFrame(self.bad_rows, columns=["fila", "motivo"])
+
+    def summary(self):
+        texto = (
+            f"{self.rows} filas leídas · {self.written} guardadas · "
+            f"{self.duplicates} fechas repetidas · {self.bad} con errores"
+        )
+        if self.bad > len(self.bad_rows):
+            texto += f" (se muestran las primeras {len(self.bad_rows)})"
+        return texto
+
+
+# ---- Lectura por bloques ----
+def _file_name(source):
+    return source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+
+
+def _detect_format(source):
+    nombre = str(_file_name(source)).lower()
+    if nombre.endswith((".parquet", ".pq")):
+        return "parquet"
+    if nombre.endswith((".csv", ".txt")):
+        return "csv"
+    raise ValueError("Formato no reconocido: usa un archivo .csv o .parquet")
+
+
+def _normalize_columns(df):
+    columnas = {}
+    for c in df.columns:
+        limpio = str(c).strip().lower()
+        columnas[c] = COLUMN_ALIASES.get(limpio, limpio)
+    return df.rename(columns=columnas)
+
+
+def iter_chunks(source, fmt=None, chunk_rows=CHUNK_ROWS):
+    """Bloques del archivo como DataFrames con los encabezados normalizados."""
+    fmt = fmt or _detect_format(source)
+    if fmt == "csv":
+        lector = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+        with lector:
+            for chunk in lector:
+                yield _normalize_columns(chunk)
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError(
+                "Para importar Parquet instala el paquete: pip install pyarrow"
+            ) from exc
+        archivo = pq.ParquetFile(source)
+        for batch in archivo.iter_batches(batch_size=chunk_rows):
+            # Las fechas date32 llegan como datetime64 y no como objetos date
+            yield _normalize_columns(batch.to_pandas(date_as_object=False))
+    else:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+
+def detect_kind(columns):
+    """'registros' o 'pesos' según los encabezados del archivo."""
+    columns = set(columns)
+    if "weight" in columns:
+        return "pesos"
+    if columns & set(MEAL_COLS):
+        return "registros"
+    raise ValueError("No se reconoce el archivo: faltan las columnas de comidas o de peso.")
+
+
+# ---- Validación vectorizada ----
+def _text(col):
+    return col.astype("string").str.strip().fillna("")
+
+
+def _parse_dates(col, today):
+    """Fechas ISO (texto) y máscara de inválidas; acepta AAAA-MM-DD y DD/MM/AAAA."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        fechas = col.dt.tz_localize(None) if col.dt.tz is not None else col
+    else:
+        texto = _text(col)
+        fechas = pd.to_datetime(texto, format="%Y-%m-%d", errors="coerce")
+        faltan = fechas.isna() & (texto != "")
+        if faltan.any():
+            fechas = fechas.fillna(
+                pd.to_datetime(texto.where(faltan), format="%d/%m/%Y", errors="coerce")
+            )
+    fechas = fechas.dt.normalize()
+    invalidas = fechas.isna().to_numpy()
+    futuras = (fechas > pd.Timestamp(today)).to_numpy()
+    return fechas.dt.strftime("%Y-%m-%d"), invalidas, futuras
+
+
+def _parse_bool(col):
+    """Valores sí/no de una columna de comida y máscara de inválidos."""
+    if pd.api.types.is_bool_dtype(col) and not col.isna().any():
+        valores = col.to_numpy(dtype=bool)
+        return valores, np.zeros(len(col), dtype=bool)
+    texto = _text(col).str.lower()
+    si = texto.isin(_TRUE).to_numpy()
+    no = texto.isin(_FALSE).to_numpy()
+    return si, ~(si | no)
+
+
+def _optional_text(col):
+    texto = _text(col)
+    return texto.astype(object).where((texto != "").to_numpy(), None)
+
+
+def _validate(chunk, kind, default_patient, today, allowed=None):
+    """
+    Bloque validado y motivos de rechazo por fila (None si la fila es buena).
+    El bloque validado tiene las columnas de la tabla más "patient".
+    """
+    n = len(chunk)
+    motivo = np.full(n, None, dtype=object)
+
+    def marcar(mascara, texto):
+        # Solo se guarda el primer motivo de cada fila
+        motivo[mascara & (motivo == None)] = texto  # noqa: E711
+
+    limpio = pd.DataFrame(index=chunk.index)
+    if "patient" in chunk.columns:
+        pacientes = _text(chunk["patient"])
+        if default_patient:
+            pacientes = pacientes.where(pacientes != "", default_patient)
+        marcar((pacientes == "").to_numpy(), "sin paciente")
+        limpio["patient"] = pacientes.astype(object)
+    else:
+        limpio["patient"] = default_patient
+    if allowed is not None:
+        marcar(~limpio["patient"].isin(allowed).to_numpy(), "paciente no permitido")
+
+    fechas, invalidas, futuras = _parse_dates(chunk["date"], today)
+    marcar(invalidas, "fecha inválida")
+    marcar(futuras, "fecha futura")
+    limpio["date"] = fechas.astype(object)
+
+    if kind == "pesos":
+        # float64 y no un entero con NA: las comparaciones deben dar bool
+        pesos = pd.to_numeric(
+            _text(chunk["weight"]).str.replace(",", "."), errors="coerce"
+        ).astype("float64")
+        marcar(pesos.isna().to_numpy(), "peso inválido")
+        bajo, alto = WEIGHT_RANGE
+        marcar(((pesos < bajo) | (pesos > alto)).to_numpy(), "peso fuera de rango")
+        limpio["weight"] = pesos
+    else:
+        for c in MEAL_COLS:
+            if c in chunk.columns:
+                valores, malos = _parse_bool(chunk[c])
+                marcar(malos, f"{c}: se esperaba sí/no")
+            else:
+                valores = np.zeros(n, dtype=bool)
+            limpio[c] = valores
+        if "mood" in chunk.columns:
+            texto = _text(chunk["mood"])
+            moods = texto.str.lower().map(_MOODS)
+            marcar((moods.isna() & (texto != "")).to_numpy(), "estado de ánimo desconocido")
+            limpio["mood"] = moods.astype(object).where(moods.notna().to_numpy(), None)
+        else:
+            limpio["mood"] = None
+        if "comentarios" in chunk.columns:
+            limpio["comentarios"] = _optional_text(chunk["comentarios"])
+        else:
+            limpio["comentarios"] = None
+    return limpio, motivo
+
+
+# ---- Importación ----
+def _check_columns(columns, kind):
+    faltan = [c for c in ("date", "weight") if c not in columns] if kind == "pesos" else (
+        [] if "date" in columns else ["date"]
+    )
+    if kind == "registros" and not set(MEAL_COLS) & set(columns):
+        faltan.append("tiempos de comida")
+    if faltan:
+        raise ValueError(f"Al archivo le faltan columnas: {', '.join(faltan)}")
+
+
+def import_file(storage, source, patient=None, kind=None, fmt=None, replace=False,
+                chunk_rows=CHUNK_ROWS, today=None, allowed=None):
+    """
+    Importa un archivo CSV/Parquet de registros diarios o de pesos.
+    patient: paciente de las filas sin columna "paciente" (o vacías).
+    allowed: pacientes a los que se puede escribir (None = cualquiera);
+    las filas de otros se rechazan sin tocar su historial.
+    replace: borra el historial previo (del mismo tipo) de cada paciente
+    del archivo antes de escribir su primer bloque.
+    Devuelve un ImportReport.
+    """
+    today = today or date.today()
+    report = None
+    reemplazados = set()
+    offset = 0
+    for chunk in iter_chunks(source, fmt, chunk_rows):
+        if report is None:
+            kind = kind or detect_kind(chunk.columns)
+            _check_columns(chunk.columns, kind)
+            if not patient and "patient" not in chunk.columns:
+                raise ValueError("Indica el paciente o agrega una columna 'paciente'.")
+            report = ImportReport(kind)
+
+        limpio, motivo = _validate(chunk, kind, patient, today, allowed)
+        malas = motivo != None  # noqa: E711
+        if malas.any():
+            filas = np.flatnonzero(malas) + offset + 1
+            report.add_bad(filas, motivo[malas])
+        report.rows += len(chunk)
+        offset += len(chunk)
+
+        buenas = limpio[~malas]
+        antes = len(buenas)
+        buenas = buenas.drop_duplicates(["patient", "date"], keep="last")
+        report.duplicates += antes - len(buenas)
+
+        for paciente, filas in buenas.groupby("patient", sort=False):
+            reemplazar = replace and paciente not in reemplazados
+            reemplazados.add(paciente)
+            if kind == "pesos":
+                storage.upsert_weights_frame(paciente, filas, replace=reemplazar)
+            else:
+                storage.upsert_daily_logs_frame(paciente, filas, replace=reemplazar)
+            report.written += len(filas)
+            report.patients.add(paciente)
+
+    if report is None:
+        raise ValueError("El archivo está vacío.")
+    for paciente in report.patients:
+        rebuild_summary(storage, paciente, today)
+    return report
+
+
+def rebuild_summary(storage, patient, today=None):
+    """Recalcula la fila de resumen del panel desde lo guardado (si hay perfil)."""
+    profile = storage.load_profile(patient)
+    if profile is None:
+        return
+    logs = storage.load_daily_logs_compact(patient)
+    series = storage.load_weight_series(patient)
+    peso = series.last("weight")
+    summary = compute_summary(
+        profile,
+        None if peso is None else float(peso),
+        StreakTracker.from_compact(logs),
+        AdherenceIndex.from_compact(logs),
+        date.fromordinal(int(logs.days[-1])) if len(logs) else None,
+        today,
+        WeightTrend.from_series(series),
+    )
+    storage.upsert_summary(patient, profile["clinician"], summary)
+
+
+def main(argv):
+    """Importa un archivo desde la terminal (ver el encabezado del módulo)."""
+    from nutri.storage import Storage
+
+    replace = "--reemplazar" in argv
+    argv = [a for a in argv if a != "--reemplazar"]
+    if len(argv) not in (2, 3) or (len(argv) == 3 and argv[2] not in KINDS):
+        print("Uso: python -m nutri.importer <paciente> <archivo> [registros|pesos] [--reemplazar]")
+        return 1
+    patient, path = argv[:2]
+    kind = argv[2] if len(argv) == 3 else None
+    try:
+        report = import_file(Storage(), path, patient=patient, kind=kind, replace=replace)
+    except ValueError as exc:
+        print(f"No se pudo importar: {exc}")
+        return 1
+    print(f"Importación de {report.kind}: {report.summary()}")
+    for fila, motivo in report.bad_rows[:20]:
+        print(f"  fila {fila}: {motivo}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
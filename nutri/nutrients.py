@@ -0,0 +1,298 @@
+# nutri/nutrients.py
+# -------------------------------------------------------------
+# Calorías y macronutrimentos estimados de los planes de alimentación
+# -------------------------------------------------------------
+# La tabla de alimentos es un CSV local estilo SMAE (Sistema Mexicano
+# de Alimentos Equivalentes): una fila por alimento con su porción
+# equivalente (cantidad, unidad y gramos), el grupo y la energía,
+# proteína, lípidos e hidratos de carbono de un equivalente. Se carga
+# una vez en una matriz numpy (alimentos × nutrimentos) y un índice de
+# nombres y sinónimos normalizados (sin acentos ni plurales).
+#
+# Cada Descripción del plan se lee como texto libre: se buscan los
+# nombres de alimentos (la coincidencia más larga gana) y, antes de
+# cada uno, una cantidad opcional ("2", "1/2", "una"), un tamaño
+# ("pequeño", "poca") y una medida ("cda", "taza", "puñado"). Sin
+# cantidad se usa la porción habitual del alimento (columna porcion_eq).
+# El resultado son pares (alimento, equivalentes), que se guardan por
+# descripción en una caché LRU: los planes comparten muchas comidas.
+#
+# Los totales por comida, día y semana salen de una sola multiplicación
+# equivalentes × matriz de nutrimentos y sumas con np.add.at. MealPlan
+# guarda el resultado, así que se calcula una vez por versión del plan.
+#
+# La tabla se puede cambiar con la variable de entorno NUTRI_FOODS_PATH.
+
+import os
+import re
+import unicodedata
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+
+from nutri.cache import LRUCache
+
+DEFAULT_FOODS_PATH = os.environ.get(
+    "NUTRI_FOODS_PATH", os.path.join("data", "alimentos_smae.csv")
+)
+
+FOOD_COLS = [
+    "alimento", "sinonimos", "grupo", "cantidad", "unidad", "peso_g",
+    "porcion_eq", "contenedor", "energia_kcal", "proteina_g", "lipidos_g", "hidratos_g",
+]
+
+# Nutrimentos por equivalente (columnas de la tabla) y su nombre en la app
+NUTRIENT_COLS = ["energia_kcal", "proteina_g", "lipidos_g", "hidratos_g"]
+NUTRIENT_LABELS = {
+    "energia_kcal": "Energía (kcal)",
+    "proteina_g": "Proteína (g)",
+    "lipidos_g": "Lípidos (g)",
+    "hidratos_g": "Hidratos de carbono (g)",
+}
+
+# Gramos aproximados de cada medida casera
+UNIT_GRAMS = {
+    "g": 1.0, "gr": 1.0, "gramo": 1.0, "ml": 1.0,
+    "taza": 240.0, "vaso": 240.0,
+    "cda": 15.0, "cucharada": 15.0,
+    "cdita": 5.0, "cucharadita": 5.0,
+    "punado": 30.0, "rebanada": 25.0, "lata": 140.0,
+}
+# Medidas que cuentan piezas del propio alimento o equivalentes directos
+PIECE_UNITS = {"pieza", "pza", "pz"}
+EQUIVALENT_UNITS = {"porcion", "equivalente"}
+
+NUMBER_WORDS = {
+    "un": 1.0, "una": 1.0, "uno": 1.0, "medio": 0.5, "media": 0.5,
+    "dos": 2.0, "tres": 3.0, "cuatro": 4.0, "cinco": 5.0,
+}
+SIZE_WORDS = {
+    "pequeno": 0.75, "chico": 0.75, "mediano": 1.0, "grande": 1.5,
+    "poco": 0.5, "poca": 0.5,
+}
+# Entre dos alimentos indica una alternativa: solo cuenta el primero
+ALTERNATIVE_WORDS = {"o", "u"}
+
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)?(?:/\d+)?|[a-z]+")
+_PARENS = re.compile(r"\([^)]*\)")
+
+
+def normalize(text):
+    """Minúsculas sin acentos ni paréntesis (notas como "(al horno)")."""
+    text = _PARENS.sub(" ", str(text).lower())
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def stem(token):
+    """Forma singular aproximada: nueces → nuez, nopales → nopal, uvas → uva."""
+    if len(token) <= 3:
+        return token
+    if token.endswith("ces"):
+        return token[:-3] + "z"
+    if token.endswith("s"):
+        token = token[:-1]
+    if token.endswith("e") and len(token) > 3:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Palabras (en singular) y números de un texto."""
+    return [t if t[0].isdigit() else stem(t) for t in _TOKEN.findall(normalize(text))]
+
+
+# Las mismas palabras en la forma que deja tokenize()
+_NUMBERS = {stem(k): v for k, v in NUMBER_WORDS.items()}
+_SIZES = {stem(k): v for k, v in SIZE_WORDS.items()}
+_GRAMS = {stem(k): v for k, v in UNIT_GRAMS.items()}
+_PIECES = {stem(k) for k in PIECE_UNITS}
+_EQUIVALENTS = {stem(k) for k in EQUIVALENT_UNITS}
+_UNITS = set(_GRAMS) | _PIECES | _EQUIVALENTS
+
+
+def parse_quantity(text):
+    """Cantidad escrita como "2", "1.5", "1/2" o "2 1/2"."""
+    total = 0.0
+    for part in str(text).replace(",", ".").split():
+        total += float(Fraction(part))
+    return total
+
+
+class FoodTable:
+    """Tabla de alimentos indexada por nombre, con la matriz de nutrimentos."""
+
+    def __init__(self, df, cache_size=4096):
+        faltan = [c for c in FOOD_COLS if c not in df.columns]
+        if faltan:
+            raise ValueError(f"A la tabla de alimentos le faltan columnas: {', '.join(faltan)}")
+        df = df[FOOD_COLS].reset_index(drop=True)
+        self.df = df
+        self.names = df["alimento"].tolist()
+        self.groups = df["grupo"].tolist()
+        self.nutrients = df[NUTRIENT_COLS].to_numpy(dtype=np.float64)
+        self.amount = np.array([parse_quantity(c) for c in df["cantidad"]])
+        self.units = [stem(normalize(u).strip()) for u in df["unidad"]]
+        self.grams = df["peso_g"].to_numpy(dtype=np.float64)
+        self.default_eq = df["porcion_eq"].to_numpy(dtype=np.float64)
+        self.container = df["contenedor"].astype(bool).to_numpy()
+
+        # Índice: tupla de palabras normalizadas → fila
+        self.index = {}
+        for i, (nombre, sinonimos) in enumerate(zip(df["alimento"], df["sinonimos"].fillna(""))):
+            for texto in [nombre] + [s for s in str(sinonimos).split("|") if s.strip()]:
+                self.index.setdefault(tuple(tokenize(texto)), i)
+        self.max_words = max((len(k) for k in self.index), default=0)
+        self._parsed = LRUCache(maxsize=cache_size)
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_FOODS_PATH):
+        return cls(pd.read_csv(path, dtype={"cantidad": str}))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _match(self, tokens, i):
+        """Alimento más largo que empieza en tokens[i]: (fila, siguiente) o None."""
+        for n in range(min(self.max_words, len(tokens) - i), 0, -1):
+            fila = self.index.get(tuple(tokens[i:i + n]))
+            if fila is not None:
+                return fila, i + n
+        return None
+
+    def _equivalents(self, food, qty, unit, size):
+        """Equivalentes de una cantidad con medida (o sin ella)."""
+        if qty is None:
+            return self.default_eq[food] * size
+        if unit is None or unit in _PIECES or unit == self.units[food]:
+            return qty / self.amount[food] * size
+        if unit in _EQUIVALENTS:
+            return qty * size
+        return qty * _GRAMS[unit] * size / self.grams[food]
+
+    def parse(self, description):
+        """
+        Alimentos reconocidos en una descripción como tupla de pares
+        (fila, equivalentes). Se guarda por descripción.
+        """
+        return self._parsed.get_or_compute(description, lambda: self._parse(description))
+
+    def _parse(self, description):
+        tokens = tokenize(description)
+        items = []
+        i, alternativa = 0, False
+        while i < len(tokens):
+            # [cantidad] [tamaño] [medida] [tamaño] [de] alimento [tamaño]
+            j, qty, unit, size = i, None, None, 1.0
+            while j < len(tokens) and (tokens[j][0].isdigit() or tokens[j] in _NUMBERS):
+                valor = _NUMBERS.get(tokens[j])
+                qty = (qty or 0.0) + (parse_quantity(tokens[j]) if valor is None else valor)
+                j += 1
+            if j < len(tokens) and tokens[j] in _SIZES:
+                size *= _SIZES[tokens[j]]
+                j += 1
+            if qty is not None and j < len(tokens) and tokens[j] in _UNITS:
+                unit = tokens[j]
+                j += 1
+                if j < len(tokens) and tokens[j] in _SIZES:
+                    size *= _SIZES[tokens[j]]
+                    j += 1
+            if j < len(tokens) and tokens[j] == "de" and j > i:
+                j += 1
+
+            found = self._match(tokens, j)
+            if found is None:
+                if tokens[i] in ALTERNATIVE_WORDS and items:
+                    alternativa = True
+                i += 1
+                continue
+            food, k = found
+            if k < len(tokens) and tokens[k] in _SIZES:
+                size *= _SIZES[tokens[k]]
+                k += 1
+            # "ensalada de pollo con..." cuenta por sus ingredientes
+            contenedor = self.container[food] and k < len(tokens) and tokens[k] in ("de", "con")
+            if not alternativa and not contenedor:
+                items.append((food, float(self._equivalents(food, qty, unit, size))))
+            alternativa = False
+            i = k
+        return tuple(items)
+
+
+class PlanNutrition:
+    """Energía y macros estimados de un plan: por comida, por día y de la semana."""
+
+    def __init__(self, plan, foods):
+        self.foods = foods
+        self.plan = plan
+        df = plan.df
+        parsed = [foods.parse(d) for d in df["Descripción"]]
+        lengths = np.array([len(p) for p in parsed], dtype=np.int64)
+        food_idx = np.array([f for p in parsed for f, _ in p], dtype=np.int64)
+        eq = np.array([e for p in parsed for _, e in p], dtype=np.float64)
+
+        # Cada alimento aporta equivalentes × (nutrimentos de un equivalente)
+        meal_idx = np.repeat(np.arange(len(df)), lengths)
+        self.per_meal = np.zeros((len(df), len(NUTRIENT_COLS)))
+        np.add.at(self.per_meal, meal_idx, eq[:, None] * foods.nutrients[food_idx])
+        self.day_codes = pd.Categorical(df["Día"], categories=plan.days).codes
+        self.per_day = np.zeros((len(plan.days), len(NUTRIENT_COLS)))
+        np.add.at(self.per_day, self.day_codes, self.per_meal)
+
+        self.recognized = lengths > 0
+        self.foods_per_meal = [", ".join(foods.names[f] for f, _ in p) for p in parsed]
+        self.week = dict(zip(NUTRIENT_COLS, self.per_day.sum(axis=0).round(1).tolist()))
+        dias = max(len(plan.days), 1)
+        self.daily_average = dict(zip(NUTRIENT_COLS, (self.per_day.sum(axis=0) / dias).round(1).tolist()))
+        self._tables = {}
+
+    @property
+    def days(self):
+        """Totales por día (DataFrame indexado por Día)."""
+        return pd.DataFrame(
+            self.per_day.round(1), columns=NUTRIENT_COLS, index=pd.Index(self.plan.days, name="Día")
+        )
+
+    def day_totals(self, day):
+        """Totales de un día como dict por nutrimento."""
+        fila = self.per_day[self.plan.days.index(day)].round(1).tolist()
+        return dict(zip(NUTRIENT_COLS, fila))
+
+    def meal_kcal(self, day):
+        """Energía de cada comida del día, en orden (None si no se reconoció nada)."""
+        pos = np.flatnonzero(self.day_codes == self.plan.days.index(day))
+        kcal = self.per_meal[pos, 0].round(1)
+        return [float(k) if ok else None for k, ok in zip(kcal, self.recognized[pos])]
+
+    def day_table(self, day):
+        """
+        Tabla del día (la del plan más energía, macros y alimentos reconocidos).
+        Solo se arma la del día que se consulta.
+        """
+        if day not in self._tables:
+            pos = np.flatnonzero(self.day_codes == self.plan.days.index(day))
+            tabla = self.plan.by_day[day].copy()
+            for k, col in enumerate(NUTRIENT_COLS):
+                tabla[NUTRIENT_LABELS[col]] = self.per_meal[pos, k].round(1)
+            tabla["Alimentos reconocidos"] = [self.foods_per_meal[i] for i in pos]
+            self._tables[day] = tabla
+        return self._tables[day]
+
+    @property
+    def unmatched(self):
+        """Comidas (día, tiempo) en las que no se reconoció ningún alimento."""
+        df = self.plan.df
+        return list(zip(df["Día"][~self.recognized], df["Tiempo de comida"][~self.recognized]))
+
+
+def macro_split(totals):
+    """Porcentaje de la energía que aporta cada macro (4, 9 y 4 kcal por gramo)."""
+    kcal = totals["proteina_g"] * 4 + totals["lipidos_g"] * 9 + totals["hidratos_g"] * 4
+    if not kcal:
+        return {"proteina_g": 0.0, "lipidos_g": 0.0, "hidratos_g": 0.0}
+    return {
+        "proteina_g": totals["proteina_g"] * 4 / kcal,
+        "lipidos_g": totals["lipidos_g"] * 9 / kcal,
+        "hidratos_g": totals["hidratos_g"] * 4 / kcal,
+    }
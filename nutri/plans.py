@@ -0,0 +1,114 @@
+# nutri/plans.py
+# -------------------------------------------------------------
+# Planes de alimentación por paciente, versionados y en caché
+# -------------------------------------------------------------
+# Cada vez que la nutrióloga carga un plan se guarda como una versión
+# nueva en SQLite. Los planes ya procesados (con la tabla separada por
+# día) viven en una caché LRU del proceso con llave (paciente, versión),
+# así que abrir "Mi plan de alimentación" no reconstruye nada.
+# La versión 0 es el plan base de ejemplo (get_diet_plan_df en app.py).
+# Las calorías y macros estimados (nutri/nutrients.py) se calculan la
+# primera vez que se piden y se quedan en el plan, junto con su versión.
+
+import sys
+
+import pandas as pd
+
+from nutri.cache import LRUCache
+from nutri.nutrients import PlanNutrition
+
+PLAN_COLS = ["Día", "Tiempo de comida", "Descripción"]
+DAY_ORDER = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+
+class MealPlan:
+    """Plan ya procesado: tabla completa, días y tabla de cada día."""
+
+    def __init__(self, version, df):
+        self.version = version
+        self.df = df.reset_index(drop=True)
+        self.days = self.df["Día"].unique().tolist()
+        # Cada día se separa una sola vez; las vistas se reutilizan tal cual
+        self.by_day = {
+            dia: grupo.reset_index(drop=True)
+            for dia, grupo in self.df.groupby("Día", sort=False)
+        }
+        self.meals_by_day = {
+            dia: list(zip(grupo["Tiempo de comida"], grupo["Descripción"]))
+            for dia, grupo in self.by_day.items()
+        }
+        self._nutrition = None
+
+    def nutrition(self, foods):
+        """Energía y macros estimados con la tabla de alimentos (una vez por versión)."""
+        if self._nutrition is None or self._nutrition.foods is not foods:
+            self._nutrition = PlanNutrition(self, foods)
+        return self._nutrition
+
+
+def validate_plan_df(df):
+    """Revisa columnas y días de un plan; devuelve el DataFrame limpio."""
+    faltan = [c for c in PLAN_COLS if c not in df.columns]
+    if faltan:
+        raise ValueError(f"Al plan le faltan columnas: {', '.join(faltan)}")
+    df = df[PLAN_COLS].dropna(subset=["Día", "Tiempo de comida"]).copy()
+    for c in PLAN_COLS:
+        # Sin fillna, una descripción vacía (NaN/None) quedaría como "nan"/"None"
+        df[c] = df[c].fillna("").astype(str).str.strip()
+    desconocidos = sorted(set(df["Día"]) - set(DAY_ORDER))
+    if desconocidos:
+        raise ValueError(f"Días no reconocidos: {', '.join(desconocidos)}")
+    if df.empty:
+        raise ValueError("El plan no tiene comidas.")
+    return df
+
+
+def read_plan_file(path_or_buffer):
+    """Lee un plan desde CSV (columnas Día, Tiempo de comida, Descripción)."""
+    return validate_plan_df(pd.read_csv(path_or_buffer))
+
+
+class PlanStore:
+    """Planes por paciente con caché LRU compartida por el proceso."""
+
+    def __init__(self, storage, default_factory, maxsize=256):
+        self.storage = storage
+        self.default_factory = default_factory
+        self.cache = LRUCache(maxsize=maxsize)
+
+    def get(self, patient):
+        """Plan vigente del paciente (una consulta de versión si ya está en caché)."""
+        version = self.storage.current_plan_version(patient)
+        if version == 0:
+            return self.base_plan()
+        return self.cache.get_or_compute(
+            (patient, version),
+            lambda: MealPlan(version, self.storage.load_plan(patient, version)),
+        )
+
+    def base_plan(self):
+        """Plan base de ejemplo (versión 0), el de quienes no tienen plan propio."""
+        return self.cache.get_or_compute((None, 0), lambda: MealPlan(0, self.default_factory()))
+
+    def update(self, patient, df):
+        """Guarda una versión nueva del plan e invalida las anteriores."""
+        version = self.storage.save_plan(patient, validate_plan_df(df))
+        self.cache.invalidate(lambda key: key[0] == patient and key[1] != version)
+        return version
+
+
+def main(argv):
+    """Carga un plan desde la terminal: python -m nutri.plans <paciente> <archivo.csv>"""
+    from nutri.storage import Storage
+
+    if len(argv) != 2:
+        print("Uso: python -m nutri.plans <paciente> <archivo.csv>")
+        return 1
+    patient, path = argv
+    version = Storage().save_plan(patient, read_plan_file(path))
+    print(f"Plan de {patient} guardado como versión {version}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
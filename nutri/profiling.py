@@ -0,0 +1,188 @@
+# nutri/profiling.py
+# -------------------------------------------------------------
+# Tiempos por etapa de cada rerun (perfilado ligero)
+# -------------------------------------------------------------
+# Se activa con la variable de entorno NUTRI_PROFILING=1. Cada etapa
+# (init_session_state, sidebar, show_*, copias de DataFrame, envío de
+# gráficas...) guarda su duración en un histograma con buckets fijos
+# y en una ventana con las últimas muestras para los percentiles.
+#
+# Apagado no cuesta nada medible: timed() devuelve la función sin
+# envolver y stage() devuelve siempre el mismo contexto vacío.
+#
+# Los datos se pueden volcar a disco como JSON y en formato de texto
+# de Prometheus (NUTRI_PROFILING_DIR, por defecto data/profiling).
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+
+import numpy as np
+
+# Límites superiores de los buckets (segundos), como los de Prometheus
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Muestras recientes por etapa para calcular percentiles
+WINDOW = 1000
+
+_NULL = nullcontext()
+
+
+class StageHistogram:
+    """Histograma acumulado más ventana de las últimas muestras de una etapa."""
+
+    def __init__(self, window=WINDOW):
+        self.counts = np.zeros(len(BUCKETS) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[np.searchsorted(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def summary(self):
+        """Conteo, suma y percentiles (ms) de la ventana reciente."""
+        recent = np.fromiter(self.recent, dtype=np.float64) * 1000
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99]) if recent.size else (0.0, 0.0, 0.0)
+        return {
+            "count": self.count,
+            "sum_s": round(self.total, 6),
+            "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(recent.max()), 3) if recent.size else 0.0,
+            "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], np.cumsum(self.counts).tolist())),
+        }
+
+
+class _Timer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """Histogramas por etapa compartidos por todas las sesiones del proceso."""
+
+    def __init__(self, enabled=False, dump_dir=None, dump_every=30.0):
+        self.enabled = enabled
+        self.dump_dir = dump_dir
+        self.dump_every = dump_every
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._last_dump = time.monotonic()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.environ.get("NUTRI_PROFILING", "") not in ("", "0"),
+            dump_dir=os.environ.get("NUTRI_PROFILING_DIR", os.path.join("data", "profiling")),
+        )
+
+    def stage(self, name):
+        """Contexto que mide una etapa: with PROFILER.stage("sidebar"): ..."""
+        if not self.enabled:
+            return _NULL
+        return _Timer(self, name)
+
+    def timed(self, name=None):
+        """Decorador que mide cada llamada; sin efecto si está apagado."""
+
+        def decorate(func):
+            if not self.enabled:
+                return func
+            stage = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Timer(self, stage):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def observe(self, name, seconds):
+        with self._lock:
+            hist = self._stages.get(name)
+            if hist is None:
+                hist = self._stages[name] = StageHistogram()
+            hist.observe(seconds)
+
+    def last(self, name):
+        """Duración (s) de la medición más reciente de una etapa, o None."""
+        with self._lock:
+            hist = self._stages.get(name)
+            return hist.recent[-1] if hist is not None and hist.recent else None
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def snapshot(self):
+        """Resumen de todas las etapas, ordenado por tiempo total."""
+        with self._lock:
+            stages = {name: hist.summary() for name, hist in self._stages.items()}
+        return dict(sorted(stages.items(), key=lambda kv: -kv[1]["sum_s"]))
+
+    def to_prometheus(self, snapshot=None):
+        """Texto en formato de exposición de Prometheus."""
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        lines = [
+            "# HELP nutri_stage_seconds Duración de cada etapa del rerun.",
+            "# TYPE nutri_stage_seconds histogram",
+        ]
+        for name, s in snapshot.items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for le, n in s["buckets"].items():
+                lines.append(f'nutri_stage_seconds_bucket{{stage="{label}",le="{le}"}} {n}')
+            lines.append(f'nutri_stage_seconds_sum{{stage="{label}"}} {s["sum_s"]}')
+            lines.append(f'nutri_stage_seconds_count{{stage="{label}"}} {s["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, directory=None):
+        """Escribe profiling.json y profiling.prom (reemplazo atómico)."""
+        directory = directory or self.dump_dir
+        os.makedirs(directory, exist_ok=True)
+        snapshot = self.snapshot()
+        salidas = {
+            "profiling.json": json.dumps(
+                {"pid": os.getpid(), "time": time.time(), "stages": snapshot},
+                indent=2,
+                ensure_ascii=False,
+            ),
+            "profiling.prom": self.to_prometheus(snapshot),
+        }
+        for nombre, texto in salidas.items():
+            path = os.path.join(directory, nombre)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(texto)
+            os.replace(path + ".tmp", path)
+        self._last_dump = time.monotonic()
+        return directory
+
+    def maybe_dump(self):
+        """Vuelca a disco si pasaron dump_every segundos desde la última vez."""
+        if self.enabled and self.dump_dir and time.monotonic() - self._last_dump >= self.dump_every:
+            self.dump()
+
+
+# Instancia del proceso (Streamlit vuelve a ejecutar app.py, no este módulo)
+PROFILER = Profiler.from_env()
@@ -0,0 +1,434 @@
+# nutri/reminders.py
+# -------------------------------------------------------------
+# Recordatorios en segundo plano: citas, registros faltantes y rachas
+# -------------------------------------------------------------
+# Un programador con asyncio corre en su propio hilo junto al servidor
+# de Streamlit. Los eventos pendientes viven en un montículo (heapq)
+# ordenado por hora; el programador duerme hasta el primero y, al
+# despertar, toma todos los que vencen dentro de BATCH_SECONDS y los
+# despacha juntos, en lotes de BATCH_SIZE. Miles de recordatorios a la
+# misma hora cuestan un despertar, no uno por paciente.
+#
+# Nunca se revisa paciente por paciente:
+#   - citas: cada SYNC_SECONDS una consulta por rango trae las citas que
+#     empiezan pronto y se agendan sus avisos (APPOINTMENT_OFFSETS antes).
+#     Si ninguna agenda cambió (suma de versiones) solo se lee el tramo
+#     nuevo del horizonte; antes de enviar se confirma que la cita sigue
+#     en ese horario;
+#   - registros faltantes: a LOG_REMINDER_TIME una sola consulta da los
+#     pacientes sin registro del día;
+#   - rachas cortadas: a STREAK_REMINDER_TIME una consulta da quienes
+#     cumplieron todo antier y ayer no (racha de al menos MIN_STREAK).
+#
+# Cada recordatorio tiene una llave única que se marca en la base justo
+# antes de enviarlo (reminders_sent). Así no se repite tras un reinicio
+# ni cuando varios workers corren su propio programador.
+#
+# El envío lo hace un notificador intercambiable: cualquier objeto con
+# send(recordatorios), que se llama en un hilo aparte para no frenar el
+# programador. OutboxNotifier los agrega como líneas JSON a un archivo
+# (bandeja de salida), suficiente para pruebas o para que otro proceso
+# los mande por correo o SMS.
+#
+# Uso en un proceso aparte (con NUTRI_REMINDERS=0 en los workers):
+#   python -m nutri.reminders [bandeja.jsonl]
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from nutri.agenda import Appointment
+
+REMINDERS_ENABLED = os.environ.get("NUTRI_REMINDERS", "1") not in ("", "0")
+DEFAULT_OUTBOX_PATH = os.environ.get(
+    "NUTRI_OUTBOX_PATH", os.path.join("data", "outbox", "recordatorios.jsonl")
+)
+
+# Avisos de cita: cuánto antes del inicio
+APPOINTMENT_OFFSETS = (timedelta(hours=24), timedelta(hours=2))
+# Hora del aviso de registro faltante y del de racha cortada
+LOG_REMINDER_TIME = time(20, 0)
+STREAK_REMINDER_TIME = time(9, 0)
+MIN_STREAK = 3
+
+# Un despertar despacha lo que vence en los siguientes BATCH_SECONDS
+BATCH_SECONDS = 60
+BATCH_SIZE = 500
+# Cada cuánto se vuelven a leer las citas próximas
+SYNC_SECONDS = 300
+# Reintentos de un envío fallido
+RETRY_SECONDS = 120
+MAX_ATTEMPTS = 3
+# Días que se guardan las marcas de envío
+KEEP_SENT_DAYS = 60
+
+# Trabajos internos del montículo
+SYNC_JOB = "citas"
+LOG_JOB = "registros"
+STREAK_JOB = "rachas"
+
+log = logging.getLogger(__name__)
+
+
+class Reminder:
+    """Un recordatorio para un paciente."""
+
+    __slots__ = ("key", "kind", "patient", "due", "text", "appointment", "attempts")
+
+    def __init__(self, key, kind, patient, due, text, appointment=None):
+        self.key = key
+        self.kind = kind
+        self.patient = patient
+        self.due = due
+        self.text = text
+        # (id, inicio en texto) de la cita, para confirmarla antes de enviar
+        self.appointment = appointment
+        self.attempts = 0
+
+    def to_dict(self):
+        return {
+            "llave": self.key,
+            "tipo": self.kind,
+            "paciente": self.patient,
+            "hora": self.due.isoformat(timespec="seconds"),
+            "texto": self.text,
+        }
+
+    def __repr__(self):
+        return f"Reminder({self.key!r}, {self.due:%Y-%m-%d %H:%M})"
+
+
+class OutboxNotifier:
+    """Escribe cada recordatorio como una línea JSON en la bandeja de salida."""
+
+    def __init__(self, path=DEFAULT_OUTBOX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, reminders):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        lineas = "".join(json.dumps(r.to_dict(), ensure_ascii=False) + "\n" for r in reminders)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lineas)
+
+
+def _text(moment):
+    # Mismo formato ordenable que las citas y las marcas de envío
+    return moment.strftime("%Y-%m-%d %H:%M")
+
+
+def _next_at(now, at):
+    """Siguiente momento (hoy o mañana) con la hora at."""
+    moment = datetime.combine(now.date(), at)
+    return moment if moment > now else moment + timedelta(days=1)
+
+
+class ReminderScheduler:
+    """Montículo de recordatorios pendientes que se despachan por lotes."""
+
+    def __init__(self, storage, notifier, clock=datetime.now, offsets=APPOINTMENT_OFFSETS,
+                 log_time=LOG_REMINDER_TIME, streak_time=STREAK_REMINDER_TIME,
+                 min_streak=MIN_STREAK, batch_seconds=BATCH_SECONDS, batch_size=BATCH_SIZE,
+                 sync_seconds=SYNC_SECONDS):
+        self.storage = storage
+        self.notifier = notifier
+        self.clock = clock
+        self.offsets = sorted(offsets, reverse=True)
+        self.log_time = log_time
+        self.streak_time = streak_time
+        self.min_streak = min_streak
+        self.batch = timedelta(seconds=batch_seconds)
+        self.batch_size = batch_size
+        self.sync = timedelta(seconds=sync_seconds)
+        self.stats = Counter()
+        self._heap = []
+        self._seq = itertools.count()
+        self._queued = set()     # llaves de recordatorios en el montículo
+        self._done = set()       # llaves ya despachadas por este proceso
+        self._sync_gen = 0
+        self._agenda_changes = None
+        self._horizon = None
+        self._wake = None
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    # ---- Montículo ----
+    def _push(self, due, item):
+        heapq.heappush(self._heap, (due, next(self._seq), item))
+        if self._wake is not None and self._heap[0][2] is item:
+            # Hay algo antes de lo que se esperaba: recalcular la espera
+            self._wake.set()
+
+    def _push_reminder(self, reminder):
+        if reminder.key in self._queued or reminder.key in self._done:
+            return
+        self._queued.add(reminder.key)
+        self._push(reminder.due, reminder)
+
+    def _push_sync(self, due):
+        # Solo la última lectura de citas agendada sigue viva
+        self._sync_gen += 1
+        self._push(due, (SYNC_JOB, self._sync_gen))
+
+    def schedule_jobs(self, now=None):
+        """Agenda la primera lectura de citas y los trabajos diarios."""
+        now = now or self.clock()
+        self._push_sync(now)
+        self._push(_next_at(now, self.log_time), (LOG_JOB, 0))
+        self._push(_next_at(now, self.streak_time), (STREAK_JOB, 0))
+
+    def next_due(self):
+        return self._heap[0][0] if self._heap else None
+
+    # ---- Despacho ----
+    async def run_due(self, now=None):
+        """
+        Despacha lo que vence hasta now + BATCH_SECONDS (un despertar).
+        Devuelve cuántos recordatorios se enviaron.
+        """
+        now = now or self.clock()
+        limite = now + self.batch
+        self.stats["despertares"] += 1
+        enviados = 0
+        while self._heap and self._heap[0][0] <= limite:
+            lote = []
+            while self._heap and self._heap[0][0] <= limite:
+                _, _, item = heapq.heappop(self._heap)
+                if isinstance(item, Reminder):
+                    self._queued.discard(item.key)
+                    lote.append(item)
+                else:
+                    await self._run_job(item, now)
+            enviados += await self._dispatch(lote, now)
+        return enviados
+
+    async def _run_job(self, job, now):
+        name, gen = job
+        if name == SYNC_JOB and gen != self._sync_gen:
+            return
+        try:
+            if name == SYNC_JOB:
+                await self._sync_appointments(now)
+            elif name == LOG_JOB:
+                await self._missing_logs(now)
+            else:
+                await self._broken_streaks(now)
+        except Exception:
+            # Un error de la base no debe detener el programador: se reintenta
+            log.warning("Falló el trabajo %s de recordatorios; se reintenta", name, exc_info=True)
+            self.stats["errores"] += 1
+            self._push(now + timedelta(seconds=RETRY_SECONDS), job)
+
+    def _retry_later(self, reminders, now):
+        """Regresa recordatorios al montículo tras un error de la base (sin gastar intentos)."""
+        self.stats["errores"] += 1
+        for r in reminders:
+            self._done.discard(r.key)
+            r.due = now + timedelta(seconds=RETRY_SECONDS)
+            self._push_reminder(r)
+
+    async def _sync_appointments(self, now):
+        horizonte = now + self.offsets[0] + self.sync + self.batch
+        # Si ninguna agenda cambió basta leer el tramo nuevo del horizonte
+        cambios = await asyncio.to_thread(self.storage.agenda_changes)
+        desde = now
+        if cambios == self._agenda_changes and self._horizon is not None:
+            desde = max(now, self._horizon)
+        rows = await asyncio.to_thread(
+            self.storage.appointments_between, _text(desde), _text(horizonte)
+        )
+        self._agenda_changes, self._horizon = cambios, horizonte
+        for row in rows:
+            self._schedule_appointment(row, now)
+        self.stats["citas leídas"] += len(rows)
+        self._push_sync(now + self.sync)
+
+    def _schedule_appointment(self, row, now):
+        cita = Appointment.from_row(row)
+        if cita.start <= now:
+            return
+        # Avisos aún vigentes; una cita agendada a última hora recibe solo el más cercano
+        pendientes = [o for o in self.offsets if cita.start - o > now - self.sync]
+        for offset in pendientes or self.offsets[-1:]:
+            minutos = int(offset.total_seconds() // 60)
+            self._push_reminder(Reminder(
+                f"cita:{cita.id}:{cita.patient}:{row[3]}:{minutos}",
+                "cita",
+                cita.patient,
+                max(cita.start - offset, now),
+                f"Recordatorio: tienes cita con tu nutrióloga el {cita.start:%d/%m/%Y} "
+                f"a las {cita.start:%H:%M}.",
+                appointment=(cita.id, row[3]),
+            ))
+
+    async def _missing_logs(self, now):
+        dia = now.date()
+        rows = await asyncio.to_thread(self.storage.patients_without_log, dia)
+        for patient, _ in rows:
+            self._push_reminder(Reminder(
+                f"registro:{patient}:{dia.isoformat()}",
+                "registro",
+                patient,
+                now,
+                "Aún no registras tu día de hoy. ¡Tómate un minuto para anotar tus comidas!",
+            ))
+        # Una vez al día: olvidar marcas viejas
+        self._done.clear()
+        await asyncio.to_thread(
+            self.storage.prune_reminders, _text(now - timedelta(days=KEEP_SENT_DAYS))
+        )
+        self._push(_next_at(now, self.log_time), (LOG_JOB, 0))
+
+    async def _broken_streaks(self, now):
+        dia = now.date()
+        rows = await asyncio.to_thread(self.storage.broken_streaks, dia, self.min_streak)
+        for patient, racha in rows:
+            self._push_reminder(Reminder(
+                f"racha:{patient}:{dia.isoformat()}",
+                "racha",
+                patient,
+                now,
+                f"Tu racha de {racha} días seguidos se cortó ayer. ¡Hoy es buen día para retomarla!",
+            ))
+        self._push(_next_at(now, self.streak_time), (STREAK_JOB, 0))
+
+    async def _dispatch(self, reminders, now):
+        if not reminders:
+            return 0
+        citas = {r.appointment[0] for r in reminders if r.appointment}
+        if citas:
+            # Canceladas o movidas desde la última lectura no se avisan
+            try:
+                vigentes = await asyncio.to_thread(self.storage.appointment_starts, citas)
+            except Exception:
+                # Los avisos de cita esperan; los demás salen ya
+                log.warning("No se pudieron confirmar las citas; se reintenta", exc_info=True)
+                self._retry_later([r for r in reminders if r.appointment], now)
+                vigentes = {}
+            reminders = [
+                r for r in reminders
+                if not r.appointment or vigentes.get(r.appointment[0]) == r.appointment[1]
+            ]
+        enviados = 0
+        for i in range(0, len(reminders), self.batch_size):
+            por_llave = {r.key: r for r in reminders[i:i + self.batch_size]}
+            try:
+                llaves = await asyncio.to_thread(
+                    self.storage.claim_reminders, list(por_llave), _text(now)
+                )
+            except Exception:
+                log.warning("No se pudieron marcar los recordatorios; se reintenta", exc_info=True)
+                self._retry_later(por_llave.values(), now)
+                continue
+            self._done.update(por_llave)
+            lote = [por_llave[k] for k in llaves]
+            if not lote:
+                continue
+            try:
+                await asyncio.to_thread(self.notifier.send, lote)
+            except Exception:
+                # Falló el envío: se liberan las marcas y se reintenta después
+                log.warning("Falló el envío de %d recordatorios", len(lote), exc_info=True)
+                try:
+                    await asyncio.to_thread(self.storage.release_reminders, llaves)
+                except Exception:
+                    log.exception("No se pudieron liberar las marcas de envío")
+                    self.stats["errores"] += 1
+                self.stats["fallidos"] += len(lote)
+                for r in lote:
+                    self._done.discard(r.key)
+                    r.attempts += 1
+                    if r.attempts < MAX_ATTEMPTS:
+                        r.due = now + timedelta(seconds=RETRY_SECONDS)
+                        self._push_reminder(r)
+                continue
+            enviados += len(lote)
+            self.stats["enviados"] += len(lote)
+            self.stats["lotes"] += 1
+        return enviados
+
+    # ---- Bucle ----
+    async def run(self):
+        """Duerme hasta el siguiente vencimiento y despacha; no termina solo."""
+        self._wake = asyncio.Event()
+        self.schedule_jobs()
+        while True:
+            self._wake.clear()
+            espera = (self._heap[0][0] - self.clock()).total_seconds()
+            if espera > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.run_due()
+            except Exception:
+                # Ningún error debe terminar el programador; se intenta en la siguiente vuelta
+                log.exception("Error inesperado al despachar recordatorios")
+                self.stats["errores"] += 1
+                await asyncio.sleep(RETRY_SECONDS)
+
+    def start(self):
+        """Arranca el programador en un hilo propio (daemon) con su event loop."""
+        if self._thread is not None:
+            return self
+        listo = threading.Event()
+
+        def main():
+            self._loop = asyncio.new_event_loop()
+            self._task = self._loop.create_task(self.run())
+            listo.set()
+            try:
+                self._loop.run_until_complete(self._task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._loop.close()
+
+        self._thread = threading.Thread(target=main, name="nutri-recordatorios", daemon=True)
+        self._thread.start()
+        listo.wait()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Detiene el programador y espera a que termine su hilo."""
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._task.cancel)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def refresh(self):
+        """Vuelve a leer las citas próximas ya (por ejemplo, tras agendar o cancelar)."""
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(lambda: self._push_sync(self.clock()))
+
+
+def main(argv):
+    from nutri.storage import Storage
+
+    notifier = OutboxNotifier(argv[0] if argv else DEFAULT_OUTBOX_PATH)
+    scheduler = ReminderScheduler(Storage(), notifier)
+    print(f"Recordatorios en {notifier.path} (Ctrl+C para salir)")
+    try:
+        asyncio.run(scheduler.run())
+    except KeyboardInterrupt:
+        pass
+    print(", ".join(f"{k}: {v}" for k, v in scheduler.stats.items()) or "Sin actividad")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
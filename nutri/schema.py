@@ -0,0 +1,42 @@
+# nutri/schema.py
+# -------------------------------------------------------------
+# Columnas compartidas de las tablas de seguimiento
+# -------------------------------------------------------------
+
+import numpy as np
+
+# Tiempos de comida en el orden en que se muestran en el formulario
+MEAL_COLS = ["desayuno", "colacion1", "comida", "colacion2", "cena"]
+
+# Columnas de los registros diarios (daily_logs_df)
+DAILY_LOG_COLS = ["date"] + MEAL_COLS + ["mood", "comentarios"]
+
+# Columnas del historial de peso (weight_df)
+WEIGHT_COLS = ["date", "weight"]
+
+# Pesos aceptados (kg), los mismos límites del panel lateral
+WEIGHT_RANGE = (30.0, 300.0)
+
+# Opciones de estado de ánimo del registro diario
+MOOD_OPTIONS = ["Muy bien", "Bien", "Regular", "Mal"]
+
+
+# Máscara de bits con los cinco tiempos cumplidos (bit i = MEAL_COLS[i])
+FULL_MASK = (1 << len(MEAL_COLS)) - 1
+
+
+def meals_to_mask(registro):
+    """Empaqueta los tiempos cumplidos de un registro en un entero de 5 bits."""
+    mask = 0
+    for i, c in enumerate(MEAL_COLS):
+        if registro[c]:
+            mask |= 1 << i
+    return mask
+
+
+def frame_to_masks(df):
+    """Máscaras de bits de todas las filas de un DataFrame (vectorizado)."""
+    mask = np.zeros(len(df), dtype=np.uint8)
+    for i, c in enumerate(MEAL_COLS):
+        mask |= df[c].to_numpy(dtype=bool).astype(np.uint8) << i
+    return mask
@@ -0,0 +1,560 @@
+# nutri/search.py
+# -------------------------------------------------------------
+# Búsqueda de texto en los planes y en los comentarios de los registros
+# -------------------------------------------------------------
+# Índice invertido en memoria (uno por proceso) sobre la Descripción de
+# cada comida de los planes vigentes y los comentarios de los registros
+# diarios de todos los pacientes. Las palabras se normalizan igual en el
+# texto y en la búsqueda: minúsculas, sin acentos ("atún" = "atun"), en
+# singular aproximado (stem de nutri/nutrients.py) y sin palabras vacías
+# ("de", "con", "la"...). La última palabra de la búsqueda cuenta también
+# como prefijo, para ir buscando mientras se escribe.
+#
+# Las listas de documentos de cada término viven en dos partes:
+#   - una base compacta en arreglos numpy (término → documentos y
+#     frecuencias, en orden, tipo CSR);
+#   - un delta en listas de Python con lo agregado después.
+# Cambiar un comentario o un plan marca sus documentos viejos como
+# borrados y agrega los nuevos al delta; cuando el delta pasa de
+# MERGE_POSTINGS entradas se funde con la base (sin los borrados).
+# Los resultados deben contener todas las palabras de la búsqueda y se
+# ordenan con BM25; en cada uno se marcan las palabras encontradas.
+#
+# SearchIndex mantiene el índice al día con la base: las escrituras de
+# la propia sesión lo actualizan al momento (update_comment, update_plan)
+# y, como máximo cada SYNC_SECONDS, se comparan las revisiones de los
+# pacientes y las versiones de sus planes para volver a leer solo a los
+# que cambiaron (otros workers, importaciones). En memoria quedan los
+# textos de los planes; el de los comentarios se lee de la base solo
+# para los resultados que se muestran.
+
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from bisect import bisect_left
+from datetime import date
+from functools import lru_cache
+from html import escape
+
+import numpy as np
+
+from nutri.nutrients import stem
+
+# Tipos de documento
+PLAN, COMMENT = 0, 1
+# Paciente con el que se indexa el plan base (versión 0)
+BASE_PLAN = ""
+
+STOPWORDS = frozenset(
+    """
+    a al algo ante como con de del el ella ellos en era es esa ese esta este
+    fue ha hay la las le les lo los me mi mis muy nos o para pero por que se
+    si sin su sus te tu tus u un una unas uno unos y ya yo
+    """.split()
+)
+
+# Entradas del delta antes de fundirlo con la base
+MERGE_POSTINGS = 50_000
+# Segundos entre revisiones de cambios hechos fuera de la sesión
+SYNC_SECONDS = 30.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Búsqueda por prefijo de la última palabra
+MIN_PREFIX_CHARS = 3
+MAX_PREFIX_TERMS = 64
+# Largo del fragmento de texto que se muestra por resultado
+SNIPPET_CHARS = 180
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def fold(text):
+    """Minúsculas sin acentos."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=1 << 16)
+def word_term(word):
+    """Término del índice para una palabra tal como aparece (None si es vacía)."""
+    folded = fold(word)
+    if folded in STOPWORDS:
+        return None
+    return folded if folded[0].isdigit() else stem(folded)
+
+
+def tokenize(text):
+    """Términos de un texto, en orden."""
+    return [t for t in map(word_term, _WORD.findall(text)) if t]
+
+
+def highlight(text, terms, width=SNIPPET_CHARS):
+    """
+    HTML del texto con las palabras de terms en <mark>. Los textos largos
+    se recortan a width caracteres alrededor de la primera coincidencia.
+    """
+    spans = [m.span() for m in _WORD.finditer(text) if word_term(m.group()) in terms]
+    start, end = 0, len(text)
+    if end > width:
+        centro = spans[0][0] if spans else 0
+        start = max(0, min(centro - width // 3, end - width))
+        if start:
+            start = text.find(" ", start) + 1 or start
+        corte = text.rfind(" ", start, start + width)
+        end = corte if start + width < end and corte > start else min(end, start + width)
+    partes, pos = [], start
+    for i, j in spans:
+        if i < start or j > end:
+            continue
+        partes.append(escape(text[pos:i]))
+        partes.append(f"<mark>{escape(text[i:j])}</mark>")
+        pos = j
+    partes.append(escape(text[pos:end]))
+    return ("…" if start else "") + "".join(partes) + ("…" if end < len(text) else "")
+
+
+class InvertedIndex:
+    """
+    Índice invertido de documentos identificados por (paciente, tipo, llave).
+    No es seguro entre hilos; SearchIndex lo usa con un candado.
+    """
+
+    def __init__(self, capacity=1024, merge_postings=MERGE_POSTINGS):
+        self.merge_postings = merge_postings
+        self._vocab = {}
+        self._terms = []
+        self._sorted = []
+        self._patients = {}
+        self._names = []
+        # (código de paciente, tipo) → {llave: documento}
+        self._sources = {}
+        # Columnas por documento; los ids no se reutilizan
+        self.n = 0
+        self._kind = np.zeros(capacity, dtype=np.int8)
+        self._patient = np.zeros(capacity, dtype=np.int32)
+        self._key = np.zeros(capacity, dtype=np.int32)
+        self._length = np.zeros(capacity, dtype=np.int32)
+        self._crc = np.zeros(capacity, dtype=np.uint32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self.live = 0
+        self.live_length = 0
+        # Base compacta y delta
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.int32)
+        self._delta = {}
+        self.delta_size = 0
+
+    def __len__(self):
+        return self.live
+
+    # ---- Documentos ----
+    def _patient_code(self, patient):
+        code = self._patients.get(patient)
+        if code is None:
+            code = self._patients[patient] = len(self._names)
+            self._names.append(patient)
+        return code
+
+    def _term_id(self, term):
+        tid = self._vocab.get(term)
+        if tid is None:
+            tid = self._vocab[term] = len(self._terms)
+            self._terms.append(term)
+        return tid
+
+    def _grow(self):
+        capacity = 2 * len(self._kind)
+        for name in ("_kind", "_patient", "_key", "_length", "_crc", "_alive"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[: self.n] = old[: self.n]
+            setattr(self, name, new)
+
+    def add(self, patient, kind, key, text):
+        """Agrega o reemplaza un documento; False si el texto no cambió."""
+        code = self._patient_code(patient)
+        source = self._sources.setdefault((code, kind), {})
+        crc = zlib.crc32(text.encode("utf-8"))
+        anterior = source.get(key)
+        if anterior is not None:
+            if self._crc[anterior] == crc:
+                return False
+            self._kill(source.pop(key))
+        conteos = {}
+        for term in tokenize(text):
+            tid = self._term_id(term)
+            conteos[tid] = conteos.get(tid, 0) + 1
+        if not conteos:
+            return True
+        if self.n == len(self._kind):
+            self._grow()
+        doc = self.n
+        self.n += 1
+        largo = sum(conteos.values())
+        self._kind[doc], self._patient[doc], self._key[doc] = kind, code, key
+        self._length[doc], self._crc[doc], self._alive[doc] = largo, crc, True
+        self.live += 1
+        self.live_length += largo
+        source[key] = doc
+        for tid, tf in conteos.items():
+            lista = self._delta.get(tid)
+            if lista is None:
+                lista = self._delta[tid] = ([], [])
+            lista[0].append(doc)
+            lista[1].append(tf)
+        self.delta_size += len(conteos)
+        if self.delta_size >= self.merge_postings:
+            self.merge()
+        return True
+
+    def _kill(self, doc):
+        self._alive[doc] = False
+        self.live -= 1
+        self.live_length -= int(self._length[doc])
+
+    def remove(self, patient, kind, key):
+        """Quita un documento; False si no estaba."""
+        code = self._patients.get(patient)
+        doc = self._sources.get((code, kind), {}).pop(key, None)
+        if doc is None:
+            return False
+        self._kill(doc)
+        return True
+
+    def replace_source(self, patient, kind, texts):
+        """
+        Deja los documentos de un paciente y tipo iguales a texts
+        ({llave: texto}); solo toca los que cambiaron. Devuelve cuántos.
+        """
+        code = self._patient_code(patient)
+        actuales = self._sources.get((code, kind), {})
+        cambios = 0
+        for key in [k for k in actuales if k not in texts]:
+            cambios += self.remove(patient, kind, key)
+        for key, text in texts.items():
+            cambios += self.add(patient, kind, key, text)
+        return cambios
+
+    def add_many(self, rows):
+        """
+        Carga masiva de documentos (paciente, tipo, llave, texto): llena las
+        columnas y las listas de una vez y funde todo con la base al final.
+        Los textos repetidos se tokenizan una sola vez.
+        """
+        kinds, codes, keys, largos, crcs = [], [], [], [], []
+        p_tids, p_docs, p_tfs = [], [], []
+        vistos = {}
+        doc = self.n
+        for patient, kind, key, text in rows:
+            code = self._patient_code(patient)
+            source = self._sources.setdefault((code, kind), {})
+            if key in source:
+                self.add(patient, kind, key, text)
+                continue
+            tokens = vistos.get(text)
+            if tokens is None:
+                conteos = {}
+                for term in tokenize(text):
+                    tid = self._term_id(term)
+                    conteos[tid] = conteos.get(tid, 0) + 1
+                tokens = vistos[text] = (
+                    zlib.crc32(text.encode("utf-8")), list(conteos), list(conteos.values()),
+                    sum(conteos.values()),
+                )
+            crc, tids, tfs, largo = tokens
+            if not largo:
+                continue
+            kinds.append(kind)
+            codes.append(code)
+            keys.append(key)
+            largos.append(largo)
+            crcs.append(crc)
+            p_tids.extend(tids)
+            p_docs.extend([doc] * len(tids))
+            p_tfs.extend(tfs)
+            source[key] = doc
+            doc += 1
+        if doc == self.n:
+            return 0
+        while len(self._kind) < doc:
+            self._grow()
+        nuevos = slice(self.n, doc)
+        self._kind[nuevos], self._patient[nuevos], self._key[nuevos] = kinds, codes, keys
+        self._length[nuevos], self._crc[nuevos], self._alive[nuevos] = largos, crcs, True
+        self.live += doc - self.n
+        self.live_length += sum(largos)
+        self.n = doc
+        self.merge((
+            np.asarray(p_tids, dtype=np.int32),
+            np.asarray(p_docs, dtype=np.int32),
+            np.asarray(p_tfs, dtype=np.int32),
+        ))
+        return len(kinds)
+
+    def merge(self, extra=None):
+        """
+        Funde el delta (y extra: arreglos de término, documento y
+        frecuencia) con la base y descarta los documentos borrados.
+        """
+        n_terms = len(self._terms)
+        conteos = np.diff(self._offsets)
+        tids = [np.repeat(np.arange(len(conteos), dtype=np.int32), conteos)]
+        docs, tfs = [self._docs], [self._tfs]
+        if extra is not None:
+            tids.append(extra[0])
+            docs.append(extra[1])
+            tfs.append(extra[2])
+        for tid, (d, t) in self._delta.items():
+            tids.append(np.full(len(d), tid, dtype=np.int32))
+            docs.append(np.asarray(d, dtype=np.int32))
+            tfs.append(np.asarray(t, dtype=np.int32))
+        tids, docs, tfs = np.concatenate(tids), np.concatenate(docs), np.concatenate(tfs)
+        vivos = self._alive[docs]
+        tids, docs, tfs = tids[vivos], docs[vivos], tfs[vivos]
+        orden = np.lexsort((docs, tids))
+        self._docs, self._tfs = docs[orden], tfs[orden]
+        self._offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tids, minlength=n_terms), out=self._offsets[1:])
+        self._delta = {}
+        self.delta_size = 0
+
+    # ---- Búsqueda ----
+    def _postings(self, tid):
+        """Documentos y frecuencias de un término (base + delta)."""
+        docs, tfs = [], []
+        if tid < len(self._offsets) - 1:
+            i, j = self._offsets[tid], self._offsets[tid + 1]
+            docs.append(self._docs[i:j])
+            tfs.append(self._tfs[i:j])
+        delta = self._delta.get(tid)
+        if delta is not None:
+            docs.append(np.asarray(delta[0], dtype=np.int32))
+            tfs.append(np.asarray(delta[1], dtype=np.int32))
+        if not docs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        if len(docs) == 1:
+            return docs[0], tfs[0]
+        return np.concatenate(docs), np.concatenate(tfs)
+
+    def _prefixed(self, prefix):
+        """Términos que empiezan con prefix (lista ordenada bajo demanda)."""
+        if len(self._sorted) != len(self._terms):
+            self._sorted = sorted(self._terms)
+        encontrados = []
+        i = bisect_left(self._sorted, prefix)
+        while i < len(self._sorted) and self._sorted[i].startswith(prefix):
+            encontrados.append(self._vocab[self._sorted[i]])
+            i += 1
+            if len(encontrados) == MAX_PREFIX_TERMS:
+                break
+        return encontrados
+
+    def query_terms(self, query):
+        """
+        Grupos de ids de término, uno por palabra de la búsqueda; la última
+        palabra incluye los términos que empiezan con ella.
+        """
+        palabras = _WORD.findall(query)
+        prefijo = bool(palabras) and not query[-1:].isspace()
+        grupos = []
+        for i, palabra in enumerate(palabras):
+            term = word_term(palabra)
+            if term is None:
+                continue
+            grupo = {self._vocab[term]} if term in self._vocab else set()
+            base = fold(palabra)
+            if prefijo and i == len(palabras) - 1 and len(base) >= MIN_PREFIX_CHARS:
+                grupo.update(self._prefixed(base))
+            grupos.append(grupo)
+        return grupos
+
+    def search(self, query, patients=None, limit=20):
+        """
+        Documentos con todas las palabras de la búsqueda, del más al menos
+        relevante (BM25): lista de (paciente, tipo, llave, puntaje) y el
+        conjunto de términos encontrados (para resaltar). patients limita
+        la búsqueda a esos pacientes.
+        """
+        grupos = self.query_terms(query)
+        if not grupos or not all(grupos) or not self.live:
+            return [], set()
+        permitidos = None
+        if patients is not None:
+            permitidos = np.zeros(len(self._names), dtype=bool)
+            codigos = [self._patients[p] for p in patients if p in self._patients]
+            permitidos[codigos] = True
+        promedio = self.live_length / self.live
+        por_palabra_docs, por_palabra_puntos, encontrados = [], [], set()
+        for grupo in grupos:
+            docs_w, puntos_w = [], []
+            for tid in grupo:
+                docs, tfs = self._postings(tid)
+                vivos = self._alive[docs]
+                docs, tfs = docs[vivos], tfs[vivos]
+                df = len(docs)
+                if permitidos is not None:
+                    dentro = permitidos[self._patient[docs]]
+                    docs, tfs = docs[dentro], tfs[dentro]
+                if not len(docs):
+                    continue
+                encontrados.add(self._terms[tid])
+                idf = np.log1p((self.live - df + 0.5) / (df + 0.5))
+                norma = BM25_K1 * (1 - BM25_B + BM25_B * self._length[docs] / promedio)
+                docs_w.append(docs)
+                puntos_w.append(idf * tfs * (BM25_K1 + 1) / (tfs + norma))
+            if not docs_w:
+                return [], set()
+            # Con prefijos un documento puede aparecer con varios términos de
+            # la misma palabra: cuenta el mejor
+            docs_w = np.concatenate(docs_w)
+            unicos, inversa = np.unique(docs_w, return_inverse=True)
+            mejor = np.zeros(len(unicos))
+            np.maximum.at(mejor, inversa, np.concatenate(puntos_w))
+            por_palabra_docs.append(unicos)
+            por_palabra_puntos.append(mejor)
+
+        docs, inversa, veces = np.unique(
+            np.concatenate(por_palabra_docs), return_inverse=True, return_counts=True
+        )
+        puntos = np.bincount(inversa, weights=np.concatenate(por_palabra_puntos))
+        completos = veces == len(grupos)
+        docs, puntos = docs[completos], puntos[completos]
+        if len(docs) > limit:
+            mejores = np.argpartition(-puntos, limit - 1)[:limit]
+            docs, puntos = docs[mejores], puntos[mejores]
+        # Empates: primero el documento indexado después (el comentario más reciente)
+        orden = np.lexsort((-docs, -puntos))
+        hits = [
+            (self._names[self._patient[d]], int(self._kind[d]), int(self._key[d]), float(p))
+            for d, p in zip(docs[orden], puntos[orden])
+        ]
+        return hits, encontrados
+
+
+class SearchIndex:
+    """Índice de planes y comentarios de todos los pacientes, al día con la base."""
+
+    def __init__(self, storage, plan_store, sync_seconds=SYNC_SECONDS):
+        self.storage = storage
+        self.plan_store = plan_store
+        self.sync_seconds = sync_seconds
+        self.index = InvertedIndex()
+        self._lock = threading.Lock()
+        # Revisión de los datos y versión del plan con que se indexó a cada paciente
+        self._revs = {}
+        self._plan_versions = {}
+        # Comidas del plan indexado: paciente → [(día, tiempo, descripción)]
+        self._plans = {}
+        self._synced = None
+
+    @property
+    def ready(self):
+        return self._synced is not None
+
+    def _index_plan(self, patient, plan):
+        filas = list(plan.df[["Día", "Tiempo de comida", "Descripción"]].itertuples(index=False, name=None))
+        self.index.replace_source(
+            patient, PLAN, {i: str(desc) for i, (_, _, desc) in enumerate(filas) if desc}
+        )
+        self._plans[patient] = filas
+        self._plan_versions[patient] = plan.version
+
+    def _index_comments(self, patient, rev):
+        textos = {
+            date.fromisoformat(dia).toordinal(): texto
+            for dia, texto in self.storage.load_comments(patient)
+        }
+        self.index.replace_source(patient, COMMENT, textos)
+        self._revs[patient] = rev
+
+    def _build(self):
+        # Las revisiones se leen antes que los datos: si algo se escribe
+        # mientras tanto, el siguiente sync lo vuelve a leer
+        self._revs = self.storage.revisions(self.storage.log_patients())
+        self.index.add_many(
+            (patient, COMMENT, date.fromisoformat(dia).toordinal(), texto)
+            for patient, dia, texto in self.storage.iter_comments()
+        )
+        self._index_plan(BASE_PLAN, self.plan_store.base_plan())
+        for patient in self.storage.plan_versions():
+            self._index_plan(patient, self.plan_store.get(patient))
+        self.index.merge()
+
+    def sync(self, force=False):
+        """Construye el índice la primera vez y luego lee solo lo que cambió."""
+        with self._lock:
+            now = time.monotonic()
+            if self._synced is None:
+                self._build()
+            elif force or now - self._synced >= self.sync_seconds:
+                pacientes = set(self.storage.log_patients()) | set(self._revs)
+                for patient, rev in self.storage.revisions(pacientes).items():
+                    if self._revs.get(patient, 0) != rev:
+                        self._index_comments(patient, rev)
+                for patient, version in self.storage.plan_versions().items():
+                    if self._plan_versions.get(patient) != version:
+                        self._index_plan(patient, self.plan_store.get(patient))
+            else:
+                return
+            self._synced = now
+
+    def update_comment(self, patient, day, text, rev):
+        """Refleja un registro recién guardado (rev: revisión que dejó la escritura)."""
+        with self._lock:
+            if self._synced is None:
+                return
+            key = day.toordinal()
+            if text and str(text).strip():
+                self.index.add(patient, COMMENT, key, str(text))
+            else:
+                self.index.remove(patient, COMMENT, key)
+            if self._revs.get(patient, 0) == rev - 1:
+                self._revs[patient] = rev
+
+    def update_plan(self, patient, plan):
+        """Refleja la versión nueva del plan de un paciente."""
+        with self._lock:
+            if self._synced is not None:
+                self._index_plan(patient, plan)
+
+    def search(self, query, patients=None, limit=20):
+        """
+        Resultados de la búsqueda, del más al menos relevante: dicts con
+        paciente, fuente ("Plan" o "Comentario"), fecha (comentarios), día
+        y tiempo (plan), texto, resaltado (HTML) y puntaje.
+        """
+        self.sync()
+        with self._lock:
+            hits, terms = self.index.search(query, patients, limit)
+            planes = {p: self._plans[p] for p, kind, _, _ in hits if kind == PLAN}
+        # Texto de los comentarios encontrados, una consulta por paciente
+        dias = {}
+        for patient, kind, key, _ in hits:
+            if kind == COMMENT:
+                dias.setdefault(patient, []).append(date.fromordinal(key).isoformat())
+        comentarios = {
+            (patient, date.fromisoformat(dia).toordinal()): texto
+            for patient, lista in dias.items()
+            for dia, texto in self.storage.load_comments(patient, lista)
+        }
+        resultados = []
+        for patient, kind, key, score in hits:
+            if kind == PLAN:
+                dia, tiempo, texto = planes[patient][key]
+                extra = {"fuente": "Plan", "fecha": None, "dia": dia, "tiempo": tiempo}
+            else:
+                texto = comentarios.get((patient, key))
+                if texto is None:
+                    continue
+                extra = {"fuente": "Comentario", "fecha": date.fromordinal(key), "dia": None, "tiempo": None}
+            resultados.append({
+                "paciente": patient or None,
+                **extra,
+                "texto": texto,
+                "resaltado": highlight(texto, terms),
+                "puntaje": score,
+            })
+        return resultados
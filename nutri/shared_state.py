@@ -0,0 +1,246 @@
+# nutri/shared_state.py
+# -------------------------------------------------------------
+# Estado compartido entre procesos (sesiones y versiones de datos)
+# -------------------------------------------------------------
+# st.session_state vive en un solo proceso. Para poner varios
+# workers detrás de un balanceador, las sesiones de login y los
+# contadores de versión de cada paciente se guardan en un almacén
+# tipo Redis. Hay tres implementaciones con la misma interfaz:
+#   - memory://            diccionario en el proceso (pruebas)
+#   - sqlite:///ruta.db    archivo compartido por los workers de un equipo
+#   - redis://host:puerto  Redis real (requiere el paquete redis)
+# Cada worker guarda además una copia local de las versiones que se
+# revisa contra el almacén como máximo una vez por version_ttl.
+
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+from nutri.storage import ConnectionPool
+
+DEFAULT_SHARED_STATE_URL = os.environ.get(
+    "NUTRI_SHARED_STATE", "sqlite:///" + os.path.join("data", "shared_state.db")
+)
+
+# Duración de una sesión de login sin reconectarse (segundos); corta
+# porque el token viaja en una cookie que no puede ser HttpOnly
+SESSION_TTL = 2 * 60 * 60
+# Cookie del navegador con el token de la sesión de login
+SESSION_COOKIE = "nutri_sid"
+
+
+class MemoryBackend:
+    """Almacén clave-valor en memoria con la semántica básica de Redis."""
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        exp = self._expires.get(key)
+        if exp is not None and exp <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def get(self, key):
+        with self._lock:
+            return self._data[key] if self._alive(key) else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = value
+            if ttl is None:
+                self._expires.pop(key, None)
+            else:
+                self._expires[key] = time.time() + ttl
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._data[key]) + 1 if self._alive(key) else 1
+            self._data[key] = value
+            return value
+
+    def expire(self, key, ttl):
+        with self._lock:
+            if self._alive(key):
+                self._expires[key] = time.time() + ttl
+
+
+class SQLiteBackend:
+    """Almacén clave-valor en un archivo SQLite (WAL) compartido por procesos."""
+
+    def __init__(self, path, pool_size=4):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        # Las mismas conexiones para todas las sesiones (y reruns) del proceso
+        self.pool = ConnectionPool(path, size=pool_size)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " key TEXT PRIMARY KEY, value TEXT, expires_at REAL"
+                ") WITHOUT ROWID"
+            )
+
+    @contextmanager
+    def _conn(self):
+        """Conexión prestada del pool, dentro de una transacción."""
+        with self.pool.connection() as conn, conn:
+            yield conn
+
+    def get(self, key):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.time() + ttl
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+                "expires_at = excluded.expires_at",
+                (key, value, expires),
+            )
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, '1', NULL) "
+                "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+                (key,),
+            )
+            return int(
+                conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()[0]
+            )
+
+    def expire(self, key, ttl):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE kv SET expires_at = ? WHERE key = ?", (time.time() + ttl, key)
+            )
+
+
+class RedisBackend:
+    """Adaptador para un servidor Redis (paquete opcional `redis`)."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "Para usar redis:// instala el paquete: pip install redis"
+            ) from exc
+        self._r = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        return self._r.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._r.set(key, value, ex=None if ttl is None else int(ttl))
+
+    def delete(self, key):
+        self._r.delete(key)
+
+    def incr(self, key):
+        return int(self._r.incr(key))
+
+    def expire(self, key, ttl):
+        self._r.expire(key, int(ttl))
+
+
+def backend_from_url(url=DEFAULT_SHARED_STATE_URL):
+    """Crea el almacén compartido a partir de una URL (memory://, sqlite:///, redis://)."""
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBackend(url)
+    raise ValueError(f"URL de estado compartido no soportada: {url}")
+
+
+class SessionStore:
+    """Sesiones de login identificadas por un token opaco."""
+
+    def __init__(self, backend, ttl=SESSION_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    def create(self, username, role):
+        """Abre una sesión y devuelve su token."""
+        token = secrets.token_urlsafe(24)
+        data = json.dumps({"username": username, "role": role})
+        self.backend.set(f"session:{token}", data, ttl=self.ttl)
+        return token
+
+    def get(self, token):
+        """Datos de la sesión (y renueva su vigencia), o None si expiró."""
+        raw = self.backend.get(f"session:{token}")
+        if raw is None:
+            return None
+        self.backend.expire(f"session:{token}", self.ttl)
+        return json.loads(raw)
+
+    def delete(self, token):
+        self.backend.delete(f"session:{token}")
+
+
+class LocalVersionCache:
+    """
+    Copia local (por worker) de contadores de versión del almacén compartido.
+    Una versión leída hace menos de version_ttl segundos se usa sin consultar
+    el almacén; las escrituras propias la actualizan al momento.
+    """
+
+    def __init__(self, backend, version_ttl=1.0):
+        self.backend = backend
+        self.version_ttl = version_ttl
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, name):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(name)
+        if cached is not None and now - cached[1] < self.version_ttl:
+            return cached[0]
+        value = int(self.backend.get(f"ver:{name}") or 0)
+        with self._lock:
+            self._versions[name] = (value, now)
+        return value
+
+    def bump(self, name):
+        value = self.backend.incr(f"ver:{name}")
+        with self._lock:
+            self._versions[name] = (value, time.monotonic())
+        return value
+
+
+class PatientVersions:
+    """Versión de los datos de cada paciente, guardada en el almacén compartido."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def current(self, patient):
+        return self.cache.version(f"patient:{patient}")
+
+    def bump(self, patient):
+        return self.cache.bump(f"patient:{patient}")
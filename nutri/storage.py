@@ -0,0 +1,1028 @@
+# nutri/storage.py
+# -------------------------------------------------------------
+# Almacenamiento persistente en SQLite (modo WAL)
+# -------------------------------------------------------------
+# Guarda los registros diarios y el historial de peso de cada
+# paciente en una base local. Las conexiones se reutilizan desde
+# un pool para no abrir una por cada rerun de Streamlit.
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from nutri.compact import CompactLogs
+from nutri.events import (
+    LOG,
+    LOGS_BATCH,
+    PROFILE,
+    WEIGHT,
+    WEIGHTS_BATCH,
+    PatientState,
+    encode_log,
+    encode_logs_batch,
+    encode_profile,
+    encode_weight,
+    encode_weights_batch,
+)
+from nutri.summaries import SUMMARY_SORT_COLS
+from nutri.schema import DAILY_LOG_COLS, MEAL_COLS, WEIGHT_COLS, frame_to_masks, meals_to_mask
+from nutri.timeseries import WEIGHT_DTYPES, TimeSeries, dates_to_ordinals
+
+DEFAULT_DB_PATH = os.environ.get(
+    "NUTRI_DB_PATH", os.path.join("data", "nutricion.db")
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_logs (
+    patient     TEXT    NOT NULL,
+    date        TEXT    NOT NULL,
+    desayuno    INTEGER NOT NULL DEFAULT 0,
+    colacion1   INTEGER NOT NULL DEFAULT 0,
+    comida      INTEGER NOT NULL DEFAULT 0,
+    colacion2   INTEGER NOT NULL DEFAULT 0,
+    cena        INTEGER NOT NULL DEFAULT 0,
+    mood        TEXT,
+    comentarios TEXT,
+    PRIMARY KEY (patient, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS weights (
+    patient TEXT NOT NULL,
+    date    TEXT NOT NULL,
+    weight  REAL NOT NULL,
+    PRIMARY KEY (patient, date)
+) WITHOUT ROWID;
+
+-- Datos del paciente que se editan en el panel lateral
+CREATE TABLE IF NOT EXISTS patients (
+    patient        TEXT PRIMARY KEY,
+    clinician      TEXT,
+    initial_weight REAL,
+    goal_weight    REAL,
+    height_m       REAL
+) WITHOUT ROWID;
+
+-- Resumen materializado por paciente para el panel de la nutrióloga.
+-- Se recalcula la fila del paciente en cada escritura suya.
+CREATE TABLE IF NOT EXISTS patient_summary (
+    patient        TEXT PRIMARY KEY,
+    clinician      TEXT,
+    current_weight REAL,
+    bmi            REAL,
+    progress_pct   REAL,
+    streak         INTEGER,
+    longest_streak INTEGER,
+    adherence_7d   REAL,
+    last_log_date  TEXT,
+    summary_day    TEXT,
+    trend_kg_week  REAL,
+    goal_date      TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_summary_weight    ON patient_summary (clinician, current_weight);
+CREATE INDEX IF NOT EXISTS idx_summary_bmi       ON patient_summary (clinician, bmi);
+CREATE INDEX IF NOT EXISTS idx_summary_progress  ON patient_summary (clinician, progress_pct);
+CREATE INDEX IF NOT EXISTS idx_summary_streak    ON patient_summary (clinician, streak);
+CREATE INDEX IF NOT EXISTS idx_summary_adherence ON patient_summary (clinician, adherence_7d);
+CREATE INDEX IF NOT EXISTS idx_summary_last_log  ON patient_summary (clinician, last_log_date);
+CREATE INDEX IF NOT EXISTS idx_summary_day       ON patient_summary (clinician, summary_day);
+
+-- Planes de alimentación por paciente; cada carga es una versión nueva
+CREATE TABLE IF NOT EXISTS meal_plans (
+    patient     TEXT    NOT NULL,
+    version     INTEGER NOT NULL,
+    position    INTEGER NOT NULL,
+    dia         TEXT    NOT NULL,
+    tiempo      TEXT    NOT NULL,
+    descripcion TEXT,
+    PRIMARY KEY (patient, version, position)
+) WITHOUT ROWID;
+
+-- Agenda de citas de cada nutrióloga. Fechas y horas en texto
+-- 'AAAA-MM-DD HH:MM' (ordenable); series agrupa los seguimientos
+CREATE TABLE IF NOT EXISTS appointments (
+    id        INTEGER PRIMARY KEY,
+    clinician TEXT NOT NULL,
+    patient   TEXT NOT NULL,
+    start_at  TEXT NOT NULL,
+    end_at    TEXT NOT NULL,
+    series    INTEGER,
+    note      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_start   ON appointments (clinician, start_at);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (patient, start_at);
+CREATE INDEX IF NOT EXISTS idx_appointments_time    ON appointments (start_at);
+
+-- Versión de la agenda de cada nutrióloga (aumenta con cada cambio)
+CREATE TABLE IF NOT EXISTS agenda_versions (
+    clinician TEXT PRIMARY KEY,
+    version   INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- Recordatorios ya enviados (llave única por evento); evita repetirlos
+-- entre reinicios o si varios procesos corren el programador
+CREATE TABLE IF NOT EXISTS reminders_sent (
+    key     TEXT PRIMARY KEY,
+    sent_at TEXT NOT NULL
+) WITHOUT ROWID;
+
+-- Bitácora de cambios por paciente (solo se agregan filas). data es el
+-- evento en binario compacto (ver nutri/events.py); ts en segundos Unix
+CREATE TABLE IF NOT EXISTS events (
+    patient TEXT    NOT NULL,
+    seq     INTEGER NOT NULL,
+    ts      INTEGER NOT NULL,
+    kind    INTEGER NOT NULL,
+    data    BLOB    NOT NULL,
+    PRIMARY KEY (patient, seq)
+) WITHOUT ROWID;
+
+-- Estado completo del paciente después del evento seq (comprimido)
+CREATE TABLE IF NOT EXISTS snapshots (
+    patient TEXT    NOT NULL,
+    seq     INTEGER NOT NULL,
+    ts      INTEGER NOT NULL,
+    data    BLOB    NOT NULL,
+    PRIMARY KEY (patient, seq)
+) WITHOUT ROWID;
+
+-- Contador por paciente que aumenta con cada escritura; permite saber
+-- con una sola consulta si los datos en memoria siguen vigentes.
+CREATE TABLE IF NOT EXISTS revisions (
+    patient TEXT PRIMARY KEY,
+    rev     INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class ConnectionPool:
+    """Pool sencillo de conexiones SQLite compartidas entre hilos."""
+
+    def __init__(self, path, size=4):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión del pool y la devuelve al terminar."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Cierra las conexiones ociosas del pool."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+
+_DAILY_LOG_UPSERT = (
+    f"INSERT INTO daily_logs (patient, {', '.join(DAILY_LOG_COLS)}) "
+    f"VALUES ({', '.join('?' for _ in range(len(DAILY_LOG_COLS) + 1))}) "
+    "ON CONFLICT (patient, date) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in DAILY_LOG_COLS[1:])
+)
+
+_WEIGHT_UPSERT = (
+    "INSERT INTO weights (patient, date, weight) VALUES (?, ?, ?) "
+    "ON CONFLICT (patient, date) DO UPDATE SET weight = excluded.weight"
+)
+
+
+# Columnas agregadas después de la primera versión de cada tabla, con el
+# índice que llevan (las bases existentes se actualizan al abrirlas)
+_ADDED_COLUMNS = (
+    ("patient_summary", "trend_kg_week", "REAL", None),
+    ("patient_summary", "goal_date", "TEXT", "idx_summary_goal_date"),
+)
+
+
+def _migrate(conn):
+    """Agrega a una base existente las columnas nuevas de _ADDED_COLUMNS."""
+    for table, column, kind, index in _ADDED_COLUMNS:
+        existentes = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in existentes:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        if index:
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {index} ON {table} (clinician, {column})"
+            )
+
+
+class Storage:
+    """Acceso a las tablas de registros diarios y peso por paciente."""
+
+    def __init__(self, path=DEFAULT_DB_PATH, pool_size=4, versions=None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.pool = ConnectionPool(path, size=pool_size)
+        # Contadores de revisión externos (p. ej. PatientVersions en estado
+        # compartido); si no se indican se usa la tabla revisions
+        self.versions = versions
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            conn.commit()
+
+    # ---- Lecturas ----
+    def load_daily_logs_compact(self, patient):
+        """Registros diarios del paciente en formato compacto (CompactLogs)."""
+        with self.pool.connection() as conn:
+            return self._logs_compact(conn, patient)
+
+    @staticmethod
+    def _logs_compact(conn, patient):
+        mask_expr = " | ".join(f"({c} << {i})" for i, c in enumerate(MEAL_COLS))
+        rows = conn.execute(
+            f"SELECT date, {mask_expr}, mood, comentarios FROM daily_logs "
+            "WHERE patient = ? ORDER BY date",
+            (patient,),
+        ).fetchall()
+        if not rows:
+            return CompactLogs.empty()
+        fechas, masks, moods, comentarios = zip(*rows)
+        return CompactLogs.from_columns(
+            dates_to_ordinals(fechas), masks, moods, comentarios
+        )
+
+    def load_weight_series(self, patient):
+        """Historial de peso del paciente como serie ordenada (TimeSeries)."""
+        with self.pool.connection() as conn:
+            return self._weight_series(conn, patient)
+
+    @staticmethod
+    def _weight_series(conn, patient):
+        rows = conn.execute(
+            "SELECT date, weight FROM weights WHERE patient = ? ORDER BY date",
+            (patient,),
+        ).fetchall()
+        if not rows:
+            return TimeSeries(WEIGHT_DTYPES)
+        fechas, pesos = zip(*rows)
+        return TimeSeries.from_arrays(
+            WEIGHT_DTYPES, dates_to_ordinals(fechas), weight=pesos
+        )
+
+    def iter_history(self, table, patient, start=None, end=None, chunk_rows=10_000):
+        """
+        Filas de daily_logs o weights de un paciente en bloques de chunk_rows
+        (DataFrames con date en texto ISO). Cada bloque es una consulta por
+        llave (date > último), así que no se retiene la conexión entre bloques.
+        """
+        cols = {"daily_logs": DAILY_LOG_COLS, "weights": WEIGHT_COLS}[table]
+        select = f"SELECT {', '.join(cols)} FROM {table} WHERE patient = ? AND date <= ? "
+        hasta = _iso(end) if end is not None else "9999-12-31"
+        sql, llave = select + "AND date >= ? ORDER BY date LIMIT ?", _iso(start) if start else ""
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(sql, (patient, hasta, llave, chunk_rows)).fetchall()
+            if rows:
+                yield pd.DataFrame.from_records(rows, columns=cols)
+            if len(rows) < chunk_rows:
+                return
+            sql, llave = select + "AND date > ? ORDER BY date LIMIT ?", rows[-1][0]
+
+    def clinician_patients(self, clinician):
+        """Usuarios de los pacientes de una nutrióloga, en orden alfabético."""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT patient FROM patients WHERE clinician = ? ORDER BY patient",
+                (clinician,),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def log_patients(self):
+        """
+        Pacientes con registros diarios. Salta de un paciente al siguiente
+        por la llave primaria en lugar de recorrer todas las filas.
+        """
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "WITH RECURSIVE p(patient) AS ("
+                "  SELECT MIN(patient) FROM daily_logs"
+                "  UNION ALL"
+                "  SELECT (SELECT MIN(patient) FROM daily_logs WHERE patient > p.patient)"
+                "  FROM p WHERE p.patient IS NOT NULL"
+                ") SELECT patient FROM p WHERE patient IS NOT NULL"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def load_comments(self, patient, days=None):
+        """Comentarios no vacíos del paciente: (fecha ISO, texto); days filtra fechas ISO."""
+        sql = "SELECT date, comentarios FROM daily_logs WHERE patient = ? AND comentarios <> ''"
+        params = [patient]
+        if days is not None:
+            sql += f" AND date IN ({', '.join('?' for _ in days)})"
+            params += list(days)
+        with self.pool.connection() as conn:
+            return conn.execute(sql + " ORDER BY date", params).fetchall()
+
+    def iter_comments(self, chunk_rows=10_000):
+        """
+        Comentarios no vacíos de todos los pacientes: (paciente, fecha ISO,
+        texto), en bloques por llave como iter_history.
+        """
+        sql = (
+            "SELECT patient, date, comentarios FROM daily_logs "
+            "WHERE (patient, date) > (?, ?) AND comentarios <> '' "
+            "ORDER BY patient, date LIMIT ?"
+        )
+        llave = ("", "")
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(sql, (*llave, chunk_rows)).fetchall()
+            yield from rows
+            if len(rows) < chunk_rows:
+                return
+            llave = rows[-1][:2]
+
+    def revision(self, patient):
+        """Revisión actual de los datos del paciente (0 si nunca se escribió)."""
+        if self.versions is not None:
+            return self.versions.current(patient)
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT rev FROM revisions WHERE patient = ?", (patient,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def revisions(self, patients):
+        """Revisión actual de varios pacientes: {paciente: revisión}."""
+        if self.versions is not None:
+            return {p: self.versions.current(p) for p in patients}
+        with self.pool.connection() as conn:
+            revs = dict(conn.execute("SELECT patient, rev FROM revisions").fetchall())
+        return {p: revs.get(p, 0) for p in patients}
+
+    def _write(self, patient, work, event):
+        """
+        Ejecuta work(conn) en una transacción y avanza la revisión del
+        paciente. event = (tipo, datos) se agrega a la bitácora en la misma
+        transacción.
+        """
+        return self._write_many([(patient, work, event)])[patient]
+
+    def _write_many(self, writes, summaries=()):
+        """
+        Varias escrituras (paciente, work, event) en una sola transacción;
+        cada paciente avanza su revisión una vez. Devuelve {paciente: revisión}.
+        """
+        pacientes = list(dict.fromkeys(patient for patient, _, _ in writes))
+        with self.pool.connection() as conn:
+            with conn:
+                # BEGIN IMMEDIATE: dos escrituras del mismo paciente no toman el mismo seq
+                conn.execute("BEGIN IMMEDIATE")
+                for patient, work, event in writes:
+                    self._append_event(conn, patient, *event, work)
+                for resumen in summaries:
+                    self._upsert_summary(conn, *resumen)
+                if self.versions is None:
+                    return {p: self._bump_revision(conn, p) for p in pacientes}
+        # Versión externa: se avanza después de confirmar, para que otro
+        # worker nunca recargue datos viejos con la versión nueva
+        return {p: self.versions.bump(p) for p in pacientes}
+
+    def _bump_revision(self, conn, patient):
+        """Aumenta la revisión dentro de la transacción en curso."""
+        conn.execute(
+            "INSERT INTO revisions (patient, rev) VALUES (?, 1) "
+            "ON CONFLICT (patient) DO UPDATE SET rev = rev + 1",
+            (patient,),
+        )
+        return conn.execute(
+            "SELECT rev FROM revisions WHERE patient = ?", (patient,)
+        ).fetchone()[0]
+
+    def _append_event(self, conn, patient, kind, data, work):
+        """Siguiente evento del paciente (con instantánea base si es el primero)."""
+        seq = conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) + 1 FROM events WHERE patient = ?", (patient,)
+        ).fetchone()[0]
+        if seq == 1:
+            self._baseline_snapshot(conn, patient)
+        work(conn)
+        conn.execute(
+            "INSERT INTO events (patient, seq, ts, kind, data) VALUES (?, ?, ?, ?, ?)",
+            (patient, seq, int(time.time()), kind, data),
+        )
+
+    def _baseline_snapshot(self, conn, patient):
+        """Datos de antes de la bitácora como instantánea seq 0."""
+        state = PatientState(
+            self._logs_compact(conn, patient),
+            self._weight_series(conn, patient),
+            self._profile(conn, patient),
+        )
+        if len(state.logs) or len(state.weights) or state.profile is not None:
+            conn.execute(
+                "INSERT OR IGNORE INTO snapshots (patient, seq, ts, data) VALUES (?, 0, ?, ?)",
+                (patient, int(time.time()), state.encode()),
+            )
+
+    def has_data(self, patient):
+        """Indica si el paciente ya tiene algún registro guardado."""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT EXISTS(SELECT 1 FROM weights WHERE patient = ?)"
+                " OR EXISTS(SELECT 1 FROM daily_logs WHERE patient = ?)",
+                (patient, patient),
+            ).fetchone()
+        return bool(row[0])
+
+    # ---- Escrituras ----
+    def upsert_daily_logs(self, patient, registros):
+        """Inserta o reemplaza registros diarios; devuelve la nueva revisión."""
+        registros = list(registros)
+        rows = [
+            (
+                patient,
+                _iso(r["date"]),
+                *(int(bool(r[c])) for c in MEAL_COLS),
+                r.get("mood"),
+                r.get("comentarios"),
+            )
+            for r in registros
+        ]
+        if len(registros) == 1:
+            event = (LOG, encode_log(registros[0]))
+        else:
+            event = (LOGS_BATCH, encode_logs_batch(
+                [_ordinal(r["date"]) for r in registros],
+                [meals_to_mask(r) for r in registros],
+                [r.get("mood") for r in registros],
+                [r.get("comentarios") for r in registros],
+            ))
+        return self._write(patient, lambda conn: conn.executemany(_DAILY_LOG_UPSERT, rows), event)
+
+    def upsert_daily_logs_frame(self, patient, df, replace=False):
+        """
+        Upsert masivo de registros ya validados (importación): date en texto
+        ISO, comidas bool, mood y comentarios texto o None. Una transacción;
+        con replace=True antes se borran los registros que ya tenía.
+        """
+        meals = [df[c].to_numpy(dtype=bool).astype(int).tolist() for c in MEAL_COLS]
+        rows = zip(
+            [patient] * len(df),
+            df["date"].tolist(),
+            *meals,
+            df["mood"].tolist(),
+            df["comentarios"].tolist(),
+        )
+        event = (LOGS_BATCH, encode_logs_batch(
+            dates_to_ordinals(df["date"].tolist()), frame_to_masks(df),
+            df["mood"].tolist(), df["comentarios"].tolist(), replace,
+        ))
+
+        def work(conn):
+            if replace:
+                conn.execute("DELETE FROM daily_logs WHERE patient = ?", (patient,))
+            conn.executemany(_DAILY_LOG_UPSERT, rows)
+
+        return self._write(patient, work, event)
+
+    def upsert_daily_log(self, patient, registro):
+        """Inserta o reemplaza el registro diario de una fecha."""
+        return self.upsert_daily_logs(patient, [registro])
+
+    def upsert_weights(self, patient, pares):
+        """Inserta o reemplaza pesos (fecha, peso); devuelve la nueva revisión."""
+        pares = list(pares)
+        rows = [(patient, _iso(d), float(w)) for d, w in pares]
+        if len(rows) == 1:
+            event = (WEIGHT, encode_weight(*pares[0]))
+        else:
+            event = (WEIGHTS_BATCH, encode_weights_batch(
+                [_ordinal(d) for d, _ in pares], [r[2] for r in rows],
+            ))
+        return self._write(patient, lambda conn: conn.executemany(_WEIGHT_UPSERT, rows), event)
+
+    def upsert_weights_frame(self, patient, df, replace=False):
+        """Upsert masivo de pesos ya validados (date en texto ISO, weight float)."""
+        rows = zip([patient] * len(df), df["date"].tolist(), df["weight"].astype(float).tolist())
+        event = (WEIGHTS_BATCH, encode_weights_batch(
+            dates_to_ordinals(df["date"].tolist()), df["weight"].to_numpy(dtype=float), replace,
+        ))
+
+        def work(conn):
+            if replace:
+                conn.execute("DELETE FROM weights WHERE patient = ?", (patient,))
+            conn.executemany(_WEIGHT_UPSERT, rows)
+
+        return self._write(patient, work, event)
+
+    def upsert_weight(self, patient, day, weight):
+        """Inserta o reemplaza el peso de una fecha."""
+        return self.upsert_weights(patient, [(day, weight)])
+
+    def upsert_batch(self, registros=(), pesos=(), resumenes=()):
+        """
+        Registros (paciente, registro) y pesos (paciente, fecha, peso) de
+        varios pacientes en una transacción, con un evento por cada uno,
+        más filas de resumen (paciente, nutrióloga, resumen).
+        Devuelve {paciente: revisión} de los pacientes con registros o pesos.
+        """
+        writes = []
+        for patient, r in registros:
+            row = (
+                patient,
+                _iso(r["date"]),
+                *(int(bool(r[c])) for c in MEAL_COLS),
+                r.get("mood"),
+                r.get("comentarios"),
+            )
+            writes.append((patient, lambda conn, row=row: conn.execute(_DAILY_LOG_UPSERT, row),
+                           (LOG, encode_log(r))))
+        for patient, day, weight in pesos:
+            row = (patient, _iso(day), float(weight))
+            writes.append((patient, lambda conn, row=row: conn.execute(_WEIGHT_UPSERT, row),
+                           (WEIGHT, encode_weight(day, weight))))
+        if not writes:
+            if resumenes:
+                with self.pool.connection() as conn:
+                    with conn:
+                        for resumen in resumenes:
+                            self._upsert_summary(conn, *resumen)
+            return {}
+        return self._write_many(writes, summaries=resumenes)
+
+    # ---- Perfil del paciente ----
+    def load_profile(self, patient):
+        """Perfil guardado del paciente (dict) o None si no existe."""
+        with self.pool.connection() as conn:
+            return self._profile(conn, patient)
+
+    @staticmethod
+    def _profile(conn, patient):
+        row = conn.execute(
+            "SELECT clinician, initial_weight, goal_weight, height_m "
+            "FROM patients WHERE patient = ?",
+            (patient,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("clinician", "initial_weight", "goal_weight", "height_m")
+        return dict(zip(keys, row))
+
+    def upsert_profile(self, patient, profile):
+        """
+        Guarda clínico, peso inicial, peso objetivo y altura del paciente;
+        devuelve la nueva revisión.
+        """
+        row = (
+            patient,
+            profile.get("clinician"),
+            profile["initial_weight"],
+            profile["goal_weight"],
+            profile["height_m"],
+        )
+        return self._write(
+            patient,
+            lambda conn: conn.execute(
+                "INSERT INTO patients (patient, clinician, initial_weight, goal_weight, height_m) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (patient) DO UPDATE SET "
+                "clinician = excluded.clinician, initial_weight = excluded.initial_weight, "
+                "goal_weight = excluded.goal_weight, height_m = excluded.height_m",
+                row,
+            ),
+            (PROFILE, encode_profile(profile)),
+        )
+
+    # ---- Bitácora de cambios ----
+    def load_events(self, patient, after, upto=None, limit=None):
+        """Eventos (seq, ts, kind, data) del paciente con seq > after, en orden."""
+        sql = "SELECT seq, ts, kind, data FROM events WHERE patient = ? AND seq > ?"
+        params = [patient, after]
+        if upto is not None:
+            sql += " AND seq <= ?"
+            params.append(upto)
+        sql += " ORDER BY seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def recent_events(self, patient, limit, before=None):
+        """Últimos eventos del paciente (más nuevo primero), antes de before."""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT seq, ts, kind, data FROM events WHERE patient = ? AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (patient, before if before is not None else 2**62, limit),
+            ).fetchall()
+
+    def last_event(self, patient):
+        """seq del último evento del paciente (0 si no tiene)."""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM events WHERE patient = ?", (patient,)
+            ).fetchone()[0]
+
+    def load_snapshot(self, patient, upto=None):
+        """Instantánea más reciente (seq, data) con seq <= upto, o None."""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT seq, data FROM snapshots WHERE patient = ? AND seq <= ? "
+                "ORDER BY seq DESC LIMIT 1",
+                (patient, upto if upto is not None else 2**62),
+            ).fetchone()
+
+    def snapshot_seq(self, patient):
+        """seq de la instantánea más reciente del paciente (-1 si no tiene)."""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM snapshots WHERE patient = ?", (patient,)
+            ).fetchone()[0]
+
+    def save_snapshot(self, patient, seq, data):
+        """Guarda una instantánea (si ya existe la de ese seq no hace nada)."""
+        with self.pool.connection() as conn:
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO snapshots (patient, seq, ts, data) VALUES (?, ?, ?, ?)",
+                    (patient, seq, int(time.time()), data),
+                )
+
+    # ---- Planes de alimentación ----
+    def current_plan_version(self, patient):
+        """Versión vigente del plan del paciente (0 = plan base de ejemplo)."""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT MAX(version) FROM meal_plans WHERE patient = ?", (patient,)
+            ).fetchone()
+        return row[0] or 0
+
+    def plan_versions(self):
+        """Versión vigente del plan de cada paciente con plan propio."""
+        with self.pool.connection() as conn:
+            return dict(conn.execute(
+                "SELECT patient, MAX(version) FROM meal_plans GROUP BY patient"
+            ).fetchall())
+
+    def load_plan(self, patient, version):
+        """Comidas de una versión del plan, en el orden en que se cargaron."""
+        with self.pool.connection() as conn:
+            return pd.read_sql_query(
+                'SELECT dia AS "Día", tiempo AS "Tiempo de comida", '
+                'descripcion AS "Descripción" FROM meal_plans '
+                "WHERE patient = ? AND version = ? ORDER BY position",
+                conn,
+                params=(patient, version),
+            )
+
+    def save_plan(self, patient, plan_df):
+        """Guarda un plan como versión nueva; devuelve el número de versión."""
+        with self.pool.connection() as conn:
+            with conn:
+                # Reserva la escritura antes de leer la versión para no duplicarla
+                conn.execute("BEGIN IMMEDIATE")
+                version = conn.execute(
+                    "SELECT COALESCE(MAX(version), 0) + 1 FROM meal_plans WHERE patient = ?",
+                    (patient,),
+                ).fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO meal_plans (patient, version, position, dia, tiempo, descripcion) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (patient, version, i, dia, tiempo, descripcion)
+                        for i, (dia, tiempo, descripcion) in enumerate(
+                            plan_df[["Día", "Tiempo de comida", "Descripción"]].itertuples(index=False)
+                        )
+                    ],
+                )
+        return version
+
+    # ---- Agenda de citas ----
+    _APPOINTMENT_COLS = "id, clinician, patient, start_at, end_at, series, note"
+
+    def agenda_version(self, clinician):
+        """Versión de la agenda de una nutrióloga (0 si nunca se escribió)."""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT version FROM agenda_versions WHERE clinician = ?", (clinician,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def load_appointments(self, clinician):
+        """Citas de una nutrióloga ordenadas por inicio, con la versión de su agenda."""
+        with self.pool.connection() as conn:
+            with conn:
+                # Lectura consistente de las citas y la versión
+                conn.execute("BEGIN")
+                rows = conn.execute(
+                    f"SELECT {self._APPOINTMENT_COLS} FROM appointments "
+                    "WHERE clinician = ? ORDER BY start_at",
+                    (clinician,),
+                ).fetchall()
+                version = conn.execute(
+                    "SELECT version FROM agenda_versions WHERE clinician = ?", (clinician,)
+                ).fetchone()
+        return rows, version[0] if version else 0
+
+    @staticmethod
+    def _agenda_conflicts(conn, clinician, start, end):
+        # Citas que empiezan dentro de [start, end) más la última que empieza
+        # antes (la única que puede seguir en curso): dos rangos del índice
+        rows = conn.execute(
+            "SELECT id FROM appointments WHERE clinician = ? AND start_at >= ? AND start_at < ?",
+            (clinician, start, end),
+        ).fetchall()
+        anterior = conn.execute(
+            "SELECT id, end_at FROM appointments WHERE clinician = ? AND start_at < ? "
+            "ORDER BY start_at DESC LIMIT 1",
+            (clinician, start),
+        ).fetchone()
+        if anterior is not None and anterior[1] > start:
+            rows.insert(0, anterior)
+        return [r[0] for r in rows]
+
+    @staticmethod
+    def _bump_agenda(conn, clinician):
+        conn.execute(
+            "INSERT INTO agenda_versions (clinician, version) VALUES (?, 1) "
+            "ON CONFLICT (clinician) DO UPDATE SET version = version + 1",
+            (clinician,),
+        )
+        return conn.execute(
+            "SELECT version FROM agenda_versions WHERE clinician = ?", (clinician,)
+        ).fetchone()[0]
+
+    def insert_appointment(self, clinician, patient, start, end, series=None, note=None,
+                           new_series=False):
+        """
+        Agrega una cita si el horario [start, end) está libre (textos
+        'AAAA-MM-DD HH:MM'). Devuelve (fila de la cita, versión de la
+        agenda) o (None, ids de las citas con que choca). Con new_series la
+        cita abre una serie con su propio id.
+        """
+        with self.pool.connection() as conn:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conflictos = self._agenda_conflicts(conn, clinician, start, end)
+                if conflictos:
+                    return None, conflictos
+                cur = conn.execute(
+                    "INSERT INTO appointments (clinician, patient, start_at, end_at, series, note) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (clinician, patient, start, end, series, note),
+                )
+                if new_series:
+                    series = cur.lastrowid
+                    conn.execute("UPDATE appointments SET series = ? WHERE id = ?", (series, series))
+                version = self._bump_agenda(conn, clinician)
+        return (cur.lastrowid, clinician, patient, start, end, series, note), version
+
+    def delete_appointments(self, clinician, ids):
+        """Cancela citas de una nutrióloga; devuelve la nueva versión de su agenda."""
+        with self.pool.connection() as conn:
+            with conn:
+                conn.executemany(
+                    "DELETE FROM appointments WHERE id = ? AND clinician = ?",
+                    [(i, clinician) for i in ids],
+                )
+                return self._bump_agenda(conn, clinician)
+
+    def agenda_changes(self):
+        """Suma de las versiones de todas las agendas: cambia con cualquier alta o baja."""
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COALESCE(SUM(version), 0) FROM agenda_versions").fetchone()[0]
+
+    def appointments_between(self, start, end):
+        """Citas de todas las nutriólogas que empiezan en [start, end), por inicio."""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                f"SELECT {self._APPOINTMENT_COLS} FROM appointments "
+                "WHERE start_at >= ? AND start_at < ? ORDER BY start_at",
+                (start, end),
+            ).fetchall()
+
+    def appointment_starts(self, ids):
+        """Inicio actual de las citas indicadas: {id: start_at} (las canceladas no están)."""
+        ids = list(ids)
+        starts = {}
+        with self.pool.connection() as conn:
+            for i in range(0, len(ids), 500):
+                lote = ids[i:i + 500]
+                starts.update(conn.execute(
+                    f"SELECT id, start_at FROM appointments WHERE id IN ({', '.join('?' * len(lote))})",
+                    lote,
+                ).fetchall())
+        return starts
+
+    # ---- Recordatorios ----
+    def patients_without_log(self, day):
+        """Pacientes con perfil que no tienen registro diario en day: (paciente, nutrióloga)."""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT p.patient, p.clinician FROM patients p WHERE NOT EXISTS ("
+                "  SELECT 1 FROM daily_logs d WHERE d.patient = p.patient AND d.date = ?"
+                ") ORDER BY p.patient",
+                (_iso(day),),
+            ).fetchall()
+
+    def broken_streaks(self, day, min_streak):
+        """
+        Pacientes cuya racha de al menos min_streak días se cortó el día
+        anterior a day: cumplieron todo antier y ayer no. (paciente, racha).
+        """
+        def completo(alias):
+            return " + ".join(f"{alias}.{c}" for c in MEAL_COLS) + f" = {len(MEAL_COLS)}"
+
+        ayer = date.fromisoformat(_iso(day)).toordinal() - 1
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT s.patient, s.streak FROM patient_summary s "
+                "JOIN daily_logs d ON d.patient = s.patient AND d.date = ? "
+                f"WHERE s.streak >= ? AND {completo('d')} AND NOT EXISTS ("
+                "  SELECT 1 FROM daily_logs y WHERE y.patient = s.patient AND y.date = ? "
+                f"  AND {completo('y')}"
+                ") ORDER BY s.patient",
+                (date.fromordinal(ayer - 1).isoformat(), min_streak, date.fromordinal(ayer).isoformat()),
+            ).fetchall()
+
+    def claim_reminders(self, keys, now):
+        """
+        Marca como enviados los recordatorios que nadie había enviado y los
+        devuelve; los demás ya salieron (otro proceso o antes de reiniciar).
+        """
+        nuevas = []
+        with self.pool.connection() as conn:
+            with conn:
+                for key in keys:
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO reminders_sent (key, sent_at) VALUES (?, ?)",
+                        (key, now),
+                    )
+                    if cur.rowcount:
+                        nuevas.append(key)
+        return nuevas
+
+    def release_reminders(self, keys):
+        """Olvida recordatorios marcados cuyo envío falló, para reintentarlos."""
+        with self.pool.connection() as conn:
+            with conn:
+                conn.executemany("DELETE FROM reminders_sent WHERE key = ?", [(k,) for k in keys])
+
+    def prune_reminders(self, before):
+        """Borra las marcas de envío anteriores a before (texto ordenable)."""
+        with self.pool.connection() as conn:
+            with conn:
+                return conn.execute(
+                    "DELETE FROM reminders_sent WHERE sent_at < ?", (before,)
+                ).rowcount
+
+    # ---- Resúmenes materializados ----
+    _SUMMARY_COLS = (
+        "current_weight", "bmi", "progress_pct", "streak", "longest_streak",
+        "adherence_7d", "last_log_date", "summary_day", "trend_kg_week", "goal_date",
+    )
+    _SUMMARY_DATES = ("last_log_date", "summary_day", "goal_date")
+
+    def upsert_summary(self, patient, clinician, summary):
+        """Reemplaza la fila de resumen de un paciente."""
+        with self.pool.connection() as conn:
+            with conn:
+                self._upsert_summary(conn, patient, clinician, summary)
+
+    def _upsert_summary(self, conn, patient, clinician, summary):
+        cols = self._SUMMARY_COLS
+        values = [
+            _iso(summary.get(c)) if c in self._SUMMARY_DATES and summary.get(c) else summary.get(c)
+            for c in cols
+        ]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in ("clinician",) + cols)
+        conn.execute(
+            f"INSERT INTO patient_summary (patient, clinician, {', '.join(cols)}) "
+            f"VALUES ({', '.join('?' * (len(cols) + 2))}) "
+            f"ON CONFLICT (patient) DO UPDATE SET {updates}",
+            (patient, clinician, *values),
+        )
+
+    def _summary_filter(self, clinician, search):
+        sql = "WHERE clinician = ?"
+        params = [clinician]
+        if search:
+            sql += " AND patient LIKE ? ESCAPE '\\'"
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(escaped + "%")
+        return sql, params
+
+    def count_summaries(self, clinician, search=""):
+        """Número de pacientes de la nutrióloga que cumplen el filtro."""
+        where, params = self._summary_filter(clinician, search)
+        with self.pool.connection() as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM patient_summary {where}", params
+            ).fetchone()[0]
+
+    def query_summaries(self, clinician, sort="patient", descending=False,
+                        search="", limit=25, offset=0):
+        """Una página de resúmenes, ordenada por una columna indexada."""
+        if sort not in SUMMARY_SORT_COLS.values():
+            raise ValueError(f"Columna de orden no válida: {sort}")
+        where, params = self._summary_filter(clinician, search)
+        direction = "DESC" if descending else "ASC"
+        with self.pool.connection() as conn:
+            return pd.read_sql_query(
+                f"SELECT patient, {', '.join(self._SUMMARY_COLS)} FROM patient_summary "
+                f"{where} ORDER BY {sort} {direction}, patient LIMIT ? OFFSET ?",
+                conn,
+                params=(*params, limit, offset),
+            )
+
+    def load_clinician_weights(self, clinician):
+        """
+        Pesos de todos los pacientes (con perfil) de una nutrióloga, para el
+        modo por lotes de la tendencia: lista de (paciente, meta, peso
+        inicial, ordinales, pesos), con las fechas en orden.
+        """
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT w.patient, w.date, w.weight, p.goal_weight, p.initial_weight "
+                "FROM weights w JOIN patients p ON p.patient = w.patient "
+                "WHERE p.clinician = ? ORDER BY w.patient, w.date",
+                (clinician,),
+            ).fetchall()
+        if not rows:
+            return []
+        patients, fechas, pesos, metas, iniciales = zip(*rows)
+        patients = np.asarray(patients, dtype=object)
+        days = dates_to_ordinals(fechas)
+        pesos = np.asarray(pesos, dtype=np.float64)
+        cortes = np.flatnonzero(patients[1:] != patients[:-1]) + 1
+        inicios = np.concatenate(([0], cortes))
+        fines = np.concatenate((cortes, [len(rows)]))
+        return [
+            (patients[i], metas[i], iniciales[i], days[i:j], pesos[i:j])
+            for i, j in zip(inicios, fines)
+        ]
+
+    def update_trends(self, rows):
+        """Actualiza ritmo y fecha meta de varios resúmenes: (paciente, kg/sem, fecha)."""
+        with self.pool.connection() as conn:
+            with conn:
+                conn.executemany(
+                    "UPDATE patient_summary SET trend_kg_week = ?, goal_date = ? WHERE patient = ?",
+                    [(kg, _iso(d) if d else None, patient) for patient, kg, d in rows],
+                )
+
+    def refresh_stale_summaries(self, clinician, today):
+        """
+        Recalcula la adherencia de 7 días de las filas calculadas antes de hoy
+        (pacientes que no han escrito nada hoy). Devuelve cuántas se tocaron.
+        """
+        desde = date.fromordinal(today.toordinal() - 6).isoformat()
+        hoy = today.isoformat()
+        meals = " + ".join(MEAL_COLS)
+        with self.pool.connection() as conn:
+            with conn:
+                cur = conn.execute(
+                    f"UPDATE patient_summary SET adherence_7d = ("
+                    f"  SELECT AVG(({meals}) / {float(len(MEAL_COLS))}) FROM daily_logs d"
+                    f"  WHERE d.patient = patient_summary.patient AND d.date BETWEEN ? AND ?"
+                    f"), summary_day = ? WHERE clinician = ? AND summary_day < ?",
+                    (desde, hoy, hoy, clinician, hoy),
+                )
+                return cur.rowcount
+
+
+def _iso(value):
+    """Fecha en formato ISO para guardarla como texto ordenable."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return pd.Timestamp(value).date().isoformat()
+
+
+def _ordinal(value):
+    """Fecha como ordinal (días desde el 1 de enero del año 1)."""
+    return date.fromisoformat(_iso(value)).toordinal()
@@ -0,0 +1,131 @@
+# nutri/streaks.py
+# -------------------------------------------------------------
+# Rachas de días cumpliendo todos los tiempos de comida
+# -------------------------------------------------------------
+# La racha actual es la corrida de días consecutivos cumplidos que
+# termina en el último día cumplido registrado (la definición que usaba
+# la app desde el inicio). En lugar de reordenar todo el
+# historial en cada rerun, se guardan las corridas como intervalos
+# y cada registro nuevo o editado solo toca sus vecinos.
+
+from bisect import bisect_right, insort
+from collections import Counter
+from datetime import date
+
+import numpy as np
+
+from nutri.schema import FULL_MASK, frame_to_masks
+
+
+def _ordinal(day):
+    return day.toordinal() if isinstance(day, date) else int(day)
+
+
+class StreakTracker:
+    """Racha actual y racha más larga, actualizadas día por día."""
+
+    def __init__(self):
+        self._complete = set()   # días (ordinales) con todos los tiempos cumplidos
+        self._starts = []        # inicios de corrida, ordenados
+        self._end_of = {}        # inicio -> fin de la corrida
+        self._start_of = {}      # fin -> inicio de la corrida
+        self._lengths = Counter()
+        self._longest = 0
+
+    @classmethod
+    def from_arrays(cls, days, masks):
+        """Construye el estado desde ordinales de fecha y máscaras de tiempos."""
+        tracker = cls()
+        days = np.asarray(days)
+        for d in days[np.asarray(masks) == FULL_MASK]:
+            tracker.update(int(d), True)
+        return tracker
+
+    @classmethod
+    def from_frame(cls, df):
+        """Construye el estado a partir de un DataFrame de registros diarios."""
+        if df.empty:
+            return cls()
+        days = [d.toordinal() for d in df["date"]]
+        return cls.from_arrays(days, frame_to_masks(df))
+
+    @classmethod
+    def from_compact(cls, logs):
+        """Construye el estado a partir de registros compactos (CompactLogs)."""
+        return cls.from_arrays(logs.days, logs.masks)
+
+    # ---- Consultas ----
+    @property
+    def current(self):
+        """Días de la corrida que termina en el último día cumplido."""
+        if not self._starts:
+            return 0
+        s = self._starts[-1]
+        return self._end_of[s] - s + 1
+
+    @property
+    def longest(self):
+        """Corrida más larga de todo el historial."""
+        return self._longest
+
+    # ---- Actualización ----
+    def update(self, day, complete):
+        """Marca un día como cumplido o no; devuelve True si algo cambió."""
+        d = _ordinal(day)
+        if complete and d not in self._complete:
+            self._complete.add(d)
+            self._join(d)
+            return True
+        if not complete and d in self._complete:
+            self._complete.discard(d)
+            self._split(d)
+            return True
+        return False
+
+    def _add_run(self, s, e):
+        self._end_of[s] = e
+        self._start_of[e] = s
+        self._lengths[e - s + 1] += 1
+        self._longest = max(self._longest, e - s + 1)
+
+    def _drop_run(self, s):
+        e = self._end_of.pop(s)
+        del self._start_of[e]
+        n = e - s + 1
+        self._lengths[n] -= 1
+        if not self._lengths[n]:
+            del self._lengths[n]
+            if n == self._longest:
+                self._longest = max(self._lengths, default=0)
+
+    def _join(self, d):
+        s, e = d, d
+        left = self._start_of.get(d - 1)
+        if left is not None:
+            self._drop_run(left)
+            s = left
+        if d + 1 in self._end_of:
+            e = self._end_of[d + 1]
+            self._drop_run(d + 1)
+            self._starts.pop(bisect_right(self._starts, d + 1) - 1)
+        if left is None:
+            # Caso común (registrar hoy): inserción al final de la lista
+            if not self._starts or self._starts[-1] < s:
+                self._starts.append(s)
+            else:
+                insort(self._starts, s)
+        self._add_run(s, e)
+
+    def _split(self, d):
+        idx = bisect_right(self._starts, d) - 1
+        s = self._starts[idx]
+        e = self._end_of[s]
+        self._drop_run(s)
+        if s < d:
+            self._add_run(s, d - 1)
+        else:
+            self._starts.pop(idx)
+        if d < e:
+            insort(self._starts, d + 1)
+            self._add_run(d + 1, e)
+
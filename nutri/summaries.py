@@ -0,0 +1,79 @@
+# nutri/summaries.py
+# -------------------------------------------------------------
+# Métricas del paciente y filas de resumen para la nutrióloga
+# -------------------------------------------------------------
+# Las mismas métricas que muestran el dashboard y la sección de
+# progreso (IMC, % hacia la meta, racha, adherencia de 7 días) se
+# guardan ya calculadas en la tabla patient_summary. Cada escritura
+# del paciente vuelve a calcular solo su fila a partir de las
+# estructuras en memoria, así el panel no recalcula nada al abrirse.
+# El ritmo y la fecha meta estimada vienen del modelo de tendencia
+# (nutri/trend.py).
+
+from datetime import date
+
+# Columnas de patient_summary que se pueden ordenar en el panel
+SUMMARY_SORT_COLS = {
+    "Paciente": "patient",
+    "Peso actual": "current_weight",
+    "IMC": "bmi",
+    "% hacia la meta": "progress_pct",
+    "Racha": "streak",
+    "Adherencia 7 días": "adherence_7d",
+    "Último registro": "last_log_date",
+    "Ritmo (kg/semana)": "trend_kg_week",
+    "Fecha meta estimada": "goal_date",
+}
+
+
+def calculate_bmi(weight, height_m):
+    """IMC estimado, o None si no hay altura."""
+    if not weight or not height_m or height_m <= 0:
+        return None
+    return weight / (height_m ** 2)
+
+
+def calculate_progress(initial, current, goal):
+    """Progreso hacia la meta entre 0 y 1 (sirve para bajar o subir de peso)."""
+    if current is None or initial == goal:
+        return 0.0
+    if initial > goal:  # meta bajar de peso
+        progress = (initial - current) / (initial - goal)
+    else:               # meta subir de peso
+        progress = (current - initial) / (goal - initial)
+    return max(0.0, min(progress, 1.0))
+
+
+def trend_columns(forecast):
+    """Ritmo (kg/semana) y fecha meta estimada a partir de WeightTrend.forecast."""
+    if forecast is None:
+        return {"trend_kg_week": None, "goal_date": None}
+    return {"trend_kg_week": forecast["kg_per_week"], "goal_date": forecast["goal_date"]}
+
+
+def compute_summary(profile, current_weight, streaks, adherence, last_log, today=None, trend=None):
+    """
+    Fila de resumen de un paciente.
+    profile: dict con initial_weight, goal_weight y height_m.
+    streaks / adherence: StreakTracker y AdherenceIndex del paciente.
+    trend: WeightTrend del paciente (opcional).
+    """
+    today = today or date.today()
+    forecast = None
+    if trend is not None:
+        forecast = trend.forecast(profile["goal_weight"], profile["initial_weight"])
+    adherencia, _ = adherence.last_days(7, today)
+    bmi = calculate_bmi(current_weight, profile["height_m"])
+    return {
+        "current_weight": current_weight,
+        "bmi": bmi,
+        "progress_pct": calculate_progress(
+            profile["initial_weight"], current_weight, profile["goal_weight"]
+        ),
+        "streak": streaks.current,
+        "longest_streak": streaks.longest,
+        "adherence_7d": adherencia,
+        "last_log_date": last_log,
+        "summary_day": today,
+        **trend_columns(forecast),
+    }
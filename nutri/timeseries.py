@@ -0,0 +1,150 @@
+# nutri/timeseries.py
+# -------------------------------------------------------------
+# Serie de tiempo ordenada por fecha con upserts por bisección
+# -------------------------------------------------------------
+# Contenedor común para el historial de peso y los registros
+# diarios. Las fechas se guardan como ordinales int32 ordenados y
+# cada columna es un arreglo numpy con capacidad extra, así que:
+#   - buscar o reemplazar un día cuesta O(log n),
+#   - agregar el día de hoy (el caso común) no mueve nada,
+#   - las vistas para gráficas son rebanadas sin copia.
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Diferencia entre el ordinal de Python y los días desde 1970 de numpy
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Columnas del historial de peso
+WEIGHT_DTYPES = {"weight": np.float64}
+
+
+def _ordinal(day):
+    return day.toordinal() if isinstance(day, date) else int(day)
+
+
+def ordinals_to_dates(days):
+    """Ordinales (int) a objetos date, de forma vectorizada."""
+    as_np = np.asarray(days, dtype=np.int64) - EPOCH_ORDINAL
+    return as_np.astype("datetime64[D]").astype(object)
+
+
+def dates_to_ordinals(values):
+    """Fechas (date, texto ISO o datetime64) a ordinales int32."""
+    as_np = np.asarray(values, dtype="datetime64[D]").astype(np.int64)
+    return (as_np + EPOCH_ORDINAL).astype(np.int32)
+
+
+class TimeSeries:
+    """Columnas numpy indexadas por fecha (una fila por día)."""
+
+    def __init__(self, dtypes, capacity=64):
+        self.dtypes = dict(dtypes)
+        self._keys = np.zeros(capacity, dtype=np.int32)
+        self._cols = {name: np.zeros(capacity, dtype=dt) for name, dt in self.dtypes.items()}
+        self._n = 0
+        # Aumenta con cada escritura que cambia algún valor
+        self.version = 0
+
+    @classmethod
+    def from_arrays(cls, dtypes, days, **columns):
+        """Construye la serie desde arreglos paralelos (se ordenan por fecha)."""
+        days = np.asarray(days, dtype=np.int32)
+        series = cls(dtypes, capacity=max(64, len(days)))
+        order = np.argsort(days, kind="stable")
+        n = len(days)
+        series._keys[:n] = days[order]
+        for name in series.dtypes:
+            series._cols[name][:n] = np.asarray(columns[name])[order]
+        series._n = n
+        return series
+
+    def __len__(self):
+        return self._n
+
+    # ---- Lectura ----
+    @property
+    def days(self):
+        """Ordinales de fecha en orden (vista de solo lectura, sin copia)."""
+        return self._readonly(self._keys[:self._n])
+
+    def column(self, name):
+        """Valores de una columna en orden de fecha (vista sin copia)."""
+        return self._readonly(self._cols[name][:self._n])
+
+    @staticmethod
+    def _readonly(view):
+        view.flags.writeable = False
+        return view
+
+    def find(self, day):
+        """Posición de un día en la serie, o -1 si no existe."""
+        d = _ordinal(day)
+        i = int(np.searchsorted(self._keys[:self._n], d))
+        if i < self._n and self._keys[i] == d:
+            return i
+        return -1
+
+    def get(self, day, name):
+        """Valor de una columna en un día, o None si el día no existe."""
+        i = self.find(day)
+        return None if i < 0 else self._cols[name][i]
+
+    def span(self, start=None, end=None):
+        """Posiciones [i, j) de los días entre start y end (incluidos)."""
+        keys = self._keys[:self._n]
+        i = 0 if start is None else int(np.searchsorted(keys, _ordinal(start), "left"))
+        j = self._n if end is None else int(np.searchsorted(keys, _ordinal(end), "right"))
+        return i, j
+
+    def to_frame(self, start=None, end=None):
+        """DataFrame (date + columnas) solo para el rango pedido."""
+        i, j = self.span(start, end)
+        data = {"date": ordinals_to_dates(self._keys[i:j])}
+        for name, col in self._cols.items():
+            data[name] = col[i:j]
+        return pd.DataFrame(data)
+
+    def last(self, name):
+        """Valor más reciente de una columna, o None si la serie está vacía."""
+        return self._cols[name][self._n - 1] if self._n else None
+
+    # ---- Escritura ----
+    def _grow(self):
+        cap = max(64, len(self._keys) * 2)
+        self._keys = np.resize(self._keys, cap)
+        for name in self._cols:
+            self._cols[name] = np.resize(self._cols[name], cap)
+
+    def upsert(self, day, **values):
+        """
+        Inserta o reemplaza los valores de un día.
+        Devuelve False (sin tocar nada) si los valores ya eran iguales.
+        """
+        d = _ordinal(day)
+        n = self._n
+        i = int(np.searchsorted(self._keys[:n], d))
+
+        if i < n and self._keys[i] == d:
+            if all(self._cols[k][i] == v for k, v in values.items()):
+                return False
+            for k, v in values.items():
+                self._cols[k][i] = v
+            self.version += 1
+            return True
+
+        if n == len(self._keys):
+            self._grow()
+        if i < n:
+            # Fecha anterior a la última: se recorre la cola un lugar
+            self._keys[i + 1:n + 1] = self._keys[i:n]
+            for col in self._cols.values():
+                col[i + 1:n + 1] = col[i:n]
+        self._keys[i] = d
+        for name, col in self._cols.items():
+            col[i] = values.get(name, None if col.dtype == object else 0)
+        self._n = n + 1
+        self.version += 1
+        return True
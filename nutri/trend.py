@@ -0,0 +1,358 @@
+# nutri/trend.py
+# -------------------------------------------------------------
+# Tendencia de peso y fecha estimada para llegar a la meta
+# -------------------------------------------------------------
+# El modelo se actualiza con cada pesaje sin volver a recorrer el
+# historial. Su estado son unas cuantas sumas:
+#   - suavizado exponencial (EWMA) del peso, con constante de tiempo
+#     en días para que pesajes irregulares cuenten lo justo;
+#   - regresión lineal ponderada con olvido exponencial (las sumas
+#     de t, w, t², t·w y w² se multiplican por 2^(-Δt/vida media));
+#     el origen de t se mueve siempre al último pesaje para que las
+#     sumas no pierdan precisión;
+#   - robustez tipo Huber: un pesaje que se aleja más de HUBER_K
+#     desviaciones de la recta se recorta a ese límite antes de
+#     sumarse (una báscula distinta o un día atípico no tuerce la
+#     tendencia).
+# Con la recta y su varianza se calculan bandas de confianza (95%) y
+# el día en que la tendencia (y sus bandas) cruzan el peso objetivo.
+#
+# La misma función de paso sirve para un paciente (números de Python)
+# y para muchos a la vez (arreglos numpy, una posición por paciente),
+# que es el modo por lotes del panel de la nutrióloga.
+
+from datetime import date, timedelta
+
+import numpy as np
+
+# Vida media (días) de una medición en la regresión
+HALF_LIFE_DAYS = 60.0
+
+# Constante de tiempo (días) del suavizado exponencial
+EWMA_DAYS = 7.0
+
+# Recorte de residuos (en desviaciones estándar)
+HUBER_K = 2.5
+
+# Mediciones efectivas mínimas para recortar y para proyectar
+MIN_POINTS = 4.0
+
+# Cuantil normal de las bandas de 95%
+Z = 1.96
+
+# Días hacia adelante que se buscan para la fecha meta
+HORIZON_DAYS = 730
+
+# Pacientes por bloque en el modo por lotes (acota la memoria de las
+# matrices paciente × pesaje y paciente × día del horizonte)
+CHUNK_PATIENTS = 1024
+
+_EPS = 1e-9
+_FIELDS = ("count", "last_day", "ewma", "s0", "s00", "st", "sw", "stt", "stw", "sww")
+
+
+def _pick(cond, a, b):
+    return a if cond else b
+
+
+class TrendState:
+    """Sumas del modelo; cada campo es un número o un arreglo (uno por paciente)."""
+
+    __slots__ = _FIELDS
+
+    def __init__(self, n=None):
+        for name in _FIELDS:
+            setattr(self, name, 0.0 if n is None else np.zeros(n))
+
+    def copy(self):
+        other = TrendState.__new__(TrendState)
+        for name in _FIELDS:
+            value = getattr(self, name)
+            setattr(other, name, value.copy() if isinstance(value, np.ndarray) else value)
+        return other
+
+
+def _fit(s, where):
+    """Peso de la recta en el último pesaje, pendiente (kg/día), varianza y n efectivo."""
+    den = s.s0 * s.stt - s.st * s.st
+    ok = den > _EPS
+    b = where(ok, (s.s0 * s.stw - s.st * s.sw) / where(ok, den, 1.0), 0.0)
+    s0 = where(s.s0 > _EPS, s.s0, 1.0)
+    a = (s.sw - b * s.st) / s0
+    n_eff = s.s0 * s.s0 / where(s.s00 > _EPS, s.s00, 1.0)
+    sse = s.sww - a * s.sw - b * s.stw
+    sse = where(sse > 0, sse, 0.0)
+    var = where(n_eff > 2, sse / s0 * n_eff / where(n_eff > 2, n_eff - 2, 1.0), 0.0)
+    return a, b, var, n_eff
+
+
+def _step(s, day, weight, where, active=np.True_):
+    """Agrega un pesaje (día ordinal, kg) al estado s, en su lugar."""
+    first = s.count == 0
+    # Las series inactivas (modo por lotes) no se mueven: dt = 0
+    dt = where(first | ~active, 0.0, day - s.last_day)
+    # Origen de t en el día nuevo: t' = t - dt
+    s.stt = s.stt - 2 * dt * s.st + dt * dt * s.s0
+    s.stw = s.stw - dt * s.sw
+    s.st = s.st - dt * s.s0
+    decay = 2.0 ** (-dt / HALF_LIFE_DAYS)
+
+    # Recorte robusto contra la recta actual (que pasa por t = 0)
+    a, _, var, n_eff = _fit(s, where)
+    limit = HUBER_K * var ** 0.5
+    robust = (n_eff >= MIN_POINTS) & (limit > 0)
+    low, high = a - limit, a + limit
+    w = where(robust & (weight < low), low, where(robust & (weight > high), high, weight))
+
+    alpha = 1.0 - 2.718281828459045 ** (-dt / EWMA_DAYS)
+    nuevo = {
+        "count": s.count + 1,
+        "last_day": day,
+        "ewma": where(first, w, s.ewma + alpha * (w - s.ewma)),
+        "s0": s.s0 * decay + 1,
+        "s00": s.s00 * decay * decay + 1,
+        "st": s.st * decay,
+        "sw": s.sw * decay + w,
+        "stt": s.stt * decay,
+        "stw": s.stw * decay,
+        "sww": s.sww * decay + w * w,
+    }
+    for name, value in nuevo.items():
+        setattr(s, name, where(active, value, getattr(s, name)))
+
+
+def _forecast(s, goal, down, where):
+    """
+    Proyección hacia la meta (ver WeightTrend.forecast). down indica si la
+    meta es bajar de peso; para arreglos, goal y down traen un valor por
+    paciente.
+    """
+    a, b, var, n_eff = _fit(s, where)
+    s0 = where(s.s0 > _EPS, s.s0, 1.0)
+    tbar = s.st / s0
+    sxx = (s.stt - s.st * tbar) * where(s.s0 > _EPS, n_eff / s0, 0.0)
+    sxx_ok = where(sxx > _EPS, sxx, 1.0)
+    se_b = (var / sxx_ok) ** 0.5
+    reached = where(down, a <= goal, a >= goal)
+    hacia_meta = where(down, b < 0, b > 0)
+    clara = (n_eff >= MIN_POINTS) & (sxx > _EPS) & hacia_meta & (abs(b) > Z * se_b) & ~reached
+    b_ok = where(abs(b) > _EPS, b, 1.0)
+    return {
+        "trend_weight": a,
+        "ewma": s.ewma,
+        "kg_per_week": b * 7,
+        "clear": clara,
+        "reached": reached,
+        "goal_days": where(clara, (goal - a) / b_ok, np.nan),
+        "var": var,
+        "tbar": tbar,
+        "sxx": sxx_ok,
+        "n_eff": n_eff,
+        "slope": b,
+        "down": down,
+    }
+
+
+def _band(fc, t):
+    """Semiancho de la banda de 95% de la recta en t días desde el último pesaje."""
+    n_eff = np.maximum(fc["n_eff"], 1.0)
+    return Z * np.sqrt(fc["var"] * (1.0 / n_eff + (t - fc["tbar"]) ** 2 / fc["sxx"]))
+
+
+def _crossings(fc, goal, horizon):
+    """
+    Primer día (1..horizon) en que cada banda cruza la meta, o nan; un
+    valor por paciente. Solo se recorren los pacientes con tendencia clara.
+    """
+    clara = np.atleast_1d(np.asarray(fc["clear"], dtype=bool))
+    early = np.full(clara.shape, np.nan)
+    late = np.full(clara.shape, np.nan)
+    filas = np.flatnonzero(clara)
+    if not len(filas):
+        return early, late
+
+    def col(value):
+        return np.broadcast_to(np.asarray(value, dtype=float), clara.shape)[filas, None]
+
+    t = np.arange(1, horizon + 1, dtype=float)
+    ancho = _band({k: col(fc[k]) for k in ("var", "n_eff", "tbar", "sxx")}, t)
+    # Distancia a la meta en la dirección en que se avanza (positiva = ya cruzó)
+    lado = 1.0 - 2.0 * col(fc["down"])
+    distancia = lado * (col(fc["trend_weight"]) + col(fc["slope"]) * t - col(goal))
+
+    def primero(mask):
+        return np.where(mask.any(axis=-1), mask.argmax(axis=-1) + 1.0, np.nan)
+
+    # Bajando: la banda inferior llega primero y la superior al último
+    early[filas] = primero(distancia + ancho >= 0)
+    late[filas] = primero(distancia - ancho >= 0)
+    return early, late
+
+
+class WeightTrend:
+    """Tendencia de peso de un paciente, actualizada pesaje por pesaje."""
+
+    def __init__(self):
+        self.state = TrendState()
+        self._before_last = None  # estado antes del último pesaje (para corregirlo)
+
+    @classmethod
+    def from_arrays(cls, days, weights):
+        trend = cls()
+        for d, w in zip(np.asarray(days).tolist(), np.asarray(weights, dtype=float).tolist()):
+            trend.update(d, w)
+        return trend
+
+    @classmethod
+    def from_series(cls, series):
+        """Construye el modelo desde la serie de peso (TimeSeries)."""
+        return cls.from_arrays(series.days, series.column("weight"))
+
+    def __len__(self):
+        return int(self.state.count)
+
+    @property
+    def last_day(self):
+        return int(self.state.last_day) if self.state.count else None
+
+    def update(self, day, weight):
+        """
+        Agrega o corrige un pesaje. Corregir el último día deshace solo ese
+        pesaje; devuelve False si el día es anterior al último (hay que
+        reconstruir con from_series).
+        """
+        day = day.toordinal() if isinstance(day, date) else int(day)
+        last = self.last_day
+        if last is not None and day < last:
+            return False
+        if last is not None and day == last:
+            if self._before_last is None:
+                return False
+            self.state = self._before_last.copy()
+        else:
+            self._before_last = self.state.copy()
+        _step(self.state, day, float(weight), _pick)
+        return True
+
+    def forecast(self, goal, initial=None, horizon=HORIZON_DAYS):
+        """
+        Proyección hacia el peso objetivo (bajar si goal < initial; sin
+        initial, si la meta está por debajo de la tendencia):
+          trend_weight / ewma: peso de la recta y suavizado en el último pesaje
+          kg_per_week: ritmo de la tendencia
+          clear: hay tendencia significativa en dirección de la meta
+          goal_date / goal_early / goal_late: fecha estimada y rango de 95%
+          reached: la tendencia ya está en la meta o la pasó
+        """
+        if not self.state.count:
+            return None
+        a = _fit(self.state, _pick)[0]
+        down = goal < (a if initial is None else initial)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fc = _forecast(self.state, float(goal), down, _pick)
+            early, late = _crossings(fc, goal, horizon)
+        early, late = early[0], late[0]
+        base = date.fromordinal(self.last_day)
+
+        def fecha(t):
+            t = float(t)
+            return None if np.isnan(t) or t > horizon else base + timedelta(days=round(t))
+
+        return {
+            "trend_weight": float(fc["trend_weight"]),
+            "ewma": float(fc["ewma"]),
+            "kg_per_week": float(fc["kg_per_week"]),
+            "clear": bool(fc["clear"]),
+            "reached": bool(fc["reached"]),
+            "goal_date": fecha(fc["goal_days"]),
+            "goal_early": fecha(early),
+            "goal_late": fecha(late),
+        }
+
+    def projection(self, days_ahead):
+        """Recta y banda de 95% para 0..days_ahead días después del último pesaje."""
+        t = np.arange(days_ahead + 1, dtype=float)
+        fc = _forecast(self.state, 0.0, True, _pick)
+        centro = fc["trend_weight"] + fc["slope"] * t
+        ancho = _band(fc, t)
+        return t.astype(int) + self.last_day, centro, centro - ancho, centro + ancho
+
+
+def forecast_batch(days_by_patient, weights_by_patient, goals, initials, horizon=HORIZON_DAYS,
+                   chunk=CHUNK_PATIENTS):
+    """
+    Modo por lotes: el mismo modelo para muchos pacientes a la vez. Avanza
+    pesaje por pesaje con arreglos de un elemento por paciente (las series
+    más cortas se quedan quietas cuando se acaban), de chunk pacientes a la
+    vez. Devuelve un dict de arreglos: trend_weight, kg_per_week, clear,
+    reached, goal_days, goal_early_days y goal_late_days (días desde el
+    último pesaje de cada paciente) y last_day.
+    """
+    goals = np.asarray(goals, dtype=float)
+    initials = np.asarray(initials, dtype=float)
+    # Bloques de series de largo parecido: cada uno avanza solo hasta su serie más larga
+    orden = np.argsort([len(d) for d in days_by_patient], kind="stable")
+    partes = [
+        _forecast_chunk(
+            [days_by_patient[i] for i in bloque], [weights_by_patient[i] for i in bloque],
+            goals[bloque], initials[bloque], horizon,
+        )
+        for bloque in (orden[i:i + chunk] for i in range(0, len(orden), chunk))
+    ] or [_forecast_chunk([], [], goals, initials, horizon)]
+    resultado = {}
+    for k in partes[0]:
+        valores = np.concatenate([p[k] for p in partes])
+        resultado[k] = np.empty_like(valores)
+        resultado[k][orden] = valores
+    return resultado
+
+
+def _forecast_chunk(days_by_patient, weights_by_patient, goals, initials, horizon):
+    n = len(days_by_patient)
+    lengths = np.array([len(d) for d in days_by_patient], dtype=np.int64)
+    largo = int(lengths.max()) if n else 0
+    days = np.zeros((n, largo))
+    weights = np.zeros((n, largo))
+    for i, (d, w) in enumerate(zip(days_by_patient, weights_by_patient)):
+        days[i, :len(d)] = d
+        weights[i, :len(w)] = w
+
+    state = TrendState(n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for k in range(largo):
+            _step(state, days[:, k], weights[:, k], np.where, active=k < lengths)
+        fc = _forecast(state, goals, goals < initials, np.where)
+        fc["clear"] = fc["clear"] & (lengths > 0)
+        early, late = _crossings(fc, goals, horizon)
+    return {
+        "trend_weight": fc["trend_weight"],
+        "kg_per_week": fc["kg_per_week"],
+        "clear": fc["clear"],
+        "reached": fc["reached"] & (lengths > 0),
+        "goal_days": fc["goal_days"],
+        "goal_early_days": early,
+        "goal_late_days": late,
+        "last_day": state.last_day.astype(np.int64),
+    }
+
+
+def refresh_clinician_trends(storage, clinician, horizon=HORIZON_DAYS):
+    """
+    Recalcula con forecast_batch el ritmo y la fecha meta de todos los
+    pacientes de una nutrióloga (una sola consulta de pesos). Devuelve
+    cuántas filas de resumen se actualizaron.
+    """
+    pacientes = storage.load_clinician_weights(clinician)
+    if not pacientes:
+        return 0
+    nombres, metas, iniciales, days, weights = zip(*pacientes)
+    fc = forecast_batch(days, weights, metas, iniciales, horizon)
+    filas = []
+    for i, paciente in enumerate(nombres):
+        t = fc["goal_days"][i]
+        meta = None
+        if fc["clear"][i] and t <= horizon:
+            meta = date.fromordinal(int(fc["last_day"][i]) + round(float(t)))
+        filas.append((paciente, float(fc["kg_per_week"][i]), meta))
+    storage.update_trends(filas)
+    return len(filas)
@@ -0,0 +1,247 @@
+# nutri/writebehind.py
+# -------------------------------------------------------------
+# Cola de escritura diferida (write-behind) de registros y pesos
+# -------------------------------------------------------------
+# "Guardar registro" y el peso del panel lateral ya cambian la sesión en
+# memoria; la escritura a la base solo se encola y la página sigue. Un
+# hilo aparte vacía la cola en una sola transacción (upsert_batch) a más
+# tardar FLUSH_SECONDS después de la primera escritura pendiente, o antes
+# si se juntan MAX_BATCH. Varias escrituras del mismo (paciente, fecha)
+# antes del vaciado se juntan en la última; el resumen del paciente para
+# el panel de la nutrióloga viaja en la misma transacción.
+#
+# Lectura de lo propio: pending(paciente) devuelve lo que aún no llega a
+# la base (incluido el lote que se está escribiendo) como eventos, para
+# aplicarlo encima del estado cuando la sesión lo recarga. Al salir del
+# proceso se vacía lo pendiente; flush() también se llama antes de leer
+# la base completa (exportar) o de importar.
+#
+# Si la base rechaza el lote (por ejemplo, está bloqueada) vuelve a la
+# cola y se reintenta con espera creciente (hasta MAX_BACKOFF); tras
+# WARN_FAILURES fallos seguidos se avisa en el log, pero nada se tira. Si
+# falla por otra cosa se reintenta escritura por escritura y se descartan
+# (con aviso en el log) solo las que no se pueden guardar; si la base falla
+# a la mitad, vuelven a la cola solo las que no se alcanzaron a guardar.
+
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+
+from nutri.events import LOG, WEIGHT, Event
+
+# Espera máxima de una escritura en la cola
+FLUSH_SECONDS = 0.5
+# Con tantas escrituras pendientes se vacía sin esperar
+MAX_BATCH = 500
+# Espera máxima (segundos) entre reintentos cuando la base falla
+MAX_BACKOFF = 30.0
+# Fallos seguidos antes de avisar en el log que la base no responde
+WARN_FAILURES = 10
+
+# Tipos de escritura en la cola
+_SUMMARY = 0
+
+log = logging.getLogger(__name__)
+
+
+def _day_key(day):
+    return day.toordinal()
+
+
+class WriteBehind:
+    """Cola de escrituras de registros, pesos y resúmenes que se vacía por lotes."""
+
+    def __init__(self, storage, delay=FLUSH_SECONDS, max_batch=MAX_BATCH, on_flush=None):
+        self.storage = storage
+        self.delay = delay
+        self.max_batch = max_batch
+        # on_flush(revisiones, registros) tras cada lote confirmado
+        self.on_flush = on_flush
+        # paciente → {(tipo, día): datos}; el lote en escritura sigue visible
+        self._pending = {}
+        self._inflight = {}
+        self._count = 0
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._writing = threading.Lock()
+        self._thread = None
+        self._atexit = False
+        # Fallos seguidos de la base (para la espera entre reintentos)
+        self._failures = 0
+        self.stats = {"encoladas": 0, "juntadas": 0, "lotes": 0, "escritas": 0, "errores": 0,
+                      "descartadas": 0, "reintentos": 0, "espera_max_ms": 0.0}
+
+    # ---- Encolar ----
+    def put_log(self, patient, registro):
+        """Encola el registro diario de una fecha."""
+        self._put(patient, (LOG, _day_key(registro["date"])), dict(registro))
+
+    def put_weight(self, patient, day, weight):
+        """Encola el peso de una fecha."""
+        self._put(patient, (WEIGHT, _day_key(day)), {"date": day, "weight": float(weight)})
+
+    def put_summary(self, patient, clinician, summary):
+        """Encola la fila de resumen del paciente (solo cuenta la última)."""
+        self._put(patient, (_SUMMARY, None), (clinician, summary))
+
+    def _put(self, patient, key, data):
+        with self._cond:
+            pendientes = self._pending.setdefault(patient, {})
+            if key in pendientes:
+                self.stats["juntadas"] += 1
+            else:
+                self._count += 1
+            pendientes[key] = (int(time.time()), data)
+            self.stats["encoladas"] += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._thread is None:
+                if not self._atexit:
+                    atexit.register(self.flush)
+                    self._atexit = True
+                self._thread = threading.Thread(target=self._run, name="nutri-escrituras", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    # ---- Lectura de lo propio ----
+    def pending(self, patient):
+        """
+        Registros y pesos del paciente que aún no están en la base, como
+        eventos (seq 0, ts de cuando se encolaron).
+        """
+        with self._cond:
+            datos = dict(self._inflight.get(patient, {}))
+            datos.update(self._pending.get(patient, {}))
+        return [Event(0, ts, kind, d) for (kind, _), (ts, d) in datos.items() if kind != _SUMMARY]
+
+    # ---- Vaciado ----
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._pending:
+                        self._cond.wait()
+                    limite = self._oldest + self.delay
+                    while self._count < self.max_batch:
+                        espera = limite - time.monotonic()
+                        if espera <= 0:
+                            break
+                        self._cond.wait(espera)
+                try:
+                    ok = self.flush()
+                except Exception:
+                    log.exception("Error inesperado al vaciar la cola de escritura")
+                    ok = False
+                if ok:
+                    self._failures = 0
+                    continue
+                # La base no aceptó el lote: se reintenta con espera creciente
+                self._failures += 1
+                self.stats["reintentos"] += 1
+                if self._failures % WARN_FAILURES == 0:
+                    log.error("La base rechazó %d lotes seguidos; las escrituras siguen en la cola",
+                              self._failures)
+                time.sleep(min(self.delay * 2 ** min(self._failures - 1, 16), MAX_BACKOFF))
+        finally:
+            # Si el hilo termina, la siguiente escritura arranca otro
+            with self._cond:
+                self._thread = None
+
+    def flush(self):
+        """Escribe ya todo lo pendiente; False si la transacción falló."""
+        with self._writing:
+            with self._cond:
+                if not self._pending:
+                    return True
+                lote, self._pending, self._count = self._pending, {}, 0
+                inicio, self._oldest = self._oldest, None
+                self._inflight = lote
+            try:
+                revs, registros, escritas = self._write(lote)
+            except sqlite3.Error:
+                log.warning("La base no aceptó el lote de escrituras; se reintenta", exc_info=True)
+                self._requeue(lote, inicio)
+                self.stats["errores"] += 1
+                return False
+            except Exception:
+                log.exception("Lote de escrituras inválido; se guardan una por una")
+                self.stats["errores"] += 1
+                revs, registros, escritas, faltan = self._write_one_by_one(lote)
+                if faltan:
+                    # La base falló a la mitad: lo ya guardado no se repite
+                    self._requeue(faltan, inicio)
+                    if escritas:
+                        self._done(revs, registros, escritas, inicio)
+                    return False
+            finally:
+                with self._cond:
+                    self._inflight = {}
+            self._done(revs, registros, escritas, inicio)
+            return True
+
+    def _done(self, revs, registros, escritas, inicio):
+        """Cuenta lo escrito y avisa a on_flush."""
+        self.stats["lotes"] += 1
+        self.stats["escritas"] += escritas
+        self.stats["espera_max_ms"] = max(
+            self.stats["espera_max_ms"], (time.monotonic() - inicio) * 1000
+        )
+        if self.on_flush is not None and registros:
+            try:
+                self.on_flush(revs, registros)
+            except Exception:
+                log.exception("Error al avisar de un lote de escrituras guardado")
+
+    def _write(self, lote):
+        """Un lote en una transacción: (revisiones, registros, escrituras)."""
+        registros, pesos, resumenes = [], [], []
+        for patient, datos in lote.items():
+            for (kind, _), (_, d) in datos.items():
+                if kind == LOG:
+                    registros.append((patient, d))
+                elif kind == WEIGHT:
+                    pesos.append((patient, d["date"], d["weight"]))
+                else:
+                    resumenes.append((patient, *d))
+        revs = self.storage.upsert_batch(registros, pesos, resumenes)
+        return revs, registros, len(registros) + len(pesos) + len(resumenes)
+
+    def _write_one_by_one(self, lote):
+        """
+        Cada escritura en su transacción; las que fallan se descartan. Si la
+        base falla, se detiene y devuelve en faltan (mismo formato que el
+        lote) lo que no se guardó: (revisiones, registros, escrituras, faltan).
+        """
+        revs, registros, escritas = {}, [], 0
+        entradas = [(patient, key, valor) for patient, datos in lote.items() for key, valor in datos.items()]
+        for i, (patient, key, valor) in enumerate(entradas):
+            try:
+                r, regs, n = self._write({patient: {key: valor}})
+            except sqlite3.Error:
+                log.warning("La base falló a la mitad del lote; se reintenta el resto", exc_info=True)
+                self.stats["errores"] += 1
+                faltan = {}
+                for p, k, v in entradas[i:]:
+                    faltan.setdefault(p, {})[k] = v
+                return revs, registros, escritas, faltan
+            except Exception:
+                log.exception("Escritura descartada de %s: %r", patient, key)
+                self.stats["descartadas"] += 1
+                continue
+            revs.update(r)
+            registros += regs
+            escritas += n
+        return revs, registros, escritas, {}
+
+    def _requeue(self, lote, inicio):
+        """Vuelve a la cola sin pisar lo que se encoló mientras tanto."""
+        with self._cond:
+            for patient, datos in lote.items():
+                pendientes = self._pending.setdefault(patient, {})
+                for key, d in datos.items():
+                    if key not in pendientes:
+                        pendientes[key] = d
+                        self._count += 1
+            self._oldest = inicio if self._oldest is None else min(inicio, self._oldest)
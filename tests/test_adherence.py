@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from nutri.adherence import N_MEALS, AdherenceIndex
+
+
+def _window(days, start, end):
+    """Adherencia de la ventana sumando los días uno por uno."""
+    dentro = [m for d, m in days.items() if start <= d <= end]
+    if not dentro:
+        return None, 0
+    return sum(dentro) / (N_MEALS * len(dentro)), len(dentro)
+
+
+def test_empty_index():
+    index = AdherenceIndex()
+    assert index.window(date(2024, 1, 1), date(2024, 12, 31)) == (None, 0)
+    assert index.last_days(7, today=date(2024, 1, 1)) == (None, 0)
+
+
+def test_window_counts_only_logged_days():
+    hoy = date(2024, 3, 10)
+    index = AdherenceIndex()
+    index.update(hoy - timedelta(days=9), 5)
+    index.update(hoy - timedelta(days=2), 3)
+    index.update(hoy, 4)
+    assert index.last_days(7, today=hoy) == (pytest.approx(7 / 10), 2)
+    assert index.last_days(30, today=hoy) == (pytest.approx(12 / 15), 3)
+
+
+def test_replacing_a_day_updates_later_windows():
+    index = AdherenceIndex.from_arrays([10, 11, 12], [5, 5, 5])
+    index.update(10, 0)
+    assert index.window(10, 12) == (pytest.approx(10 / 15), 3)
+    assert index.window(11, 12) == (pytest.approx(1.0), 2)
+
+
+def test_day_before_the_origin_moves_the_axis():
+    index = AdherenceIndex.from_arrays([100, 101], [5, 4])
+    index.update(90, 1)
+    assert index.origin == 90
+    assert index.window(0, 200) == (pytest.approx(10 / 15), 3)
+    fechas, valores = index.daily(date.fromordinal(90), date.fromordinal(101))
+    assert fechas == [date.fromordinal(d) for d in (90, 100, 101)]
+    assert list(valores) == pytest.approx([0.2, 1.0, 0.8])
+
+
+def test_random_updates_match_a_direct_sum():
+    rng = np.random.default_rng(1)
+    index = AdherenceIndex()
+    days = {}
+    for _ in range(500):
+        d = int(rng.integers(1_000, 1_400))
+        meals = int(rng.integers(0, N_MEALS + 1))
+        index.update(d, meals)
+        days[d] = meals
+        start = int(rng.integers(950, 1_450))
+        end = start + int(rng.integers(0, 120))
+        value, logged = index.window(start, end)
+        expected, expected_logged = _window(days, start, end)
+        assert logged == expected_logged
+        assert value == pytest.approx(expected)
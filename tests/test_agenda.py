@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from nutri.agenda import Agenda
+from nutri.storage import Storage
+
+# Lunes
+LUNES = datetime(2024, 1, 1, 9, 0)
+
+
+@pytest.fixture
+def agenda(tmp_path):
+    return Agenda(Storage(str(tmp_path / "n.db")))
+
+
+def test_overlapping_appointments_are_rejected(agenda):
+    agenda.book("brenda", "ana", LUNES, 45)
+    with pytest.raises(ValueError):
+        agenda.book("brenda", "beto", LUNES + timedelta(minutes=30), 45)
+    # Justo al terminar sí cabe, y otra nutrióloga tiene su propia agenda
+    agenda.book("brenda", "beto", LUNES + timedelta(minutes=45), 45)
+    agenda.book("carla", "beto", LUNES, 45)
+    with pytest.raises(ValueError):
+        agenda.book("brenda", "ana", datetime(2024, 1, 7, 9, 0), 45)  # domingo
+    assert [a.patient for a in agenda.day("brenda", LUNES.date())] == ["ana", "beto"]
+
+
+def test_another_worker_sees_the_booking(agenda):
+    otra = Agenda(agenda.storage)
+    assert otra.free_slots("brenda", LUNES.date())[0] == LUNES
+    agenda.book("brenda", "ana", LUNES, 45)
+    with pytest.raises(ValueError):
+        otra.book("brenda", "beto", LUNES, 45)
+    assert otra.next_free("brenda", LUNES, 45) == LUNES + timedelta(minutes=45)
+
+
+def test_cancel_then_rebook_the_same_slot(agenda):
+    cita = agenda.book("brenda", "ana", LUNES, 45)
+    assert agenda.next_for_patient("brenda", "ana", now=LUNES - timedelta(days=1)).id == cita.id
+    assert [c.id for c in agenda.cancel("brenda", cita.id)] == [cita.id]
+    assert agenda.cancel("brenda", cita.id) == []
+    nueva = agenda.book("brenda", "beto", LUNES, 45)
+    assert [a.id for a in agenda.day("brenda", LUNES.date())] == [nueva.id]
+    assert agenda.next_for_patient("brenda", "ana", now=LUNES - timedelta(days=1)) is None
+
+
+def test_series_moves_busy_slots_and_cancels_the_rest(agenda):
+    agenda.book("brenda", "beto", LUNES + timedelta(days=7), 45)
+    citas, movidas, omitidas = agenda.book_series("brenda", "ana", LUNES, 45, every_days=7, count=3)
+    assert len(citas) == 3 and omitidas == []
+    assert [(pedida, c.start) for pedida, c in movidas] == [
+        (LUNES + timedelta(days=7), LUNES + timedelta(days=7, minutes=45))
+    ]
+    assert len({c.series for c in citas}) == 1
+    canceladas = agenda.cancel("brenda", citas[1].id, following=True)
+    assert [c.id for c in canceladas] == [citas[1].id, citas[2].id]
+    assert [a.patient for a in agenda.day("brenda", LUNES.date())] == ["ana"]
+
+
+def test_series_reports_the_dates_it_could_not_book(agenda, monkeypatch):
+    insertar = agenda.storage.insert_appointment
+
+    def ocupado_el_segundo_lunes(clinician, patient, start, end, *args, **kwargs):
+        # Otro worker gana ese día cada vez que se intenta
+        if start.startswith("2024-01-08"):
+            return None, []
+        return insertar(clinician, patient, start, end, *args, **kwargs)
+
+    monkeypatch.setattr(agenda.storage, "insert_appointment", ocupado_el_segundo_lunes)
+    citas, movidas, omitidas = agenda.book_series("brenda", "ana", LUNES, 45, every_days=7, count=3)
+    assert omitidas == [LUNES + timedelta(days=7)]
+    assert [c.start for c in citas] == [LUNES, LUNES + timedelta(days=14)]
+    assert movidas == []
+    assert agenda.day("brenda", (LUNES + timedelta(days=7)).date()) == []
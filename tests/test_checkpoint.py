@@ -0,0 +1,107 @@
+import os
+import shutil
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from nutri.checkpoint import Checkpointer
+from nutri.events import EventLog
+from nutri.schema import MEAL_COLS
+from nutri.storage import Storage
+
+pytest.importorskip("pyarrow")
+
+INICIO = date(2024, 1, 1)
+
+
+def _registro(k, mood="Bien"):
+    registro = {"date": INICIO + timedelta(days=k), "mood": mood, "comentarios": f"día {k}" if k % 2 else None}
+    registro.update((c, (k + i) % 3 != 0) for i, c in enumerate(MEAL_COLS))
+    return registro
+
+
+def _fill(storage, n=10, start=0):
+    for k in range(start, start + n):
+        storage.upsert_daily_log("ana", _registro(k, mood="Eufórico" if k == 3 else "Bien"))
+        storage.upsert_weight("ana", INICIO + timedelta(days=k), 80 - k / 10)
+
+
+def _same_state(a, b):
+    pd.testing.assert_frame_equal(a.logs.to_frame(), b.logs.to_frame())
+    pd.testing.assert_frame_equal(a.weights.to_frame(), b.weights.to_frame())
+    assert a.profile == b.profile
+    assert a.seq == b.seq
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(str(tmp_path / "n.db"))
+
+
+def test_write_then_restore(storage, tmp_path):
+    _fill(storage)
+    storage.upsert_profile("ana", {"clinician": "brenda", "initial_weight": 80.0, "goal_weight": 70.0, "height_m": 1.6})
+    state = EventLog(storage).load("ana")
+    checkpoints = Checkpointer(str(tmp_path / "ck"), delay=0)
+    checkpoints.schedule("ana", state)
+    checkpoints.flush()
+    assert checkpoints.stats["escritos"] == 1
+    _same_state(Checkpointer(str(tmp_path / "ck")).restore("ana"), state)
+    assert Checkpointer(str(tmp_path / "ck")).restore("beto") is None
+
+
+def test_load_catches_up_from_the_checkpoint(storage, tmp_path):
+    _fill(storage)
+    directorio = str(tmp_path / "ck")
+    checkpoints = Checkpointer(directorio, delay=60)
+    EventLog(storage, checkpoints=checkpoints).load("ana")
+    checkpoints.flush()
+    _fill(storage, n=3, start=10)
+    nuevo = Checkpointer(directorio, delay=60)
+    state = EventLog(storage, checkpoints=nuevo).load("ana")
+    assert nuevo.stats["restaurados"] == 1
+    _same_state(state, EventLog(storage).load("ana"))
+
+
+def test_stale_or_torn_checkpoints_fall_back_to_the_database(storage, tmp_path):
+    _fill(storage)
+    directorio = str(tmp_path / "ck")
+    checkpoints = Checkpointer(directorio, delay=60)
+    checkpoints.schedule("ana", EventLog(storage).load("ana"))
+    checkpoints.flush()
+
+    # De otra base con menos eventos: el punto de control va adelante
+    otra = Storage(str(tmp_path / "otra.db"))
+    _fill(otra, n=4)
+    restaurado = Checkpointer(directorio, delay=60)
+    state = EventLog(otra, checkpoints=restaurado).load("ana")
+    _same_state(state, EventLog(otra).load("ana"))
+
+    # Se cortó a la mitad: el archivo de pesos es de otro punto de control
+    respaldo = str(tmp_path / "pesos.arrow")
+    _, pesos = checkpoints._paths("ana")
+    shutil.copy(pesos, respaldo)
+    _fill(storage, n=1, start=20)
+    checkpoints.schedule("ana", EventLog(storage).load("ana"))
+    checkpoints.flush()
+    shutil.copy(respaldo, pesos)
+    assert Checkpointer(directorio).restore("ana") is None
+
+
+def test_a_failed_write_is_logged_and_leaves_no_temporaries(storage, tmp_path):
+    _fill(storage, n=2)
+    checkpoints = Checkpointer(str(tmp_path / "ck"), delay=60)
+    logs, _ = checkpoints._paths("ana")
+    # Un directorio donde va el archivo: el renombrado falla
+    os.makedirs(logs)
+    state = EventLog(storage).load("ana")
+    checkpoints.schedule("ana", state)
+    checkpoints.flush()
+    assert checkpoints.stats["errores"] == 1
+    assert not [p for p in os.listdir(tmp_path / "ck") if p.endswith(".tmp")]
+    # El mismo estado se puede volver a pedir cuando se corrige
+    os.rmdir(logs)
+    checkpoints.schedule("ana", state)
+    checkpoints.flush()
+    assert checkpoints.stats["escritos"] == 1
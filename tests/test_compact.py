@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from nutri.compact import CompactLogs
+from nutri.schema import DAILY_LOG_COLS, MEAL_COLS, meals_to_mask
+
+
+def _frame():
+    inicio = date(2024, 5, 1)
+    rows = []
+    for k, mood in enumerate(["Bien", "Mal", "Eufórico", None, "Regular"]):
+        row = {"date": inicio + timedelta(days=k), "mood": mood, "comentarios": f"día {k}" if k % 2 else None}
+        row.update((c, (k + i) % 3 != 0) for i, c in enumerate(MEAL_COLS))
+        rows.append(row)
+    return pd.DataFrame(rows, columns=DAILY_LOG_COLS)
+
+
+def test_round_trip_through_the_frame():
+    df = _frame()
+    logs = CompactLogs.from_frame(df)
+    assert len(logs) == len(df)
+    # Un ánimo fuera de la lista estándar se agrega como categoría
+    assert "Eufórico" in logs.mood_categories
+    pd.testing.assert_frame_equal(logs.to_frame(), df, check_dtype=False)
+
+
+def test_meals_done_counts_bits():
+    logs = CompactLogs.from_frame(_frame())
+    expected = _frame()[MEAL_COLS].sum(axis=1).to_numpy()
+    assert np.array_equal(logs.meals_done(), expected)
+
+
+def test_upsert_registro_inserts_in_order_and_detects_no_change():
+    logs = CompactLogs.from_frame(_frame())
+    registro = {"date": date(2024, 4, 30), "mood": "Bien", "comentarios": "antes"}
+    registro.update((c, True) for c in MEAL_COLS)
+    assert logs.upsert_registro(registro)
+    assert not logs.upsert_registro(registro)
+    assert logs.days[0] == date(2024, 4, 30).toordinal()
+    assert logs.masks[0] == meals_to_mask(registro)
+    assert logs.to_frame(end=date(2024, 4, 30))["comentarios"].tolist() == ["antes"]
+
+
+def test_filters_and_pages():
+    logs = CompactLogs.from_frame(_frame())
+    assert list(logs.filter_positions(moods=["Bien", "Mal"])) == [0, 1]
+    assert list(logs.filter_positions(text="DÍA")) == [1, 3]
+    # Días sin desayuno (bit 0)
+    sin_desayuno = logs.filter_positions(missed=1)
+    assert list(sin_desayuno) == [0, 3]
+    todas = logs.filter_positions()
+    assert list(logs.page_before(todas, size=2)) == [4, 3]
+    assert list(logs.page_before(todas, before=int(logs.days[3]), size=2)) == [2, 1]
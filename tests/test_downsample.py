@@ -0,0 +1,39 @@
+import numpy as np
+
+from nutri.cache import LRUCache
+from nutri.downsample import lttb_indices
+
+
+def test_short_series_are_kept_whole():
+    assert list(lttb_indices([0, 1, 2], [5, 6, 7], 10)) == [0, 1, 2]
+    assert list(lttb_indices(range(10), range(10), 2)) == list(range(10))
+
+
+def test_keeps_ends_and_one_point_per_bucket():
+    rng = np.random.default_rng(3)
+    x = np.arange(5_000)
+    y = rng.normal(75, 1, len(x)).cumsum()
+    idx = lttb_indices(x, y, 500)
+    assert len(idx) == 500
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_keeps_a_lone_spike():
+    y = np.zeros(1_000)
+    y[437] = 10.0
+    assert 437 in lttb_indices(np.arange(1_000), y, 50)
+
+
+def test_lru_cache_drops_the_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get_or_compute("a", lambda: 0) == 1
+    assert cache.get_or_compute("d", lambda: 4) == 4
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.invalidate(lambda k: k in ("a", "d"))
+    assert len(cache) == 0
@@ -0,0 +1,135 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nutri.events import (
+    LOG,
+    LOGS_BATCH,
+    PROFILE,
+    WEIGHT,
+    WEIGHTS_BATCH,
+    Event,
+    EventLog,
+    PatientState,
+    decode,
+    encode_log,
+    encode_logs_batch,
+    encode_profile,
+    encode_weight,
+    encode_weights_batch,
+)
+from nutri.schema import MEAL_COLS
+from nutri.storage import Storage
+
+INICIO = date(2024, 1, 1)
+
+
+def _registro(k, comentario=None, mood="Bien"):
+    registro = {"date": INICIO + timedelta(days=k), "mood": mood, "comentarios": comentario}
+    registro.update((c, (k + i) % 4 != 0) for i, c in enumerate(MEAL_COLS))
+    return registro
+
+
+def _same_state(a, b):
+    pd.testing.assert_frame_equal(a.logs.to_frame(), b.logs.to_frame())
+    pd.testing.assert_frame_equal(a.weights.to_frame(), b.weights.to_frame())
+    assert a.profile == b.profile
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(str(tmp_path / "n.db"))
+
+
+def test_single_events_round_trip():
+    registro = _registro(3, comentario="Comí fuera ñ", mood=None)
+    assert decode(LOG, encode_log(registro)) == registro
+    assert decode(WEIGHT, encode_weight(INICIO, 72.5)) == {"date": INICIO, "weight": 72.5}
+    perfil = {"clinician": "brenda", "initial_weight": 80.0, "goal_weight": None, "height_m": 1.6}
+    assert decode(PROFILE, encode_profile(perfil)) == perfil
+
+
+def test_batches_round_trip():
+    days = np.array([10, 11, 12], dtype=np.int32)
+    lote = decode(LOGS_BATCH, encode_logs_batch(days, [31, 0, 7], ["Bien", None, "Mal"], [None, "x", ""], replace=True))
+    assert lote["replace"]
+    assert list(lote["days"]) == [10, 11, 12]
+    assert list(lote["masks"]) == [31, 0, 7]
+    assert list(lote["moods"]) == ["Bien", None, "Mal"]
+    assert list(lote["comments"]) == [None, "x", ""]
+    pesos = decode(WEIGHTS_BATCH, encode_weights_batch(days, [70.0, 69.5, 69.0]))
+    assert not pesos["replace"]
+    assert list(pesos["weights"]) == [70.0, 69.5, 69.0]
+
+
+def test_batch_merge_keeps_new_values_on_repeated_days():
+    state = PatientState()
+    state.apply(Event(1, 0, WEIGHTS_BATCH, decode(WEIGHTS_BATCH, encode_weights_batch([1, 2, 3], [70, 71, 72]))))
+    state.apply(Event(2, 0, WEIGHTS_BATCH, decode(WEIGHTS_BATCH, encode_weights_batch([3, 4], [60, 61]))))
+    assert list(state.weights.days) == [1, 2, 3, 4]
+    assert list(state.weights.column("weight")) == [70, 71, 60, 61]
+    state.apply(Event(3, 0, WEIGHTS_BATCH, decode(WEIGHTS_BATCH, encode_weights_batch([9], [50], replace=True))))
+    assert list(state.weights.days) == [9]
+    assert state.seq == 3
+
+
+def test_snapshot_encoding_round_trip():
+    state = PatientState()
+    for k in range(20):
+        state.apply(Event(k + 1, 0, LOG, _registro(k, comentario=f"día {k}" if k % 3 else None)))
+        state.apply(Event(k + 1, 0, WEIGHT, {"date": INICIO + timedelta(days=k), "weight": 80 - k / 10}))
+    state.profile = {"clinician": "brenda", "initial_weight": 80.0, "goal_weight": 70.0, "height_m": 1.65}
+    copia = PatientState.decode(state.encode(), state.seq)
+    _same_state(copia, state)
+    assert copia.seq == state.seq
+
+
+def test_replay_matches_the_tables(storage):
+    storage.upsert_daily_logs_frame("ana", pd.DataFrame([_registro(k) for k in range(30)]))
+    for k in range(0, 40, 2):
+        storage.upsert_daily_log("ana", _registro(k, comentario="editado"))
+        storage.upsert_weight("ana", INICIO + timedelta(days=k), 80 - k / 10)
+    storage.upsert_profile("ana", {"clinician": "brenda", "initial_weight": 80.0, "goal_weight": 70.0, "height_m": 1.65})
+
+    state = EventLog(storage).load("ana")
+    tablas = PatientState(storage.load_daily_logs_compact("ana"), storage.load_weight_series("ana"))
+    pd.testing.assert_frame_equal(state.logs.to_frame(), tablas.logs.to_frame())
+    pd.testing.assert_frame_equal(state.weights.to_frame(), tablas.weights.to_frame())
+    assert state.profile["goal_weight"] == 70.0
+    assert state.seq == storage.last_event("ana")
+
+
+def test_snapshot_then_tail_matches_a_full_replay(storage):
+    log = EventLog(storage, snapshot_every=10)
+    for k in range(25):
+        storage.upsert_weight("ana", INICIO + timedelta(days=k), 70.0 + k)
+    primero = log.load("ana")
+    assert storage.snapshot_seq("ana") == primero.seq
+    for k in range(5):
+        storage.upsert_daily_log("ana", _registro(k))
+    desde_instantanea = EventLog(storage).load("ana")
+    completo = PatientState()
+    for row in storage.load_events("ana", after=0):
+        completo.apply(Event.from_row(row))
+    _same_state(desde_instantanea, completo)
+
+
+def test_since_and_time_travel(storage):
+    log = EventLog(storage)
+    storage.upsert_weight("ana", INICIO, 80.0)
+    state = log.load("ana")
+    antes = state.seq
+    storage.upsert_weight("ana", INICIO, 79.0)
+    storage.upsert_weight("ana", INICIO + timedelta(days=1), 78.0)
+    nuevos = log.since("ana", state.seq)
+    assert [e.kind for e in nuevos] == [WEIGHT, WEIGHT]
+    for event in nuevos:
+        state.apply(event)
+    assert list(state.weights.column("weight")) == [79.0, 78.0]
+    assert log.since("ana", antes, limit=1) is None
+    # Estado como estaba en un evento anterior
+    viejo = log.load("ana", upto=antes)
+    assert list(viejo.weights.column("weight")) == [80.0]
+    assert [e.seq for e in log.history("ana", limit=2)] == [state.seq, state.seq - 1]
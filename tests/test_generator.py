@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from nutri.generator import DEFAULT_MACROS, macro_targets, read_specs, spec_exclusions, spec_targets
+
+
+def test_blank_cells_in_the_patients_csv_use_the_defaults(tmp_path):
+    path = tmp_path / "pacientes.csv"
+    path.write_text(
+        "paciente,kcal,proteina_pct,lipidos_pct,hidratos_pct,exclusiones\n"
+        "ana,1800,,,,\n"
+        "beto,2000,25,30,45,lacteo; gluten\n",
+        encoding="utf-8",
+    )
+    ana, beto = read_specs(path)
+    assert ana == {"paciente": "ana", "kcal": 1800}
+    assert spec_exclusions(ana) == []
+    metas = spec_targets(ana)
+    assert np.isfinite(metas).all()
+    assert np.allclose(metas, macro_targets(1800.0, *(m * 100 for m in DEFAULT_MACROS)))
+    assert spec_exclusions(beto) == ["lacteo", "gluten"]
+    assert np.allclose(spec_targets(beto), macro_targets(2000.0, 25, 30, 45))
+
+
+def test_nan_in_a_spec_counts_as_missing():
+    spec = {"paciente": "ana", "kcal": 1800, "proteina_pct": float("nan"), "exclusiones": float("nan")}
+    assert spec_exclusions(spec) == []
+    assert np.isfinite(spec_targets(spec)).all()
+    with pytest.raises(ValueError):
+        spec_targets({"paciente": "ana", "kcal": float("nan")})
@@ -0,0 +1,82 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from nutri.importer import import_file
+from nutri.storage import Storage
+
+HOY = date(2024, 6, 30)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(str(tmp_path / "n.db"))
+
+
+def _csv(tmp_path, texto, nombre="datos.csv"):
+    path = tmp_path / nombre
+    path.write_text(texto, encoding="utf-8")
+    return str(path)
+
+
+def _pesos(storage, patient):
+    serie = storage.load_weight_series(patient)
+    return dict(zip(serie.to_frame()["date"].astype(str), serie.column("weight")))
+
+
+def test_bad_rows_are_numbered_across_chunks(storage, tmp_path):
+    path = _csv(tmp_path, "fecha,peso\n"
+                          "2024-01-01,80\n"
+                          "2024-01-02,abc\n"
+                          "02/01/2024,79.5\n"
+                          "2030-01-01,79\n"
+                          "2024-01-05,500\n"
+                          "no es fecha,78\n")
+    report = import_file(storage, path, patient="ana", chunk_rows=2, today=HOY)
+    assert report.kind == "pesos"
+    assert (report.rows, report.written, report.bad) == (6, 2, 4)
+    assert report.bad_rows == [
+        (2, "peso inválido"), (4, "fecha futura"), (5, "peso fuera de rango"), (6, "fecha inválida"),
+    ]
+    # DD/MM/AAAA también se acepta; la fecha repetida en otro bloque gana al final
+    assert _pesos(storage, "ana") == {"2024-01-01": 80.0, "2024-01-02": 79.5}
+
+
+def test_repeated_dates_keep_the_last_row(storage, tmp_path):
+    path = _csv(tmp_path, "fecha,desayuno,comida,ánimo,comentarios\n"
+                          "2024-01-01,sí,no,bien,primero\n"
+                          "2024-01-01,sí,sí,Mal,\n"
+                          "2024-01-02,x,,,nota\n")
+    report = import_file(storage, path, patient="ana", today=HOY)
+    assert report.kind == "registros" and report.duplicates == 1 and report.bad == 0
+    df = storage.load_daily_logs_compact("ana").to_frame()
+    assert df["mood"].iloc[0] == "Mal" and pd.isna(df["mood"].iloc[1])
+    assert df["comida"].tolist() == [True, False]
+    assert pd.isna(df["comentarios"].iloc[0]) and df["comentarios"].iloc[1] == "nota"
+
+
+def test_replace_drops_the_previous_history(storage, tmp_path):
+    import_file(storage, _csv(tmp_path, "fecha,peso\n2024-01-01,80\n2024-01-02,79\n"), patient="ana", today=HOY)
+    import_file(storage, _csv(tmp_path, "fecha,peso\n2024-02-01,77\n"), patient="ana", today=HOY)
+    assert len(_pesos(storage, "ana")) == 3
+    nuevo = _csv(tmp_path, "fecha,peso\n2024-03-01,76\n2024-03-02,75.5\n")
+    import_file(storage, nuevo, patient="ana", replace=True, chunk_rows=1, today=HOY)
+    # Solo se borra antes del primer bloque: el segundo no borra al primero
+    assert _pesos(storage, "ana") == {"2024-03-01": 76.0, "2024-03-02": 75.5}
+
+
+def test_a_patient_column_cannot_write_to_other_patients(storage, tmp_path):
+    storage.upsert_weight("beto", date(2024, 1, 1), 90.0)
+    path = _csv(tmp_path, "paciente,fecha,peso\n"
+                          "ana,2024-01-01,80\n"
+                          "beto,2024-01-01,60\n"
+                          ",2024-01-02,79\n")
+    report = import_file(storage, path, patient="ana", today=HOY, replace=True, allowed={"ana"})
+    assert report.patients == {"ana"}
+    assert report.bad_rows == [(2, "paciente no permitido")]
+    assert _pesos(storage, "ana") == {"2024-01-01": 80.0, "2024-01-02": 79.0}
+    assert _pesos(storage, "beto") == {"2024-01-01": 90.0}
+    # Sin paciente fijo, la columna manda (migración de varios pacientes)
+    report = import_file(storage, path, today=HOY, allowed={"ana", "beto"})
+    assert report.patients == {"ana", "beto"} and report.bad_rows == [(3, "sin paciente")]
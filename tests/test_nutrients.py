@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from nutri.nutrients import FOOD_COLS, FoodTable, macro_split, parse_quantity, tokenize
+from nutri.plans import PLAN_COLS, MealPlan
+
+ALIMENTOS = [
+    # alimento, sinonimos, grupo, cantidad, unidad, peso_g, porcion_eq, contenedor, kcal, prot, lip, hc
+    ("avena", "avena en hojuelas", "Cereales", "1/3", "taza", 27, 1, 0, 70, 2, 0, 15),
+    ("tortilla de maíz", "tortilla", "Cereales", "1", "pieza", 30, 1, 0, 70, 2, 0, 15),
+    ("pechuga de pollo", "pollo", "AOA", "30", "g", 30, 3, 0, 40, 7, 1, 0),
+    ("nuez", "", "Grasas", "3", "pieza", 9, 1, 0, 45, 1, 5, 1),
+    ("ensalada", "", "Verduras", "1", "taza", 80, 1, 1, 25, 2, 0, 4),
+    ("jitomate", "", "Verduras", "1", "pieza", 120, 1, 0, 25, 2, 0, 4),
+]
+
+
+@pytest.fixture
+def foods():
+    return FoodTable(pd.DataFrame(ALIMENTOS, columns=FOOD_COLS))
+
+
+def _parsed(foods, description):
+    return [(foods.names[f], pytest.approx(eq)) for f, eq in foods.parse(description)]
+
+
+def test_parse_quantity():
+    assert parse_quantity("2") == 2.0
+    assert parse_quantity("1,5") == 1.5
+    assert parse_quantity("1/3") == pytest.approx(1 / 3)
+    assert parse_quantity("2 1/2") == 2.5
+    with pytest.raises(ValueError):
+        parse_quantity("media")
+
+
+def test_tokenize_folds_accents_plurals_and_notes():
+    assert tokenize("2 Tortillas de Maíz (al comal)") == ["2", "tortilla", "de", "maiz"]
+    assert tokenize("Nueces") == ["nuez"]
+
+
+def test_quantities_units_and_sizes(foods):
+    assert _parsed(foods, "2 tortillas de maíz") == [("tortilla de maíz", 2.0)]
+    assert _parsed(foods, "1 taza de avena") == [("avena", 3.0)]
+    assert _parsed(foods, "90 g de pechuga de pollo") == [("pechuga de pollo", 3.0)]
+    assert _parsed(foods, "media pieza de jitomate grande") == [("jitomate", 0.75)]
+    assert _parsed(foods, "6 nueces") == [("nuez", 2.0)]
+    # Sin cantidad: la porción habitual
+    assert _parsed(foods, "Pollo asado") == [("pechuga de pollo", 3.0)]
+
+
+def test_longest_name_wins_and_alternatives_count_once(foods):
+    assert _parsed(foods, "avena en hojuelas con nuez") == [("avena", 1.0), ("nuez", 1.0)]
+    assert _parsed(foods, "pollo o avena") == [("pechuga de pollo", 3.0)]
+    # Un contenedor seguido de sus ingredientes cuenta por los ingredientes
+    assert _parsed(foods, "ensalada de jitomate") == [("jitomate", 1.0)]
+    assert _parsed(foods, "ensalada") == [("ensalada", 1.0)]
+    assert foods.parse("café negro") == ()
+
+
+def test_plan_totals_by_meal_and_day(foods):
+    plan = MealPlan(1, pd.DataFrame([
+        ("Lunes", "Desayuno", "1 taza de avena"),
+        ("Lunes", "Comida", "2 tortillas y pollo"),
+        ("Martes", "Comida", "Caldo"),
+    ], columns=PLAN_COLS))
+    nutricion = plan.nutrition(foods)
+    assert nutricion.meal_kcal("Lunes") == [210.0, 260.0]
+    assert nutricion.meal_kcal("Martes") == [None]
+    assert nutricion.day_totals("Lunes")["proteina_g"] == 31.0
+    assert nutricion.daily_average["energia_kcal"] == 235.0
+    assert nutricion.unmatched == [("Martes", "Comida")]
+
+
+def test_macro_split():
+    split = macro_split({"proteina_g": 25.0, "lipidos_g": 0.0, "hidratos_g": 25.0})
+    assert split == {"proteina_g": 0.5, "lipidos_g": 0.0, "hidratos_g": 0.5}
+    assert macro_split({"proteina_g": 0, "lipidos_g": 0, "hidratos_g": 0})["lipidos_g"] == 0.0
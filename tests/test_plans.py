@@ -0,0 +1,31 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nutri.plans import read_plan_file, validate_plan_df
+
+
+def test_empty_descriptions_stay_empty():
+    df = pd.DataFrame({
+        "Día": ["Lunes", " Martes ", "Miércoles"],
+        "Tiempo de comida": ["Desayuno", "Comida", "Cena"],
+        "Descripción": [np.nan, None, "  Sopa de verduras "],
+    })
+    limpio = validate_plan_df(df)
+    assert limpio["Descripción"].tolist() == ["", "", "Sopa de verduras"]
+    assert limpio["Día"].tolist() == ["Lunes", "Martes", "Miércoles"]
+
+
+def test_csv_with_blank_cells():
+    csv = "Día,Tiempo de comida,Descripción\nLunes,Desayuno,\nLunes,Comida,Pollo\n,Cena,Sin día\n"
+    plan = read_plan_file(io.StringIO(csv))
+    assert plan["Descripción"].tolist() == ["", "Pollo"]
+
+
+def test_rejects_unknown_days_and_missing_columns():
+    with pytest.raises(ValueError, match="Días no reconocidos"):
+        validate_plan_df(pd.DataFrame({"Día": ["Lunez"], "Tiempo de comida": ["Cena"], "Descripción": ["x"]}))
+    with pytest.raises(ValueError, match="faltan columnas"):
+        validate_plan_df(pd.DataFrame({"Día": ["Lunes"]}))
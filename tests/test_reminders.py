@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+from nutri.reminders import MAX_ATTEMPTS, Reminder, ReminderScheduler
+from nutri.storage import Storage
+
+AHORA = datetime(2024, 3, 4, 8, 0)
+
+
+class Notifier:
+    def __init__(self, fallas=0):
+        self.enviados = []
+        self.fallas = fallas
+
+    def send(self, reminders):
+        if self.fallas:
+            self.fallas -= 1
+            raise OSError("bandeja no disponible")
+        self.enviados.extend(r.key for r in reminders)
+
+
+def _reminder(key, patient="ana"):
+    return Reminder(key, "registro", patient, AHORA, "Recuerda registrar tu día")
+
+
+def _dispatch(scheduler, *reminders, now=AHORA):
+    for r in reminders:
+        scheduler._push_reminder(r)
+    return asyncio.run(scheduler.run_due(now))
+
+
+def test_claims_are_idempotent(tmp_path):
+    storage = Storage(str(tmp_path / "n.db"))
+    assert storage.claim_reminders(["a", "b"], "2024-03-04 08:00") == ["a", "b"]
+    assert storage.claim_reminders(["b", "c"], "2024-03-04 08:01") == ["c"]
+    storage.release_reminders(["b"])
+    assert storage.claim_reminders(["b"], "2024-03-04 08:02") == ["b"]
+
+
+def test_a_reminder_goes_out_once_across_processes(tmp_path):
+    storage = Storage(str(tmp_path / "n.db"))
+    uno, otro = Notifier(), Notifier()
+    assert _dispatch(ReminderScheduler(storage, uno, clock=lambda: AHORA), _reminder("r1"), _reminder("r2")) == 2
+    # Otro proceso (o el mismo tras reiniciar) con los mismos recordatorios
+    assert _dispatch(ReminderScheduler(storage, otro, clock=lambda: AHORA), _reminder("r1"), _reminder("r3")) == 1
+    assert uno.enviados == ["r1", "r2"]
+    assert otro.enviados == ["r3"]
+
+
+def test_a_failed_send_releases_the_claim_and_retries(tmp_path):
+    storage = Storage(str(tmp_path / "n.db"))
+    notifier = Notifier(fallas=1)
+    scheduler = ReminderScheduler(storage, notifier, clock=lambda: AHORA)
+    assert _dispatch(scheduler, _reminder("r1")) == 0
+    assert scheduler.stats["fallidos"] == 1
+    assert len(scheduler) == 1
+    assert asyncio.run(scheduler.run_due(scheduler.next_due())) == 1
+    assert notifier.enviados == ["r1"]
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    storage = Storage(str(tmp_path / "n.db"))
+    scheduler = ReminderScheduler(storage, Notifier(fallas=MAX_ATTEMPTS), clock=lambda: AHORA)
+    _dispatch(scheduler, _reminder("r1"))
+    while len(scheduler):
+        asyncio.run(scheduler.run_due(scheduler.next_due()))
+    assert scheduler.stats["fallidos"] == MAX_ATTEMPTS
+    # La marca quedó libre: otro proceso lo puede enviar
+    assert storage.claim_reminders(["r1"], "2024-03-04 09:00") == ["r1"]
@@ -0,0 +1,89 @@
+from datetime import date
+
+import pandas as pd
+
+from nutri.plans import PlanStore
+from nutri.search import COMMENT, PLAN, InvertedIndex, SearchIndex, highlight, tokenize
+from nutri.storage import Storage
+
+
+def _doc_keys(index, query, **kwargs):
+    hits, _ = index.search(query, **kwargs)
+    return [(patient, key) for patient, _, key, _ in hits]
+
+
+def test_tokenize_folds_accents_plurals_and_stopwords():
+    assert tokenize("Atún con ensalada y Tortillas de maíz") == ["atun", "ensalada", "tortilla", "maiz"]
+
+
+def test_highlight_marks_matches_and_escapes_html():
+    html = highlight("Comí <poco> atún", {"atun"})
+    assert html == "Comí &lt;poco&gt; <mark>atún</mark>"
+
+
+def test_all_words_must_match():
+    index = InvertedIndex()
+    index.add("ana", COMMENT, 1, "Comí atún con ensalada")
+    index.add("ana", COMMENT, 2, "Solo ensalada")
+    index.add("beto", PLAN, 0, "Tostadas de atún")
+    assert sorted(_doc_keys(index, "atun ")) == [("ana", 1), ("beto", 0)]
+    assert _doc_keys(index, "ensaladas atún ") == [("ana", 1)]
+    assert _doc_keys(index, "pollo ") == []
+
+
+def test_last_word_is_a_prefix_while_typing():
+    index = InvertedIndex()
+    index.add("ana", COMMENT, 1, "Mucha hambre en la tarde")
+    assert _doc_keys(index, "hamb") == [("ana", 1)]
+    # Con espacio al final la palabra ya está completa
+    assert _doc_keys(index, "hamb ") == []
+
+
+def test_replacing_and_removing_documents():
+    index = InvertedIndex(merge_postings=4)
+    index.add("ana", COMMENT, 1, "Desayuné avena")
+    assert not index.add("ana", COMMENT, 1, "Desayuné avena")
+    index.add("ana", COMMENT, 1, "Desayuné huevo")
+    assert _doc_keys(index, "avena ") == []
+    assert _doc_keys(index, "huevo ") == [("ana", 1)]
+    assert index.replace_source("ana", COMMENT, {2: "Cené avena"}) == 2
+    assert _doc_keys(index, "huevo ") == []
+    assert _doc_keys(index, "avena ") == [("ana", 2)]
+    assert _doc_keys(index, "avena ", patients=["beto"]) == []
+
+
+def test_bulk_load_matches_one_by_one():
+    rows = [(f"p{k % 7}", COMMENT, k, f"comida {k % 5} con frijoles y nopales día {k}") for k in range(200)]
+    uno = InvertedIndex(merge_postings=50)
+    for row in rows:
+        uno.add(*row)
+    masivo = InvertedIndex()
+    masivo.add_many(rows)
+    for query in ("frijoles", "nopales 3", "comida 4 frij"):
+        assert sorted(_doc_keys(uno, query, limit=500)) == sorted(_doc_keys(masivo, query, limit=500))
+
+
+def test_search_index_follows_the_database(tmp_path):
+    storage = Storage(str(tmp_path / "n.db"))
+    plan = pd.DataFrame(
+        [("Lunes", "Comida", "Pechuga de pollo con verduras")],
+        columns=["Día", "Tiempo de comida", "Descripción"],
+    )
+    index = SearchIndex(storage, PlanStore(storage, lambda: plan))
+    registro = {"date": date(2024, 5, 1), "mood": "Bien", "comentarios": "Comí pollo en casa"}
+    registro.update(desayuno=True, colacion1=True, comida=True, colacion2=False, cena=True)
+    storage.upsert_daily_log("ana", registro)
+
+    resultados = index.search("pollo")
+    assert {r["fuente"] for r in resultados} == {"Plan", "Comentario"}
+    comentario = next(r for r in resultados if r["fuente"] == "Comentario")
+    assert comentario["paciente"] == "ana"
+    assert comentario["fecha"] == date(2024, 5, 1)
+    assert "<mark>pollo</mark>" in comentario["resaltado"]
+
+    # Cambios hechos fuera de la sesión se ven al sincronizar
+    registro["comentarios"] = "Comí pescado"
+    storage.upsert_daily_log("ana", registro)
+    index.sync(force=True)
+    assert [r["fuente"] for r in index.search("pollo")] == ["Plan"]
+    assert [r["paciente"] for r in index.search("pescado")] == ["ana"]
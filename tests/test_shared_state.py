@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from nutri.shared_state import (
+    LocalVersionCache,
+    MemoryBackend,
+    PatientVersions,
+    SessionStore,
+    backend_from_url,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return backend_from_url(f"sqlite:///{tmp_path / 'estado.db'}")
+
+
+def test_key_value_operations(backend):
+    assert backend.get("a") is None
+    backend.set("a", "uno")
+    assert backend.get("a") == "uno"
+    assert backend.incr("n") == 1
+    assert backend.incr("n") == 2
+    backend.delete("a")
+    assert backend.get("a") is None
+
+
+def test_keys_expire(backend):
+    backend.set("corta", "x", ttl=0.05)
+    backend.set("larga", "y", ttl=60)
+    backend.expire("larga", 0.05)
+    time.sleep(0.1)
+    assert backend.get("corta") is None
+    assert backend.get("larga") is None
+
+
+def test_sessions(backend):
+    sesiones = SessionStore(backend, ttl=60)
+    token = sesiones.create("brenda", "nutrióloga")
+    assert sesiones.get(token) == {"username": "brenda", "role": "nutrióloga"}
+    # Un token inventado no abre nada
+    assert sesiones.get(token + "x") is None
+    sesiones.delete(token)
+    assert sesiones.get(token) is None
+
+
+def test_a_session_is_renewed_when_it_is_used(backend):
+    sesiones = SessionStore(backend, ttl=0.3)
+    token = sesiones.create("ana", "paciente")
+    time.sleep(0.2)
+    assert sesiones.get(token) is not None
+    time.sleep(0.2)
+    assert sesiones.get(token) is not None
+    time.sleep(0.4)
+    assert sesiones.get(token) is None
+
+
+def test_versions_are_shared_between_workers(tmp_path):
+    url = f"sqlite:///{tmp_path / 'estado.db'}"
+    uno = PatientVersions(LocalVersionCache(backend_from_url(url), version_ttl=0))
+    otro_cache = LocalVersionCache(backend_from_url(url), version_ttl=60)
+    otro = PatientVersions(otro_cache)
+    assert otro.current("ana") == 0
+    assert uno.bump("ana") == 1
+    # La copia local se usa hasta que vence
+    assert otro.current("ana") == 0
+    otro_cache.version_ttl = 0
+    assert otro.current("ana") == 1
+    assert otro.bump("ana") == 2
+    assert uno.current("ana") == 2
+
+
+def test_unknown_urls_are_rejected():
+    with pytest.raises(ValueError):
+        backend_from_url("postgres://localhost/nutri")
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from nutri.schema import FULL_MASK, MEAL_COLS
+from nutri.streaks import StreakTracker
+
+
+def _runs(days):
+    """Racha actual y más larga recorriendo los días cumplidos en orden."""
+    current = longest = 0
+    previous = None
+    for d in sorted(days):
+        current = current + 1 if previous is not None and d == previous + 1 else 1
+        longest = max(longest, current)
+        previous = d
+    return current, longest
+
+
+def test_empty_tracker():
+    tracker = StreakTracker()
+    assert tracker.current == 0
+    assert tracker.longest == 0
+
+
+def test_current_is_the_run_ending_on_the_last_complete_day():
+    tracker = StreakTracker.from_arrays([1, 2, 3, 10, 11], [FULL_MASK] * 5)
+    assert tracker.current == 2
+    assert tracker.longest == 3
+
+
+def test_incomplete_days_do_not_count():
+    tracker = StreakTracker.from_arrays([1, 2, 3], [FULL_MASK, FULL_MASK - 1, FULL_MASK])
+    assert tracker.current == 1
+    assert tracker.longest == 1
+
+
+def test_filling_a_gap_joins_both_runs():
+    tracker = StreakTracker.from_arrays([1, 2, 4, 5], [FULL_MASK] * 4)
+    assert tracker.update(3, True)
+    assert tracker.current == 5
+    assert tracker.longest == 5
+    assert not tracker.update(3, True)
+
+
+def test_unmarking_a_day_splits_its_run():
+    tracker = StreakTracker.from_arrays(range(1, 8), [FULL_MASK] * 7)
+    assert tracker.update(4, False)
+    assert tracker.current == 3
+    assert tracker.longest == 3
+    assert tracker.update(7, False)
+    assert tracker.current == 2
+    assert not tracker.update(7, False)
+
+
+def test_random_edits_match_a_full_recount():
+    rng = np.random.default_rng(0)
+    tracker = StreakTracker()
+    complete = set()
+    for _ in range(2_000):
+        d = int(rng.integers(0, 60))
+        done = bool(rng.random() < 0.7)
+        tracker.update(d, done)
+        if done:
+            complete.add(d)
+        else:
+            complete.discard(d)
+        assert (tracker.current, tracker.longest) == _runs(complete)
+
+
+def test_from_frame_uses_dates():
+    inicio = date(2024, 1, 1)
+    df = pd.DataFrame({"date": [inicio + timedelta(days=k) for k in range(4)]})
+    for c in MEAL_COLS:
+        df[c] = [True, True, False, True]
+    tracker = StreakTracker.from_frame(df)
+    assert tracker.current == 1
+    assert tracker.longest == 2
+    tracker.update(inicio + timedelta(days=2), True)
+    assert tracker.current == 4
@@ -0,0 +1,55 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from nutri.timeseries import WEIGHT_DTYPES, TimeSeries, dates_to_ordinals, ordinals_to_dates
+
+
+def test_ordinal_conversions_round_trip():
+    fechas = [date(1999, 12, 31), date(2024, 2, 29)]
+    ordinales = dates_to_ordinals(fechas)
+    assert list(ordinales) == [d.toordinal() for d in fechas]
+    assert list(ordinals_to_dates(ordinales)) == fechas
+    assert list(dates_to_ordinals(["2024-02-29"])) == [date(2024, 2, 29).toordinal()]
+
+
+def test_upsert_keeps_days_sorted_and_unique():
+    rng = np.random.default_rng(2)
+    series = TimeSeries(WEIGHT_DTYPES)
+    expected = {}
+    for _ in range(500):
+        d = int(rng.integers(0, 200))
+        w = float(rng.integers(60, 90))
+        series.upsert(d, weight=w)
+        expected[d] = w
+    assert list(series.days) == sorted(expected)
+    assert list(series.column("weight")) == [expected[d] for d in sorted(expected)]
+
+
+def test_upsert_without_changes_keeps_the_version():
+    series = TimeSeries(WEIGHT_DTYPES)
+    assert series.upsert(date(2024, 1, 1), weight=70.0)
+    version = series.version
+    assert not series.upsert(date(2024, 1, 1), weight=70.0)
+    assert series.version == version
+    assert series.upsert(date(2024, 1, 1), weight=69.5)
+    assert series.get(date(2024, 1, 1), "weight") == 69.5
+    assert series.get(date(2024, 1, 2), "weight") is None
+
+
+def test_from_arrays_sorts_and_span_is_inclusive():
+    series = TimeSeries.from_arrays(WEIGHT_DTYPES, [30, 10, 20], weight=[3.0, 1.0, 2.0])
+    assert list(series.days) == [10, 20, 30]
+    assert series.last("weight") == 3.0
+    assert series.span(10, 20) == (0, 2)
+    assert series.span(11, 29) == (1, 2)
+    assert series.find(15) == -1
+    frame = series.to_frame(start=date.fromordinal(20))
+    assert frame["weight"].tolist() == [2.0, 3.0]
+
+
+def test_views_are_read_only():
+    series = TimeSeries.from_arrays(WEIGHT_DTYPES, [1, 2], weight=[1.0, 2.0])
+    with pytest.raises(ValueError):
+        series.column("weight")[0] = 5.0
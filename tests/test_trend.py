@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from nutri.trend import WeightTrend, forecast_batch
+
+INICIO = date(2024, 1, 1).toordinal()
+
+
+def _series(n, slope, start=80.0, noise=0.0, seed=0, every=1):
+    rng = np.random.default_rng(seed)
+    days = INICIO + np.arange(0, n * every, every)
+    weights = start + slope * (days - INICIO) + rng.normal(0, noise, n)
+    return days, weights
+
+
+def test_steady_loss_reaches_the_goal_on_the_line():
+    days, weights = _series(60, -0.1)
+    fc = WeightTrend.from_arrays(days, weights).forecast(70.0, initial=80.0)
+    assert fc["clear"] and not fc["reached"]
+    assert fc["kg_per_week"] == pytest.approx(-0.7)
+    # 80 - 0.1·t = 70 → t = 100 días desde el inicio
+    assert fc["goal_date"] == date.fromordinal(INICIO + 100)
+    assert fc["goal_early"] <= fc["goal_date"] <= fc["goal_late"]
+
+
+def test_no_clear_trend_without_progress():
+    days, weights = _series(60, 0.0, noise=0.3)
+    fc = WeightTrend.from_arrays(days, weights).forecast(70.0, initial=80.0)
+    assert not fc["clear"]
+    assert fc["goal_date"] is None
+
+
+def test_goal_already_reached():
+    days, weights = _series(30, -0.1, start=71.0)
+    fc = WeightTrend.from_arrays(days, weights).forecast(70.0, initial=80.0)
+    assert fc["reached"]
+    assert fc["goal_date"] is None
+
+
+def test_an_outlier_barely_moves_the_trend():
+    days, weights = _series(60, -0.1, noise=0.2, seed=1)
+    limpio = WeightTrend.from_arrays(days, weights).forecast(70.0, initial=80.0)
+    weights[40] += 15.0
+    atipico = WeightTrend.from_arrays(days, weights).forecast(70.0, initial=80.0)
+    assert abs(atipico["kg_per_week"] - limpio["kg_per_week"]) < 0.1
+
+
+def test_correcting_the_last_weight_matches_a_rebuild():
+    days, weights = _series(40, -0.05, noise=0.2, seed=2)
+    trend = WeightTrend.from_arrays(days, weights)
+    assert trend.update(int(days[-1]), 75.0)
+    weights[-1] = 75.0
+    rebuilt = WeightTrend.from_arrays(days, weights)
+    assert trend.forecast(70.0, initial=80.0) == rebuilt.forecast(70.0, initial=80.0)
+    # Un día anterior al último no se puede agregar en su lugar
+    assert not trend.update(int(days[0]), 70.0)
+
+
+def test_batch_matches_one_patient_at_a_time():
+    series = [
+        _series(90, -0.08, noise=0.3, seed=3),
+        _series(20, 0.05, start=60.0, noise=0.1, seed=4, every=3),
+        _series(5, -0.2, seed=5),
+        _series(120, 0.0, noise=0.4, seed=6),
+    ]
+    goals = [72.0, 65.0, 79.0, 70.0]
+    initials = [80.0, 60.0, 80.0, 80.0]
+    batch = forecast_batch([d for d, _ in series], [w for _, w in series], goals, initials)
+    for i, ((days, weights), goal, initial) in enumerate(zip(series, goals, initials)):
+        fc = WeightTrend.from_arrays(days, weights).forecast(goal, initial=initial)
+        assert batch["kg_per_week"][i] == pytest.approx(fc["kg_per_week"])
+        assert bool(batch["clear"][i]) == fc["clear"]
+        assert batch["last_day"][i] == days[-1]
+        base = date.fromordinal(int(days[-1]))
+        for key, fecha in (("goal_days", "goal_date"), ("goal_early_days", "goal_early"),
+                           ("goal_late_days", "goal_late")):
+            t = batch[key][i]
+            esperado = None if np.isnan(t) or t > 730 else base + timedelta(days=round(float(t)))
+            assert esperado == fc[fecha], (i, key)
+
+
+def test_batch_with_an_empty_series():
+    batch = forecast_batch([[], _series(30, -0.1)[0]], [[], _series(30, -0.1)[1]],
+                           [70.0, 70.0], [80.0, 80.0])
+    assert not batch["clear"][0]
+    assert batch["clear"][1]
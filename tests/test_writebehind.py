@@ -0,0 +1,92 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from nutri.events import LOG, WEIGHT
+from nutri.schema import MEAL_COLS
+from nutri.storage import Storage
+from nutri.writebehind import WriteBehind
+
+INICIO = date(2024, 1, 1)
+
+
+def _registro(k, comentario=None):
+    registro = {"date": INICIO + timedelta(days=k), "mood": "Bien", "comentarios": comentario}
+    registro.update((c, True) for c in MEAL_COLS)
+    return registro
+
+
+class FlakyStorage:
+    """Storage que rechaza los lotes de varias escrituras y falla tras `ok` escrituras sueltas."""
+
+    def __init__(self, storage, ok):
+        self.storage = storage
+        self.ok = ok
+
+    def upsert_batch(self, registros=(), pesos=(), resumenes=()):
+        if len(registros) + len(pesos) + len(resumenes) > 1:
+            raise ValueError("lote inválido")
+        if self.ok == 0:
+            raise sqlite3.OperationalError("database is locked")
+        self.ok -= 1
+        return self.storage.upsert_batch(registros, pesos, resumenes)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(str(tmp_path / "n.db"))
+
+
+def test_repeated_writes_are_coalesced_and_visible_before_the_flush(storage):
+    cola = WriteBehind(storage, delay=60)
+    cola.put_log("ana", _registro(0, "primero"))
+    cola.put_log("ana", _registro(0, "corregido"))
+    cola.put_weight("ana", INICIO, 80.0)
+    cola.put_weight("ana", INICIO, 79.5)
+    assert cola.stats["juntadas"] == 2
+
+    pendientes = {e.kind: e.data for e in cola.pending("ana")}
+    assert pendientes[LOG]["comentarios"] == "corregido"
+    assert pendientes[WEIGHT]["weight"] == 79.5
+    assert cola.pending("beto") == []
+    assert storage.load_events("ana", after=0) == []
+
+    assert cola.flush()
+    assert cola.pending("ana") == []
+    assert len(storage.load_events("ana", after=0)) == 2
+    assert list(storage.load_weight_series("ana").column("weight")) == [79.5]
+
+
+def test_a_rejected_batch_stays_queued(storage, monkeypatch):
+    cola = WriteBehind(storage, delay=60)
+    cola.put_weight("ana", INICIO, 80.0)
+    original = storage.upsert_batch
+
+    def bloqueada(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(storage, "upsert_batch", bloqueada)
+    assert not cola.flush()
+    assert [e.data["weight"] for e in cola.pending("ana")] == [80.0]
+    # Lo encolado mientras tanto no se pisa con lo que regresa a la cola
+    cola.put_weight("ana", INICIO, 79.0)
+    monkeypatch.setattr(storage, "upsert_batch", original)
+    assert cola.flush()
+    assert list(storage.load_weight_series("ana").column("weight")) == [79.0]
+
+
+def test_only_unwritten_entries_are_requeued(storage):
+    cola = WriteBehind(FlakyStorage(storage, ok=2), delay=60)
+    for k in range(5):
+        cola.put_weight("ana", INICIO + timedelta(days=k), 70.0 + k)
+    assert not cola.flush()
+    assert cola.stats["escritas"] == 2
+    assert len(cola.pending("ana")) == 3
+
+    cola.storage.ok = 10
+    assert cola.flush()
+    assert cola.pending("ana") == []
+    # Cada peso se guardó una sola vez
+    assert len(storage.load_events("ana", after=0)) == 5
+    assert list(storage.load_weight_series("ana").column("weight")) == [70.0, 71.0, 72.0, 73.0, 74.0]